@@ -0,0 +1,6 @@
+'''
+Shared modules of ViWrap
+Note: The shared modules (i.e., seq_io, job_pool, supervisor) only use standard libraries unless their docstrings say otherwise,
+so that helper scripts running in other conda envs can also import them. Scripts in the ViWrap env import them as "scripts.X",
+and helper scripts import them as "X" from this folder
+'''
@@ -4,6 +4,8 @@ try:
     import warnings
     import sys
     import os
+    import resource_pool # For sharing CPU cores and memory among all tools of a run
+    import process_metrics # For recording the resource usage of all tools of a run
     from glob import glob
     warnings.filterwarnings("ignore")   
 except Exception as e:
@@ -16,8 +18,9 @@ def add_custom_MAGs_to_host_db__make_gtdbtk_results(viwrap_outdir, custom_MAGs_d
         # Step 1 Check the extension of input genomes
         sys.exit(f'Please make sure your there are input MAGs in {custom_MAGs_dir} and all of them end with ".fasta"')
     else:
-        os.system(f'gtdbtk de_novo_wf --genome_dir {custom_MAGs_dir} --bacteria --outgroup_taxon p__Patescibacteria --out_dir {viwrap_outdir}/07_iPHoP_outdir/custom_MAGs_GTDB-tk_results --cpus {threads} --force --extension fasta 1> /dev/null')
-        os.system(f'gtdbtk de_novo_wf --genome_dir {custom_MAGs_dir} --archaea --outgroup_taxon p__Altiarchaeota --out_dir {viwrap_outdir}/07_iPHoP_outdir/custom_MAGs_GTDB-tk_results --cpus {threads} --force --extension fasta 1> /dev/null')
+        with resource_pool.allocate(int(threads), resource_pool.TOOL2MEMORY['GTDB-Tk']) as cores:
+            process_metrics.system(f'gtdbtk de_novo_wf --genome_dir {custom_MAGs_dir} --bacteria --outgroup_taxon p__Patescibacteria --out_dir {viwrap_outdir}/07_iPHoP_outdir/custom_MAGs_GTDB-tk_results --cpus {cores} --force --extension fasta 1> /dev/null', check=True)
+            process_metrics.system(f'gtdbtk de_novo_wf --genome_dir {custom_MAGs_dir} --archaea --outgroup_taxon p__Altiarchaeota --out_dir {viwrap_outdir}/07_iPHoP_outdir/custom_MAGs_GTDB-tk_results --cpus {cores} --force --extension fasta 1> /dev/null', check=True)
                 
 viwrap_outdir, custom_MAGs_dir, threads = sys.argv[1], sys.argv[2], sys.argv[3]
 add_custom_MAGs_to_host_db__make_gtdbtk_results(viwrap_outdir, custom_MAGs_dir, threads)        
\ No newline at end of file
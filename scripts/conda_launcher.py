@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+
+'''
+Aim: Start helper scripts and tools in the ViWrap-* conda envs without paying "conda run" for every call
+Note: Each env is activated by "conda run" only once; the env variables it sets (PATH, LD_LIBRARY_PATH, CONDA_PREFIX, and those from activate.d scripts)
+are cached, and later commands are started directly by the shell with these variables.
+If an env can not be resolved, its commands fall back to "conda run".
+The time spent on resolving envs and starting commands is kept, and can be reported at the end of the run.
+Commands are supervised (see supervisor.py): their stderr is kept in a job log, and a non-zero exit code raises JobError with the end of the log,
+so that the step fails at once instead of passing broken results to the next steps
+'''
+
+try:
+    import warnings
+    import sys
+    import os
+    import json
+    import time
+    import threading
+    import subprocess
+    from concurrent.futures import ThreadPoolExecutor
+    warnings.filterwarnings("ignore")
+    try:
+        from scripts import process_metrics
+        from scripts import supervisor
+    except ImportError:
+        import process_metrics
+        import supervisor
+except Exception as e:
+    sys.stderr.write(str(e) + "\n\n")
+    exit(1)
+
+
+ENV_DUMP_MARKER = '__ViWrap_env__'
+ENV_DUMP_CMD = f"python -c \"import os, json; print('{ENV_DUMP_MARKER}' + json.dumps(dict(os.environ)))\""
+
+env_dir2resolved = {} # env_dir => (changed variables, removed variables), or None if the env can not be resolved
+env_dir2resolve_time = {} # env_dir => seconds spent on "conda run" to resolve it
+env_dir2launches = {} # env_dir => [number of commands started, total seconds spent on starting them]
+env_dir2lock = {} # env_dir => lock, so that an env is only resolved once when steps run at the same time
+lock = threading.Lock()
+
+
+def resolve_env(env_dir):
+    # Activate the env by "conda run" once and keep the variables that differ from the current ones
+    with lock:
+        env_lock = env_dir2lock.setdefault(env_dir, threading.Lock())
+    with env_lock:
+        if env_dir in env_dir2resolved:
+            return env_dir2resolved[env_dir]
+        start_time = time.time()
+        resolved = None
+        try:
+            output = subprocess.run(f"conda run -p {env_dir} {ENV_DUMP_CMD}", shell=True, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, universal_newlines=True).stdout
+            if ENV_DUMP_MARKER in output:
+                activated = json.loads(output.split(ENV_DUMP_MARKER, 1)[1].splitlines()[0])
+                # Variables of "conda run" itself should not leak into later commands
+                activated.pop('CONDA_RUN', None)
+                changed = {key: value for key, value in activated.items() if os.environ.get(key) != value}
+                removed = [key for key in os.environ if key not in activated]
+                resolved = (changed, removed)
+        except (OSError, ValueError):
+            resolved = None
+        env_dir2resolved[env_dir] = resolved
+        env_dir2resolve_time[env_dir] = time.time() - start_time
+        return resolved
+
+def resolve_envs(env_dirs, max_workers = 4):
+    # Resolve all envs of a run at the start, a few at the same time
+    with ThreadPoolExecutor(max_workers = max_workers) as executor:
+        list(executor.map(resolve_env, env_dirs))
+
+def get_env(env_dir):
+    # The variables to start a command in the env: the current ones (so that later changes, i.e., the resource pool, are kept) plus the resolved ones
+    resolved = resolve_env(env_dir)
+    if resolved is None:
+        return None
+    changed, removed = resolved
+    env = dict(os.environ)
+    for key in removed:
+        env.pop(key, None)
+    env.update(changed)
+    return env
+
+def get_job_name(cmd):
+    # The helper script (i.e., "python path/to/run_CheckV.py ..." => run_CheckV) or the tool of a command
+    words = cmd.split()
+    if len(words) > 1 and words[0] == 'python':
+        return os.path.splitext(os.path.basename(words[1]))[0]
+    return os.path.basename(words[0]) if words else 'job'
+
+def run(env_dir, cmd):
+    # Replacement of os.system(f"conda run -p {env_dir} {cmd}"); returns 0, or raises supervisor.JobError if the command fails
+    env = get_env(env_dir)
+    def popen(cmd, **kwargs):
+        start_time = time.time()
+        if env is None:
+            proc = process_metrics.Popen(f"conda run -p {env_dir} {cmd}", shell=True, **kwargs)
+        else:
+            proc = process_metrics.Popen(cmd, shell=True, env=env, **kwargs)
+        launch_time = time.time() - start_time
+        with lock:
+            launches = env_dir2launches.setdefault(env_dir, [0, 0.0])
+            launches[0] += 1
+            launches[1] += launch_time
+        return proc
+    # Helper scripts are not run again, as most of them refuse to write into the folders left by a failed run
+    supervisor.run(cmd, get_job_name(cmd), popen)
+    return 0
+
+def get_launch_report():
+    # One line for each env: how long resolving took, and how many commands were started and the mean time to start one
+    lines = []
+    for env_dir in sorted(env_dir2launches.keys() | env_dir2resolve_time.keys()):
+        num, total_time = env_dir2launches.get(env_dir, [0, 0.0])
+        resolve_time = env_dir2resolve_time.get(env_dir, 0.0)
+        mode = 'resolved once' if env_dir2resolved.get(env_dir) else 'fell back to "conda run"'
+        mean_time = total_time / num * 1000 if num else 0.0
+        lines.append(f"{os.path.basename(env_dir)}: {mode} in {resolve_time:.1f} s; {num} launches, {mean_time:.1f} ms each")
+    return '\n'.join(lines)
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+
+'''
+Aim: Estimate the wall time, peak memory (RSS), and disk footprint of each ViWrap step before a run (--dry_run)
+Note: Each step has a rough built-in cost, scaled by the size of the input assembly and reads and by the number of threads (Amdahl's law).
+When steps are finished, the pipeline appends what they really took to a step history file (ViWrap_step_history.jsonl in the db dir);
+the built-in cost of a step is then calibrated by the median ratio of what was measured to what was estimated in the previous runs
+'''
+
+try:
+    import warnings
+    import sys
+    import os
+    import json
+    from datetime import timedelta
+    from statistics import median
+    from collections import namedtuple
+    warnings.filterwarnings("ignore")
+except Exception as e:
+    sys.stderr.write(str(e) + "\n\n")
+    exit(1)
+
+
+GZ_RATIO = 3.5 # Rough compression ratio of gzipped fasta and fastq files
+FASTQ_BYTES_PER_BASE = 2.1 # A fastq record stores each base and its quality, plus the header lines
+
+# fixed: seconds; per_mbp/per_gbp: seconds with 1 thread per Mbp of assembly/per Gbp of reads; parallel: the fraction of the work that uses more threads
+# rss_gb: peak memory in GB; disk_per_mbp/disk_per_gbp: MB written per Mbp of assembly/per Gbp of reads
+StepCost = namedtuple('StepCost', ['fixed', 'per_mbp', 'per_gbp', 'parallel', 'rss_gb', 'disk_per_mbp', 'disk_per_gbp'], defaults = [0, 0, 0, 0.0, 1, 0, 0])
+
+# Rough built-in costs, only used until there are measured steps in the history
+STEP2COST = {
+    'identify_virus_by_VIBRANT': StepCost(60, 600, 0, 0.9, 4, 5),
+    'identify_virus_by_VirSorter2': StepCost(120, 1200, 0, 0.9, 8, 10),
+    'identify_virus_by_DVF': StepCost(60, 300, 0, 0.0, 4, 1),
+    'get_overlapped_viral_scaffolds': StepCost(30, 5, 0, 0.0, 2, 1),
+    'get_virus_genome_files': StepCost(30, 5, 0, 0.0, 2, 1),
+    'map_reads': StepCost(60, 20, 3600, 0.9, 16, 2, 1500),
+    'run_vRhyme': StepCost(60, 60, 0, 0.8, 8, 2),
+    'get_vRhyme_best_bin_lytic_and_lysogenic_info': StepCost(10, 1),
+    'get_vRhyme_best_bin_scaffold_complete_info': StepCost(10, 1),
+    'make_vRhyme_best_bins_fasta_modified': StepCost(10, 1, 0, 0.0, 1, 1),
+    'make_unbinned_viral_gn': StepCost(10, 1, 0, 0.0, 1, 1),
+    'link_viral_gn': StepCost(10, 1, 0, 0.0, 1, 1),
+    'split_viral_gn': StepCost(10, 1, 0, 0.0, 1, 1),
+    'run_vContact2': StepCost(600, 60, 0, 0.8, 16, 5),
+    'run_Tax_RefSeq': StepCost(60, 30, 0, 0.9, 2, 0.5),
+    'run_Tax_VOG': StepCost(60, 60, 0, 0.9, 1, 0.5),
+    'run_Tax_vContact2': StepCost(10, 1),
+    'combine_Tax': StepCost(10, 1),
+    'run_CheckV': StepCost(120, 60, 0, 0.95, 4, 2),
+    'run_dRep': StepCost(60, 20, 0, 0.9, 2, 2),
+    'run_iPHoP': StepCost(1800, 300, 0, 0.9, 64, 2),
+    'run_iPHoP_custom_MAGs': StepCost(7200, 300, 0, 0.9, 80, 20),
+    'summarize': StepCost(60, 10, 0, 0.0, 4, 2),
+    'visualize': StepCost(30, 1, 0, 0.0, 2, 0.5)
+}
+DEFAULT_COST = StepCost(60, 10, 0, 0.0, 1, 1) # For a step that is not in STEP2COST
+identify_method2step = {'vb': 'identify_virus_by_VIBRANT', 'vs': 'identify_virus_by_VirSorter2', 'dvf': 'identify_virus_by_DVF'} # "identify_virus" runs one of the branches
+
+
+def get_seq_size(seq_file, bytes_per_base = 1):
+    # The number of bases in a fasta/fastq file, estimated from the file size; 0 if it is not there (missing inputs are reported by the pre-check)
+    if not os.path.exists(seq_file):
+        return 0
+    size = os.path.getsize(seq_file)
+    if seq_file.endswith('.gz'):
+        size *= GZ_RATIO
+    return size / bytes_per_base
+
+def get_run_features(args):
+    # The inputs that decide the cost of a run: the sizes of the assembly and the reads, the number of threads, and the identify method
+    reads = [x for x in args.get('input_reads', 'none').split(',') if x and x != 'none']
+    return {
+        'assembly_mbp': round(get_seq_size(args['input_metagenome']) / 1e6, 3),
+        'reads_gbp': round(sum(get_seq_size(x, FASTQ_BYTES_PER_BASE) for x in reads) / 1e9, 3),
+        'threads': int(args['threads']),
+        'identify_method': args['identify_method']
+    }
+
+def get_cost_key(step, features):
+    if step == 'identify_virus':
+        return identify_method2step.get(features.get('identify_method'), step)
+    return step
+
+def get_default_estimate(step, features):
+    # Returns {'wall_time': seconds, 'peak_rss': bytes, 'disk': bytes} from the built-in cost
+    cost = STEP2COST.get(get_cost_key(step, features), DEFAULT_COST)
+    work = cost.per_mbp * features['assembly_mbp'] + cost.per_gbp * features['reads_gbp']
+    threads = max(1, int(features['threads']))
+    return {
+        'wall_time': cost.fixed + work * ((1 - cost.parallel) + cost.parallel / threads),
+        'peak_rss': cost.rss_gb * 1e9,
+        'disk': (cost.disk_per_mbp * features['assembly_mbp'] + cost.disk_per_gbp * features['reads_gbp']) * 1e6
+    }
+
+def read_history(history_file):
+    # Returns [step record]; broken lines (i.e., cut off by a crash) are skipped
+    records = []
+    if history_file and os.path.exists(history_file):
+        with open(history_file) as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    pass
+    return records
+
+def get_calibration(records):
+    # Returns cost key => {metric: median ratio of measured to estimated, 'steps': the number of measured steps}
+    metric2field = {'wall_time': 'wall_time', 'peak_rss': 'peak_rss', 'disk': 'disk_bytes'}
+    key2ratios = {} # cost key => {metric: [ratio]}
+    for record in records:
+        estimate = get_default_estimate(record['step'], record['features'])
+        metric2ratios = key2ratios.setdefault(get_cost_key(record['step'], record['features']), {})
+        for metric, field in metric2field.items():
+            if record.get(field) is not None and estimate[metric] > 0:
+                metric2ratios.setdefault(metric, []).append(record[field] / estimate[metric])
+    calibration = {}
+    for key, metric2ratios in key2ratios.items():
+        calibration[key] = {metric: median(ratios) for metric, ratios in metric2ratios.items()}
+        calibration[key]['steps'] = max(len(ratios) for ratios in metric2ratios.values()) if metric2ratios else 0
+    return calibration
+
+def get_estimate(step, features, calibration):
+    estimate = get_default_estimate(step, features)
+    factors = calibration.get(get_cost_key(step, features), {})
+    for metric in ['wall_time', 'peak_rss', 'disk']:
+        estimate[metric] *= factors.get(metric, 1)
+    estimate['calibrated_steps'] = factors.get('steps', 0)
+    return estimate
+
+def simulate(order, dependencies, name2wall_time, max_parallel_steps):
+    # Start ready steps in order as the pipeline does, at most max_parallel_steps at the same time; returns name => (start, end) in seconds
+    name2span = {}
+    running = {} # name => end
+    now = 0.0
+    while len(name2span) < len(order):
+        for name in order:
+            if len(running) >= max_parallel_steps:
+                break
+            if name not in name2span and all(x in name2span and x not in running for x in dependencies[name]):
+                name2span[name] = (now, now + name2wall_time[name])
+                running[name] = now + name2wall_time[name]
+        name = min(running, key = running.get)
+        now = running.pop(name)
+    return name2span
+
+def get_plan_report(run, max_parallel_steps):
+    # The planned steps with their estimates, the total wall time, the peak memory of the steps running at the same time, and the disk footprint
+    dependencies = run.get_dependencies()
+    order = run.get_order(dependencies)
+    if run.priority:
+        order = sorted(order, key = run.priority)
+    records = read_history(run.history_file)
+    calibration = get_calibration(records)
+    name2estimate = {}
+    for name in order:
+        step = run.steps[name]
+        name2estimate[name] = get_estimate(step.marker_name, step.run_features or run.run_features, calibration)
+    name2span = simulate(order, dependencies, {name: name2estimate[name]['wall_time'] for name in order}, max(1, int(max_parallel_steps)))
+
+    def get_time(seconds):
+        return str(timedelta(seconds = int(seconds)))
+    name_width = max(len(name) for name in order) + 2
+    lines = [f"{'step':<{name_width}}{'start':>10}{'wall time':>12}{'peak RSS':>12}{'disk':>10}  estimate from"]
+    for name in order:
+        estimate = name2estimate[name]
+        source = f"{estimate['calibrated_steps']} previous runs" if estimate['calibrated_steps'] else 'built-in cost'
+        lines.append(f"{name:<{name_width}}{get_time(name2span[name][0]):>10}{get_time(estimate['wall_time']):>12}{estimate['peak_rss'] / 1e9:>9.1f} GB{estimate['disk'] / 1e9:>7.1f} GB  {source}")
+        if dependencies[name]:
+            lines.append(f"{'':<{name_width}}after: {', '.join(sorted(dependencies[name]))}")
+
+    # The peak memory is the largest sum of the steps running at the same time (checked at each step start)
+    peak_rss = max(sum(name2estimate[x]['peak_rss'] for x in order if x == name or name2span[x][0] <= name2span[name][0] < name2span[x][1]) for name in order)
+    lines.append('')
+    lines.append(f"Estimated total wall time: {get_time(max(end for _, end in name2span.values()))}")
+    lines.append(f"Estimated peak memory of the steps running at the same time: {peak_rss / 1e9:.1f} GB")
+    lines.append(f"Estimated disk footprint: {sum(x['disk'] for x in name2estimate.values()) / 1e9:.1f} GB")
+    lines.append(f"Calibrated by {len(records)} measured steps in {run.history_file}" if records else f"No measured steps in {run.history_file} yet; all estimates are rough built-in costs")
+    return '\n'.join(lines)
@@ -11,72 +11,37 @@ try:
     from subprocess import DEVNULL, STDOUT, check_call
     from Bio import SeqIO
     import re
+    from scripts import seq_io # For streaming fasta, faa, and ffn reading and writing
+    from scripts import job_pool # For running downloads with a bounded number of parallel processes
 except Exception as e:
     sys.stderr.write(str(e) + "\n\n")
     exit(1)
 
-WHITESPACE_PATTERN = re.compile(r"\s+")
-
-
-def store_seq(input_seq_file):  
-    # The input sequence file should be a file with full path
-    head = ""  # Store the header line
-    seq_dict = {}  # Store the sequence dict
-
-    with open(input_seq_file, "r") as seq_lines:
-        for line in seq_lines:
-            line = line.rstrip("\n")  # Remove "\n" in the end
-            if ">" in line:
-                head = WHITESPACE_PATTERN.split(line)[0]
-                seq_dict[head] = ""
-            else:
-                seq_dict[head] += line
-    
-    return seq_dict    
-
-def write_down_seq(seq_dict, path_to_file): 
-    # Two inputs are required:
-    # (1) The dict of the sequence
-    # (2) The path that you want to write your sequence down
-    
-    seq_file = open(path_to_file,"w")
-    for head in seq_dict:
-        seq_file.write(head + "\n")
-        seq_file.write(seq_dict[head] + "\n")
-    seq_file.close()
     
 def dl_refseq_viral_protein(tax_classification_db_dir):
-    dl_cmd = []
+    dl_cmd = [] # [(file, cmd)]
     for i in range(1, 4):
         each_dl_cmd = f'wget https://ftp.ncbi.nlm.nih.gov/refseq/release/viral/viral.{i}.protein.faa.gz -O {tax_classification_db_dir}/viral.{i}.protein.faa.gz'
         each_gzip_cmd = f'gzip -d {tax_classification_db_dir}/viral.{i}.protein.faa.gz'
         each_cmd = each_dl_cmd + ";" + each_gzip_cmd
-        dl_cmd.append(each_cmd)
+        dl_cmd.append((f'viral.{i}.protein.faa', each_cmd))
     
-    n = 4 # The number of parallel processes
-    for j in range(max(int(len(dl_cmd)/n + 1), 1)):
-        procs = [subprocess.Popen(i, shell=True, stdout=DEVNULL) for i in dl_cmd[j*n: min((j+1)*n, len(dl_cmd))] ]
-        for p in procs:
-            p.wait()  
+    job_pool.run_jobs(dl_cmd, 4, shell=True, stdout=DEVNULL) # At most 4 downloads at the same time
             
     combind_cmd = f'cat {tax_classification_db_dir}/viral.*.protein.faa > {tax_classification_db_dir}/NCBI_RefSeq_viral.faa'
     rm_cmd = f'rm {tax_classification_db_dir}/viral.*.protein.faa'
     os.system(combind_cmd + ";" + rm_cmd)
     
 def dl_refseq_viral_protein_gpff(tax_classification_db_dir):
-    dl_cmd = []
+    dl_cmd = [] # [(file, cmd)]
     #os.mkdir(tax_classification_db_dir)
     for i in range(1, 4):
         each_dl_cmd = f'wget https://ftp.ncbi.nlm.nih.gov/refseq/release/viral/viral.{i}.protein.gpff.gz -O {tax_classification_db_dir}/viral.{i}.protein.gpff.gz'
         each_gzip_cmd = f'gzip -d {tax_classification_db_dir}/viral.{i}.protein.gpff.gz'
         each_cmd = each_dl_cmd + ";" + each_gzip_cmd
-        dl_cmd.append(each_cmd)
+        dl_cmd.append((f'viral.{i}.protein.gpff', each_cmd))
     
-    n = 4 # The number of parallel processes
-    for j in range(max(int(len(dl_cmd)/n + 1), 1)):
-        procs = [subprocess.Popen(i, shell=True, stdout=DEVNULL) for i in dl_cmd[j*n: min((j+1)*n, len(dl_cmd))] ]
-        for p in procs:
-            p.wait()  
+    job_pool.run_jobs(dl_cmd, 4, shell=True, stdout=DEVNULL) # At most 4 downloads at the same time
             
     combind_cmd = f'cat {tax_classification_db_dir}/viral.*.protein.gpff > {tax_classification_db_dir}/NCBI_RefSeq_viral.gpff'
     rm_cmd = f'rm {tax_classification_db_dir}/viral.*.protein.gpff'
@@ -101,7 +66,6 @@ def parse_gpff(tax_classification_db_dir):
     fo.close()    
     
 def grep_NCBI_RefSeq_viral_proteins_w_tax(tax_classification_db_dir):
-    pro_seq = store_seq(f'{tax_classification_db_dir}/NCBI_RefSeq_viral.faa')
     accessions_w_tax = set()
     
     with open(f'{tax_classification_db_dir}/NCBI_RefSeq_viral_protein2NCBI_tax.txt',"r") as lines:
@@ -111,14 +75,17 @@ def grep_NCBI_RefSeq_viral_proteins_w_tax(tax_classification_db_dir):
             accessions_w_tax.add(acc)
     lines.close()        
     
-    pro_seq_w_tax = {}
-    for pro in pro_seq:
-        acc = pro.replace(">", "").split(".", 1)[0]
-        if acc in accessions_w_tax:
-            acc_w_arrow = ">" + acc
-            pro_seq_w_tax[acc_w_arrow] = pro_seq[pro]
-    
-    write_down_seq(pro_seq_w_tax, f'{tax_classification_db_dir}/NCBI_RefSeq_viral.faa')
+    # Stream the proteins into a tmp file and then replace the original faa; each accession is only written once
+    pro_seq_file = f'{tax_classification_db_dir}/NCBI_RefSeq_viral.faa'
+    pro_seq_file_tmp = pro_seq_file + '.tmp'
+    accessions_written = set()
+    with seq_io.open_seq_file(pro_seq_file_tmp, 'w') as pro_seq_w_tax:
+        for pro, seq in seq_io.read_seq(pro_seq_file):
+            acc = pro.replace(">", "").split(".", 1)[0]
+            if acc in accessions_w_tax and acc not in accessions_written:
+                accessions_written.add(acc)
+                pro_seq_w_tax.write(f'>{acc}\n{seq}\n')
+    os.replace(pro_seq_file_tmp, pro_seq_file)
 
 def reformat_NCBI_tax_to_ICTV_8_rank_tax(tax_classification_db_dir, ictv_tax_info, pro2ictv_8_rank_tax):
     # Step 1 Store NCBI tax and dereplicate it
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+
+'''
+Aim: Send the parallel sub-jobs of a step (i.e., CheckV of each genome chunk, dRep of each genus, DIAMOND/hmmsearch of each genome or chunk)
+to a chosen backend: the local machine, a SLURM cluster (sbatch/squeue/scancel), or a mock cluster with local workers
+Note: The backend is chosen by the VIWRAP_EXECUTOR env variable: "local" (default), "slurm", or "mock".
+Cluster jobs run the same commands with the same paths, so the output dir must be on a file system shared by all nodes;
+their outputs are written straight into the usual layout. Each cluster job is a bash script next to its job log
+("job.sh"), which writes the exit code of the command to "job.exit"; a job that is gone without this file has been killed (i.e., out of memory).
+The mock cluster queues the job scripts and runs them by VIWRAP_MAX_CLUSTER_JOBS local workers, so the cluster path can be tested on one machine
+'''
+
+try:
+    import warnings
+    import sys
+    import os
+    import math
+    import time
+    import signal
+    import shlex
+    import threading
+    import subprocess
+    from collections import deque
+    from datetime import datetime
+    warnings.filterwarnings("ignore")
+    try:
+        from scripts import resource_pool
+        from scripts import process_metrics
+    except ImportError:
+        import resource_pool
+        import process_metrics
+except Exception as e:
+    sys.stderr.write(str(e) + "\n\n")
+    exit(1)
+
+
+EXECUTOR_ENV = 'VIWRAP_EXECUTOR'
+MAX_CLUSTER_JOBS_ENV = 'VIWRAP_MAX_CLUSTER_JOBS'
+SBATCH_ARGS_ENV = 'VIWRAP_SBATCH_ARGS'
+STATE_CHECK_INTERVAL = 30 # Seconds between two checks of the scheduler for a cluster job that has not written its exit code
+KILLED = -signal.SIGKILL # The exit code of a cluster job that is gone without its exit code
+
+
+class LocalExecutor:
+    # Jobs are processes on this machine, taking their cores and memory from the resource pool of the run
+    def get_parallel_jobs(self, parallel_jobs):
+        return parallel_jobs
+
+    def get_cores(self, cores):
+        pool = resource_pool.get_pool()
+        if pool is not None:
+            with pool.locked_state() as state:
+                cores = min(int(cores), state['cores'])
+        return cores
+
+    def popen(self, cmd, job, cores = 1, memory = 0, **kwargs):
+        return resource_pool.Popen(cmd, cores, memory, job = job, **kwargs)
+
+
+class ClusterJob:
+    # A Popen-like handle of a cluster job: wait(timeout) returns the exit code or raises subprocess.TimeoutExpired; cancel() kills it
+    def __init__(self, cluster, job_id, job, cmd, exit_file):
+        self.cluster = cluster
+        self.job_id = job_id
+        self.job = job
+        self.cmd = cmd
+        self.exit_file = exit_file
+        self.start_time = time.time()
+        self.last_check_time = self.start_time
+        self.returncode = None
+
+    def poll(self):
+        if self.returncode is None:
+            if os.path.exists(self.exit_file):
+                with open(self.exit_file) as f:
+                    content = f.read().strip()
+                if not content: # The exit code is being written
+                    return None
+                self.returncode = int(content)
+            elif time.time() - self.last_check_time > STATE_CHECK_INTERVAL:
+                self.last_check_time = time.time()
+                if self.cluster.get_state(self.job_id) is None and not os.path.exists(self.exit_file):
+                    self.returncode = KILLED
+            if self.returncode is not None:
+                self.write_metrics()
+        return self.returncode
+
+    def wait(self, timeout = None):
+        end_time = time.time() + timeout if timeout is not None else None
+        while self.poll() is None:
+            if end_time is not None and time.time() >= end_time:
+                raise subprocess.TimeoutExpired(self.cmd, timeout)
+            time.sleep(0.2)
+        return self.returncode
+
+    def cancel(self):
+        self.cluster.cancel(self.job_id)
+        if self.returncode is None:
+            self.returncode = KILLED
+            self.write_metrics()
+
+    def write_metrics(self):
+        # The usage of a cluster job is not known here (see the scheduler accounting); only its wall time and exit code are recorded
+        process_metrics.write_record({
+            'step': process_metrics.get_step(), 'level': 'tool', 'cmd': self.cmd[:process_metrics.MAX_CMD_LENGTH], 'job': self.job,
+            'start_time': str(datetime.fromtimestamp(self.start_time).replace(microsecond=0)), 'start_timestamp': round(self.start_time, 6),
+            'wall_time': round(time.time() - self.start_time, 3), 'user_time': 0.0, 'system_time': 0.0, 'max_rss_bytes': 0, 'read_bytes': 0, 'write_bytes': 0,
+            'exit_code': self.returncode, 'job_id': self.job_id
+        })
+
+
+class ClusterExecutor:
+    # Jobs are bash scripts submitted to a cluster; up to VIWRAP_MAX_CLUSTER_JOBS of them are in the queue at the same time
+    def __init__(self, cluster):
+        self.cluster = cluster
+
+    def get_parallel_jobs(self, parallel_jobs):
+        return max(parallel_jobs, int(os.environ.get(MAX_CLUSTER_JOBS_ENV) or 100))
+
+    def get_cores(self, cores):
+        return int(cores)
+
+    def popen(self, cmd, job, cores = 1, memory = 0, stderr = None, **kwargs):
+        # The job log is the stderr file given by the supervisor; other Popen arguments do not apply to cluster jobs
+        log_file = os.path.abspath(stderr.name)
+        job_file_prefix = log_file[:-len('.stderr.txt')] if log_file.endswith('.stderr.txt') else log_file
+        script_file, exit_file = f'{job_file_prefix}.sh', f'{job_file_prefix}.exit'
+        if os.path.exists(exit_file):
+            os.remove(exit_file)
+        with open(script_file, 'w') as f:
+            # The command runs in a subshell, so that its "exit" does not skip writing the exit code
+            f.write(f"#!/bin/bash\ncd {shlex.quote(os.getcwd())}\n(\n{cmd}\n)\necho $? > {shlex.quote(exit_file)}.tmp && mv {shlex.quote(exit_file)}.tmp {shlex.quote(exit_file)}\n")
+        job_id = self.cluster.submit(job, script_file, log_file, cores, memory)
+        return ClusterJob(self.cluster, job_id, job, cmd, exit_file)
+
+
+class SlurmCluster:
+    def submit(self, job, script_file, log_file, cores, memory):
+        cmd = ['sbatch', '--parsable', '--job-name', job.replace(' ', '_'), '--cpus-per-task', str(cores), '--output', '/dev/null', '--error', log_file, '--open-mode', 'append']
+        if memory:
+            cmd += ['--mem', f'{math.ceil(memory)}G']
+        cmd += shlex.split(os.environ.get(SBATCH_ARGS_ENV, '')) + [script_file]
+        output = subprocess.run(cmd, stdout = subprocess.PIPE, stderr = subprocess.PIPE, universal_newlines = True)
+        if output.returncode != 0:
+            raise OSError(f"sbatch failed for job {job}: {output.stderr.strip()}")
+        return output.stdout.strip().split(';')[0] # "job id" or "job id;cluster name"
+
+    def get_state(self, job_id):
+        # The state of a job in the queue (i.e., PENDING or RUNNING), or None if it is not in the queue anymore
+        output = subprocess.run(['squeue', '-h', '-j', job_id, '-o', '%T'], stdout = subprocess.PIPE, stderr = subprocess.DEVNULL, universal_newlines = True)
+        if output.returncode != 0: # squeue fails for an id that is not known anymore
+            return None
+        return output.stdout.strip() or None
+
+    def cancel(self, job_id):
+        subprocess.run(['scancel', job_id], stdout = subprocess.DEVNULL, stderr = subprocess.DEVNULL)
+
+
+class MockCluster:
+    # A queue of job scripts run by local worker threads, in the order they are submitted; for testing the cluster path on one machine
+    def __init__(self, workers):
+        self.workers = workers
+        self.queue = deque() # [job id]
+        self.job_id2state = {} # job id => 'PENDING' or 'RUNNING'; finished jobs are removed
+        self.job_id2info = {} # job id => (script file, log file)
+        self.job_id2proc = {} # job id => Popen of the running script
+        self.next_job_id = 1
+        self.condition = threading.Condition()
+        for _ in range(workers):
+            threading.Thread(target = self.work, daemon = True).start()
+
+    def submit(self, job, script_file, log_file, cores, memory):
+        with self.condition:
+            job_id = str(self.next_job_id)
+            self.next_job_id += 1
+            self.job_id2state[job_id] = 'PENDING'
+            self.job_id2info[job_id] = (script_file, log_file)
+            self.queue.append(job_id)
+            self.condition.notify()
+        return job_id
+
+    def work(self):
+        while True:
+            with self.condition:
+                while not self.queue:
+                    self.condition.wait()
+                job_id = self.queue.popleft()
+                script_file, log_file = self.job_id2info[job_id]
+                self.job_id2state[job_id] = 'RUNNING'
+                with open(log_file, 'a') as log:
+                    self.job_id2proc[job_id] = subprocess.Popen(['bash', script_file], stdout = subprocess.DEVNULL, stderr = log, start_new_session = True)
+            self.job_id2proc[job_id].wait()
+            with self.condition:
+                self.job_id2state.pop(job_id, None)
+                self.job_id2proc.pop(job_id, None)
+
+    def get_state(self, job_id):
+        with self.condition:
+            return self.job_id2state.get(job_id)
+
+    def cancel(self, job_id):
+        with self.condition:
+            if job_id in self.queue:
+                self.queue.remove(job_id)
+                self.job_id2state.pop(job_id, None)
+            proc = self.job_id2proc.get(job_id)
+            if proc is not None:
+                try:
+                    os.killpg(proc.pid, signal.SIGKILL)
+                except OSError:
+                    pass
+
+
+executor = None # The executor of this process, made at the first use
+executor_lock = threading.Lock()
+
+def get_executor():
+    global executor
+    with executor_lock:
+        if executor is None:
+            name = os.environ.get(EXECUTOR_ENV) or 'local'
+            if name == 'local':
+                executor = LocalExecutor()
+            elif name == 'slurm':
+                executor = ClusterExecutor(SlurmCluster())
+            elif name == 'mock':
+                executor = ClusterExecutor(MockCluster(int(os.environ.get(MAX_CLUSTER_JOBS_ENV) or 4)))
+            else:
+                sys.exit(f"Unknown executor {name}; it should be local, slurm, or mock")
+        return executor
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+
+'''
+Aim: Keep the protein => scaffold => genome relation of all viral genomes in one registry, built once per run
+Note: The registry is a folder of columnar files; every genome, scaffold, and protein gets an integer code (in first-seen order):
+genome.names, scaffold.names, protein.names    names joined by "\n"
+genome.offsets, scaffold.offsets, protein.offsets    start offset of each name in the *.names file (uint64, n + 1 values)
+scaffold.genome    genome code of each scaffold (uint32)
+protein.scaffold    scaffold code of each protein (uint32)
+All files are memory-mapped when loaded, so later stages do not need to re-parse headers or re-walk genome dirs
+Names are the ones used in the genome files, i.e., long names with the genome as the prefix ("vRhyme_bin_1__NODE_1_..._1")
+'''
+
+try:
+    import warnings
+    import sys
+    import os
+    import mmap
+    from array import array
+    from glob import glob
+    from pathlib import Path
+    warnings.filterwarnings("ignore")
+    try:
+        from scripts import seq_io
+    except ImportError:
+        import seq_io
+except Exception as e:
+    sys.stderr.write(str(e) + "\n\n")
+    exit(1)
+
+
+REGISTRY_COLUMNS = ['genome', 'scaffold', 'protein']
+CODE_TYPE = 'I' # uint32 for codes
+OFFSET_TYPE = 'Q' # uint64 for name offsets
+
+
+def write_id_registry(registry_dir, scf_gn_records, pro_scf_gn_records):
+    # scf_gn_records: iterable of (scf, gn); pro_scf_gn_records: iterable of (pro, scf, gn)
+    # Scaffolds only appear in pro_scf_gn_records are also registered
+    code = {column: {} for column in REGISTRY_COLUMNS} # column => name => code
+    scaffold2genome = array(CODE_TYPE)
+    protein2scaffold = array(CODE_TYPE)
+
+    def get_code(column, name):
+        if name not in code[column]:
+            code[column][name] = len(code[column])
+        return code[column][name]
+
+    def add_scaffold(scf, gn):
+        if scf not in code['scaffold']:
+            get_code('scaffold', scf)
+            scaffold2genome.append(get_code('genome', gn))
+        return code['scaffold'][scf]
+
+    for scf, gn in scf_gn_records:
+        add_scaffold(scf, gn)
+    for pro, scf, gn in pro_scf_gn_records:
+        if pro not in code['protein']:
+            get_code('protein', pro)
+            protein2scaffold.append(add_scaffold(scf, gn))
+
+    os.makedirs(registry_dir, exist_ok = True)
+    for column in REGISTRY_COLUMNS:
+        offsets = array(OFFSET_TYPE, [0])
+        with open(os.path.join(registry_dir, f'{column}.names'), 'wb') as f:
+            for name in code[column]: # dict keeps the insertion order, i.e., the code order
+                name = (name + '\n').encode()
+                f.write(name)
+                offsets.append(offsets[-1] + len(name))
+        with open(os.path.join(registry_dir, f'{column}.offsets'), 'wb') as f:
+            offsets.tofile(f)
+    with open(os.path.join(registry_dir, 'scaffold.genome'), 'wb') as f:
+        scaffold2genome.tofile(f)
+    with open(os.path.join(registry_dir, 'protein.scaffold'), 'wb') as f:
+        protein2scaffold.tofile(f)
+
+def build_id_registry_from_gn_dirs(registry_dir, gn_dirs):
+    # For genome dirs containing "<gn>.fasta" and "<gn>.faa" files (vRhyme bins and unbinned genomes)
+    # scf is the fasta header, pro is the faa header, and gn is the file stem
+    fasta_addrs = []
+    faa_addrs = []
+    for gn_dir in gn_dirs:
+        fasta_addrs.extend(sorted(glob(os.path.join(gn_dir, '*.fasta'))))
+        faa_addrs.extend(sorted(glob(os.path.join(gn_dir, '*.faa'))))
+
+    scf_gn_records = ((header.replace('>', '', 1), Path(fasta_addr).stem) for fasta_addr in fasta_addrs for header in seq_io.read_headers(fasta_addr))
+    pro_scf_gn_records = ((header.replace('>', '', 1), header.replace('>', '', 1).rsplit('_', 1)[0], Path(faa_addr).stem) for faa_addr in faa_addrs for header in seq_io.read_headers(faa_addr))
+    write_id_registry(registry_dir, scf_gn_records, pro_scf_gn_records)
+
+def build_id_registry_from_single_scf_gns(registry_dir, fasta_file, faa_file):
+    # For genomes which are single scaffolds (run_wo_reads): gn is the same as scf
+    scf_gn_records = ((header.replace('>', '', 1), header.replace('>', '', 1)) for header in seq_io.read_headers(fasta_file))
+    pro_scf_gn_records = ((header.replace('>', '', 1), header.replace('>', '', 1).rsplit('_', 1)[0], header.replace('>', '', 1).rsplit('_', 1)[0]) for header in seq_io.read_headers(faa_file))
+    write_id_registry(registry_dir, scf_gn_records, pro_scf_gn_records)
+
+def map_file(file_name):
+    # mmap can not map an empty file
+    if os.path.getsize(file_name) == 0:
+        return b''
+    with open(file_name, 'rb') as f:
+        return mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ)
+
+def map_array(file_name, type_code):
+    mapped = map_file(file_name)
+    if not mapped:
+        return array(type_code)
+    return memoryview(mapped).cast(type_code)
+
+def load_id_registry(registry_dir):
+    # Returns the dict of memory-mapped columns
+    registry = {}
+    for column in REGISTRY_COLUMNS:
+        registry[f'{column}.names'] = map_file(os.path.join(registry_dir, f'{column}.names'))
+        registry[f'{column}.offsets'] = map_array(os.path.join(registry_dir, f'{column}.offsets'), OFFSET_TYPE)
+    registry['scaffold.genome'] = map_array(os.path.join(registry_dir, 'scaffold.genome'), CODE_TYPE)
+    registry['protein.scaffold'] = map_array(os.path.join(registry_dir, 'protein.scaffold'), CODE_TYPE)
+    return registry
+
+def get_count(registry, column):
+    return len(registry[f'{column}.offsets']) - 1
+
+def get_name(registry, column, code):
+    offsets = registry[f'{column}.offsets']
+    return registry[f'{column}.names'][offsets[code]:offsets[code + 1] - 1].decode()
+
+def get_names(registry, column):
+    # Decode all names of a column at once, the list index is the code
+    names = registry[f'{column}.names'][:].decode().split('\n')
+    return names[:-1]
+
+def get_pro2gn(registry):
+    gns = get_names(registry, 'genome')
+    scaffold2genome = registry['scaffold.genome']
+    protein2scaffold = registry['protein.scaffold']
+    return {pro: gns[scaffold2genome[protein2scaffold[i]]] for i, pro in enumerate(get_names(registry, 'protein'))}
+
+def get_gn2pros(registry):
+    gn2pros = {gn: [] for gn in get_names(registry, 'genome')} # gn => [pros]
+    gns = list(gn2pros)
+    scaffold2genome = registry['scaffold.genome']
+    protein2scaffold = registry['protein.scaffold']
+    for i, pro in enumerate(get_names(registry, 'protein')):
+        gn2pros[gns[scaffold2genome[protein2scaffold[i]]]].append(pro)
+    return gn2pros
+
+def get_gn2scfs(registry):
+    gn2scfs = {gn: [] for gn in get_names(registry, 'genome')} # gn => [scfs]
+    gns = list(gn2scfs)
+    scaffold2genome = registry['scaffold.genome']
+    for i, scf in enumerate(get_names(registry, 'scaffold')):
+        gn2scfs[gns[scaffold2genome[i]]].append(scf)
+    return gn2scfs
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+
+'''
+Aim: Run many independent sub-jobs (i.e., one CheckV run for each chunk of genomes) with at most n of them running at the same time
+Note: The n workers take jobs from one shared queue, and a worker starts the next job as soon as its last job exits;
+so a slow job only holds its own slot, instead of keeping the other n-1 slots idle until a whole wave of n jobs is finished.
+A local job also takes its cores and memory from the resource pool of the run (see resource_pool.py) before it starts.
+For tools with a threads option, run_packed_jobs() decides the number of threads of each job (and so the number of jobs at the same time)
+from the number of jobs, the input size of each job, and the scaling of the tool: a few large inputs get wide jobs, and many inputs get narrow ones;
+get_chunks() groups many small inputs (i.e., genomes for CheckV) into a few chunks by the same scaling, so that a tool loads its database once for each chunk.
+With the input sizes, the largest jobs are started first (longest processing time first), so that a large job does not start last and
+run alone at the end; the total time then gets close to the total work divided by the running jobs.
+Each job is supervised (see supervisor.py): its stderr is kept in a job log, it is stopped after the timeout, and it is run again after a transient failure;
+when a job fails for good, the running jobs are killed, no new jobs are started, and the script exits with the error of the job.
+Jobs run on the backend chosen for the run (see executors.py): local processes, or cluster jobs with more of them at the same time
+'''
+
+try:
+    import warnings
+    import sys
+    import math
+    import heapq
+    import threading
+    from collections import deque, namedtuple
+    from concurrent.futures import ThreadPoolExecutor
+    warnings.filterwarnings("ignore")
+    try:
+        from scripts import supervisor
+        from scripts import executors
+    except ImportError:
+        import supervisor
+        import executors
+except Exception as e:
+    sys.stderr.write(str(e) + "\n\n")
+    exit(1)
+
+
+THREADS = '__THREADS__' # Placeholder in the command of a packed job, replaced by its number of threads
+
+# Rough scaling of each tool: startup: seconds to start a job (i.e., loading the database); per_unit: seconds with 1 thread for one unit of input;
+# parallel: the fraction of the work that uses more threads (Amdahl's law). The input unit is MB of fasta/faa, or genomes for dRep
+JobScaling = namedtuple('JobScaling', ['startup', 'per_unit', 'parallel'])
+TOOL2SCALING = {
+    'CheckV': JobScaling(30, 120, 0.7), # DIAMOND and hmmsearch steps scale; database loading and the rest do not
+    'diamond': JobScaling(10, 60, 0.9),
+    'hmmsearch': JobScaling(5, 600, 0.6), # hmmsearch --cpu uses worker threads that are fed by one reading thread
+    'dRep': JobScaling(10, 2, 0.8)
+}
+
+
+def get_job_time(scaling, size, threads):
+    return scaling.startup + scaling.per_unit * size * ((1 - scaling.parallel) + scaling.parallel / threads)
+
+def get_total_time(scaling, sizes, threads, parallel_jobs):
+    # The total time is at least the work divided by the running jobs, and at least the time of the largest job
+    job_times = [get_job_time(scaling, size, threads) for size in sizes]
+    return max(sum(job_times) / parallel_jobs, max(job_times))
+
+def get_packing(tool, sizes, cores):
+    # Returns (threads of each job, the number of jobs at the same time) that give the shortest estimated total time of all jobs
+    scaling = TOOL2SCALING[tool]
+    cores = max(1, int(cores))
+    if not sizes:
+        return 1, cores
+    best_packing, best_time = None, None
+    for threads in range(1, cores + 1):
+        parallel_jobs = min(cores // threads, len(sizes))
+        total_time = get_total_time(scaling, sizes, threads, parallel_jobs)
+        if best_time is None or total_time < best_time * 0.99: # Narrower jobs are kept unless wider ones are clearly faster
+            best_packing, best_time = (threads, parallel_jobs), total_time
+    return best_packing
+
+def get_chunks(tool, input2size, cores, max_chunk_size):
+    # Group many small inputs into chunks, so that the startup of the tool (i.e., loading the database) is paid once for each chunk instead of each input;
+    # returns [[input]]: the number of chunks gives the shortest estimated total time (with the packing of get_packing),
+    # and it is at least the total size divided by max_chunk_size, so that a failed or timed-out chunk does not lose too much work
+    if not input2size:
+        return []
+    scaling = TOOL2SCALING[tool]
+    cores = max(1, executors.get_executor().get_cores(cores))
+    inputs = sorted(input2size, key = lambda x: input2size[x], reverse = True)
+    min_chunk_num = min(len(inputs), max(1, math.ceil(sum(input2size.values()) / max_chunk_size)))
+    best_chunks, best_time = None, None
+    for chunk_num in range(min_chunk_num, max(min_chunk_num, min(len(inputs), cores)) + 1):
+        # Each input goes to the smallest chunk (largest inputs first), so that chunks get similar sizes
+        heap = [(0, i) for i in range(chunk_num)] # [(chunk size, chunk index)]
+        chunks = [[] for _ in range(chunk_num)]
+        for name in inputs:
+            size, i = heapq.heappop(heap)
+            chunks[i].append(name)
+            heapq.heappush(heap, (size + input2size[name], i))
+        sizes = [size for size, i in heap]
+        total_time = get_total_time(scaling, sizes, *get_packing(tool, sizes, cores))
+        if best_time is None or total_time < best_time * 0.99: # Fewer chunks are kept unless more ones are clearly faster
+            best_chunks, best_time = chunks, total_time
+    return best_chunks
+
+def run_jobs(jobs, max_parallel, cores = 1, memory = 0, job2size = None, **kwargs):
+    # jobs: [(job name, cmd)] or [(job name, cmd, [output file or dir])]; the outputs of a job are removed before each attempt (see supervisor.py)
+    # each job uses the given cores and memory (GB); kwargs are passed to Popen (i.e., shell=True, stdout=DEVNULL)
+    # job2size: job name => input size; if given, larger jobs are started first (jobs of the same size keep their order)
+    if job2size:
+        jobs = sorted(jobs, key = lambda x: job2size.get(x[0], 0), reverse = True)
+    job_queue = deque(jobs)
+    executor = executors.get_executor()
+    timeout, retries = supervisor.get_timeout(), supervisor.get_retries()
+    abort = threading.Event() # Set when a job has failed for good
+    errors = [] # [JobError]
+    lock = threading.Lock()
+
+    def work():
+        while not abort.is_set():
+            with lock:
+                if not job_queue:
+                    return
+                job, cmd, *outputs = job_queue.popleft()
+            def popen(cmd, **popen_kwargs):
+                return executor.popen(cmd, job, cores, memory, **popen_kwargs)
+            try:
+                supervisor.run(cmd, job, popen, timeout, retries, abort, outputs[0] if outputs else None, **kwargs)
+            except supervisor.JobError as e:
+                with lock:
+                    if not abort.is_set():
+                        errors.append(e)
+                    abort.set()
+
+    workers = max(1, min(executor.get_parallel_jobs(int(max_parallel)), len(job_queue)))
+    with ThreadPoolExecutor(max_workers = workers) as thread_executor:
+        futures = [thread_executor.submit(work) for _ in range(workers)]
+        for future in futures:
+            future.result() # Raise the error of a worker, i.e., a command that can not be started
+    if errors:
+        sys.exit(str(errors[0]))
+
+def run_packed_jobs(tool, jobs, job2size, cores, memory = 0, **kwargs):
+    # jobs: [(job name, cmd with THREADS)] or [(job name, cmd with THREADS, [output file or dir])]; job2size: job name => input size in the unit of the tool (see TOOL2SCALING); cores: all cores for these jobs
+    cores = executors.get_executor().get_cores(cores)
+    threads, parallel_jobs = get_packing(tool, [job2size[job] for job, cmd, *outputs in jobs], cores)
+    run_jobs([(job, cmd.replace(THREADS, str(threads)), *outputs) for job, cmd, *outputs in jobs], parallel_jobs, threads, memory, job2size, **kwargs)
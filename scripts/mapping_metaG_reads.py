@@ -12,6 +12,10 @@ try:
     from pathlib import Path
     import pyfastx # For fastq and fasta reading and parsing 
     import pandas as pd
+    import seq_io # For streaming fasta, faa, and ffn reading and writing
+    import viral_id # For parsing scaffold IDs once (memoised)
+    import resource_pool # For sharing CPU cores and memory among all tools of a run
+    import process_metrics # For recording the resource usage of all tools of a run
 except Exception as e:
     sys.stderr.write(str(e) + "\n\n")
     exit(1)
@@ -23,30 +27,33 @@ def make_bowtie2_idx(fasta, working_dir, num_threads):
     fa = pyfastx.Fasta(fasta)
     fasta_size = fa.size
     
-    if fasta_size <= 4000000000:
-        # Indexing the reference sequence 
-        indexing_cmd = f'bowtie2-build {fasta} {working_dir}/{index_name} --threads {num_threads} --quiet 1> /dev/null'
-        os.system(indexing_cmd)
-    else:
-        # Indexing the reference sequence 
-        indexing_cmd = f'bowtie2-build --large-index {fasta} {working_dir}/{index_name} --threads {num_threads} --quiet 1> /dev/null'
-        os.system(indexing_cmd)
+    with resource_pool.allocate(int(num_threads), resource_pool.TOOL2MEMORY['bowtie2']) as cores:
+        if fasta_size <= 4000000000:
+            # Indexing the reference sequence 
+            indexing_cmd = f'bowtie2-build {fasta} {working_dir}/{index_name} --threads {cores} --quiet 1> /dev/null'
+            process_metrics.system(indexing_cmd, check=True)
+        else:
+            # Indexing the reference sequence 
+            indexing_cmd = f'bowtie2-build --large-index {fasta} {working_dir}/{index_name} --threads {cores} --quiet 1> /dev/null'
+            process_metrics.system(indexing_cmd, check=True)
     
 def run_bowtie2(fasta, input_read_pair, working_dir, sam_name, num_threads):
     file_name = Path(fasta).stem
     index_name = file_name + ".bowtie2_idx"
     
     # Mapping 
-    mapping_cmd = f'bowtie2 -x {working_dir}/{index_name} -1 {input_read_pair.split(",")[0]} -2 {input_read_pair.split(",")[1]} -S {working_dir}/{sam_name}.sam -p {int(num_threads)} --no-unal --quiet --mm 1> /dev/null'
-    os.system(mapping_cmd) 
+    with resource_pool.allocate(int(num_threads), resource_pool.TOOL2MEMORY['bowtie2']) as cores:
+        mapping_cmd = f'bowtie2 -x {working_dir}/{index_name} -1 {input_read_pair.split(",")[0]} -2 {input_read_pair.split(",")[1]} -S {working_dir}/{sam_name}.sam -p {cores} --no-unal --quiet --mm 1> /dev/null'
+        process_metrics.system(mapping_cmd, check=True) 
     
 def run_minimap2(fasta, input_reads, working_dir, sam_name, input_reads_type, num_threads):
     input_reads_type_map = {'pacbio':'map-pb', 'pacbio_hifi':'map-hifi', 'pacbio_asm20':'asm20', 'nanopore':'map-ont'}
     ax_input = input_reads_type_map[input_reads_type]
     
     # Mapping
-    mapping_cmd = f'minimap2 -ax {ax_input} {fasta} {input_reads} -t {int(num_threads)} > {working_dir}/{sam_name}.sam 2> /dev/null' 
-    os.system(mapping_cmd)  
+    with resource_pool.allocate(int(num_threads), resource_pool.TOOL2MEMORY['minimap2']) as cores:
+        mapping_cmd = f'minimap2 -ax {ax_input} {fasta} {input_reads} -t {cores} > {working_dir}/{sam_name}.sam 2> /dev/null' 
+        process_metrics.system(mapping_cmd, check=True)  
     
 def run_consent(input_reads, input_reads_type, num_threads):
     num_threads = int(num_threads)
@@ -60,36 +67,10 @@ def run_consent(input_reads, input_reads_type, num_threads):
         out_fasta_file = input_reads.replace('.fastq.gz', '.corrected.fasta', 1)
     
     # Correcting
-    correcting_cmd = f'CONSENT-correct --in {input_reads} --out {out_fasta_file} --type {reads_type} -j {num_threads} 1> /dev/null'
-    os.system(correcting_cmd)
+    with resource_pool.allocate(num_threads, resource_pool.TOOL2MEMORY['CONSENT']) as cores:
+        correcting_cmd = f'CONSENT-correct --in {input_reads} --out {out_fasta_file} --type {reads_type} -j {cores} 1> /dev/null'
+        process_metrics.system(correcting_cmd, check=True)
 
-def store_seq(input_seq_file): # The input sequence file should be a file with full path
-    head = "" # Store the header line
-    seq_dict = {} # Store the sequence dict
-    
-    with open(input_seq_file, "r") as seq_lines:
-        for line in seq_lines:
-            line = line.rstrip("\n") # Remove "\n" in the end
-            if ">" in line:
-                if (" " or "\t") in line: # Break at the first " " or "\t"
-                    spliter = ""
-                    for i in range(len(line)):
-                        if line[i] == " " or line[i] == "\t":
-                            spliter = line[i]
-                            break 
-                           
-                    head = line.split(f'{spliter}', 1)[0]
-                    seq_dict[head] = ""
-                else:
-                    head = line
-                    seq_dict[head] = ""
-            else:
-                seq_dict[head] += line
-            
-    seq_lines.close()
-    
-    return seq_dict    
-        
 def convert_sam_to_sorted_bam(input_sam_file, num_threads):
     # Open the SAM file in reading mode
     samfile = pysam.AlignmentFile(input_sam_file, "r")
@@ -108,13 +89,15 @@ def convert_sam_to_sorted_bam(input_sam_file, num_threads):
 
     # Sort the BAM file
     out_sorted_bam_file = input_sam_file.replace('.sam', '.sorted.bam', 1)
-    pysam.sort("-o", out_sorted_bam_file, out_bam_file) 
+    with resource_pool.allocate(int(num_threads), resource_pool.TOOL2MEMORY['samtools']) as cores:
+        pysam.sort("-@", str(cores), "-o", out_sorted_bam_file, out_bam_file) 
 
 def filter_sorted_bam(out_sorted_bam_file, filtered_bam_file, reads_mapping_identity_cutoff, aligned_length, threads):   
     reads_mapping_identity_cutoff = int(float(reads_mapping_identity_cutoff) * 100)
     threads = int(threads)
-    filter_cmd = f'coverm filter --bam-files {out_sorted_bam_file} --output-bam-files {filtered_bam_file} --min-read-aligned-length {aligned_length} --min-read-percent-identity {reads_mapping_identity_cutoff} --threads {threads}'
-    os.system(filter_cmd)
+    with resource_pool.allocate(threads, resource_pool.TOOL2MEMORY['coverm']) as cores:
+        filter_cmd = f'coverm filter --bam-files {out_sorted_bam_file} --output-bam-files {filtered_bam_file} --min-read-aligned-length {aligned_length} --min-read-percent-identity {reads_mapping_identity_cutoff} --threads {cores}'
+        process_metrics.system(filter_cmd, check=True)
         
 def mapping_metaG_reads(viral_scaffold, metagenomic_scaffold, metaG_reads, mapping_result_dir, input_reads_type, reads_mapping_identity_cutoff, threads):
     threads = int(threads)
@@ -149,7 +132,7 @@ def mapping_metaG_reads(viral_scaffold, metagenomic_scaffold, metaG_reads, mappi
             filtered_bam_file = input_sam_file.replace('.sam', '.filtered.bam', 1)
             aligned_length = 50
             filter_sorted_bam(out_sorted_bam_file, filtered_bam_file, reads_mapping_identity_cutoff, aligned_length, threads)
-            os.system(f'rm {input_sam_file} {out_bam_file} {out_sorted_bam_file}')    
+            process_metrics.system(f'rm {input_sam_file} {out_bam_file} {out_sorted_bam_file}')    
         
         # Step 3 Get coverage
         bam_files = ''
@@ -158,26 +141,18 @@ def mapping_metaG_reads(viral_scaffold, metagenomic_scaffold, metaG_reads, mappi
             bam_files_list.append(f'{mapping_result_dir}/{sam_name}.filtered.bam')
         bam_files = ' '.join(bam_files_list)
         
-        os.system(f'coverm contig --methods metabat --bam-files {bam_files} --threads {threads} > {mapping_result_dir}/all_coverm_raw_result.txt')
+        with resource_pool.allocate(threads, resource_pool.TOOL2MEMORY['coverm']) as cores:
+            process_metrics.system(f'coverm contig --methods metabat --bam-files {bam_files} --threads {cores} > {mapping_result_dir}/all_coverm_raw_result.txt', check=True)
         
         # Step 4 Parse all_coverm_raw_result.txt
         coverm_raw_table = pd.read_csv(f'{mapping_result_dir}/all_coverm_raw_result.txt', sep = '\t')
         coverm_raw_table_subset = coverm_raw_table.drop(['contigLen', 'totalAvgDepth'], axis = 1)
         
-        dict_virus_rename = {} # old_name => new_name
-        viral_seq = store_seq(viral_scaffold)
-        for header in viral_seq:
-            new_name = header.replace('>', '', 1)
-            old_name = ''
-            if '||' in new_name:
-                old_name = new_name.rsplit('||', 1)[0]
-            elif '_fragment_' in new_name:
-                old_name = new_name.rsplit('_fragment_', 1)[0]
-            else:
-                old_name = new_name
-            dict_virus_rename[old_name] = new_name   
+        new_names = pd.Series([header.replace('>', '', 1) for header in seq_io.read_headers(viral_scaffold)], dtype = str)
+        old_names = viral_id.parse_scaffold_id_column(new_names)['contig'] # Remove "||suffix" (VirSorter2) or "_fragment_N" (VIBRANT) of all names at once
+        dict_virus_rename = dict(zip(old_names, new_names)) # old_name => new_name
         
-        coverm_raw_table_subset.replace({"contigName": dict_virus_rename},inplace = True)
+        coverm_raw_table_subset['contigName'] = coverm_raw_table_subset['contigName'].map(dict_virus_rename).fillna(coverm_raw_table_subset['contigName'])
         coverm_raw_table_subset.to_csv(f'{mapping_result_dir}/vRhyme_input_coverage.txt', sep='\t', index=False)
     elif input_reads_type == 'pacbio' or input_reads_type == 'pacbio_hifi' or input_reads_type == 'pacbio_asm20' or input_reads_type == 'nanopore':
         # Step 1 Run minimap2
@@ -209,7 +184,7 @@ def mapping_metaG_reads(viral_scaffold, metagenomic_scaffold, metaG_reads, mappi
             filtered_bam_file = input_sam_file.replace('.sam', '.filtered.bam', 1)
             aligned_length = 500
             filter_sorted_bam(out_sorted_bam_file, filtered_bam_file, reads_mapping_identity_cutoff, aligned_length, threads)
-            os.system(f'rm {input_sam_file} {out_bam_file} {out_sorted_bam_file}')   
+            process_metrics.system(f'rm {input_sam_file} {out_bam_file} {out_sorted_bam_file}')   
         
         # Step 3 Get coverage
         bam_files = ''
@@ -218,26 +193,18 @@ def mapping_metaG_reads(viral_scaffold, metagenomic_scaffold, metaG_reads, mappi
             bam_files_list.append(f'{mapping_result_dir}/{sam_name}.filtered.bam')
         bam_files = ' '.join(bam_files_list)
         
-        os.system(f'coverm contig --methods metabat --bam-files {bam_files} --threads {threads} > {mapping_result_dir}/all_coverm_raw_result.txt')   
+        with resource_pool.allocate(threads, resource_pool.TOOL2MEMORY['coverm']) as cores:
+            process_metrics.system(f'coverm contig --methods metabat --bam-files {bam_files} --threads {cores} > {mapping_result_dir}/all_coverm_raw_result.txt', check=True)   
 
         # Step 4 Parse all_coverm_raw_result.txt
         coverm_raw_table = pd.read_csv(f'{mapping_result_dir}/all_coverm_raw_result.txt', sep = '\t')
         coverm_raw_table_subset = coverm_raw_table.drop(['contigLen', 'totalAvgDepth'], axis = 1)
         
-        dict_virus_rename = {} # old_name => new_name
-        viral_seq = store_seq(viral_scaffold)
-        for header in viral_seq:
-            new_name = header.replace('>', '', 1)
-            old_name = ''
-            if '||' in new_name:
-                old_name = new_name.rsplit('||', 1)[0]
-            elif '_fragment_' in new_name:
-                old_name = new_name.rsplit('_fragment_', 1)[0]
-            else:
-                old_name = new_name
-            dict_virus_rename[old_name] = new_name   
+        new_names = pd.Series([header.replace('>', '', 1) for header in seq_io.read_headers(viral_scaffold)], dtype = str)
+        old_names = viral_id.parse_scaffold_id_column(new_names)['contig'] # Remove "||suffix" (VirSorter2) or "_fragment_N" (VIBRANT) of all names at once
+        dict_virus_rename = dict(zip(old_names, new_names)) # old_name => new_name
         
-        coverm_raw_table_subset.replace({"contigName": dict_virus_rename},inplace = True)
+        coverm_raw_table_subset['contigName'] = coverm_raw_table_subset['contigName'].map(dict_virus_rename).fillna(coverm_raw_table_subset['contigName'])
         coverm_raw_table_subset.to_csv(f'{mapping_result_dir}/vRhyme_input_coverage.txt', sep='\t', index=False)        
     
     
@@ -0,0 +1,202 @@
+import sys
+import os
+import argparse
+import logging
+from scripts import master_run
+from scripts import master_run_wo_reads
+from scripts import pipeline
+from scripts import resource_pool
+from scripts import conda_launcher
+from scripts import cost_model
+from scripts import process_metrics
+from scripts import timeline
+from scripts import supervisor
+from scripts import executors
+from datetime import datetime
+
+
+
+logger = logging.getLogger(__name__)
+sample_sheet_columns = ['sample', 'input_metagenome', 'input_reads', 'custom_MAGs_dir'] # The first two are required; the others can be left empty
+
+
+def fetch_arguments(parser,root_dir,db_path_default):
+    parser.set_defaults(func=main)
+    parser.set_defaults(program="batch")
+    parser.add_argument('--sample_sheet','-s', dest='sample_sheet', required=True, default='none', help=r'(required) tab-separated sample sheet with a header line and the columns: sample, input_metagenome, input_reads, and custom_MAGs_dir. "input_reads" is given the same way as --input_reads of "ViWrap run"; samples without reads are run as "ViWrap run_wo_reads". "input_reads" and "custom_MAGs_dir" can be empty or "none"')
+    parser.add_argument('--input_reads_type', '-rt', dest = 'input_reads_type', required=False, default='illumina', help=r'input metagenomic reads type of all samples. The default is illumina. If you are using long reads, you will need to assign: pacbio - PacBio CLR reads, pacbio_hifi - PacBio HiFi/CCS reads, pacbio_asm20 - PacBio HiFi/CCS reads asm20, nanopore - Oxford Nanopore reads')
+    parser.add_argument('--reads_mapping_identity_cutoff', '-id', dest = 'reads_mapping_identity_cutoff', required=False, default=0.97, help=r'reads mapping identity cutoff. The default is 0.97')
+    parser.add_argument('--out_dir','-o', dest='out_dir', required=False, default='./ViWrap_batch_outdir', help=r'output directory (default = ./ViWrap_batch_outdir); the result of each sample is deposited in "out_dir/sample" with the same layout as "ViWrap run". ViWrap will exit if the folder already exists, unless --resume is used')
+    parser.add_argument('--db_dir','-d', dest='db_dir', required=False, default=db_path_default, help=f'(required) database directory; default = {db_path_default}')
+    parser.add_argument('--identify_method', dest='identify_method', required=False, default='vb-vs',help=r'(required) the virus identifying method to choose: vb - VIBRANT; vs - VirSorter2 and CheckV; dvf - DeepVirFinder; vb-vs - Use VIBRANT and VirSorter2 to get the overlapped viruses (default); vb-vs-dvf - Use all these three methods and get the overlapped viruses')
+    parser.add_argument('--conda_env_dir', dest='conda_env_dir', required=True, default='none', help=r'(required) the directory where you put your conda environment files. It is the parent directory that contains all the conda environment folders')
+    parser.add_argument('--threads','-t', dest='threads', required=False, default=10, help=r'number of threads shared by all samples (default = 10)')
+    parser.add_argument('--virome','-v', dest='virome', action='store_true', required=False, default=False, help=r"edit VIBRANT's sensitivity if the input datasets are viromes")
+    parser.add_argument('--input_length_limit', dest='input_length_limit', required=False, default=2000, help=r'length in basepairs to limit input sequences (default=2000, can increase but not decrease); 2000 at least suggested for VIBRANT (vb)-based pipeline, 5000 at least suggested for VirSorter2 (vs)-based pipeline')
+    parser.add_argument('--max_gn_per_dir', dest='max_gn_per_dir', required=False, default=10000, help=r'maximum number of viral genomes in one folder when splitting viral genomes of the samples without reads (as "ViWrap run_wo_reads") for CheckV, dRep, and taxonomic charaterization (default = 10000; 0 = never use sub-folders)')
+    parser.add_argument('--max_parallel_steps', dest='max_parallel_steps', required=False, default=4, help=r'maximum number of steps (of all samples) to run at the same time; all running steps share the given --threads (default = 4)')
+    parser.add_argument('--job_timeout', dest='job_timeout', required=False, default=0, help=r'maximum seconds for each parallel sub-job (i.e., CheckV of a genome chunk, dRep of a genus, or DIAMOND/hmmsearch of a genome); a job running longer is killed and run again (default = 0, no limit)')
+    parser.add_argument('--job_retries', dest='job_retries', required=False, default=2, help=r'number of times to run a parallel sub-job again after a transient failure, i.e., killed under memory pressure or by --job_timeout (default = 2); any other failure stops the step at once')
+    parser.add_argument('--executor', dest='executor', required=False, default='local', help=r'where to run the parallel sub-jobs (CheckV of each genome chunk, dRep of each genus, DIAMOND/hmmsearch of each genome or chunk): local - on this machine (default); slurm - submitted by sbatch to a SLURM cluster, the output dir should be on a file system shared by all nodes; mock - a local mock cluster for testing')
+    parser.add_argument('--max_cluster_jobs', dest='max_cluster_jobs', required=False, default=100, help=r'maximum number of sub-jobs of a step in the cluster queue at the same time with "--executor slurm" or "mock" (default = 100; for "mock", it is also the number of local workers)')
+    parser.add_argument('--sbatch_args', dest='sbatch_args', required=False, default='', help=r'extra sbatch options for the sub-jobs with "--executor slurm", given in quotes, i.e., "--partition=short --time=4:00:00"')
+    parser.add_argument('--resume', dest='resume', action='store_true', required=False, default=False, help=r"resume an interrupted batch run in the existing output directory: finished steps of each sample that are still valid are skipped")
+    parser.add_argument('--dry_run', dest='dry_run', action='store_true', required=False, default=False, help=r"only print the planned steps with their estimated wall time, peak memory, and disk footprint, based on the input sizes and the measured steps of previous runs (ViWrap_step_history.jsonl in the db dir) for all samples; nothing is run")
+    parser.add_argument('--root_dir', dest='root_dir', required=False, default=root_dir,help=argparse.SUPPRESS)
+
+
+def read_sample_sheet(sample_sheet):
+    # Returns [sample info dict]; lines starting with "#" and empty lines are skipped
+    samples = []
+    with open(sample_sheet) as f:
+        header = None
+        for line in f:
+            line = line.rstrip('\n')
+            if not line.strip() or line.startswith('#'):
+                continue
+            fields = [x.strip() for x in line.split('\t')]
+            if header is None:
+                header = fields
+                for column in ['sample', 'input_metagenome']:
+                    if column not in header:
+                        sys.exit(f"Please make sure that the sample sheet {sample_sheet} has a header line with the \"{column}\" column")
+                continue
+            sample_info = {column: (fields[i] if i < len(fields) else '') for i, column in enumerate(header) if column in sample_sheet_columns}
+            for column in ['input_reads', 'custom_MAGs_dir']:
+                if not sample_info.get(column):
+                    sample_info[column] = 'none'
+            samples.append(sample_info)
+
+    sample_names = [x['sample'] for x in samples]
+    if not samples:
+        sys.exit(f"There is no sample in the sample sheet {sample_sheet}")
+    for sample in sample_names:
+        if not sample or '/' in sample or sample_names.count(sample) > 1:
+            sys.exit(f"Please make sure that each sample name in {sample_sheet} is given, unique, and has no \"/\": {sample}")
+    return samples
+
+def get_sample_args(args, sample_info):
+    # The args of one sample as if it is run by "ViWrap run" or "ViWrap run_wo_reads"; returns (master module, args)
+    sample_args = dict(args)
+    sample_args.update(sample_info)
+    sample_args['out_dir'] = os.path.join(args['out_dir'], sample_info['sample'])
+    master = master_run if sample_info['input_reads'] != 'none' else master_run_wo_reads
+    sample_args['program'] = 'run' if master == master_run else 'run_wo_reads'
+    master.set_defaults(sample_args)
+    # The iPHoP db with custom MAGs is made for each sample, so it is kept in the sample folder instead of the shared db dir
+    sample_args['iPHoP_db_custom'] = os.path.join(sample_args['iphop_outdir'], 'iPHoP_db_custom')
+    return master, sample_args
+
+def get_sample2master_args(args):
+    # Read the sample sheet and pre-check the inputs of all samples; returns sample => (master module, sample args)
+    if not os.path.exists(args['sample_sheet']):
+        sys.exit(f"Could not find sample sheet {args['sample_sheet']}")
+    sample2master_args = {}
+    for sample_info in read_sample_sheet(args['sample_sheet']):
+        master, sample_args = get_sample_args(args, sample_info)
+        master.check_inputs(sample_args)
+        sample2master_args[sample_info['sample']] = (master, sample_args)
+    return sample2master_args
+
+def build_pipeline(args, sample2master_args):
+    # One pipeline with the steps of all samples, named as "sample/step"
+    run = pipeline.Pipeline(args['max_parallel_steps'], os.path.join(args['out_dir'], 'ViWrap_checkpoints'), args['resume'])
+    name2rank = {} # "sample/step" => (the position of the step in its sample, the position of the sample)
+    for sample_index, (sample, (master, sample_args)) in enumerate(sample2master_args.items()):
+        sample_run = master.build_pipeline(sample_args)
+        run.add_pipeline(sample, sample_run)
+        for step_index, name in enumerate(sample_run.get_order()):
+            name2rank[f'{sample}/{name}'] = (step_index, sample_index)
+    ## Ready steps are started step by step rather than sample by sample (i.e., iPHoP of all samples one after another),
+    ## so that the databases read by a step are still in the page cache when the same step of the next sample starts
+    run.priority = name2rank.get
+    run.history_file = os.path.join(args['db_dir'],'ViWrap_step_history.jsonl')
+    return run
+
+def add_sample_name(record):
+    # Log filter: add the sample name of the running step (if any) to the message
+    name = getattr(pipeline.step_context, 'name', None)
+    record.sample = f"{name.split('/', 1)[0]} | " if name and '/' in name else ''
+    return True
+
+def main(args):
+    # Welcome and logger
+    print("### Welcome to ViWrap ###\n")
+
+    if args['dry_run']:
+        # Only print the planned steps of all samples with their estimates; nothing is run or written
+        print(cost_model.get_plan_report(build_pipeline(args, get_sample2master_args(args)), args['max_parallel_steps']))
+        return
+
+	## Set up the logger
+    if not args['resume'] or not os.path.exists(args['out_dir']):
+        os.mkdir(args['out_dir'])
+    log_file = os.path.join(args['out_dir'],'ViWrap_batch.log')
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(sample)s%(message)s",
+        handlers=[
+            logging.FileHandler(log_file),
+            logging.StreamHandler(sys.stdout)
+        ]
+    )
+    for handler in logging.getLogger().handlers:
+        handler.addFilter(add_sample_name)
+    logger = logging.getLogger(__name__)
+
+    ## Store the input arguments
+    logger.info(f"The issued command is:\n{' '.join(sys.argv)}\n")
+
+    # Step 1 Pre-check inputs of all samples before any step starts
+    start_time = datetime.now().replace(microsecond=0)
+    time_current = f"[{str(datetime.now().replace(microsecond=0))}]"
+    logger.info(f"{time_current} | Pre-check inputings of all samples. In processing...")
+
+    sample2master_args = get_sample2master_args(args) # sample => (master module, sample args)
+    for sample, (master, sample_args) in sample2master_args.items():
+        if os.path.exists(sample_args['out_dir']) and not args['resume']:
+            sys.exit(f"The output dir of sample {sample} - {sample_args['out_dir']} - exists already; please use --resume to continue it or remove it")
+
+    time_current = f"[{str(datetime.now().replace(microsecond=0))}]"
+    logger.info(f"{time_current} | Looks like the inputs of all {len(sample2master_args)} samples are set up well, start up to run ViWrap pipeline")
+
+
+    # Step 2 Run the steps of all samples in one job queue
+    ## Share --threads and the memory among all tools of all samples
+    pool_file = os.path.abspath(os.path.join(args['out_dir'], 'ViWrap_resource_pool.json'))
+    resource_pool.create_pool(pool_file, int(args['threads']))
+    os.environ[resource_pool.POOL_ENV] = pool_file
+    with resource_pool.get_pool().locked_state() as pool_state:
+        logger.info(f"All tools share {pool_state['cores']} cores and {pool_state['memory']:.1f} GB memory")
+
+    ## Record the resource usage of all processes of all samples
+    os.environ[process_metrics.METRICS_ENV] = os.path.abspath(os.path.join(args['out_dir'], 'ViWrap_process_metrics.jsonl'))
+    run_metrics_file = os.path.join(args['out_dir'], 'ViWrap_run_metrics.json')
+    ## Keep the stderr of each job, and set the timeout, retries, and backend of parallel sub-jobs
+    os.environ[supervisor.LOG_DIR_ENV] = os.path.abspath(os.path.join(args['out_dir'], 'ViWrap_job_logs'))
+    os.environ[supervisor.TIMEOUT_ENV] = str(args['job_timeout'])
+    os.environ[supervisor.RETRIES_ENV] = str(args['job_retries'])
+    os.environ[executors.EXECUTOR_ENV] = args['executor']
+    os.environ[executors.MAX_CLUSTER_JOBS_ENV] = str(args['max_cluster_jobs'])
+    os.environ[executors.SBATCH_ARGS_ENV] = args['sbatch_args']
+    trace_file = os.path.join(args['out_dir'], 'ViWrap_trace.json')
+
+    for master, sample_args in sample2master_args.values():
+        os.makedirs(sample_args['out_dir'], exist_ok = True)
+    run = build_pipeline(args, sample2master_args)
+    run.get_step_metrics = lambda name: {'peak_rss': process_metrics.get_step_peak_rss(name)}
+
+    ## Resolve the conda envs of all steps once
+    conda_launcher.resolve_envs(sorted(set(env_dir for step in run.steps.values() for env_dir in step.envs)))
+    try:
+        run.run()
+    finally:
+        process_metrics.write_run_metrics(run_metrics_file, run.step2span)
+        timeline.write_trace(trace_file, run.step2span, process_metrics.read_records(os.environ[process_metrics.METRICS_ENV]))
+    logger.info(f"Conda env launching:\n{conda_launcher.get_launch_report()}")
+    logger.info(f"The wall time, CPU time, peak memory, and disk I/O of each step and each process are in {run_metrics_file}; the timeline of all steps and processes is in {trace_file} (open it in https://ui.perfetto.dev)")
+
+
+    end_time = datetime.now().replace(microsecond=0)
+    duration = end_time - start_time
+    logger.info(f"The total running time is {duration} (in \"hr:min:sec\" format)")
@@ -102,7 +102,13 @@ def main(args):
             os.system(f"rm -r {os.path.join(args['iphop_custom_outdir_wo_reads'], 'Wdir')}")
         
         time_current = f"[{str(datetime.now().replace(microsecond=0))}]"
-        logger.info(f"{time_current} | 04_iPHoP_outdir has been cleaned")        
+        logger.info(f"{time_current} | 04_iPHoP_outdir has been cleaned")
+
+    # Clean sequence offset index files (*.seqidx) in all outdirs
+    os.system(f"find {args['out_dir']} -name '*.seqidx' -delete")
+
+    time_current = f"[{str(datetime.now().replace(microsecond=0))}]"
+    logger.info(f"{time_current} | Sequence index files have been cleaned")
 
     end_time = datetime.now().replace(microsecond=0)
     duration = end_time - start_time
@@ -5,6 +5,7 @@ import logging
 import scripts
 from scripts import module
 from scripts import downloadDB
+from scripts import conda_launcher
 from datetime import datetime
 from pathlib import Path
 from glob import glob
@@ -65,7 +66,7 @@ def main(args):
 
     # Step 2  Make VIBRANT db
     vibrant_db_dir_absolute_path = os.path.abspath(args['VIBRANT_db'])
-    os.system(f"conda run -p {os.path.join(args['conda_env_dir'], 'ViWrap-VIBRANT')} bash {os.path.join(args['conda_env_dir'], 'ViWrap-VIBRANT/bin/download-db.sh')} {vibrant_db_dir_absolute_path}")
+    conda_launcher.run(os.path.join(args['conda_env_dir'], 'ViWrap-VIBRANT'), f"bash {os.path.join(args['conda_env_dir'], 'ViWrap-VIBRANT/bin/download-db.sh')} {vibrant_db_dir_absolute_path}")
     
     time_current = f"[{str(datetime.now().replace(microsecond=0))}]"
     logger.info(f"{time_current} | VIBRANT db has been set up")  
@@ -125,7 +126,7 @@ def main(args):
     
 
     # Step 4 Make CheckV db
-    os.system(f"conda run -p {os.path.join(args['conda_env_dir'], 'ViWrap-CheckV')} checkv download_database {args['db_dir']} >/dev/null 2>&1")
+    conda_launcher.run(os.path.join(args['conda_env_dir'], 'ViWrap-CheckV'), f"checkv download_database {args['db_dir']} >/dev/null")
     os.system(f"mv {os.path.join(args['db_dir'], 'checkv-db-v*')} {args['CheckV_db']}")
 
     time_current = f"[{str(datetime.now().replace(microsecond=0))}]"
@@ -156,7 +157,7 @@ def main(args):
     
 
     # Step 7 Download VirSorter2 db
-    os.system(f"conda run -p {os.path.join(args['conda_env_dir'], 'ViWrap-vs2')} virsorter setup -d {args['VirSorter2_db']} -j {args['threads']} >/dev/null 2>&1")
+    conda_launcher.run(os.path.join(args['conda_env_dir'], 'ViWrap-vs2'), f"virsorter setup -d {args['VirSorter2_db']} -j {args['threads']} >/dev/null")
     
     time_current = f"[{str(datetime.now().replace(microsecond=0))}]"
     logger.info(f"{time_current} | VirSorter2 db has been set up")     
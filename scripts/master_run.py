@@ -2,13 +2,29 @@ import sys
 import os
 import argparse
 import logging
+import shutil
 import scripts
 from scripts import module
+from scripts import id_registry
+from scripts import pipeline
+from scripts import resource_pool
+from scripts import conda_launcher
+from scripts import cost_model
+from scripts import process_metrics
+from scripts import timeline
+from scripts import supervisor
+from scripts import executors
+from functools import partial
 from datetime import datetime
 from pathlib import Path
 from glob import glob
 
 
+
+logger = logging.getLogger(__name__)
+identify_method2name = {'vb-vs': 'VIBRANT-VirSorter2', 'vb-vs-dvf': 'VIBRANT-VirSorter2-DVF'} # The methods that run more than one identification branch
+
+
 def fetch_arguments(parser,root_dir,db_path_default):
     parser.set_defaults(func=main)
     parser.set_defaults(program="run")
@@ -16,7 +32,7 @@ def fetch_arguments(parser,root_dir,db_path_default):
     parser.add_argument('--input_reads', '-r', dest = 'input_reads', required=True, default='none', help=r'(required) input metagenomic reads. The input paired reads should be  "forward_1.fastq or forward_R1.fastq" and "reverse_2.fastq or reverse_R2.fastq" connected by ",". Multiple paired reads can be provided at the same time for one metagenome assembly, connected by ",".  For example: -r /path/to/Lake_01_T1_1.fastq,/path/to/Lake_01_T1_2.fastq,/path/to/Lake_01_T2_1.fastq,/path/to/Lake_01_T2_2.fastq  Note that the extension of the input reads should be ".fastq" or ".fastq.gz"')
     parser.add_argument('--input_reads_type', '-rt', dest = 'input_reads_type', required=False, default='illumina', help=r'input metagenomic reads type. The default is illumina. If you are using long reads, you will need to assign: pacbio - PacBio CLR reads, pacbio_hifi - PacBio HiFi/CCS reads, pacbio_asm20 - PacBio HiFi/CCS reads asm20, nanopore - Oxford Nanopore reads')
     parser.add_argument('--reads_mapping_identity_cutoff', '-id', dest = 'reads_mapping_identity_cutoff', required=False, default=0.97, help=r'reads mapping identity cutoff. The default is 0.97. 0.97 is suitable for all illumina reads and also suitable for PacBio Sequel II or Nanopore PromethION Q20+ reads. For other PacBio or Nanopore reads with high error rate, the id cutoff is suggested to be 1 - error rate')
-    parser.add_argument('--out_dir','-o', dest='out_dir', required=False, default='./ViWrap_outdir', help=r'(required) output directory to deposit all results (default = ./ViWrap_outdir) output folder to deposit all results. ViWrap will exit if the folder already exists')
+    parser.add_argument('--out_dir','-o', dest='out_dir', required=False, default='./ViWrap_outdir', help=r'(required) output directory to deposit all results (default = ./ViWrap_outdir) output folder to deposit all results. ViWrap will exit if the folder already exists, unless --resume is used')
     parser.add_argument('--db_dir','-d', dest='db_dir', required=False, default=db_path_default, help=f'(required) database directory; default = {db_path_default}')
     parser.add_argument('--identify_method', dest='identify_method', required=False, default='vb-vs',help=r'(required) the virus identifying method to choose: vb - VIBRANT; vs - VirSorter2 and CheckV; dvf - DeepVirFinder; vb-vs - Use VIBRANT and VirSorter2 to get the overlapped viruses (default); vb-vs-dvf - Use all these three methods and get the overlapped viruses')
     parser.add_argument('--conda_env_dir', dest='conda_env_dir', required=True, default='none', help=r'(required) the directory where you put your conda environment files. It is the parent directory that contains all the conda environment folders')
@@ -24,6 +40,14 @@ def fetch_arguments(parser,root_dir,db_path_default):
     parser.add_argument('--virome','-v', dest='virome', action='store_true', required=False, default=False, help=r"edit VIBRANT's sensitivity if the input dataset is a virome. It is suggested to use it if you know that the input assembly is virome or metagenome")
     parser.add_argument('--input_length_limit', dest='input_length_limit', required=False, default=2000, help=r'length in basepairs to limit input sequences (default=2000, can increase but not decrease); 2000 at least suggested for VIBRANT (vb)-based pipeline, 5000 at least suggested for VirSorter2 (vs)-based pipeline')
     parser.add_argument('--custom_MAGs_dir', dest='custom_MAGs_dir', required=False, default='none', help=r'custom MAGs dir that contains only *.fasta files for MAGs reconstructed from the same metagenome, this will be used in iPHoP for host prediction; note that it should be the absolute address path')	
+    parser.add_argument('--max_parallel_steps', dest='max_parallel_steps', required=False, default=4, help=r'maximum number of independent pipeline steps to run at the same time, i.e., taxonomic charaterization, dRep, and iPHoP can run together once viral genomes are ready; all running steps share the given --threads (default = 4)')
+    parser.add_argument('--job_timeout', dest='job_timeout', required=False, default=0, help=r'maximum seconds for each parallel sub-job (i.e., CheckV of a genome chunk, dRep of a genus, or DIAMOND/hmmsearch of a genome); a job running longer is killed and run again (default = 0, no limit)')
+    parser.add_argument('--job_retries', dest='job_retries', required=False, default=2, help=r'number of times to run a parallel sub-job again after a transient failure, i.e., killed under memory pressure or by --job_timeout (default = 2); any other failure stops the step at once')
+    parser.add_argument('--executor', dest='executor', required=False, default='local', help=r'where to run the parallel sub-jobs (CheckV of each genome chunk, dRep of each genus, DIAMOND/hmmsearch of each genome or chunk): local - on this machine (default); slurm - submitted by sbatch to a SLURM cluster, the output dir should be on a file system shared by all nodes; mock - a local mock cluster for testing')
+    parser.add_argument('--max_cluster_jobs', dest='max_cluster_jobs', required=False, default=100, help=r'maximum number of sub-jobs of a step in the cluster queue at the same time with "--executor slurm" or "mock" (default = 100; for "mock", it is also the number of local workers)')
+    parser.add_argument('--sbatch_args', dest='sbatch_args', required=False, default='', help=r'extra sbatch options for the sub-jobs with "--executor slurm", given in quotes, i.e., "--partition=short --time=4:00:00"')
+    parser.add_argument('--resume', dest='resume', action='store_true', required=False, default=False, help=r"resume an interrupted run in the existing output directory: steps that were finished and whose inputs, tool versions, and parameters are not changed are skipped; the other steps and all steps downstream of them are run again")
+    parser.add_argument('--dry_run', dest='dry_run', action='store_true', required=False, default=False, help=r"only print the planned steps with their estimated wall time, peak memory, and disk footprint, based on the input sizes and the measured steps of previous runs (ViWrap_step_history.jsonl in the db dir); nothing is run")
     parser.add_argument('--root_dir', dest='root_dir', required=False, default=root_dir,help=argparse.SUPPRESS)
     
 
@@ -56,79 +80,62 @@ def set_defaults(args):
     args['iphop_custom_outdir'] = os.path.join(args['out_dir'],'07_iPHoP_outdir/iPHoP_outdir_custom_MAGs')
     args['viwrap_summary_outdir'] = os.path.join(args['out_dir'],'08_ViWrap_summary_outdir')
     args['viwrap_visualization_outdir'] = os.path.join(args['out_dir'],'09_Virus_statistics_visualization')
-    
-def main(args):
-    # Welcome and logger
-    print("### Welcome to ViWrap ###\n") 
-
-	## Set up the logger
-    os.mkdir(args['out_dir'])
-    log_file = os.path.join(args['out_dir'],'ViWrap_run.log')
-    logging.basicConfig(
-        level=logging.INFO,
-        format="%(message)s",
-        handlers=[
-            logging.FileHandler(log_file),
-            logging.StreamHandler(sys.stdout)
-        ]
-    )    
-    logger = logging.getLogger(__name__) 
-
-    ## Store the input arguments
-    issued_command = scripts.module.get_run_input_arguments(args)
-    logger.info(f"The issued command is:\n{issued_command}\n")
-    
-    ## Set the default args:
-    set_defaults(args)
-    
-    # Step 1 Pre-check inputs
-    start_time = datetime.now().replace(microsecond=0)
-    time_current = f"[{str(datetime.now().replace(microsecond=0))}]"
-    logger.info(f"{time_current} | Pre-check inputings. In processing...")
-    
-    if not os.path.exists(args['input_metagenome']):
-        sys.exit(f"Could not find input metagenome {args['input_metagenome']}")        
-    if not os.path.exists(args['db_dir']):
-        sys.exit(f"Could not find directory {args['db_dir']}. Maybe the database directory was not specified with the --db_dir and is not the default \".ViWrap_db/\" directory?")
-
-    if args['input_reads_type'] != 'illumina' and args['input_reads_type'] != 'pacbio' and args['input_reads_type'] != 'pacbio_hifi' and args['input_reads_type'] != 'pacbio_asm20' and args['input_reads_type'] != 'nanopore':
-        sys.exit(f"The input reads type should be one of these: illumina, pacbio, pacbio_hifi, pacbio_asm20, and nanopore")  
-        
-    metaG_reads_list = args['input_reads'].split(',')
-    for each_read in metaG_reads_list:
-        if not each_read.endswith('.fastq') and not each_read.endswith('.fastq.gz'):
-            sys.exit(f"Please make sure that all your input reads are ended with .fastq or fastq.gz")  
-    
-    sample2read_info = scripts.module.get_read_info(args['input_reads'], args['input_reads_type'])  
-    
-    if args['custom_MAGs_dir'] != 'none' and not os.path.exists(args['custom_MAGs_dir']):
-        sys.exit(f"Could not find custom MAGs directory {args['custom_MAGs_dir']}. Maybe the directory is not correct")
-    elif args['custom_MAGs_dir'] != 'none' and os.path.exists(args['custom_MAGs_dir']):   
-        for file in glob(f"os.path.join(args['custom_MAGs_dir'],'*.fasta')"):
-            if '.fasta' not in file:
-                sys.exit(f"Make sure all MAGs in custom MAGs directory {args['custom_MAGs_dir']} end with \'.fasta\', and no additional files within the directory")
-                
-    if args['custom_MAGs_dir'] != 'none' and not os.path.isabs(args['custom_MAGs_dir']):
-        sys.exit(f"Please make sure that the path to custom MAGs directory {args['custom_MAGs_dir']} is a full absolute path")
-                
-    if not os.path.exists(args['conda_env_dir']):
-        sys.exit(f"Could not find conda env dirs within {args['conda_env_dir']}") 
-    
-    if os.path.exists(args['iPHoP_db_custom']):
-        sys.exit(f"Please make sure that {args['iPHoP_db_custom']} is not present before ViWrap run. If present, please remove the folder") 
-
-    time_current = f"[{str(datetime.now().replace(microsecond=0))}]"
-    logger.info(f"{time_current} | Looks like the input metagenome and reads, database, and custom MAGs dir (if option used) are now set up well, start up to run ViWrap pipeline")
-         
-
+    args['checkpoint_dir'] = os.path.join(args['out_dir'],'ViWrap_checkpoints')
+    args['resource_pool_file'] = os.path.join(args['out_dir'],'ViWrap_resource_pool.json')
+    args['step_history_file'] = os.path.join(args['db_dir'],'ViWrap_step_history.jsonl')
+    args['process_metrics_file'] = os.path.join(args['out_dir'],'ViWrap_process_metrics.jsonl')
+    args['run_metrics_file'] = os.path.join(args['out_dir'],'ViWrap_run_metrics.json')
+    args['trace_file'] = os.path.join(args['out_dir'],'ViWrap_trace.json')
+    args['job_log_dir'] = os.path.join(args['out_dir'],'ViWrap_job_logs')
+    args['id_registry_dir'] = os.path.join(args['vrhyme_outdir'],'viral_id_registry')
+    
+    ## Store intermediate files and folders shared between steps
+    identify_method2outdir = {'vb': args['vibrant_outdir'], 'vs': args['virsorter_outdir'], 'dvf': args['dvf_outdir'], 'vb-vs-dvf': args['vb_vs_dvf_outdir'], 'vb-vs': args['vb_vs_outdir']}
+    args['identify_outdir'] = identify_method2outdir.get(args['identify_method'], '')
+    args['inner_vb_outdir'] = os.path.join(args['identify_outdir'], f"VIBRANT_{Path(args['input_metagenome']).stem}")
+    args['inner_vs_outdir'] = os.path.join(args['identify_outdir'], f"VirSorter_{Path(args['input_metagenome']).stem}")
+    args['inner_dvf_outdir'] = os.path.join(args['identify_outdir'], f"DeepVirFinder_{Path(args['input_metagenome']).stem}") if args['identify_method'] == 'vb-vs-dvf' else ''
+    args['overlap_outdir'] = os.path.join(args['identify_outdir'], f"Overlap_{Path(args['input_metagenome']).stem}")
+    metagenomic_scaffold_stem_name = Path(args['input_metagenome']).stem
+    if args['identify_method'] == 'vb':
+        args['viral_scaffold'] = os.path.join(args['vibrant_outdir'],f"VIBRANT_phages_{metagenomic_scaffold_stem_name}",f"{metagenomic_scaffold_stem_name}.phages_combined.fna")
+        args['scf2lytic_or_lyso_summary'] = os.path.join(args['vibrant_outdir'], 'scf2lytic_or_lyso.summary.txt')
+    elif args['identify_method'] == 'vs':
+        args['viral_scaffold'] = os.path.join(args['virsorter_outdir'], 'final_vs2_virus.fasta')
+        args['scf2lytic_or_lyso_summary'] = ''
+    elif args['identify_method'] == 'dvf':
+        args['viral_scaffold'] = os.path.join(args['dvf_outdir'], 'final_dvf_virus.fasta')  
+        args['scf2lytic_or_lyso_summary'] = ''
+    elif args['identify_method'] == 'vb-vs-dvf':
+        args['viral_scaffold'] = os.path.join(args['vb_vs_dvf_outdir'], f"Overlap_{metagenomic_scaffold_stem_name}", 'final_overlapped_virus.fasta')   
+        args['scf2lytic_or_lyso_summary'] = os.path.join(args['vb_vs_dvf_outdir'],f"VIBRANT_{metagenomic_scaffold_stem_name}", 'scf2lytic_or_lyso.summary.txt')
+    elif args['identify_method'] == 'vb-vs':        
+        args['viral_scaffold'] = os.path.join(args['vb_vs_outdir'], f"Overlap_{metagenomic_scaffold_stem_name}", 'final_overlapped_virus.fasta')   
+        args['scf2lytic_or_lyso_summary'] = os.path.join(args['vb_vs_outdir'],f"VIBRANT_{metagenomic_scaffold_stem_name}", 'scf2lytic_or_lyso.summary.txt')
+    args['vRhyme_best_bin_dir'] = os.path.join(args['vrhyme_outdir'], 'vRhyme_best_bins_fasta')
+    args['vRhyme_best_bin_lytic_and_lysogenic_info'] = os.path.join(args['vrhyme_outdir'], 'vRhyme_best_bin_lytic_and_lysogenic_info.txt')
+    args['vRhyme_best_bin_scaffold_complete_info'] = os.path.join(args['vrhyme_outdir'], 'vRhyme_best_bin_scaffold_complete_info.txt')
+    args['vRhyme_best_bin_dir_modified'] = os.path.join(args['vrhyme_outdir'], 'vRhyme_best_bins_fasta_modified')
+    args['vRhyme_unbinned_viral_gn_dir'] = os.path.join(args['vrhyme_outdir'], 'vRhyme_unbinned_viral_gn_fasta')
+    args['all_vRhyme_faa'] = os.path.join(args['vrhyme_outdir'], 'all_vRhyme_faa.faa')
+    args['all_vRhyme_fasta_Nlinked'] = os.path.join(args['vrhyme_outdir'], 'all_vRhyme_fasta.Nlinked_viral_gn.fasta')
+    args['genome_by_genome_file'] = os.path.join(args['vcontact2_outdir'], 'genome_by_genome_overview.csv')
+    args['genus_cluster_info'] = os.path.join(args['out_dir'], 'Genus_cluster_info.txt')
+    args['species_cluster_info'] = os.path.join(args['out_dir'], 'Species_cluster_info.txt')
+    args['tax_refseq_output'] = os.path.join(args['out_dir'], 'tax_refseq_output.txt')
+    args['tax_vog_output'] = os.path.join(args['out_dir'], 'tax_vog_output.txt')
+    args['tax_vcontact2_output'] = os.path.join(args['out_dir'], 'tax_vcontact2_output.txt')
+    args['tax_classification_result'] = os.path.join(args['out_dir'], 'Tax_classification_result.txt')
+    
+def step_identify_virus(args):
     # Step 2 Run VIBRANT or VirSorter2 or DVF
     if args['identify_method'] == 'vb':
         time_current = f"[{str(datetime.now().replace(microsecond=0))}]"
         logger.info(f"{time_current} | Run VIBRANT to identify and annotate virus from input metagenome. In processing...")
     
-        os.system(f"conda run -p {os.path.join(args['conda_env_dir'], 'ViWrap-VIBRANT')} python {os.path.join(args['root_dir'],'scripts/run_VIBRANT.py')} {args['input_metagenome']} {args['out_dir']} {args['threads']} {args['virome']} {args['input_length_limit']} {args['db_dir']} >/dev/null 2>&1")
+        conda_launcher.run(os.path.join(args['conda_env_dir'], 'ViWrap-VIBRANT'), f"python {os.path.join(args['root_dir'],'scripts/run_VIBRANT.py')} {args['input_metagenome']} {args['out_dir']} {args['threads']} {args['virome']} {args['input_length_limit']} {args['db_dir']} >/dev/null")
         default_vibrant_outdir = os.path.join(args['out_dir'],f"VIBRANT_{Path(args['input_metagenome']).stem}")
-        os.system(f"mv {default_vibrant_outdir} {args['vibrant_outdir']}")
+        shutil.move(default_vibrant_outdir, args['vibrant_outdir'])
         scripts.module.parse_vibrant_lytic_and_lysogenic_info(args['vibrant_outdir'], Path(args['input_metagenome']).stem)
     
         time_current = f"[{str(datetime.now().replace(microsecond=0))}]"
@@ -138,22 +145,22 @@ def main(args):
         time_current = f"[{str(datetime.now().replace(microsecond=0))}]"
         logger.info(f"{time_current} | Run VirSorter2 to identify viruses from input metagenome. Also plus CheckV to QC and trim, and KEGG, Pfam, and VOG HMMs to annotate viruses. In processing...")    
     
-        os.system(f"conda run -p {os.path.join(args['conda_env_dir'], 'ViWrap-vs2')} python {os.path.join(args['root_dir'],'scripts/run_VirSorter2_1st.py')} {args['input_metagenome']} {args['virsorter_outdir']} {args['threads']} {args['input_length_limit']} ") # >/dev/null 2>&1
+        conda_launcher.run(os.path.join(args['conda_env_dir'], 'ViWrap-vs2'), f"python {os.path.join(args['root_dir'],'scripts/run_VirSorter2_1st.py')} {args['input_metagenome']} {args['virsorter_outdir']} {args['threads']} {args['input_length_limit']} ") # >/dev/null 2>&1
     
         time_current = f"[{str(datetime.now().replace(microsecond=0))}]"
         logger.info(f"{time_current} | Run VirSorter2 the 1st time to identify viruses from input metagenome. Finished")    
 
-        os.system(f"conda run -p {os.path.join(args['conda_env_dir'], 'ViWrap-CheckV')} python {os.path.join(args['root_dir'],'scripts/run_VirSorter2_CheckV_1st.py')} {args['virsorter_outdir']} {args['threads']} {args['CheckV_db']} >/dev/null 2>&1")
+        conda_launcher.run(os.path.join(args['conda_env_dir'], 'ViWrap-CheckV'), f"python {os.path.join(args['root_dir'],'scripts/run_VirSorter2_CheckV_1st.py')} {args['virsorter_outdir']} {args['threads']} {args['CheckV_db']} >/dev/null")
         
         time_current = f"[{str(datetime.now().replace(microsecond=0))}]"
         logger.info(f"{time_current} | Run CheckV the 1st time to QC and trim viruses identified from VirSorter2 1st run. Finished")   
         
-        os.system(f"conda run -p {os.path.join(args['conda_env_dir'], 'ViWrap-vs2')} python {os.path.join(args['root_dir'],'scripts/run_VirSorter2_2nd.py')} {args['virsorter_outdir']} {args['threads']} {args['input_length_limit']} >/dev/null 2>&1")
+        conda_launcher.run(os.path.join(args['conda_env_dir'], 'ViWrap-vs2'), f"python {os.path.join(args['root_dir'],'scripts/run_VirSorter2_2nd.py')} {args['virsorter_outdir']} {args['threads']} {args['input_length_limit']} >/dev/null")
     
         time_current = f"[{str(datetime.now().replace(microsecond=0))}]"
         logger.info(f"{time_current} | Run VirSorter2 the 2nd time for CheckV-trimmed sequences. Finished")    
 
-        os.system(f"conda run -p {os.path.join(args['conda_env_dir'], 'ViWrap-CheckV')} python {os.path.join(args['root_dir'],'scripts/run_VirSorter2_CheckV_2nd.py')} {args['virsorter_outdir']} {args['threads']} {args['CheckV_db']} >/dev/null 2>&1")
+        conda_launcher.run(os.path.join(args['conda_env_dir'], 'ViWrap-CheckV'), f"python {os.path.join(args['root_dir'],'scripts/run_VirSorter2_CheckV_2nd.py')} {args['virsorter_outdir']} {args['threads']} {args['CheckV_db']} >/dev/null")
         
         time_current = f"[{str(datetime.now().replace(microsecond=0))}]"
         logger.info(f"{time_current} | Run CheckV the 2nd time to get viral and host gene counts. Finished")
@@ -169,17 +176,17 @@ def main(args):
         scripts.module.get_keep2_mc_seq(args['virsorter_outdir'], keep2_list_file, manual_check_list_file, keep2_fasta, manual_check_fasta)
         
         if os.path.exists(keep2_fasta) and os.path.getsize(keep2_fasta) != 0:
-            os.system(f"conda run -p {os.path.join(args['conda_env_dir'], 'ViWrap-VIBRANT')} python {os.path.join(args['root_dir'],'scripts/run_VIBRANT.py')} {keep2_fasta} {args['virsorter_outdir']} {args['threads']} {args['virome']} {args['input_length_limit']} {args['db_dir']} >/dev/null 2>&1")
+            conda_launcher.run(os.path.join(args['conda_env_dir'], 'ViWrap-VIBRANT'), f"python {os.path.join(args['root_dir'],'scripts/run_VIBRANT.py')} {keep2_fasta} {args['virsorter_outdir']} {args['threads']} {args['virome']} {args['input_length_limit']} {args['db_dir']} >/dev/null")
             keep2_vb_result = os.path.join(args['virsorter_outdir'], 'VIBRANT_keep2/VIBRANT_phages_keep2/keep2.phages_combined.fna') 
             keep2_list_vb_passed_file = os.path.join(args['virsorter_outdir'], 'keep2_list_vb_passed.txt')
             scripts.module.get_keep2_vb_passed_list(args['virsorter_outdir'], keep2_vb_result, keep2_list_vb_passed_file)
-            os.system(f"rm -r {os.path.join(args['virsorter_outdir'], 'VIBRANT_keep2')}")
+            shutil.rmtree(os.path.join(args['virsorter_outdir'], 'VIBRANT_keep2'))
         if os.path.exists(manual_check_fasta) and os.path.getsize(manual_check_fasta) != 0:
-            os.system(f"conda run -p {os.path.join(args['conda_env_dir'], 'ViWrap-VIBRANT')} python {os.path.join(args['root_dir'],'scripts/run_VIBRANT.py')} {manual_check_fasta} {args['virsorter_outdir']} {args['threads']} {args['virome']} {args['input_length_limit']} {args['db_dir']} >/dev/null 2>&1")
+            conda_launcher.run(os.path.join(args['conda_env_dir'], 'ViWrap-VIBRANT'), f"python {os.path.join(args['root_dir'],'scripts/run_VIBRANT.py')} {manual_check_fasta} {args['virsorter_outdir']} {args['threads']} {args['virome']} {args['input_length_limit']} {args['db_dir']} >/dev/null")
             manual_check_vb_result = os.path.join(args['virsorter_outdir'], 'VIBRANT_manual_check/VIBRANT_phages_manual_check/manual_check.phages_combined.fna') 
             manual_check_list_vb_passed_file = os.path.join(args['virsorter_outdir'], 'manual_check_list_vb_passed.txt')
             scripts.module.get_manual_check_vb_passed_list(args['virsorter_outdir'], manual_check_vb_result, manual_check_list_vb_passed_file)
-            os.system(f"rm -r {os.path.join(args['virsorter_outdir'], 'VIBRANT_manual_check')}")            
+            shutil.rmtree(os.path.join(args['virsorter_outdir'], 'VIBRANT_manual_check'))            
 
         keep2_list_vb_passed_file = os.path.join(args['virsorter_outdir'], 'keep2_list_vb_passed.txt')
         manual_check_list_vb_passed_file = os.path.join(args['virsorter_outdir'], 'manual_check_list_vb_passed.txt')
@@ -189,269 +196,205 @@ def main(args):
         time_current = f"[{str(datetime.now().replace(microsecond=0))}]"
         logger.info(f"{time_current} | Run VIBRANT to check \"keep2\" and \"manual_check\" groups and get the final VirSorter2 virus sequences. Finished")  
 
-        os.system(f"conda run -p {os.path.join(args['conda_env_dir'], 'ViWrap-VIBRANT')} python {os.path.join(args['root_dir'],'scripts/run_annotate_by_VIBRANT_db.py')} {args['VIBRANT_db']} {args['identify_method']} {args['virsorter_outdir']} {args['dvf_outdir']} {args['out_dir']} {args['threads']}")
+        conda_launcher.run(os.path.join(args['conda_env_dir'], 'ViWrap-VIBRANT'), f"python {os.path.join(args['root_dir'],'scripts/run_annotate_by_VIBRANT_db.py')} {args['VIBRANT_db']} {args['identify_method']} {args['virsorter_outdir']} {args['dvf_outdir']} {args['out_dir']} {args['threads']}")
 
         time_current = f"[{str(datetime.now().replace(microsecond=0))}]"
         logger.info(f"{time_current} | Use KEGG, Pfam, and VOG HMMs to annotate viruses. Finished") 
         
     elif args['identify_method'] == 'dvf':
-        os.system(f"conda run -p {os.path.join(args['conda_env_dir'], 'ViWrap-DVF')} python {os.path.join(args['root_dir'],'scripts/run_DVF.py')} {args['input_metagenome']} {args['dvf_outdir']} {args['input_length_limit']} {args['DVF_db']} >/dev/null 2>&1")
+        conda_launcher.run(os.path.join(args['conda_env_dir'], 'ViWrap-DVF'), f"python {os.path.join(args['root_dir'],'scripts/run_DVF.py')} {args['input_metagenome']} {args['dvf_outdir']} {args['input_length_limit']} {args['DVF_db']} >/dev/null")
         final_dvf_virus_fasta_file = os.path.join(args['dvf_outdir'], 'final_dvf_virus.fasta')
         scripts.module.get_dvf_result_seq(args, args['dvf_outdir'], final_dvf_virus_fasta_file)
         
         time_current = f"[{str(datetime.now().replace(microsecond=0))}]"
         logger.info(f"{time_current} | Run DeepVirFinder to identify viruses from input metagenome. Finished")   
 
-        os.system(f"conda run -p {os.path.join(args['conda_env_dir'], 'ViWrap-VIBRANT')} python {os.path.join(args['root_dir'],'scripts/run_annotate_by_VIBRANT_db.py')} {args['VIBRANT_db']} {args['identify_method']} {args['virsorter_outdir']} {args['dvf_outdir']} {args['out_dir']} {args['threads']}") 
+        conda_launcher.run(os.path.join(args['conda_env_dir'], 'ViWrap-VIBRANT'), f"python {os.path.join(args['root_dir'],'scripts/run_annotate_by_VIBRANT_db.py')} {args['VIBRANT_db']} {args['identify_method']} {args['virsorter_outdir']} {args['dvf_outdir']} {args['out_dir']} {args['threads']}") 
         
         time_current = f"[{str(datetime.now().replace(microsecond=0))}]"
         logger.info(f"{time_current} | Use KEGG, Pfam, and VOG HMMs to annotate viruses. Finished") 
         
-    elif args['identify_method'] == 'vb-vs-dvf':
-        ## Set output folders
-        inner_vb_outdir = os.path.join(args['vb_vs_dvf_outdir'],f"VIBRANT_{Path(args['input_metagenome']).stem}")
-        inner_vs_outdir = os.path.join(args['vb_vs_dvf_outdir'],f"VirSorter_{Path(args['input_metagenome']).stem}")
-        inner_dvf_outdir = os.path.join(args['vb_vs_dvf_outdir'],f"DeepVirFinder_{Path(args['input_metagenome']).stem}")
-        
-        ## Firstly, run VIBRANT 
-        
-        time_current = f"[{str(datetime.now().replace(microsecond=0))}]"
-        logger.info(f"{time_current} | Run VIBRANT-VirSorter2-DVF method. Run VIBRANT to identify and annotate virus from input metagenome. In processing...")
-        os.system(f"conda run -p {os.path.join(args['conda_env_dir'], 'ViWrap-VIBRANT')} python {os.path.join(args['root_dir'],'scripts/run_VIBRANT.py')} {args['input_metagenome']} {args['vb_vs_dvf_outdir']} {args['threads']} {args['virome']} {args['input_length_limit']} {args['db_dir']} >/dev/null 2>&1")
-        scripts.module.parse_vibrant_lytic_and_lysogenic_info(inner_vb_outdir, Path(args['input_metagenome']).stem)
-        time_current = f"[{str(datetime.now().replace(microsecond=0))}]"
-        logger.info(f"{time_current} | Run VIBRANT-VirSorter2-DVF method. Run VIBRANT to identify and annotate viruses from input metagenome. Finished") 
-        
-        ## Secondly, run VirSorter2
-        time_current = f"[{str(datetime.now().replace(microsecond=0))}]"
-        logger.info(f"{time_current} | Run VIBRANT-VirSorter2-DVF method. Run VirSorter2 to identify viruses from input metagenome. Also plus CheckV to QC and trim, and KEGG, Pfam, and VOG HMMs to annotate viruses. In processing...")    
-    
-        os.system(f"conda run -p {os.path.join(args['conda_env_dir'], 'ViWrap-vs2')} python {os.path.join(args['root_dir'],'scripts/run_VirSorter2_1st.py')} {args['input_metagenome']} {inner_vs_outdir} {args['threads']} {args['input_length_limit']} >/dev/null 2>&1")
-    
-        time_current = f"[{str(datetime.now().replace(microsecond=0))}]"
-        logger.info(f"{time_current} | Run VIBRANT-VirSorter2-DVF method. Run VirSorter2 the 1st time to identify viruses from input metagenome. Finished")    
+    else:
+        sys.exit(f"Please make sure your input for --identify_method option is one of these: \"vb-vs\", \"vb-vs-dvf\", \"vb\", \"vs\", and \"dvf\"; you can also omit this in the command line, the default is \"vb\"")
 
-        os.system(f"conda run -p {os.path.join(args['conda_env_dir'], 'ViWrap-CheckV')} python {os.path.join(args['root_dir'],'scripts/run_VirSorter2_CheckV_1st.py')} {inner_vs_outdir} {args['threads']} {args['CheckV_db']} >/dev/null 2>&1")
-        
-        time_current = f"[{str(datetime.now().replace(microsecond=0))}]"
-        logger.info(f"{time_current} | Run VIBRANT-VirSorter2-DVF method. Run CheckV the 1st time to QC and trim viruses identified from VirSorter2 1st run. Finished")   
-        
-        os.system(f"conda run -p {os.path.join(args['conda_env_dir'], 'ViWrap-vs2')} python {os.path.join(args['root_dir'],'scripts/run_VirSorter2_2nd.py')} {inner_vs_outdir} {args['threads']} {args['input_length_limit']} >/dev/null 2>&1")
+def step_identify_virus_by_VIBRANT(args, threads):
+    # Step 2 Run VIBRANT-VirSorter2(-DVF) method; the VIBRANT, VirSorter2, and DVF branches are independent until the overlap step, so they run at the same time
+    method_name = identify_method2name[args['identify_method']]
+    os.makedirs(args['identify_outdir'], exist_ok = True) # Each branch makes the shared outdir if it is not there yet
     
-        time_current = f"[{str(datetime.now().replace(microsecond=0))}]"
-        logger.info(f"{time_current} | Run VIBRANT-VirSorter2-DVF method. Run VirSorter2 the 2nd time for CheckV-trimmed sequences. Finished")    
-
-        os.system(f"conda run -p {os.path.join(args['conda_env_dir'], 'ViWrap-CheckV')} python {os.path.join(args['root_dir'],'scripts/run_VirSorter2_CheckV_2nd.py')} {inner_vs_outdir} {args['threads']} {args['CheckV_db']} >/dev/null 2>&1")
-        
-        time_current = f"[{str(datetime.now().replace(microsecond=0))}]"
-        logger.info(f"{time_current} | Run VIBRANT-VirSorter2-DVF method. Run CheckV the 2nd time to get viral and host gene counts. Finished")
+    time_current = f"[{str(datetime.now().replace(microsecond=0))}]"
+    logger.info(f"{time_current} | Run {method_name} method. Run VIBRANT to identify and annotate virus from input metagenome. In processing...")
+    conda_launcher.run(os.path.join(args['conda_env_dir'], 'ViWrap-VIBRANT'), f"python {os.path.join(args['root_dir'],'scripts/run_VIBRANT.py')} {args['input_metagenome']} {args['identify_outdir']} {threads} {args['virome']} {args['input_length_limit']} {args['db_dir']} >/dev/null")
+    scripts.module.parse_vibrant_lytic_and_lysogenic_info(args['inner_vb_outdir'], Path(args['input_metagenome']).stem)
+    time_current = f"[{str(datetime.now().replace(microsecond=0))}]"
+    logger.info(f"{time_current} | Run {method_name} method. Run VIBRANT to identify and annotate viruses from input metagenome. Finished")
 
-        keep1_list_file = os.path.join(inner_vs_outdir, 'keep1_list.txt')
-        keep2_list_file = os.path.join(inner_vs_outdir, 'keep2_list.txt')
-        discard_list_file = os.path.join(inner_vs_outdir, 'discard_list.txt')
-        manual_check_list_file = os.path.join(inner_vs_outdir, 'manual_check_list.txt')
-        scripts.module.screen_virsorter2_result(inner_vs_outdir, keep1_list_file, keep2_list_file, discard_list_file, manual_check_list_file)
-        
-        keep2_fasta = os.path.join(inner_vs_outdir, 'keep2.fasta')
-        manual_check_fasta = os.path.join(inner_vs_outdir, 'manual_check.fasta')
-        scripts.module.get_keep2_mc_seq(inner_vs_outdir, keep2_list_file, manual_check_list_file, keep2_fasta, manual_check_fasta)
-        
-        if os.path.exists(keep2_fasta) and os.path.getsize(keep2_fasta) != 0:
-            os.system(f"conda run -p {os.path.join(args['conda_env_dir'], 'ViWrap-VIBRANT')} python {os.path.join(args['root_dir'],'scripts/run_VIBRANT.py')} {keep2_fasta} {inner_vs_outdir} {args['threads']} {args['virome']} {args['input_length_limit']} {args['db_dir']} >/dev/null 2>&1")
-            keep2_vb_result = os.path.join(inner_vs_outdir, 'VIBRANT_keep2/VIBRANT_phages_keep2/keep2.phages_combined.fna') 
-            keep2_list_vb_passed_file = os.path.join(inner_vs_outdir, 'keep2_list_vb_passed.txt')
-            scripts.module.get_keep2_vb_passed_list(inner_vs_outdir, keep2_vb_result, keep2_list_vb_passed_file)
-            os.system(f"rm -r {os.path.join(inner_vs_outdir, 'VIBRANT_keep2')}")
-        if os.path.exists(manual_check_fasta) and os.path.getsize(manual_check_fasta) != 0:
-            os.system(f"conda run -p {os.path.join(args['conda_env_dir'], 'ViWrap-VIBRANT')} python {os.path.join(args['root_dir'],'scripts/run_VIBRANT.py')} {manual_check_fasta} {inner_vs_outdir} {args['threads']} {args['virome']} {args['input_length_limit']} {args['db_dir']} >/dev/null 2>&1")
-            manual_check_vb_result = os.path.join(inner_vs_outdir, 'VIBRANT_manual_check/VIBRANT_phages_manual_check/manual_check.phages_combined.fna') 
-            manual_check_list_vb_passed_file = os.path.join(inner_vs_outdir, 'manual_check_list_vb_passed.txt')
-            scripts.module.get_manual_check_vb_passed_list(inner_vs_outdir, manual_check_vb_result, manual_check_list_vb_passed_file)
-            os.system(f"rm -r {os.path.join(inner_vs_outdir, 'VIBRANT_manual_check')}")            
-
-        keep2_list_vb_passed_file = os.path.join(inner_vs_outdir, 'keep2_list_vb_passed.txt')
-        manual_check_list_vb_passed_file = os.path.join(inner_vs_outdir, 'manual_check_list_vb_passed.txt')
-        final_vs2_virus_fasta_file = os.path.join(inner_vs_outdir, 'final_vs2_virus.fasta')
-        scripts.module.get_final_vs2_virus(inner_vs_outdir, keep1_list_file, keep2_list_vb_passed_file, manual_check_list_vb_passed_file, final_vs2_virus_fasta_file)
-        
-        time_current = f"[{str(datetime.now().replace(microsecond=0))}]"
-        logger.info(f"{time_current} | Run VIBRANT-VirSorter2-DVF method. Run VIBRANT to check \"keep2\" and \"manual_check\" groups and get the final VirSorter2 virus sequences. Finished")  
-       
-        ## Thirdly, run DVF
-        os.system(f"conda run -p {os.path.join(args['conda_env_dir'], 'ViWrap-DVF')} python {os.path.join(args['root_dir'],'scripts/run_DVF.py')} {args['input_metagenome']} {inner_dvf_outdir} {args['input_length_limit']} {args['DVF_db']} >/dev/null 2>&1")
-        final_dvf_virus_fasta_file = os.path.join(inner_dvf_outdir, 'final_dvf_virus.fasta')
-        scripts.module.get_dvf_result_seq(args, inner_dvf_outdir, final_dvf_virus_fasta_file)
-        
-        time_current = f"[{str(datetime.now().replace(microsecond=0))}]"
-        logger.info(f"{time_current} | Run VIBRANT-VirSorter2-DVF method. Run DeepVirFinder to identify viruses from input metagenome. Finished")   
-        
-        ## Fourly, get the overlapped result
-        overlap_outdir = os.path.join(args['vb_vs_dvf_outdir'],f"Overlap_{Path(args['input_metagenome']).stem}")
-        final_vb_virus_fasta_file = os.path.join(inner_vb_outdir, f"VIBRANT_phages_{Path(args['input_metagenome']).stem}", f"{Path(args['input_metagenome']).stem}.phages_combined.fna")
-        final_vs2_virus_fasta_file = os.path.join(inner_vs_outdir, 'final_vs2_virus.fasta')
-        final_dvf_virus_fasta_file = os.path.join(inner_dvf_outdir, 'final_dvf_virus.fasta')
-        final_vb_virus_annotation_file = os.path.join(inner_vb_outdir, f"VIBRANT_results_{Path(args['input_metagenome']).stem}", f"VIBRANT_annotations_{Path(args['input_metagenome']).stem}.tsv")
-        scripts.module.get_overlapped_viral_scaffolds(final_vb_virus_fasta_file, final_vs2_virus_fasta_file, final_dvf_virus_fasta_file, final_vb_virus_annotation_file, overlap_outdir)
-        
-    elif args['identify_method'] == 'vb-vs':
-        ## Set output folders
-        inner_vb_outdir = os.path.join(args['vb_vs_outdir'],f"VIBRANT_{Path(args['input_metagenome']).stem}")
-        inner_vs_outdir = os.path.join(args['vb_vs_outdir'],f"VirSorter_{Path(args['input_metagenome']).stem}")
-        
-        ## Firstly, run VIBRANT 
-        time_current = f"[{str(datetime.now().replace(microsecond=0))}]"
-        logger.info(f"{time_current} | Run VIBRANT-VirSorter2 method. Run VIBRANT to identify and annotate virus from input metagenome. In processing...")
-        os.system(f"conda run -p {os.path.join(args['conda_env_dir'], 'ViWrap-VIBRANT')} python {os.path.join(args['root_dir'],'scripts/run_VIBRANT.py')} {args['input_metagenome']} {args['vb_vs_outdir']} {args['threads']} {args['virome']} {args['input_length_limit']} {args['db_dir']} >/dev/null 2>&1")
-        scripts.module.parse_vibrant_lytic_and_lysogenic_info(inner_vb_outdir, Path(args['input_metagenome']).stem)
-        time_current = f"[{str(datetime.now().replace(microsecond=0))}]"
-        logger.info(f"{time_current} | Run VIBRANT-VirSorter2 method. Run VIBRANT to identify and annotate viruses from input metagenome. Finished") 
-        
-        ## Secondly, run VirSorter2
-        time_current = f"[{str(datetime.now().replace(microsecond=0))}]"
-        logger.info(f"{time_current} | Run VIBRANT-VirSorter2 method. Run VirSorter2 to identify viruses from input metagenome. Also plus CheckV to QC and trim, and KEGG, Pfam, and VOG HMMs to annotate viruses. In processing...")    
+def step_identify_virus_by_VirSorter2(args, threads):
+    method_name = identify_method2name[args['identify_method']]
+    os.makedirs(args['identify_outdir'], exist_ok = True)
     
-        os.system(f"conda run -p {os.path.join(args['conda_env_dir'], 'ViWrap-vs2')} python {os.path.join(args['root_dir'],'scripts/run_VirSorter2_1st.py')} {args['input_metagenome']} {inner_vs_outdir} {args['threads']} {args['input_length_limit']} >/dev/null 2>&1")
+    time_current = f"[{str(datetime.now().replace(microsecond=0))}]"
+    logger.info(f"{time_current} | Run {method_name} method. Run VirSorter2 to identify viruses from input metagenome. Also plus CheckV to QC and trim, and KEGG, Pfam, and VOG HMMs to annotate viruses. In processing...")    
     
-        time_current = f"[{str(datetime.now().replace(microsecond=0))}]"
-        logger.info(f"{time_current} | Run VIBRANT-VirSorter2 method. Run VirSorter2 the 1st time to identify viruses from input metagenome. Finished")    
-
-        os.system(f"conda run -p {os.path.join(args['conda_env_dir'], 'ViWrap-CheckV')} python {os.path.join(args['root_dir'],'scripts/run_VirSorter2_CheckV_1st.py')} {inner_vs_outdir} {args['threads']} {args['CheckV_db']} >/dev/null 2>&1")
-        
-        time_current = f"[{str(datetime.now().replace(microsecond=0))}]"
-        logger.info(f"{time_current} | Run VIBRANT-VirSorter2 method. Run CheckV the 1st time to QC and trim viruses identified from VirSorter2 1st run. Finished")   
-        
-        os.system(f"conda run -p {os.path.join(args['conda_env_dir'], 'ViWrap-vs2')} python {os.path.join(args['root_dir'],'scripts/run_VirSorter2_2nd.py')} {inner_vs_outdir} {args['threads']} {args['input_length_limit']} >/dev/null 2>&1")
+    conda_launcher.run(os.path.join(args['conda_env_dir'], 'ViWrap-vs2'), f"python {os.path.join(args['root_dir'],'scripts/run_VirSorter2_1st.py')} {args['input_metagenome']} {args['inner_vs_outdir']} {threads} {args['input_length_limit']} >/dev/null")
     
-        time_current = f"[{str(datetime.now().replace(microsecond=0))}]"
-        logger.info(f"{time_current} | Run VIBRANT-VirSorter2 method. Run VirSorter2 the 2nd time for CheckV-trimmed sequences. Finished")    
-
-        os.system(f"conda run -p {os.path.join(args['conda_env_dir'], 'ViWrap-CheckV')} python {os.path.join(args['root_dir'],'scripts/run_VirSorter2_CheckV_2nd.py')} {inner_vs_outdir} {args['threads']} {args['CheckV_db']} >/dev/null 2>&1")
-        
-        time_current = f"[{str(datetime.now().replace(microsecond=0))}]"
-        logger.info(f"{time_current} | Run VIBRANT-VirSorter2 method. Run CheckV the 2nd time to get viral and host gene counts. Finished")
+    time_current = f"[{str(datetime.now().replace(microsecond=0))}]"
+    logger.info(f"{time_current} | Run {method_name} method. Run VirSorter2 the 1st time to identify viruses from input metagenome. Finished")    
+    
+    conda_launcher.run(os.path.join(args['conda_env_dir'], 'ViWrap-CheckV'), f"python {os.path.join(args['root_dir'],'scripts/run_VirSorter2_CheckV_1st.py')} {args['inner_vs_outdir']} {threads} {args['CheckV_db']} >/dev/null")
+    
+    time_current = f"[{str(datetime.now().replace(microsecond=0))}]"
+    logger.info(f"{time_current} | Run {method_name} method. Run CheckV the 1st time to QC and trim viruses identified from VirSorter2 1st run. Finished")   
+    
+    conda_launcher.run(os.path.join(args['conda_env_dir'], 'ViWrap-vs2'), f"python {os.path.join(args['root_dir'],'scripts/run_VirSorter2_2nd.py')} {args['inner_vs_outdir']} {threads} {args['input_length_limit']} >/dev/null")
+    
+    time_current = f"[{str(datetime.now().replace(microsecond=0))}]"
+    logger.info(f"{time_current} | Run {method_name} method. Run VirSorter2 the 2nd time for CheckV-trimmed sequences. Finished")    
+    
+    conda_launcher.run(os.path.join(args['conda_env_dir'], 'ViWrap-CheckV'), f"python {os.path.join(args['root_dir'],'scripts/run_VirSorter2_CheckV_2nd.py')} {args['inner_vs_outdir']} {threads} {args['CheckV_db']} >/dev/null")
+    
+    time_current = f"[{str(datetime.now().replace(microsecond=0))}]"
+    logger.info(f"{time_current} | Run {method_name} method. Run CheckV the 2nd time to get viral and host gene counts. Finished")
+    
+    keep1_list_file = os.path.join(args['inner_vs_outdir'], 'keep1_list.txt')
+    keep2_list_file = os.path.join(args['inner_vs_outdir'], 'keep2_list.txt')
+    discard_list_file = os.path.join(args['inner_vs_outdir'], 'discard_list.txt')
+    manual_check_list_file = os.path.join(args['inner_vs_outdir'], 'manual_check_list.txt')
+    scripts.module.screen_virsorter2_result(args['inner_vs_outdir'], keep1_list_file, keep2_list_file, discard_list_file, manual_check_list_file)
+    
+    keep2_fasta = os.path.join(args['inner_vs_outdir'], 'keep2.fasta')
+    manual_check_fasta = os.path.join(args['inner_vs_outdir'], 'manual_check.fasta')
+    scripts.module.get_keep2_mc_seq(args['inner_vs_outdir'], keep2_list_file, manual_check_list_file, keep2_fasta, manual_check_fasta)
+    
+    if os.path.exists(keep2_fasta) and os.path.getsize(keep2_fasta) != 0:
+        conda_launcher.run(os.path.join(args['conda_env_dir'], 'ViWrap-VIBRANT'), f"python {os.path.join(args['root_dir'],'scripts/run_VIBRANT.py')} {keep2_fasta} {args['inner_vs_outdir']} {threads} {args['virome']} {args['input_length_limit']} {args['db_dir']} >/dev/null")
+        keep2_vb_result = os.path.join(args['inner_vs_outdir'], 'VIBRANT_keep2/VIBRANT_phages_keep2/keep2.phages_combined.fna') 
+        keep2_list_vb_passed_file = os.path.join(args['inner_vs_outdir'], 'keep2_list_vb_passed.txt')
+        scripts.module.get_keep2_vb_passed_list(args['inner_vs_outdir'], keep2_vb_result, keep2_list_vb_passed_file)
+        shutil.rmtree(os.path.join(args['inner_vs_outdir'], 'VIBRANT_keep2'))
+    if os.path.exists(manual_check_fasta) and os.path.getsize(manual_check_fasta) != 0:
+        conda_launcher.run(os.path.join(args['conda_env_dir'], 'ViWrap-VIBRANT'), f"python {os.path.join(args['root_dir'],'scripts/run_VIBRANT.py')} {manual_check_fasta} {args['inner_vs_outdir']} {threads} {args['virome']} {args['input_length_limit']} {args['db_dir']} >/dev/null")
+        manual_check_vb_result = os.path.join(args['inner_vs_outdir'], 'VIBRANT_manual_check/VIBRANT_phages_manual_check/manual_check.phages_combined.fna') 
+        manual_check_list_vb_passed_file = os.path.join(args['inner_vs_outdir'], 'manual_check_list_vb_passed.txt')
+        scripts.module.get_manual_check_vb_passed_list(args['inner_vs_outdir'], manual_check_vb_result, manual_check_list_vb_passed_file)
+        shutil.rmtree(os.path.join(args['inner_vs_outdir'], 'VIBRANT_manual_check'))    
+    
+    keep2_list_vb_passed_file = os.path.join(args['inner_vs_outdir'], 'keep2_list_vb_passed.txt')
+    manual_check_list_vb_passed_file = os.path.join(args['inner_vs_outdir'], 'manual_check_list_vb_passed.txt')
+    final_vs2_virus_fasta_file = os.path.join(args['inner_vs_outdir'], 'final_vs2_virus.fasta')
+    scripts.module.get_final_vs2_virus(args['inner_vs_outdir'], keep1_list_file, keep2_list_vb_passed_file, manual_check_list_vb_passed_file, final_vs2_virus_fasta_file)
+    
+    time_current = f"[{str(datetime.now().replace(microsecond=0))}]"
+    logger.info(f"{time_current} | Run {method_name} method. Run VIBRANT to check \"keep2\" and \"manual_check\" groups and get the final VirSorter2 virus sequences. Finished")
 
-        keep1_list_file = os.path.join(inner_vs_outdir, 'keep1_list.txt')
-        keep2_list_file = os.path.join(inner_vs_outdir, 'keep2_list.txt')
-        discard_list_file = os.path.join(inner_vs_outdir, 'discard_list.txt')
-        manual_check_list_file = os.path.join(inner_vs_outdir, 'manual_check_list.txt')
-        scripts.module.screen_virsorter2_result(inner_vs_outdir, keep1_list_file, keep2_list_file, discard_list_file, manual_check_list_file)
-        
-        keep2_fasta = os.path.join(inner_vs_outdir, 'keep2.fasta')
-        manual_check_fasta = os.path.join(inner_vs_outdir, 'manual_check.fasta')
-        scripts.module.get_keep2_mc_seq(inner_vs_outdir, keep2_list_file, manual_check_list_file, keep2_fasta, manual_check_fasta)
-        
-        if os.path.exists(keep2_fasta) and os.path.getsize(keep2_fasta) != 0:
-            os.system(f"conda run -p {os.path.join(args['conda_env_dir'], 'ViWrap-VIBRANT')} python {os.path.join(args['root_dir'],'scripts/run_VIBRANT.py')} {keep2_fasta} {inner_vs_outdir} {args['threads']} {args['virome']} {args['input_length_limit']} {args['db_dir']} >/dev/null 2>&1")
-            keep2_vb_result = os.path.join(inner_vs_outdir, 'VIBRANT_keep2/VIBRANT_phages_keep2/keep2.phages_combined.fna') 
-            keep2_list_vb_passed_file = os.path.join(inner_vs_outdir, 'keep2_list_vb_passed.txt')
-            scripts.module.get_keep2_vb_passed_list(inner_vs_outdir, keep2_vb_result, keep2_list_vb_passed_file)
-            os.system(f"rm -r {os.path.join(inner_vs_outdir, 'VIBRANT_keep2')}")
-        if os.path.exists(manual_check_fasta) and os.path.getsize(manual_check_fasta) != 0:
-            os.system(f"conda run -p {os.path.join(args['conda_env_dir'], 'ViWrap-VIBRANT')} python {os.path.join(args['root_dir'],'scripts/run_VIBRANT.py')} {manual_check_fasta} {inner_vs_outdir} {args['threads']} {args['virome']} {args['input_length_limit']} {args['db_dir']} >/dev/null 2>&1")
-            manual_check_vb_result = os.path.join(inner_vs_outdir, 'VIBRANT_manual_check/VIBRANT_phages_manual_check/manual_check.phages_combined.fna') 
-            manual_check_list_vb_passed_file = os.path.join(inner_vs_outdir, 'manual_check_list_vb_passed.txt')
-            scripts.module.get_manual_check_vb_passed_list(inner_vs_outdir, manual_check_vb_result, manual_check_list_vb_passed_file)
-            os.system(f"rm -r {os.path.join(inner_vs_outdir, 'VIBRANT_manual_check')}")            
-
-        keep2_list_vb_passed_file = os.path.join(inner_vs_outdir, 'keep2_list_vb_passed.txt')
-        manual_check_list_vb_passed_file = os.path.join(inner_vs_outdir, 'manual_check_list_vb_passed.txt')
-        final_vs2_virus_fasta_file = os.path.join(inner_vs_outdir, 'final_vs2_virus.fasta')
-        scripts.module.get_final_vs2_virus(inner_vs_outdir, keep1_list_file, keep2_list_vb_passed_file, manual_check_list_vb_passed_file, final_vs2_virus_fasta_file)
-        
-        time_current = f"[{str(datetime.now().replace(microsecond=0))}]"
-        logger.info(f"{time_current} | Run VIBRANT-VirSorter2 method. Run VIBRANT to check \"keep2\" and \"manual_check\" groups and get the final VirSorter2 virus sequences. Finished")  
-                  
-        ## Thirdly, get the overlapped result
-        overlap_outdir = os.path.join(args['vb_vs_outdir'],f"Overlap_{Path(args['input_metagenome']).stem}")
-        final_vb_virus_fasta_file = os.path.join(inner_vb_outdir, f"VIBRANT_phages_{Path(args['input_metagenome']).stem}", f"{Path(args['input_metagenome']).stem}.phages_combined.fna")
-        final_vs2_virus_fasta_file = os.path.join(inner_vs_outdir, 'final_vs2_virus.fasta')
-        final_vb_virus_annotation_file = os.path.join(inner_vb_outdir, f"VIBRANT_results_{Path(args['input_metagenome']).stem}", f"VIBRANT_annotations_{Path(args['input_metagenome']).stem}.tsv")
-        scripts.module.get_overlapped_viral_scaffolds(final_vb_virus_fasta_file, final_vs2_virus_fasta_file, '', final_vb_virus_annotation_file, overlap_outdir)
+def step_identify_virus_by_DVF(args):
+    # DeepVirFinder has no threads option
+    method_name = identify_method2name[args['identify_method']]
+    os.makedirs(args['identify_outdir'], exist_ok = True)
     
-    else:
-        sys.exit(f"Please make sure your input for --identify_method option is one of these: \"vb-vs\", \"vb-vs-dvf\", \"vb\", \"vs\", and \"dvf\"; you can also omit this in the command line, the default is \"vb\"")
+    conda_launcher.run(os.path.join(args['conda_env_dir'], 'ViWrap-DVF'), f"python {os.path.join(args['root_dir'],'scripts/run_DVF.py')} {args['input_metagenome']} {args['inner_dvf_outdir']} {args['input_length_limit']} {args['DVF_db']} >/dev/null")
+    final_dvf_virus_fasta_file = os.path.join(args['inner_dvf_outdir'], 'final_dvf_virus.fasta')
+    scripts.module.get_dvf_result_seq(args, args['inner_dvf_outdir'], final_dvf_virus_fasta_file)
+    
+    time_current = f"[{str(datetime.now().replace(microsecond=0))}]"
+    logger.info(f"{time_current} | Run {method_name} method. Run DeepVirFinder to identify viruses from input metagenome. Finished")   
 
+def step_get_overlapped_viral_scaffolds(args):
+    # Get the overlapped result once all branches are finished
+    final_vb_virus_fasta_file = os.path.join(args['inner_vb_outdir'], f"VIBRANT_phages_{Path(args['input_metagenome']).stem}", f"{Path(args['input_metagenome']).stem}.phages_combined.fna")
+    final_vs2_virus_fasta_file = os.path.join(args['inner_vs_outdir'], 'final_vs2_virus.fasta')
+    final_dvf_virus_fasta_file = ''
+    if args['inner_dvf_outdir']:
+        final_dvf_virus_fasta_file = os.path.join(args['inner_dvf_outdir'], 'final_dvf_virus.fasta')
+    final_vb_virus_annotation_file = os.path.join(args['inner_vb_outdir'], f"VIBRANT_results_{Path(args['input_metagenome']).stem}", f"VIBRANT_annotations_{Path(args['input_metagenome']).stem}.tsv")
+    scripts.module.get_overlapped_viral_scaffolds(final_vb_virus_fasta_file, final_vs2_virus_fasta_file, final_dvf_virus_fasta_file, final_vb_virus_annotation_file, args['overlap_outdir'])
+
+def step_map_reads(args):
+    viral_scaffold = args['viral_scaffold']
 
     # Step 3 Metagenomic mapping
     time_current = f"[{str(datetime.now().replace(microsecond=0))}]"
     logger.info(f"{time_current} | Map reads to metagenome. In processing...")
     
-    viral_scaffold = ''
-    if args['identify_method'] == 'vb':
-        viral_scaffold = os.path.join(args['vibrant_outdir'],f"VIBRANT_phages_{Path(args['input_metagenome']).stem}",f"{Path(args['input_metagenome']).stem}.phages_combined.fna")
-    elif args['identify_method'] == 'vs':
-        viral_scaffold = os.path.join(args['virsorter_outdir'], 'final_vs2_virus.fasta')
-    elif args['identify_method'] == 'dvf':
-        viral_scaffold = os.path.join(args['dvf_outdir'], 'final_dvf_virus.fasta')  
-    elif args['identify_method'] == 'vb-vs-dvf':
-        viral_scaffold = os.path.join(args['vb_vs_dvf_outdir'], f"Overlap_{Path(args['input_metagenome']).stem}", 'final_overlapped_virus.fasta')   
-    elif args['identify_method'] == 'vb-vs':        
-        viral_scaffold = os.path.join(args['vb_vs_outdir'], f"Overlap_{Path(args['input_metagenome']).stem}", 'final_overlapped_virus.fasta')   
-    os.system(f"conda run -p {os.path.join(args['conda_env_dir'], 'ViWrap-Mapping')} python {os.path.join(args['root_dir'],'scripts/mapping_metaG_reads.py')} {viral_scaffold} {args['input_metagenome']} {args['input_reads']} {args['mapping_outdir']} {args['input_reads_type']} {args['reads_mapping_identity_cutoff']} {args['threads']} >/dev/null 2>&1")
+    conda_launcher.run(os.path.join(args['conda_env_dir'], 'ViWrap-Mapping'), f"python {os.path.join(args['root_dir'],'scripts/mapping_metaG_reads.py')} {viral_scaffold} {args['input_metagenome']} {args['input_reads']} {args['mapping_outdir']} {args['input_reads_type']} {args['reads_mapping_identity_cutoff']} {args['threads']} >/dev/null")
 
     time_current = f"[{str(datetime.now().replace(microsecond=0))}]"
     logger.info(f"{time_current} | Map reads to metagenome. Finished")
    
+def step_run_vRhyme(args):
+    viral_scaffold = args['viral_scaffold']
 
     # Step 4 Run vRhyme
     time_current = f"[{str(datetime.now().replace(microsecond=0))}]"
     logger.info(f"{time_current} | Run vRhyme to bin viral scaffolds. In processing...")        
     
     ## Step 4.1 Run vRhyme to get the original vRhyme_best_bins    
-    os.system(f"conda run -p {os.path.join(args['conda_env_dir'], 'ViWrap-vRhyme')} python {os.path.join(args['root_dir'],'scripts/run_vRhyme.py')} {viral_scaffold} {args['vrhyme_outdir']} {args['mapping_outdir']} {args['threads']} >/dev/null 2>&1")
-    vRhyme_best_bin_dir = os.path.join(args['vrhyme_outdir'], 'vRhyme_best_bins_fasta')
-       
+    conda_launcher.run(os.path.join(args['conda_env_dir'], 'ViWrap-vRhyme'), f"python {os.path.join(args['root_dir'],'scripts/run_vRhyme.py')} {viral_scaffold} {args['vrhyme_outdir']} {args['mapping_outdir']} {args['threads']} >/dev/null")
+
+def step_get_vRhyme_best_bin_lytic_and_lysogenic_info(args):
+    vRhyme_best_bin_dir = args['vRhyme_best_bin_dir']
+    scf2lytic_or_lyso_summary = args['scf2lytic_or_lyso_summary']
+
     ## Step 4.2 Get the lytic and lysogenic information for vRhyme_best_bins 
-    scf2lytic_or_lyso_summary = ''
-    if args['identify_method'] == 'vb':
-        scf2lytic_or_lyso_summary = os.path.join(args['vibrant_outdir'], 'scf2lytic_or_lyso.summary.txt')
-    elif args['identify_method'] == 'vb-vs-dvf':
-        scf2lytic_or_lyso_summary = os.path.join(args['vb_vs_dvf_outdir'],f"VIBRANT_{Path(args['input_metagenome']).stem}", 'scf2lytic_or_lyso.summary.txt')
-    elif args['identify_method'] == 'vb-vs':        
-        scf2lytic_or_lyso_summary = os.path.join(args['vb_vs_outdir'],f"VIBRANT_{Path(args['input_metagenome']).stem}", 'scf2lytic_or_lyso.summary.txt')
     scripts.module.get_vRhyme_best_bin_lytic_and_lysogenic_info(vRhyme_best_bin_dir, args['vrhyme_outdir'], scf2lytic_or_lyso_summary)
-    vRhyme_best_bin_lytic_and_lysogenic_info = os.path.join(args['vrhyme_outdir'], 'vRhyme_best_bin_lytic_and_lysogenic_info.txt')
-        
+
+def step_get_vRhyme_best_bin_scaffold_complete_info(args):
+    vRhyme_best_bin_dir = args['vRhyme_best_bin_dir']
+
     ## Step 4.3 Get the scaffold complete information for vRhyme_best_bins
     vRhyme_best_bin_CheckV_result = os.path.join(args['vrhyme_outdir'], 'vRhyme_best_bins_fasta_CheckV_result')
-    os.system(f"conda run -p {os.path.join(args['conda_env_dir'], 'ViWrap-CheckV')} python {os.path.join(args['root_dir'],'scripts/run_CheckV.py')} {vRhyme_best_bin_dir} {vRhyme_best_bin_CheckV_result} {args['threads']} {args['CheckV_db']} >/dev/null 2>&1")
+    conda_launcher.run(os.path.join(args['conda_env_dir'], 'ViWrap-CheckV'), f"python {os.path.join(args['root_dir'],'scripts/run_CheckV.py')} {vRhyme_best_bin_dir} {vRhyme_best_bin_CheckV_result} {args['threads']} {args['CheckV_db']} >/dev/null")
     CheckV_quality_summary = os.path.join(vRhyme_best_bin_CheckV_result, 'CheckV_quality_summary.txt')
     scripts.module.parse_checkv_result(vRhyme_best_bin_CheckV_result, CheckV_quality_summary)   
-    vRhyme_best_bin_scaffold_complete_info = os.path.join(args['vrhyme_outdir'], 'vRhyme_best_bin_scaffold_complete_info.txt')  
+    vRhyme_best_bin_scaffold_complete_info = args['vRhyme_best_bin_scaffold_complete_info']
     scripts.module.get_vRhyme_best_bin_scaffold_complete_info(CheckV_quality_summary, vRhyme_best_bin_scaffold_complete_info)
-    os.system(f"rm -rf {vRhyme_best_bin_CheckV_result}")
-    
+    shutil.rmtree(vRhyme_best_bin_CheckV_result, ignore_errors = True)
+
+def step_make_vRhyme_best_bins_fasta_modified(args):
+    vRhyme_best_bin_dir = args['vRhyme_best_bin_dir']
+    vRhyme_best_bin_lytic_and_lysogenic_info = args['vRhyme_best_bin_lytic_and_lysogenic_info']
+    vRhyme_best_bin_scaffold_complete_info = args['vRhyme_best_bin_scaffold_complete_info']
+
     ## Step 4.4 Get modified vRhyme_best_bins acccording to both lytic and lysogenic and scaffold complete information
-    vRhyme_best_bin_dir_modified = os.path.join(args['vrhyme_outdir'], 'vRhyme_best_bins_fasta_modified')
+    vRhyme_best_bin_dir_modified = args['vRhyme_best_bin_dir_modified']
     scripts.module.make_vRhyme_best_bins_fasta_modified(vRhyme_best_bin_dir, vRhyme_best_bin_dir_modified, vRhyme_best_bin_lytic_and_lysogenic_info, vRhyme_best_bin_scaffold_complete_info)    
 
     time_current = f"[{str(datetime.now().replace(microsecond=0))}]"
     logger.info(f"{time_current} | Run vRhyme to bin viral scaffolds. Finished") 
     
     
+def step_make_unbinned_viral_gn(args):
+    viral_scaffold = args['viral_scaffold']
+    vRhyme_best_bin_dir_modified = args['vRhyme_best_bin_dir_modified']
+
     # Step 5 Run vContact2
     time_current = f"[{str(datetime.now().replace(microsecond=0))}]"
     logger.info(f"{time_current} | Run vContact2 to cluster viral genomes. In processing...")    
     ## Step 5.1 Make unbinned viral gn folder
-    vRhyme_unbinned_viral_gn_dir = os.path.join(args['vrhyme_outdir'], 'vRhyme_unbinned_viral_gn_fasta')
+    vRhyme_unbinned_viral_gn_dir = args['vRhyme_unbinned_viral_gn_dir']
     scripts.module.make_unbinned_viral_gn(viral_scaffold, vRhyme_best_bin_dir_modified, vRhyme_unbinned_viral_gn_dir)
+    id_registry.build_id_registry_from_gn_dirs(args['id_registry_dir'], [vRhyme_best_bin_dir_modified, vRhyme_unbinned_viral_gn_dir])
+
+def step_run_vContact2(args):
+    vRhyme_best_bin_dir_modified = args['vRhyme_best_bin_dir_modified']
+    vRhyme_unbinned_viral_gn_dir = args['vRhyme_unbinned_viral_gn_dir']
 
     ## Step 5.2 Prepare pro2viral_gn map file
     pro2viral_gn_map = os.path.join(args['vrhyme_outdir'], 'pro2viral_gn_map.csv')
-    scripts.module.get_pro2viral_gn_map(vRhyme_best_bin_dir_modified, vRhyme_unbinned_viral_gn_dir, pro2viral_gn_map)
+    scripts.module.get_pro2viral_gn_map(args['id_registry_dir'], pro2viral_gn_map)
 
     ## Step 5.3 Make all vRhyme viral gn combined faa file
-    all_vRhyme_faa = os.path.join(args['vrhyme_outdir'], 'all_vRhyme_faa.faa')
+    all_vRhyme_faa = args['all_vRhyme_faa']
     scripts.module.combine_all_vRhyme_faa(vRhyme_best_bin_dir_modified, vRhyme_unbinned_viral_gn_dir, all_vRhyme_faa)
 
     ## Step 5.4 Run vContact2
     cluster_one_jar = os.path.join(args['conda_env_dir'], 'ViWrap-vContact2/bin/cluster_one-1.0.jar')
-    os.system(f"conda run -p {os.path.join(args['conda_env_dir'], 'ViWrap-vContact2')} python {os.path.join(args['root_dir'],'scripts/run_vContact2.py')} {all_vRhyme_faa} {pro2viral_gn_map} {args['Tax_classification_db']} {cluster_one_jar} {args['vcontact2_outdir']} {args['threads']} >/dev/null 2>&1")
+    conda_launcher.run(os.path.join(args['conda_env_dir'], 'ViWrap-vContact2'), f"python {os.path.join(args['root_dir'],'scripts/run_vContact2.py')} {all_vRhyme_faa} {pro2viral_gn_map} {args['Tax_classification_db']} {cluster_one_jar} {args['vcontact2_outdir']} {args['threads']} >/dev/null")
 
 
     ## Step 5.5 Write down genus cluster info
-    genome_by_genome_file = os.path.join(args['vcontact2_outdir'], 'genome_by_genome_overview.csv')
-    genus_cluster_info = os.path.join(args['out_dir'], 'Genus_cluster_info.txt')
+    genome_by_genome_file = args['genome_by_genome_file']
+    genus_cluster_info = args['genus_cluster_info']
     ref_pro2viral_gn_map = os.path.join(args['Tax_classification_db'], 'IMGVR_high-quality_phage_vOTU_representatives_pro2viral_gn_map.csv')
     scripts.module.get_genus_cluster_info(genome_by_genome_file, genus_cluster_info, ref_pro2viral_gn_map) 
  
@@ -459,16 +402,22 @@ def main(args):
     logger.info(f"{time_current} | Run vContact2 to cluster viral genomes. Finished")   
     
 
+def step_link_viral_gn(args):
+    vRhyme_best_bin_dir_modified = args['vRhyme_best_bin_dir_modified']
+    vRhyme_unbinned_viral_gn_dir = args['vRhyme_unbinned_viral_gn_dir']
+
     # Step 6 Run CheckV
     time_current = f"[{str(datetime.now().replace(microsecond=0))}]"
     logger.info(f"{time_current} | Run CheckV to evaluate virus genome quality. In processing...")       
-    ## Step 6.1 Link multiple scaffolds within a bin
+    ## Step 6.1 Link multiple scaffolds within a bin, and write down all the linked genomes into one file (for iPHoP) in the same pass
     os.mkdir(args['nlinked_viral_gn_dir'])
-    scripts.module.Nlinker(vRhyme_best_bin_dir_modified, args['nlinked_viral_gn_dir'], 'fasta', 1000)  
-    scripts.module.Nlinker(vRhyme_unbinned_viral_gn_dir, args['nlinked_viral_gn_dir'], 'fasta', 1000) 
+    all_vRhyme_fasta_Nlinked = args['all_vRhyme_fasta_Nlinked']
+    scripts.module.Nlinker(vRhyme_best_bin_dir_modified, args['nlinked_viral_gn_dir'], 'fasta', 1000, all_vRhyme_fasta_Nlinked, args['threads'])  
+    scripts.module.Nlinker(vRhyme_unbinned_viral_gn_dir, args['nlinked_viral_gn_dir'], 'fasta', 1000, all_vRhyme_fasta_Nlinked, args['threads']) 
 
+def step_run_CheckV(args):
     ## Step 6.2 Run CheckV in parallel and parse the result
-    os.system(f"conda run -p {os.path.join(args['conda_env_dir'], 'ViWrap-CheckV')} python {os.path.join(args['root_dir'],'scripts/run_CheckV.py')} {args['nlinked_viral_gn_dir']} {args['checkv_outdir']} {args['threads']} {args['CheckV_db']} >/dev/null 2>&1")
+    conda_launcher.run(os.path.join(args['conda_env_dir'], 'ViWrap-CheckV'), f"python {os.path.join(args['root_dir'],'scripts/run_CheckV.py')} {args['nlinked_viral_gn_dir']} {args['checkv_outdir']} {args['threads']} {args['CheckV_db']} >/dev/null")
     CheckV_quality_summary = os.path.join(args['checkv_outdir'], 'CheckV_quality_summary.txt')
     scripts.module.parse_checkv_result(args['checkv_outdir'], CheckV_quality_summary)    
 
@@ -476,6 +425,11 @@ def main(args):
     logger.info(f"{time_current} | Run CheckV to evaluate virus genome quality. Finished")
     
     
+def step_run_dRep(args):
+    vRhyme_best_bin_dir_modified = args['vRhyme_best_bin_dir_modified']
+    vRhyme_unbinned_viral_gn_dir = args['vRhyme_unbinned_viral_gn_dir']
+    genus_cluster_info = args['genus_cluster_info']
+
     # Step 7 Run dRep to get viral species
     time_current = f"[{str(datetime.now().replace(microsecond=0))}]"
     logger.info(f"{time_current} | Run dRep to cluster virus species. In processing...") 
@@ -485,68 +439,100 @@ def main(args):
 
     ## Step 7.2 Run dRep
     viral_genus_genome_list_dir = os.path.join(args['drep_outdir'], 'viral_genus_genome_list')
-    os.system(f"conda run -p {os.path.join(args['conda_env_dir'], 'ViWrap-dRep')} python {os.path.join(args['root_dir'],'scripts/run_dRep.py')} {args['drep_outdir']} {viral_genus_genome_list_dir} {args['threads']} 2000 >/dev/null 2>&1")
-    species_cluster_info = os.path.join(args['out_dir'], 'Species_cluster_info.txt')
+    conda_launcher.run(os.path.join(args['conda_env_dir'], 'ViWrap-dRep'), f"python {os.path.join(args['root_dir'],'scripts/run_dRep.py')} {args['drep_outdir']} {viral_genus_genome_list_dir} {args['threads']} 2000 >/dev/null")
+    species_cluster_info = args['species_cluster_info']
     scripts.module.parse_dRep(args['out_dir'], args['drep_outdir'], species_cluster_info, genus_cluster_info, viral_genus_genome_list_dir)
     
     time_current = f"[{str(datetime.now().replace(microsecond=0))}]"
     logger.info(f"{time_current} | Run dRep to cluster virus species. Finished") 
     
     
+def step_run_Tax_RefSeq(args):
+    vRhyme_best_bin_dir_modified = args['vRhyme_best_bin_dir_modified']
+    vRhyme_unbinned_viral_gn_dir = args['vRhyme_unbinned_viral_gn_dir']
+
     # Step 8 Taxonomic charaterization
     time_current = f"[{str(datetime.now().replace(microsecond=0))}]"
     logger.info(f"{time_current} | Conduct taxonomic charaterization. In processing...")  
     
     ## Step 8.1 Run diamond to NCBI RefSeq viral protein db 
-    tax_refseq_output = os.path.join(args['out_dir'], 'tax_refseq_output.txt')
-    os.system(f"conda run -p {os.path.join(args['conda_env_dir'], 'ViWrap-Tax')} python {os.path.join(args['root_dir'],'scripts/run_Tax_RefSeq.py')} {args['out_dir']} {vRhyme_best_bin_dir_modified} {vRhyme_unbinned_viral_gn_dir} {args['Tax_classification_db']} {pro2viral_gn_map} {args['threads']} {tax_refseq_output}")
+    tax_refseq_output = args['tax_refseq_output']
+    conda_launcher.run(os.path.join(args['conda_env_dir'], 'ViWrap-Tax'), f"python {os.path.join(args['root_dir'],'scripts/run_Tax_RefSeq.py')} {args['out_dir']} {vRhyme_best_bin_dir_modified} {vRhyme_unbinned_viral_gn_dir} {args['Tax_classification_db']} {args['id_registry_dir']} {args['threads']} {tax_refseq_output}")
+
+def step_run_Tax_VOG(args):
+    vRhyme_best_bin_dir_modified = args['vRhyme_best_bin_dir_modified']
+    vRhyme_unbinned_viral_gn_dir = args['vRhyme_unbinned_viral_gn_dir']
 
     ## Step 8.2 Run hmmsearch to marker VOG HMM db
     vog_marker_table = os.path.join(args['Tax_classification_db'], 'VOG_marker_table.txt')
-    tax_vog_output = os.path.join(args['out_dir'], 'tax_vog_output.txt')
-    os.system(f"conda run -p {os.path.join(args['conda_env_dir'], 'ViWrap-Tax')} python {os.path.join(args['root_dir'],'scripts/run_Tax_VOG.py')} {vog_marker_table} {args['out_dir']} {vRhyme_best_bin_dir_modified} {vRhyme_unbinned_viral_gn_dir} {args['Tax_classification_db']} {pro2viral_gn_map} {args['threads']} {tax_vog_output}")
+    tax_vog_output = args['tax_vog_output']
+    conda_launcher.run(os.path.join(args['conda_env_dir'], 'ViWrap-Tax'), f"python {os.path.join(args['root_dir'],'scripts/run_Tax_VOG.py')} {vog_marker_table} {args['out_dir']} {vRhyme_best_bin_dir_modified} {vRhyme_unbinned_viral_gn_dir} {args['Tax_classification_db']} {args['id_registry_dir']} {args['threads']} {tax_vog_output}")
+
+def step_run_Tax_vContact2(args):
+    genome_by_genome_file = args['genome_by_genome_file']
 
     ## Step 8.3 Get taxonomy information from vContact2 result
-    tax_vcontact2_output = os.path.join(args['out_dir'], 'tax_vcontact2_output.txt')
+    tax_vcontact2_output = args['tax_vcontact2_output']
     IMGVR_db_map = os.path.join(args['Tax_classification_db'], 'IMGVR_high-quality_phage_vOTU_representatives_pro2viral_gn_map.csv')
-    os.system(f"conda run -p {os.path.join(args['conda_env_dir'], 'ViWrap-Tax')} python {os.path.join(args['root_dir'],'scripts/run_Tax_vContact2.py')} {genome_by_genome_file} {IMGVR_db_map} {tax_vcontact2_output}")
+    conda_launcher.run(os.path.join(args['conda_env_dir'], 'ViWrap-Tax'), f"python {os.path.join(args['root_dir'],'scripts/run_Tax_vContact2.py')} {genome_by_genome_file} {IMGVR_db_map} {tax_vcontact2_output}")
+
+def step_combine_Tax(args):
+    genus_cluster_info = args['genus_cluster_info']
+    tax_refseq_output = args['tax_refseq_output']
+    tax_vog_output = args['tax_vog_output']
+    tax_vcontact2_output = args['tax_vcontact2_output']
 
     ## Step 8.4 Integrate all taxonomical results
-    tax_classification_result = os.path.join(args['out_dir'], 'Tax_classification_result.txt')
-    os.system(f"conda run -p {os.path.join(args['conda_env_dir'], 'ViWrap-Tax')} python {os.path.join(args['root_dir'],'scripts/run_Tax_combine.py')} {args['out_dir']} {genus_cluster_info} {tax_classification_result}")
-    os.system(f"rm {tax_refseq_output} {tax_vog_output} {tax_vcontact2_output}")    
+    tax_classification_result = args['tax_classification_result']
+    conda_launcher.run(os.path.join(args['conda_env_dir'], 'ViWrap-Tax'), f"python {os.path.join(args['root_dir'],'scripts/run_Tax_combine.py')} {args['out_dir']} {genus_cluster_info} {tax_classification_result}")
+    for tax_output in [tax_refseq_output, tax_vog_output, tax_vcontact2_output]:
+        os.remove(tax_output)    
     
     time_current = f"[{str(datetime.now().replace(microsecond=0))}]"
     logger.info(f"{time_current} | Conduct taxonomic charaterization. Finished")  
     
         
+def step_run_iPHoP(args):
+    all_vRhyme_fasta_Nlinked = args['all_vRhyme_fasta_Nlinked']
+
     # Step 9 Host prediction
     time_current = f"[{str(datetime.now().replace(microsecond=0))}]"
     logger.info(f"{time_current} | Conduct Host prediction by iPHoP. In processing...")      
     ## Step 9.1 Host prediction by iPHoP
-    all_vRhyme_fasta_Nlinked = os.path.join(args['vrhyme_outdir'], 'all_vRhyme_fasta.Nlinked_viral_gn.fasta')
-    scripts.module.combine_all_vRhyme_fasta(args['nlinked_viral_gn_dir'], '', all_vRhyme_fasta_Nlinked)
-    os.system(f"conda run -p {os.path.join(args['conda_env_dir'], 'ViWrap-iPHoP')} python {os.path.join(args['root_dir'],'scripts/run_iPHoP.py')} {all_vRhyme_fasta_Nlinked} {args['iphop_outdir']} {args['iPHoP_db']} {args['threads']} >/dev/null 2>&1")
+    ## all_vRhyme_fasta_Nlinked has been written down by Nlinker in Step 6.1
+    conda_launcher.run(os.path.join(args['conda_env_dir'], 'ViWrap-iPHoP'), f"python {os.path.join(args['root_dir'],'scripts/run_iPHoP.py')} {all_vRhyme_fasta_Nlinked} {args['iphop_outdir']} {args['iPHoP_db']} {args['threads']} >/dev/null")
 
     time_current = f"[{str(datetime.now().replace(microsecond=0))}]"
     logger.info(f"{time_current} | Conduct Host prediction by iPHoP. Finished")  
     
+def step_run_iPHoP_custom_MAGs(args):
+    all_vRhyme_fasta_Nlinked = args['all_vRhyme_fasta_Nlinked']
+
     ## Step 9.2 Host prediction by iPHoP by adding custom MAGs to host db
     if args['custom_MAGs_dir'] != 'none':
         time_current = f"[{str(datetime.now().replace(microsecond=0))}]"
         logger.info(f"{time_current} | Conduct Host prediction by iPHoP using custom MAGs. In processing...")   
                
-        os.system(f"conda run -p {os.path.join(args['conda_env_dir'], 'ViWrap-GTDBTk')} python {os.path.join(args['root_dir'],'scripts/add_custom_MAGs_to_host_db__make_gtdbtk_results.py')} {args['out_dir']} {args['custom_MAGs_dir']} {args['threads']} >/dev/null 2>&1")
-        os.system(f"conda run -p {os.path.join(args['conda_env_dir'], 'ViWrap-iPHoP')} python {os.path.join(args['root_dir'],'scripts/add_custom_MAGs_to_host_db__add_to_db.py')} {args['out_dir']} {args['custom_MAGs_dir']} {args['iPHoP_db']} {args['iPHoP_db_custom']} >/dev/null 2>&1")
-        os.system(f"conda run -p {os.path.join(args['conda_env_dir'], 'ViWrap-iPHoP')} python {os.path.join(args['root_dir'],'scripts/run_iPHoP.py')} {all_vRhyme_fasta_Nlinked} {args['iphop_custom_outdir']} {args['iPHoP_db_custom']} {args['threads']} >/dev/null 2>&1")  
+        conda_launcher.run(os.path.join(args['conda_env_dir'], 'ViWrap-GTDBTk'), f"python {os.path.join(args['root_dir'],'scripts/add_custom_MAGs_to_host_db__make_gtdbtk_results.py')} {args['out_dir']} {args['custom_MAGs_dir']} {args['threads']} >/dev/null")
+        conda_launcher.run(os.path.join(args['conda_env_dir'], 'ViWrap-iPHoP'), f"python {os.path.join(args['root_dir'],'scripts/add_custom_MAGs_to_host_db__add_to_db.py')} {args['out_dir']} {args['custom_MAGs_dir']} {args['iPHoP_db']} {args['iPHoP_db_custom']} >/dev/null")
+        conda_launcher.run(os.path.join(args['conda_env_dir'], 'ViWrap-iPHoP'), f"python {os.path.join(args['root_dir'],'scripts/run_iPHoP.py')} {all_vRhyme_fasta_Nlinked} {args['iphop_custom_outdir']} {args['iPHoP_db_custom']} {args['threads']} >/dev/null")  
 
         time_current = f"[{str(datetime.now().replace(microsecond=0))}]"
         logger.info(f"{time_current} | Conduct Host prediction by iPHoP using custom MAGs. Finished") 
     
     
+def step_summarize(args):
+    vRhyme_best_bin_dir_modified = args['vRhyme_best_bin_dir_modified']
+    vRhyme_unbinned_viral_gn_dir = args['vRhyme_unbinned_viral_gn_dir']
+    vRhyme_best_bin_lytic_and_lysogenic_info = args['vRhyme_best_bin_lytic_and_lysogenic_info']
+    scf2lytic_or_lyso_summary = args['scf2lytic_or_lyso_summary']
+    all_vRhyme_faa = args['all_vRhyme_faa']
+    sample2read_info = args['sample2read_info']
+
     # Step 10 Get virus genome abundance
     os.mkdir(args['viwrap_summary_outdir'])
-    os.system(f"mv {os.path.join(args['out_dir'],'*.txt')} {args['viwrap_summary_outdir']}")
+    for txt_file in glob(os.path.join(args['out_dir'], '*.txt')):
+        shutil.move(txt_file, args['viwrap_summary_outdir'])
     virus_raw_abundance = os.path.join(args['viwrap_summary_outdir'],'Virus_raw_abundance.txt')
     scripts.module.get_virus_raw_abundance(args['mapping_outdir'], vRhyme_best_bin_dir_modified, vRhyme_unbinned_viral_gn_dir, virus_raw_abundance)
     sample2read_info_file = os.path.join(args['viwrap_summary_outdir'],'Sample2read_info.txt')
@@ -561,8 +547,8 @@ def main(args):
     ## Step 11.1 Move all virus genome fasta, ffn, and faa files
     viral_gn_dir = os.path.join(args['viwrap_summary_outdir'],'Virus_genomes_files')
     os.mkdir(viral_gn_dir)
-    os.system(f'cp {vRhyme_best_bin_dir_modified}/* {viral_gn_dir}')
-    os.system(f'cp {vRhyme_unbinned_viral_gn_dir}/* {viral_gn_dir}')
+    for gn_file in glob(os.path.join(vRhyme_best_bin_dir_modified, '*')) + glob(os.path.join(vRhyme_unbinned_viral_gn_dir, '*')):
+        shutil.copy(gn_file, viral_gn_dir)
     
     ## Step 11.2 Get VIBRANT lytic and lysogenic information and genome information
     checkv_dict = scripts.module.get_checkv_useful_info(os.path.join(args['checkv_outdir'], 'CheckV_quality_summary.txt'))
@@ -574,7 +560,7 @@ def main(args):
     if args['identify_method'] == 'vb':
         gn2long_scf2kos = scripts.module.get_amg_info_for_vb(args['vibrant_outdir'], Path(args['input_metagenome']).stem, viral_gn_dir)
     elif args['identify_method'] == 'vs' or args['identify_method'] == 'dvf' or args['identify_method'] == 'vb-vs-dvf' or args['identify_method'] == 'vb-vs':
-        gn2long_scf2kos = scripts.module.get_amg_info_for_vs_and_dvf(args, viral_gn_dir)
+        gn2long_scf2kos = scripts.module.get_amg_info_for_vs_and_dvf(args)
     gn2amg_statistics = scripts.module.get_amg_statistics(gn2long_scf2kos)
     virus_summary_info = os.path.join(args['viwrap_summary_outdir'],'Virus_summary_info.txt')
     scripts.module.get_virus_summary_info(checkv_dict, gn2lyso_lytic_result, gn2size_and_scf_no_and_pro_count, gn2amg_statistics, virus_summary_info) 
@@ -594,22 +580,269 @@ def main(args):
     virus_annotation_result_file = os.path.join(args['viwrap_summary_outdir'],'Virus_annotation_results.txt')
     amg_pro2info = scripts.module.get_amg_pro_info(AMG_dir, virus_annotation_result_file, args['VIBRANT_db']) # Get the amg_pro2info dict
     scripts.module.write_down_amg_pro2info(AMG_dir, amg_pro2info) # Write down the amg_pro2info dict
-    scripts.module.pick_amg_pro(AMG_dir, amg_pro2info, viral_gn_dir) # Pick the AMG proteins and write down the AMG proteins
+    scripts.module.pick_amg_pro(AMG_dir, amg_pro2info, all_vRhyme_faa) # Pick the AMG proteins and write down the AMG proteins
     
     time_current = f"[{str(datetime.now().replace(microsecond=0))}]"
     logger.info(f"{time_current} | Get virus sequence information. Finished")  
      
    
+def step_visualize(args):
     # Step 12 Visualize the result
     scripts.module.generate_result_visualization_inputs(args['viwrap_visualization_outdir'], args['viwrap_summary_outdir'], args['VIBRANT_db'])
     visualization_input_dir = os.path.join(args['viwrap_visualization_outdir'],'Result_visualization_inputs')
-    os.system(f"python {os.path.join(args['root_dir'],'scripts/run_Visualization.py')} -i {visualization_input_dir} -r {args['out_dir']} -o '09_Virus_statistics_visualization/Result_visualization_outputs'")
+    supervisor.run(f"python {os.path.join(args['root_dir'],'scripts/run_Visualization.py')} -i {visualization_input_dir} -r {args['out_dir']} -o '09_Virus_statistics_visualization/Result_visualization_outputs'", 'run_Visualization', shell=True) # Runs in the ViWrap env; a failure fails the step
     
     time_current = f"[{str(datetime.now().replace(microsecond=0))}]"
     logger.info(f"{time_current} | Visualize the result. Finished")  
     
     
+def build_pipeline(args):
+    # Declare every step with the artifacts it needs and makes; the order of adding is the order of the original straight-line run
+    # The params, conda envs, and the inputs not made by any step (the input metagenome, reads, and databases) are recorded in the checkpoint markers
+    run = pipeline.Pipeline(args['max_parallel_steps'], args['checkpoint_dir'], args['resume'])
+    identify_method2dbs = {'vb': ['VIBRANT_db'], 'vs': ['VirSorter2_db', 'CheckV_db', 'VIBRANT_db'], 'dvf': ['DVF_db', 'VIBRANT_db']}
+    identify_method2envs = {'vb': ['ViWrap-VIBRANT'], 'vs': ['ViWrap-vs2', 'ViWrap-CheckV', 'ViWrap-VIBRANT'], 'dvf': ['ViWrap-DVF', 'ViWrap-VIBRANT']}
+    def get_envs(*env_names):
+        return [os.path.join(args['conda_env_dir'], env_name) for env_name in env_names]
+        
+    identify_params = pipeline.get_params(args, ['identify_method', 'virome', 'input_length_limit'])
+    if args['identify_method'] in identify_method2name:
+        # VIBRANT, the VirSorter2 - CheckV - VirSorter2 - CheckV chain, and DVF (vb-vs-dvf) run at the same time, splitting the threads between them;
+        # the overlap step starts once all of them are finished
+        branches = ['VIBRANT', 'VirSorter2', 'DVF'] if args['identify_method'] == 'vb-vs-dvf' else ['VIBRANT', 'VirSorter2']
+        branch2threads = {branch: int(args['threads']) for branch in branches}
+        if int(args['max_parallel_steps']) >= len(branches):
+            branch2threads = pipeline.split_threads(args['threads'], {branch: pipeline.IDENTIFY_BRANCH2SCALING[branch] for branch in branches})
+            time_current = f"[{str(datetime.now().replace(microsecond=0))}]"
+            logger.info(f"{time_current} | Split {args['threads']} threads between the virus identification branches: {', '.join(f'{branch} - {branch2threads[branch]}' for branch in branches if branch != 'DVF')}")
+        run.add_step('identify_virus_by_VIBRANT', partial(step_identify_virus_by_VIBRANT, args, branch2threads['VIBRANT']), 
+            inputs = [args['input_metagenome'], args['VIBRANT_db']], 
+            outputs = [args['inner_vb_outdir'], args['scf2lytic_or_lyso_summary']], 
+            params = identify_params, 
+            envs = get_envs('ViWrap-VIBRANT'))
+        run.add_step('identify_virus_by_VirSorter2', partial(step_identify_virus_by_VirSorter2, args, branch2threads['VirSorter2']), 
+            inputs = [args['input_metagenome'], args['VirSorter2_db'], args['CheckV_db'], args['VIBRANT_db']], 
+            outputs = [args['inner_vs_outdir']], 
+            params = identify_params, 
+            envs = get_envs('ViWrap-vs2', 'ViWrap-CheckV', 'ViWrap-VIBRANT'))
+        if 'DVF' in branches:
+            run.add_step('identify_virus_by_DVF', partial(step_identify_virus_by_DVF, args), 
+                inputs = [args['input_metagenome'], args['DVF_db']], 
+                outputs = [args['inner_dvf_outdir']], 
+                params = identify_params, 
+                envs = get_envs('ViWrap-DVF'))
+        run.add_step('get_overlapped_viral_scaffolds', partial(step_get_overlapped_viral_scaffolds, args), 
+            inputs = [args['inner_vb_outdir'], args['inner_vs_outdir'], args['inner_dvf_outdir']], 
+            outputs = [args['overlap_outdir'], args['viral_scaffold']])
+    else:
+        run.add_step('identify_virus', partial(step_identify_virus, args), 
+            inputs = [args['input_metagenome']] + [args[db] for db in identify_method2dbs[args['identify_method']]], 
+            outputs = [args['identify_outdir'], args['viral_scaffold'], args['scf2lytic_or_lyso_summary']], 
+            params = identify_params, 
+            envs = get_envs(*identify_method2envs[args['identify_method']]))
+    run.add_step('map_reads', partial(step_map_reads, args), 
+        inputs = [args['viral_scaffold'], args['input_metagenome']] + args['input_reads'].split(','), 
+        outputs = [args['mapping_outdir']], 
+        params = pipeline.get_params(args, ['input_reads_type', 'reads_mapping_identity_cutoff']), 
+        envs = get_envs('ViWrap-Mapping'))
+    run.add_step('run_vRhyme', partial(step_run_vRhyme, args), 
+        inputs = [args['viral_scaffold'], args['mapping_outdir']], 
+        outputs = [args['vrhyme_outdir'], args['vRhyme_best_bin_dir']], 
+        envs = get_envs('ViWrap-vRhyme'))
+    run.add_step('get_vRhyme_best_bin_lytic_and_lysogenic_info', partial(step_get_vRhyme_best_bin_lytic_and_lysogenic_info, args), 
+        inputs = [args['vRhyme_best_bin_dir'], args['scf2lytic_or_lyso_summary']], 
+        outputs = [args['vRhyme_best_bin_lytic_and_lysogenic_info']])
+    run.add_step('get_vRhyme_best_bin_scaffold_complete_info', partial(step_get_vRhyme_best_bin_scaffold_complete_info, args), 
+        inputs = [args['vRhyme_best_bin_dir'], args['CheckV_db']], 
+        outputs = [args['vRhyme_best_bin_scaffold_complete_info']], 
+        envs = get_envs('ViWrap-CheckV'))
+    run.add_step('make_vRhyme_best_bins_fasta_modified', partial(step_make_vRhyme_best_bins_fasta_modified, args), 
+        inputs = [args['vRhyme_best_bin_dir'], args['vRhyme_best_bin_lytic_and_lysogenic_info'], args['vRhyme_best_bin_scaffold_complete_info']], 
+        outputs = [args['vRhyme_best_bin_dir_modified']])
+    run.add_step('make_unbinned_viral_gn', partial(step_make_unbinned_viral_gn, args), 
+        inputs = [args['viral_scaffold'], args['vRhyme_best_bin_dir_modified']], 
+        outputs = [args['vRhyme_unbinned_viral_gn_dir'], args['id_registry_dir']])
+    run.add_step('run_vContact2', partial(step_run_vContact2, args), 
+        inputs = [args['vRhyme_best_bin_dir_modified'], args['vRhyme_unbinned_viral_gn_dir'], args['id_registry_dir'], args['Tax_classification_db']], 
+        outputs = [args['all_vRhyme_faa'], args['vcontact2_outdir'], args['genome_by_genome_file'], args['genus_cluster_info']], 
+        envs = get_envs('ViWrap-vContact2'))
+    run.add_step('link_viral_gn', partial(step_link_viral_gn, args), 
+        inputs = [args['vRhyme_best_bin_dir_modified'], args['vRhyme_unbinned_viral_gn_dir']], 
+        outputs = [args['nlinked_viral_gn_dir'], args['all_vRhyme_fasta_Nlinked']])
+    run.add_step('run_CheckV', partial(step_run_CheckV, args), 
+        inputs = [args['nlinked_viral_gn_dir'], args['CheckV_db']], 
+        outputs = [args['checkv_outdir']], 
+        envs = get_envs('ViWrap-CheckV'))
+    run.add_step('run_dRep', partial(step_run_dRep, args), 
+        inputs = [args['genus_cluster_info'], args['vRhyme_best_bin_dir_modified'], args['vRhyme_unbinned_viral_gn_dir']], 
+        outputs = [args['drep_outdir'], args['species_cluster_info']], 
+        envs = get_envs('ViWrap-dRep'))
+    run.add_step('run_Tax_RefSeq', partial(step_run_Tax_RefSeq, args), 
+        inputs = [args['vRhyme_best_bin_dir_modified'], args['vRhyme_unbinned_viral_gn_dir'], args['id_registry_dir'], args['Tax_classification_db']], 
+        outputs = [args['tax_refseq_output']], 
+        envs = get_envs('ViWrap-Tax'))
+    run.add_step('run_Tax_VOG', partial(step_run_Tax_VOG, args), 
+        inputs = [args['vRhyme_best_bin_dir_modified'], args['vRhyme_unbinned_viral_gn_dir'], args['id_registry_dir'], args['Tax_classification_db']], 
+        outputs = [args['tax_vog_output']], 
+        envs = get_envs('ViWrap-Tax'))
+    run.add_step('run_Tax_vContact2', partial(step_run_Tax_vContact2, args), 
+        inputs = [args['genome_by_genome_file'], args['Tax_classification_db']], 
+        outputs = [args['tax_vcontact2_output']], 
+        envs = get_envs('ViWrap-Tax'))
+    run.add_step('combine_Tax', partial(step_combine_Tax, args), 
+        inputs = [args['genus_cluster_info'], args['tax_refseq_output'], args['tax_vog_output'], args['tax_vcontact2_output']], 
+        outputs = [args['tax_classification_result']], 
+        envs = get_envs('ViWrap-Tax'), 
+        removes = [args['tax_refseq_output'], args['tax_vog_output'], args['tax_vcontact2_output']])
+    run.add_step('run_iPHoP', partial(step_run_iPHoP, args), 
+        inputs = [args['all_vRhyme_fasta_Nlinked'], args['iPHoP_db']], 
+        outputs = [args['iphop_outdir']], 
+        envs = get_envs('ViWrap-iPHoP'))
+    summary_inputs = [args['mapping_outdir'], args['vRhyme_best_bin_dir_modified'], args['vRhyme_unbinned_viral_gn_dir'], args['id_registry_dir'], args['vRhyme_best_bin_lytic_and_lysogenic_info'], 
+        args['all_vRhyme_faa'], args['checkv_outdir'], args['genus_cluster_info'], args['species_cluster_info'], args['tax_classification_result'], args['iphop_outdir'], args['VIBRANT_db']]
+    if args['custom_MAGs_dir'] != 'none':
+        # The GTDB-Tk results are written into the iPHoP outdir, so it runs after the default iPHoP run has made the folder
+        # The custom iPHoP db is made by this step, so it is cleared together with the outdir when the step is run again
+        run.add_step('run_iPHoP_custom_MAGs', partial(step_run_iPHoP_custom_MAGs, args), 
+            inputs = [args['all_vRhyme_fasta_Nlinked'], args['iphop_outdir'], args['custom_MAGs_dir'], args['iPHoP_db']], 
+            outputs = [args['iphop_custom_outdir'], args['iPHoP_db_custom']], 
+            params = pipeline.get_params(args, ['custom_MAGs_dir']), 
+            envs = get_envs('ViWrap-GTDBTk', 'ViWrap-iPHoP'))
+        summary_inputs.append(args['iphop_custom_outdir'])
+    # The summary step moves all "*.txt" files in the outdir, so it waits for every step that writes them
+    run.add_step('summarize', partial(step_summarize, args), 
+        inputs = summary_inputs, 
+        outputs = [args['viwrap_summary_outdir']], 
+        params = pipeline.get_params(args, ['identify_method']), 
+        removes = [args['genus_cluster_info'], args['species_cluster_info'], args['tax_classification_result']])
+    run.add_step('visualize', partial(step_visualize, args), 
+        inputs = [args['viwrap_summary_outdir'], args['VIBRANT_db']], 
+        outputs = [args['viwrap_visualization_outdir']])
+    ## Record what each finished step took, for the estimates of --dry_run
+    run.history_file = args['step_history_file']
+    run.run_features = cost_model.get_run_features(args)
+    return run
+    
+def check_inputs(args):
+    # Exit with a message if any input, database, or option is not set up well
+    if not os.path.exists(args['input_metagenome']):
+        sys.exit(f"Could not find input metagenome {args['input_metagenome']}")        
+    if not os.path.exists(args['db_dir']):
+        sys.exit(f"Could not find directory {args['db_dir']}. Maybe the database directory was not specified with the --db_dir and is not the default \".ViWrap_db/\" directory?")
+
+    if args['input_reads_type'] != 'illumina' and args['input_reads_type'] != 'pacbio' and args['input_reads_type'] != 'pacbio_hifi' and args['input_reads_type'] != 'pacbio_asm20' and args['input_reads_type'] != 'nanopore':
+        sys.exit(f"The input reads type should be one of these: illumina, pacbio, pacbio_hifi, pacbio_asm20, and nanopore")  
+        
+    metaG_reads_list = args['input_reads'].split(',')
+    for each_read in metaG_reads_list:
+        if not each_read.endswith('.fastq') and not each_read.endswith('.fastq.gz'):
+            sys.exit(f"Please make sure that all your input reads are ended with .fastq or fastq.gz")  
+    
+    if not args.get('dry_run'):
+        # Reading all reads (and writing their pyfastx indexes) is left to the real run; a dry run estimates the read bases from the file sizes
+        args['sample2read_info'] = scripts.module.get_read_info(args['input_reads'], args['input_reads_type'])  
+    
+    if args['custom_MAGs_dir'] != 'none' and not os.path.exists(args['custom_MAGs_dir']):
+        sys.exit(f"Could not find custom MAGs directory {args['custom_MAGs_dir']}. Maybe the directory is not correct")
+    elif args['custom_MAGs_dir'] != 'none' and os.path.exists(args['custom_MAGs_dir']):   
+        for file in glob(f"os.path.join(args['custom_MAGs_dir'],'*.fasta')"):
+            if '.fasta' not in file:
+                sys.exit(f"Make sure all MAGs in custom MAGs directory {args['custom_MAGs_dir']} end with \'.fasta\', and no additional files within the directory")
+                
+    if args['custom_MAGs_dir'] != 'none' and not os.path.isabs(args['custom_MAGs_dir']):
+        sys.exit(f"Please make sure that the path to custom MAGs directory {args['custom_MAGs_dir']} is a full absolute path")
+                
+    if not os.path.exists(args['conda_env_dir']):
+        sys.exit(f"Could not find conda env dirs within {args['conda_env_dir']}") 
+    
+    if os.path.exists(args['iPHoP_db_custom']) and not args['resume']:
+        sys.exit(f"Please make sure that {args['iPHoP_db_custom']} is not present before ViWrap run. If present, please remove the folder") 
+
+    if args['identify_method'] not in ['vb', 'vs', 'dvf', 'vb-vs-dvf', 'vb-vs']:
+        sys.exit(f"Please make sure your input for --identify_method option is one of these: \"vb-vs\", \"vb-vs-dvf\", \"vb\", \"vs\", and \"dvf\"; you can also omit this in the command line, the default is \"vb\"")
+
+    if args.get('executor', 'local') not in ['local', 'slurm', 'mock']:
+        sys.exit(f"Please make sure your input for --executor option is one of these: \"local\", \"slurm\", and \"mock\"; you can also omit this in the command line, the default is \"local\"")
+
+
+def main(args):
+    # Welcome and logger
+    print("### Welcome to ViWrap ###\n") 
+
+    if args['dry_run']:
+        # Only print the planned steps with their estimates; nothing is run or written
+        set_defaults(args)
+        check_inputs(args)
+        print(cost_model.get_plan_report(build_pipeline(args), args['max_parallel_steps']))
+        return
+
+	## Set up the logger
+    if not args['resume'] or not os.path.exists(args['out_dir']):
+        os.mkdir(args['out_dir'])
+    log_file = os.path.join(args['out_dir'],'ViWrap_run.log')
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(message)s",
+        handlers=[
+            logging.FileHandler(log_file),
+            logging.StreamHandler(sys.stdout)
+        ]
+    )    
+    logger = logging.getLogger(__name__) 
+
+    ## Store the input arguments
+    issued_command = scripts.module.get_run_input_arguments(args)
+    logger.info(f"The issued command is:\n{issued_command}\n")
+    
+    ## Set the default args:
+    set_defaults(args)
+    
+    # Step 1 Pre-check inputs
+    start_time = datetime.now().replace(microsecond=0)
+    time_current = f"[{str(datetime.now().replace(microsecond=0))}]"
+    logger.info(f"{time_current} | Pre-check inputings. In processing...")
+    
+    check_inputs(args)
+
+    time_current = f"[{str(datetime.now().replace(microsecond=0))}]"
+    logger.info(f"{time_current} | Looks like the input metagenome and reads, database, and custom MAGs dir (if option used) are now set up well, start up to run ViWrap pipeline")
+         
+
+    # Step 2-12 Run all steps; independent steps (i.e., CheckV, dRep, taxonomic charaterization, and iPHoP) run at the same time
+    ## Share --threads and the memory among all tools started by the steps; the pool path is passed to the helper scripts by the env variable
+    if not os.environ.get(resource_pool.POOL_ENV):
+        pool_file = os.path.abspath(args['resource_pool_file'])
+        resource_pool.create_pool(pool_file, int(args['threads']))
+        os.environ[resource_pool.POOL_ENV] = pool_file
+    with resource_pool.get_pool().locked_state() as pool_state:
+        logger.info(f"All tools share {pool_state['cores']} cores and {pool_state['memory']:.1f} GB memory")
+    ## Record the resource usage of all processes started by the steps; the path is passed to the helper scripts by the env variable
+    if not os.environ.get(process_metrics.METRICS_ENV):
+        os.environ[process_metrics.METRICS_ENV] = os.path.abspath(args['process_metrics_file'])
+    ## Keep the stderr of each job, and set the timeout, retries, and backend of parallel sub-jobs
+    if not os.environ.get(supervisor.LOG_DIR_ENV):
+        os.environ[supervisor.LOG_DIR_ENV] = os.path.abspath(args['job_log_dir'])
+        os.environ[supervisor.TIMEOUT_ENV] = str(args['job_timeout'])
+        os.environ[supervisor.RETRIES_ENV] = str(args['job_retries'])
+        os.environ[executors.EXECUTOR_ENV] = args['executor']
+        os.environ[executors.MAX_CLUSTER_JOBS_ENV] = str(args['max_cluster_jobs'])
+        os.environ[executors.SBATCH_ARGS_ENV] = args['sbatch_args']
+    run = build_pipeline(args)
+    run.get_step_metrics = lambda name: {'peak_rss': process_metrics.get_step_peak_rss(name)}
+    ## Resolve the conda envs of all steps once, so that helper scripts are started directly instead of by "conda run" each time
+    conda_launcher.resolve_envs(sorted(set(env_dir for step in run.steps.values() for env_dir in step.envs)))
+    try:
+        run.run()
+    finally:
+        ## Keep the usage of the finished steps even if a step failed
+        process_metrics.write_run_metrics(args['run_metrics_file'], run.step2span)
+        timeline.write_trace(args['trace_file'], run.step2span, process_metrics.read_records(os.environ[process_metrics.METRICS_ENV]))
+    logger.info(f"Conda env launching:\n{conda_launcher.get_launch_report()}")
+    logger.info(f"The wall time, CPU time, peak memory, and disk I/O of each step and each process are in {args['run_metrics_file']}; the timeline of all steps and processes is in {args['trace_file']} (open it in https://ui.perfetto.dev)")
+    
+    
     end_time = datetime.now().replace(microsecond=0)
     duration = end_time - start_time
     logger.info(f"The total running time is {duration} (in \"hr:min:sec\" format)")  
    
+
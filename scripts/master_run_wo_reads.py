@@ -2,18 +2,33 @@ import sys
 import os
 import argparse
 import logging
+import shutil
 import scripts
 from scripts import module
+from scripts import id_registry
+from scripts import pipeline
+from scripts import resource_pool
+from scripts import conda_launcher
+from scripts import cost_model
+from scripts import process_metrics
+from scripts import timeline
+from scripts import supervisor
+from scripts import executors
+from functools import partial
 from datetime import datetime
 from pathlib import Path
 from glob import glob
 
 
+logger = logging.getLogger(__name__)
+identify_method2name = {'vb-vs': 'VIBRANT-VirSorter2', 'vb-vs-dvf': 'VIBRANT-VirSorter2-DVF'} # The methods that run more than one identification branch
+
+
 def fetch_arguments(parser,root_dir,db_path_default):
     parser.set_defaults(func=main)
     parser.set_defaults(program="run")
     parser.add_argument('--input_metagenome','-i', dest='input_metagenome', required=True, default='none', help=r'(required) input metagenome assembly. It can be a metagenome or entire virome assembly. The extension of the input nucleotide sequence should be ".fasta"')
-    parser.add_argument('--out_dir','-o', dest='out_dir', required=False, default='./ViWrap_outdir', help=r'(required) output directory to deposit all results (default = ./ViWrap_outdir) output folder to deposit all results. ViWrap will exit if the folder already exists')
+    parser.add_argument('--out_dir','-o', dest='out_dir', required=False, default='./ViWrap_outdir', help=r'(required) output directory to deposit all results (default = ./ViWrap_outdir) output folder to deposit all results. ViWrap will exit if the folder already exists, unless --resume is used')
     parser.add_argument('--db_dir','-d', dest='db_dir', required=False, default=db_path_default, help=f'(required) database directory; default = {db_path_default}')
     parser.add_argument('--identify_method', dest='identify_method', required=False, default='vb-vs',help=r'(required) the virus identifying method to choose: vb - VIBRANT; vs - VirSorter2 and CheckV; dvf - DeepVirFinder; vb-vs - Use VIBRANT and VirSorter2 to get the overlapped viruses (default); vb-vs-dvf - Use all these three methods and get the overlapped viruses')
     parser.add_argument('--conda_env_dir', dest='conda_env_dir', required=True, default='none', help=r'(required) the directory where you put your conda environment files. It is the parent directory that contains all the conda environment folders')
@@ -21,6 +36,15 @@ def fetch_arguments(parser,root_dir,db_path_default):
     parser.add_argument('--virome','-v', dest='virome', action='store_true', required=False, default=False, help=r"edit VIBRANT's sensitivity if the input dataset is a virome. It is suggested to use it if you know that the input assembly is virome or metagenome")
     parser.add_argument('--input_length_limit', dest='input_length_limit', required=False, default=2000, help=r'length in basepairs to limit input sequences (default=2000, can increase but not decrease); 2000 at least suggested for VIBRANT (vb)-based and INHERIT (in)-based pipeline, 5000 at least suggested for VirSorter2 (vs)-based pipeline')
     parser.add_argument('--custom_MAGs_dir', dest='custom_MAGs_dir', required=False, default='none', help=r'custom MAGs dir that contains only *.fasta files for MAGs reconstructed from the same metagenome, this will be used in iPHoP for host prediction; note that it should be the absolute address path')	
+    parser.add_argument('--max_gn_per_dir', dest='max_gn_per_dir', required=False, default=10000, help=r'maximum number of viral genomes in one folder when splitting viral genomes for CheckV, dRep, and taxonomic charaterization; if there are more genomes, they will be put into sub-folders (default = 10000; 0 = never use sub-folders)')
+    parser.add_argument('--max_parallel_steps', dest='max_parallel_steps', required=False, default=4, help=r'maximum number of independent pipeline steps to run at the same time, i.e., taxonomic charaterization, dRep, and iPHoP can run together once viral genomes are ready; all running steps share the given --threads (default = 4)')
+    parser.add_argument('--job_timeout', dest='job_timeout', required=False, default=0, help=r'maximum seconds for each parallel sub-job (i.e., CheckV of a genome chunk, dRep of a genus, or DIAMOND/hmmsearch of a genome); a job running longer is killed and run again (default = 0, no limit)')
+    parser.add_argument('--job_retries', dest='job_retries', required=False, default=2, help=r'number of times to run a parallel sub-job again after a transient failure, i.e., killed under memory pressure or by --job_timeout (default = 2); any other failure stops the step at once')
+    parser.add_argument('--executor', dest='executor', required=False, default='local', help=r'where to run the parallel sub-jobs (CheckV of each genome chunk, dRep of each genus, DIAMOND/hmmsearch of each genome or chunk): local - on this machine (default); slurm - submitted by sbatch to a SLURM cluster, the output dir should be on a file system shared by all nodes; mock - a local mock cluster for testing')
+    parser.add_argument('--max_cluster_jobs', dest='max_cluster_jobs', required=False, default=100, help=r'maximum number of sub-jobs of a step in the cluster queue at the same time with "--executor slurm" or "mock" (default = 100; for "mock", it is also the number of local workers)')
+    parser.add_argument('--sbatch_args', dest='sbatch_args', required=False, default='', help=r'extra sbatch options for the sub-jobs with "--executor slurm", given in quotes, i.e., "--partition=short --time=4:00:00"')
+    parser.add_argument('--resume', dest='resume', action='store_true', required=False, default=False, help=r"resume an interrupted run in the existing output directory: steps that were finished and whose inputs, tool versions, and parameters are not changed are skipped; the other steps and all steps downstream of them are run again")
+    parser.add_argument('--dry_run', dest='dry_run', action='store_true', required=False, default=False, help=r"only print the planned steps with their estimated wall time, peak memory, and disk footprint, based on the input sizes and the measured steps of previous runs (ViWrap_step_history.jsonl in the db dir); nothing is run")
     parser.add_argument('--root_dir', dest='root_dir', required=False, default=root_dir,help=argparse.SUPPRESS)
     
 
@@ -49,69 +73,43 @@ def set_defaults(args):
     args['iphop_outdir'] = os.path.join(args['out_dir'],'04_iPHoP_outdir')
     args['iphop_custom_outdir'] = os.path.join(args['out_dir'],'04_iPHoP_outdir/iPHoP_outdir_custom_MAGs')
     args['viwrap_summary_outdir'] = os.path.join(args['out_dir'],'05_ViWrap_summary_outdir')
-    
-def main(args):
-    # Welcome and logger
-    print("### Welcome to ViWrap ###\n") 
-
-	## Set up the logger
-    os.mkdir(args['out_dir'])
-    log_file = os.path.join(args['out_dir'],'ViWrap_run.log')
-    logging.basicConfig(
-        level=logging.INFO,
-        format="%(message)s",
-        handlers=[
-            logging.FileHandler(log_file),
-            logging.StreamHandler(sys.stdout)
-        ]
-    )    
-    logger = logging.getLogger(__name__) 
-
-    ## Store the input arguments
-    issued_command = scripts.module.get_run_input_arguments_wo_reads(args)
-    logger.info(f"The issued command is:\n{issued_command}\n")
-    
-    ## Set the default args:
-    set_defaults(args)
-    
-    # Step 1 Pre-check inputs
-    start_time = datetime.now().replace(microsecond=0)
-    time_current = f"[{str(datetime.now().replace(microsecond=0))}]"
-    logger.info(f"{time_current} | Pre-check inputings. In processing...")
-    
-    if not os.path.exists(args['input_metagenome']):
-        sys.exit(f"Could not find input metagenome {args['input_metagenome']}")        
-    if not os.path.exists(args['db_dir']):
-        sys.exit(f"Could not find directory {args['db_dir']}. Maybe the database directory was not specified with the --db_dir and is not the default \".ViWrap_db/\" directory?")
-    
-    if args['custom_MAGs_dir'] != 'none' and not os.path.exists(args['custom_MAGs_dir']):
-        sys.exit(f"Could not find custom MAGs directory {args['custom_MAGs_dir']}. Maybe the directory is not correct")
-    elif args['custom_MAGs_dir'] != 'none' and os.path.exists(args['custom_MAGs_dir']):   
-        for file in glob(f"os.path.join(args['custom_MAGs_dir'],'*.fasta')"):
-            if '.fasta' not in file:
-                sys.exit(f"Make sure all MAGs in custom MAGs directory {args['custom_MAGs_dir']} end with \'.fasta\', and no additional files within the directory")
-                
-    if args['custom_MAGs_dir'] != 'none' and not os.path.isabs(args['custom_MAGs_dir']):
-        sys.exit(f"Please make sure that the path to custom MAGs directory {args['custom_MAGs_dir']} is a full absolute path")
-                
-    if not os.path.exists(args['conda_env_dir']):
-        sys.exit(f"Could not find conda env dirs within {args['conda_env_dir']}") 
-        
-    if os.path.exists(args['iPHoP_db_custom']):
-        sys.exit(f"Please make sure that {args['iPHoP_db_custom']} is not present before ViWrap run. If present, please remove the folder")         
-
-    time_current = f"[{str(datetime.now().replace(microsecond=0))}]"
-    logger.info(f"{time_current} | Looks like the input metagenome and reads, database, and custom MAGs dir (if option used) are now set up well, start up to run ViWrap pipeline")
-         
-       
+    args['checkpoint_dir'] = os.path.join(args['out_dir'],'ViWrap_checkpoints')
+    args['resource_pool_file'] = os.path.join(args['out_dir'],'ViWrap_resource_pool.json')
+    args['step_history_file'] = os.path.join(args['db_dir'],'ViWrap_step_history.jsonl')
+    args['process_metrics_file'] = os.path.join(args['out_dir'],'ViWrap_process_metrics.jsonl')
+    args['run_metrics_file'] = os.path.join(args['out_dir'],'ViWrap_run_metrics.json')
+    args['trace_file'] = os.path.join(args['out_dir'],'ViWrap_trace.json')
+    args['job_log_dir'] = os.path.join(args['out_dir'],'ViWrap_job_logs')
+    args['id_registry_dir'] = os.path.join(args['out_dir'],'viral_id_registry')
+    
+    ## Store intermediate files and folders shared between steps
+    identify_method2outdir = {'vb': args['vibrant_outdir'], 'vs': args['virsorter_outdir'], 'dvf': args['dvf_outdir'], 'vb-vs-dvf': args['vb_vs_dvf_outdir'], 'vb-vs': args['vb_vs_outdir']}
+    args['identify_outdir'] = identify_method2outdir.get(args['identify_method'], '')
+    args['inner_vb_outdir'] = os.path.join(args['identify_outdir'], f"VIBRANT_{Path(args['input_metagenome']).stem}")
+    args['inner_vs_outdir'] = os.path.join(args['identify_outdir'], f"VirSorter_{Path(args['input_metagenome']).stem}")
+    args['inner_dvf_outdir'] = os.path.join(args['identify_outdir'], f"DeepVirFinder_{Path(args['input_metagenome']).stem}") if args['identify_method'] == 'vb-vs-dvf' else ''
+    args['overlap_outdir'] = os.path.join(args['identify_outdir'], f"Overlap_{Path(args['input_metagenome']).stem}")
+    args['final_virus_fasta_file'] = os.path.join(args['viwrap_summary_outdir'], 'final_virus.fasta')
+    args['final_virus_faa_file'] = os.path.join(args['viwrap_summary_outdir'], 'final_virus.faa')
+    args['final_virus_annotation_file'] = os.path.join(args['viwrap_summary_outdir'], 'final_virus.annotation.txt')
+    args['split_viral_gn_dir'] = os.path.join(args['viwrap_summary_outdir'], 'split_viral_gn_dir')
+    args['genome_by_genome_file'] = os.path.join(args['vcontact2_outdir'], 'genome_by_genome_overview.csv')
+    args['genus_cluster_info'] = os.path.join(args['out_dir'], 'Genus_cluster_info.txt')
+    args['species_cluster_info'] = os.path.join(args['out_dir'], 'Species_cluster_info.txt')
+    args['tax_refseq_output'] = os.path.join(args['out_dir'], 'tax_refseq_output.txt')
+    args['tax_vog_output'] = os.path.join(args['out_dir'], 'tax_vog_output.txt')
+    args['tax_vcontact2_output'] = os.path.join(args['out_dir'], 'tax_vcontact2_output.txt')
+    args['tax_classification_result'] = os.path.join(args['out_dir'], 'Tax_classification_result.txt')
+    
+def step_identify_virus(args):
     # Step 2 Run VIBRANT or VirSorter2 or DVF
     if args['identify_method'] == 'vb':
         time_current = f"[{str(datetime.now().replace(microsecond=0))}]"
         logger.info(f"{time_current} | Run VIBRANT to identify and annotate virus from input metagenome. In processing...")
     
-        os.system(f"conda run -p {os.path.join(args['conda_env_dir'], 'ViWrap-VIBRANT')} python {os.path.join(args['root_dir'],'scripts/run_VIBRANT.py')} {args['input_metagenome']} {args['out_dir']} {args['threads']} {args['virome']} {args['input_length_limit']} {args['db_dir']} >/dev/null 2>&1")
+        conda_launcher.run(os.path.join(args['conda_env_dir'], 'ViWrap-VIBRANT'), f"python {os.path.join(args['root_dir'],'scripts/run_VIBRANT.py')} {args['input_metagenome']} {args['out_dir']} {args['threads']} {args['virome']} {args['input_length_limit']} {args['db_dir']} >/dev/null")
         default_vibrant_outdir = os.path.join(args['out_dir'],f"VIBRANT_{Path(args['input_metagenome']).stem}")
-        os.system(f"mv {default_vibrant_outdir} {args['vibrant_outdir']}")
+        shutil.move(default_vibrant_outdir, args['vibrant_outdir'])
         scripts.module.parse_vibrant_lytic_and_lysogenic_info(args['vibrant_outdir'], Path(args['input_metagenome']).stem)
         final_vb_virus_fasta_file = os.path.join(args['vibrant_outdir'], 'final_vb_virus.fasta')
         final_vb_virus_ffn_file = os.path.join(args['vibrant_outdir'], 'final_vb_virus.ffn')
@@ -126,22 +124,22 @@ def main(args):
         time_current = f"[{str(datetime.now().replace(microsecond=0))}]"
         logger.info(f"{time_current} | Run VirSorter2 to identify viruses from input metagenome. Also plus CheckV to QC and trim, and KEGG, Pfam, and VOG HMMs to annotate viruses. In processing...")    
     
-        os.system(f"conda run -p {os.path.join(args['conda_env_dir'], 'ViWrap-vs2')} python {os.path.join(args['root_dir'],'scripts/run_VirSorter2_1st.py')} {args['input_metagenome']} {args['virsorter_outdir']} {args['threads']} {args['input_length_limit']} >/dev/null 2>&1")
+        conda_launcher.run(os.path.join(args['conda_env_dir'], 'ViWrap-vs2'), f"python {os.path.join(args['root_dir'],'scripts/run_VirSorter2_1st.py')} {args['input_metagenome']} {args['virsorter_outdir']} {args['threads']} {args['input_length_limit']} >/dev/null")
     
         time_current = f"[{str(datetime.now().replace(microsecond=0))}]"
         logger.info(f"{time_current} | Run VirSorter2 the 1st time to identify viruses from input metagenome. Finished")    
 
-        os.system(f"conda run -p {os.path.join(args['conda_env_dir'], 'ViWrap-CheckV')} python {os.path.join(args['root_dir'],'scripts/run_VirSorter2_CheckV_1st.py')} {args['virsorter_outdir']} {args['threads']} {args['CheckV_db']} >/dev/null 2>&1")
+        conda_launcher.run(os.path.join(args['conda_env_dir'], 'ViWrap-CheckV'), f"python {os.path.join(args['root_dir'],'scripts/run_VirSorter2_CheckV_1st.py')} {args['virsorter_outdir']} {args['threads']} {args['CheckV_db']} >/dev/null")
         
         time_current = f"[{str(datetime.now().replace(microsecond=0))}]"
         logger.info(f"{time_current} | Run CheckV the 1st time to QC and trim viruses identified from VirSorter2 1st run. Finished")   
         
-        os.system(f"conda run -p {os.path.join(args['conda_env_dir'], 'ViWrap-vs2')} python {os.path.join(args['root_dir'],'scripts/run_VirSorter2_2nd.py')} {args['virsorter_outdir']} {args['threads']} {args['input_length_limit']} >/dev/null 2>&1")
+        conda_launcher.run(os.path.join(args['conda_env_dir'], 'ViWrap-vs2'), f"python {os.path.join(args['root_dir'],'scripts/run_VirSorter2_2nd.py')} {args['virsorter_outdir']} {args['threads']} {args['input_length_limit']} >/dev/null")
     
         time_current = f"[{str(datetime.now().replace(microsecond=0))}]"
         logger.info(f"{time_current} | Run VirSorter2 the 2nd time for CheckV-trimmed sequences. Finished")    
 
-        os.system(f"conda run -p {os.path.join(args['conda_env_dir'], 'ViWrap-CheckV')} python {os.path.join(args['root_dir'],'scripts/run_VirSorter2_CheckV_2nd.py')} {args['virsorter_outdir']} {args['threads']} {args['CheckV_db']} >/dev/null 2>&1")
+        conda_launcher.run(os.path.join(args['conda_env_dir'], 'ViWrap-CheckV'), f"python {os.path.join(args['root_dir'],'scripts/run_VirSorter2_CheckV_2nd.py')} {args['virsorter_outdir']} {args['threads']} {args['CheckV_db']} >/dev/null")
         
         time_current = f"[{str(datetime.now().replace(microsecond=0))}]"
         logger.info(f"{time_current} | Run CheckV the 2nd time to get viral and host gene counts. Finished")
@@ -157,17 +155,17 @@ def main(args):
         scripts.module.get_keep2_mc_seq(args['virsorter_outdir'], keep2_list_file, manual_check_list_file, keep2_fasta, manual_check_fasta)
         
         if os.path.exists(keep2_fasta) and os.path.getsize(keep2_fasta) != 0:
-            os.system(f"conda run -p {os.path.join(args['conda_env_dir'], 'ViWrap-VIBRANT')} python {os.path.join(args['root_dir'],'scripts/run_VIBRANT.py')} {keep2_fasta} {args['virsorter_outdir']} {args['threads']} {args['virome']} {args['input_length_limit']} {args['db_dir']} >/dev/null 2>&1")
+            conda_launcher.run(os.path.join(args['conda_env_dir'], 'ViWrap-VIBRANT'), f"python {os.path.join(args['root_dir'],'scripts/run_VIBRANT.py')} {keep2_fasta} {args['virsorter_outdir']} {args['threads']} {args['virome']} {args['input_length_limit']} {args['db_dir']} >/dev/null")
             keep2_vb_result = os.path.join(args['virsorter_outdir'], 'VIBRANT_keep2/VIBRANT_phages_keep2/keep2.phages_combined.fna') 
             keep2_list_vb_passed_file = os.path.join(args['virsorter_outdir'], 'keep2_list_vb_passed.txt')
             scripts.module.get_keep2_vb_passed_list(args['virsorter_outdir'], keep2_vb_result, keep2_list_vb_passed_file)
-            os.system(f"rm -r {os.path.join(args['virsorter_outdir'], 'VIBRANT_keep2')}")
+            shutil.rmtree(os.path.join(args['virsorter_outdir'], 'VIBRANT_keep2'))
         if os.path.exists(manual_check_fasta) and os.path.getsize(manual_check_fasta) != 0:
-            os.system(f"conda run -p {os.path.join(args['conda_env_dir'], 'ViWrap-VIBRANT')} python {os.path.join(args['root_dir'],'scripts/run_VIBRANT.py')} {manual_check_fasta} {args['virsorter_outdir']} {args['threads']} {args['virome']} {args['input_length_limit']} {args['db_dir']} >/dev/null 2>&1")
+            conda_launcher.run(os.path.join(args['conda_env_dir'], 'ViWrap-VIBRANT'), f"python {os.path.join(args['root_dir'],'scripts/run_VIBRANT.py')} {manual_check_fasta} {args['virsorter_outdir']} {args['threads']} {args['virome']} {args['input_length_limit']} {args['db_dir']} >/dev/null")
             manual_check_vb_result = os.path.join(args['virsorter_outdir'], 'VIBRANT_manual_check/VIBRANT_phages_manual_check/manual_check.phages_combined.fna') 
             manual_check_list_vb_passed_file = os.path.join(args['virsorter_outdir'], 'manual_check_list_vb_passed.txt')
             scripts.module.get_manual_check_vb_passed_list(args['virsorter_outdir'], manual_check_vb_result, manual_check_list_vb_passed_file)
-            os.system(f"rm -r {os.path.join(args['virsorter_outdir'], 'VIBRANT_manual_check')}")            
+            shutil.rmtree(os.path.join(args['virsorter_outdir'], 'VIBRANT_manual_check'))            
 
         keep2_list_vb_passed_file = os.path.join(args['virsorter_outdir'], 'keep2_list_vb_passed.txt')
         manual_check_list_vb_passed_file = os.path.join(args['virsorter_outdir'], 'manual_check_list_vb_passed.txt')
@@ -178,212 +176,147 @@ def main(args):
         time_current = f"[{str(datetime.now().replace(microsecond=0))}]"
         logger.info(f"{time_current} | Run VIBRANT to check \"keep2\" and \"manual_check\" groups and get the final VirSorter2 virus sequences. Finished")  
 
-        os.system(f"conda run -p {os.path.join(args['conda_env_dir'], 'ViWrap-VIBRANT')} python {os.path.join(args['root_dir'],'scripts/run_annotate_by_VIBRANT_db.py')} {args['VIBRANT_db']} {args['identify_method']} {args['virsorter_outdir']} {args['dvf_outdir']} {args['out_dir']} {args['threads']}")
+        conda_launcher.run(os.path.join(args['conda_env_dir'], 'ViWrap-VIBRANT'), f"python {os.path.join(args['root_dir'],'scripts/run_annotate_by_VIBRANT_db.py')} {args['VIBRANT_db']} {args['identify_method']} {args['virsorter_outdir']} {args['dvf_outdir']} {args['out_dir']} {args['threads']}")
 
         time_current = f"[{str(datetime.now().replace(microsecond=0))}]"
         logger.info(f"{time_current} | Use KEGG, Pfam, and VOG HMMs to annotate viruses. Finished") 
         
     elif args['identify_method'] == 'dvf':
-        os.system(f"conda run -p {os.path.join(args['conda_env_dir'], 'ViWrap-DVF')} python {os.path.join(args['root_dir'],'scripts/run_DVF.py')} {args['input_metagenome']} {args['dvf_outdir']} {args['input_length_limit']} {args['DVF_db']} >/dev/null 2>&1")
+        conda_launcher.run(os.path.join(args['conda_env_dir'], 'ViWrap-DVF'), f"python {os.path.join(args['root_dir'],'scripts/run_DVF.py')} {args['input_metagenome']} {args['dvf_outdir']} {args['input_length_limit']} {args['DVF_db']} >/dev/null")
         final_dvf_virus_fasta_file = os.path.join(args['dvf_outdir'], 'final_dvf_virus.fasta')
         scripts.module.get_dvf_result_seq(args, args['dvf_outdir'], final_dvf_virus_fasta_file)
         
         time_current = f"[{str(datetime.now().replace(microsecond=0))}]"
         logger.info(f"{time_current} | Run DeepVirFinder to identify viruses from input metagenome. Finished")   
 
-        os.system(f"conda run -p {os.path.join(args['conda_env_dir'], 'ViWrap-VIBRANT')} python {os.path.join(args['root_dir'],'scripts/run_annotate_by_VIBRANT_db.py')} {args['VIBRANT_db']} {args['identify_method']} {args['virsorter_outdir']} {args['dvf_outdir']} {args['out_dir']} {args['threads']}") 
+        conda_launcher.run(os.path.join(args['conda_env_dir'], 'ViWrap-VIBRANT'), f"python {os.path.join(args['root_dir'],'scripts/run_annotate_by_VIBRANT_db.py')} {args['VIBRANT_db']} {args['identify_method']} {args['virsorter_outdir']} {args['dvf_outdir']} {args['out_dir']} {args['threads']}") 
         
         time_current = f"[{str(datetime.now().replace(microsecond=0))}]"
         logger.info(f"{time_current} | Use KEGG, Pfam, and VOG HMMs to annotate viruses. Finished") 
         
-    elif args['identify_method'] == 'vb-vs-dvf':
-        ## Set output folders
-        inner_vb_outdir = os.path.join(args['vb_vs_dvf_outdir'],f"VIBRANT_{Path(args['input_metagenome']).stem}")
-        inner_vs_outdir = os.path.join(args['vb_vs_dvf_outdir'],f"VirSorter_{Path(args['input_metagenome']).stem}")
-        inner_dvf_outdir = os.path.join(args['vb_vs_dvf_outdir'],f"DeepVirFinder_{Path(args['input_metagenome']).stem}")
-
-        ## Firstly, run VIBRANT 
-        
-        time_current = f"[{str(datetime.now().replace(microsecond=0))}]"
-        logger.info(f"{time_current} | Run VIBRANT-VirSorter2-DVF method. Run VIBRANT to identify and annotate virus from input metagenome. In processing...")
-        os.system(f"conda run -p {os.path.join(args['conda_env_dir'], 'ViWrap-VIBRANT')} python {os.path.join(args['root_dir'],'scripts/run_VIBRANT.py')} {args['input_metagenome']} {args['vb_vs_dvf_outdir']} {args['threads']} {args['virome']} {args['input_length_limit']} {args['db_dir']} >/dev/null 2>&1")
-        scripts.module.parse_vibrant_lytic_and_lysogenic_info(inner_vb_outdir, Path(args['input_metagenome']).stem)
-        time_current = f"[{str(datetime.now().replace(microsecond=0))}]"
-        logger.info(f"{time_current} | Run VIBRANT-VirSorter2-DVF method. Run VIBRANT to identify and annotate viruses from input metagenome. Finished") 
-        
-        ## Secondly, run VirSorter2
-        time_current = f"[{str(datetime.now().replace(microsecond=0))}]"
-        logger.info(f"{time_current} | Run VIBRANT-VirSorter2-DVF method. Run VirSorter2 to identify viruses from input metagenome. Also plus CheckV to QC and trim, and KEGG, Pfam, and VOG HMMs to annotate viruses. In processing...")    
-    
-        os.system(f"conda run -p {os.path.join(args['conda_env_dir'], 'ViWrap-vs2')} python {os.path.join(args['root_dir'],'scripts/run_VirSorter2_1st.py')} {args['input_metagenome']} {inner_vs_outdir} {args['threads']} {args['input_length_limit']} >/dev/null 2>&1")
+    else:
+        sys.exit(f"Please make sure your input for --identify_method option is one of these: \"vb-vs\", \"vb-vs-dvf\", \"vb\", \"vs\", and \"dvf\"; you can also omit this in the command line, the default is \"vb\"")
     
-        time_current = f"[{str(datetime.now().replace(microsecond=0))}]"
-        logger.info(f"{time_current} | Run VIBRANT-VirSorter2-DVF method. Run VirSorter2 the 1st time to identify viruses from input metagenome. Finished")    
 
-        os.system(f"conda run -p {os.path.join(args['conda_env_dir'], 'ViWrap-CheckV')} python {os.path.join(args['root_dir'],'scripts/run_VirSorter2_CheckV_1st.py')} {inner_vs_outdir} {args['threads']} {args['CheckV_db']} >/dev/null 2>&1")
-        
-        time_current = f"[{str(datetime.now().replace(microsecond=0))}]"
-        logger.info(f"{time_current} | Run VIBRANT-VirSorter2-DVF method. Run CheckV the 1st time to QC and trim viruses identified from VirSorter2 1st run. Finished")   
-        
-        os.system(f"conda run -p {os.path.join(args['conda_env_dir'], 'ViWrap-vs2')} python {os.path.join(args['root_dir'],'scripts/run_VirSorter2_2nd.py')} {inner_vs_outdir} {args['threads']} {args['input_length_limit']} >/dev/null 2>&1")
+def step_identify_virus_by_VIBRANT(args, threads):
+    # Step 2 Run VIBRANT-VirSorter2(-DVF) method; the VIBRANT, VirSorter2, and DVF branches are independent until the overlap step, so they run at the same time
+    method_name = identify_method2name[args['identify_method']]
+    os.makedirs(args['identify_outdir'], exist_ok = True) # Each branch makes the shared outdir if it is not there yet
     
-        time_current = f"[{str(datetime.now().replace(microsecond=0))}]"
-        logger.info(f"{time_current} | Run VIBRANT-VirSorter2-DVF method. Run VirSorter2 the 2nd time for CheckV-trimmed sequences. Finished")    
-
-        os.system(f"conda run -p {os.path.join(args['conda_env_dir'], 'ViWrap-CheckV')} python {os.path.join(args['root_dir'],'scripts/run_VirSorter2_CheckV_2nd.py')} {inner_vs_outdir} {args['threads']} {args['CheckV_db']} >/dev/null 2>&1")
-        
-        time_current = f"[{str(datetime.now().replace(microsecond=0))}]"
-        logger.info(f"{time_current} | Run VIBRANT-VirSorter2-DVF method. Run CheckV the 2nd time to get viral and host gene counts. Finished")
+    time_current = f"[{str(datetime.now().replace(microsecond=0))}]"
+    logger.info(f"{time_current} | Run {method_name} method. Run VIBRANT to identify and annotate virus from input metagenome. In processing...")
+    conda_launcher.run(os.path.join(args['conda_env_dir'], 'ViWrap-VIBRANT'), f"python {os.path.join(args['root_dir'],'scripts/run_VIBRANT.py')} {args['input_metagenome']} {args['identify_outdir']} {threads} {args['virome']} {args['input_length_limit']} {args['db_dir']} >/dev/null")
+    scripts.module.parse_vibrant_lytic_and_lysogenic_info(args['inner_vb_outdir'], Path(args['input_metagenome']).stem)
+    time_current = f"[{str(datetime.now().replace(microsecond=0))}]"
+    logger.info(f"{time_current} | Run {method_name} method. Run VIBRANT to identify and annotate viruses from input metagenome. Finished")
 
-        keep1_list_file = os.path.join(inner_vs_outdir, 'keep1_list.txt')
-        keep2_list_file = os.path.join(inner_vs_outdir, 'keep2_list.txt')
-        discard_list_file = os.path.join(inner_vs_outdir, 'discard_list.txt')
-        manual_check_list_file = os.path.join(inner_vs_outdir, 'manual_check_list.txt')
-        scripts.module.screen_virsorter2_result(inner_vs_outdir, keep1_list_file, keep2_list_file, discard_list_file, manual_check_list_file)
-        
-        keep2_fasta = os.path.join(inner_vs_outdir, 'keep2.fasta')
-        manual_check_fasta = os.path.join(inner_vs_outdir, 'manual_check.fasta')
-        scripts.module.get_keep2_mc_seq(inner_vs_outdir, keep2_list_file, manual_check_list_file, keep2_fasta, manual_check_fasta)
-        
-        if os.path.exists(keep2_fasta) and os.path.getsize(keep2_fasta) != 0:
-            os.system(f"conda run -p {os.path.join(args['conda_env_dir'], 'ViWrap-VIBRANT')} python {os.path.join(args['root_dir'],'scripts/run_VIBRANT.py')} {keep2_fasta} {inner_vs_outdir} {args['threads']} {args['virome']} {args['input_length_limit']} {args['db_dir']} >/dev/null 2>&1")
-            keep2_vb_result = os.path.join(inner_vs_outdir, 'VIBRANT_keep2/VIBRANT_phages_keep2/keep2.phages_combined.fna') 
-            keep2_list_vb_passed_file = os.path.join(inner_vs_outdir, 'keep2_list_vb_passed.txt')
-            scripts.module.get_keep2_vb_passed_list(inner_vs_outdir, keep2_vb_result, keep2_list_vb_passed_file)
-            os.system(f"rm -r {os.path.join(inner_vs_outdir, 'VIBRANT_keep2')}")
-        if os.path.exists(manual_check_fasta) and os.path.getsize(manual_check_fasta) != 0:
-            os.system(f"conda run -p {os.path.join(args['conda_env_dir'], 'ViWrap-VIBRANT')} python {os.path.join(args['root_dir'],'scripts/run_VIBRANT.py')} {manual_check_fasta} {inner_vs_outdir} {args['threads']} {args['virome']} {args['input_length_limit']} {args['db_dir']} >/dev/null 2>&1")
-            manual_check_vb_result = os.path.join(inner_vs_outdir, 'VIBRANT_manual_check/VIBRANT_phages_manual_check/manual_check.phages_combined.fna') 
-            manual_check_list_vb_passed_file = os.path.join(inner_vs_outdir, 'manual_check_list_vb_passed.txt')
-            scripts.module.get_manual_check_vb_passed_list(inner_vs_outdir, manual_check_vb_result, manual_check_list_vb_passed_file)
-            os.system(f"rm -r {os.path.join(inner_vs_outdir, 'VIBRANT_manual_check')}")            
-
-        keep2_list_vb_passed_file = os.path.join(inner_vs_outdir, 'keep2_list_vb_passed.txt')
-        manual_check_list_vb_passed_file = os.path.join(inner_vs_outdir, 'manual_check_list_vb_passed.txt')
-        final_vs2_virus_fasta_file = os.path.join(inner_vs_outdir, 'final_vs2_virus.fasta')
-        scripts.module.get_final_vs2_virus(inner_vs_outdir, keep1_list_file, keep2_list_vb_passed_file, manual_check_list_vb_passed_file, final_vs2_virus_fasta_file)
-        
-        time_current = f"[{str(datetime.now().replace(microsecond=0))}]"
-        logger.info(f"{time_current} | Run VIBRANT-VirSorter2-DVF method. Run VIBRANT to check \"keep2\" and \"manual_check\" groups and get the final VirSorter2 virus sequences. Finished")  
-       
-        ## Thirdly, run DVF
-        os.system(f"conda run -p {os.path.join(args['conda_env_dir'], 'ViWrap-DVF')} python {os.path.join(args['root_dir'],'scripts/run_DVF.py')} {args['input_metagenome']} {inner_dvf_outdir} {args['input_length_limit']} {args['DVF_db']} >/dev/null 2>&1")
-        final_dvf_virus_fasta_file = os.path.join(inner_dvf_outdir, 'final_dvf_virus.fasta')
-        scripts.module.get_dvf_result_seq(args, inner_dvf_outdir, final_dvf_virus_fasta_file)
-        
-        time_current = f"[{str(datetime.now().replace(microsecond=0))}]"
-        logger.info(f"{time_current} | Run VIBRANT-VirSorter2-DVF method. Run DeepVirFinder to identify viruses from input metagenome. Finished")   
-
-        ## Fourly, get the overlapped result
-        overlap_outdir = os.path.join(args['vb_vs_dvf_outdir'],f"Overlap_{Path(args['input_metagenome']).stem}")
-        final_vb_virus_fasta_file = os.path.join(inner_vb_outdir, f"VIBRANT_phages_{Path(args['input_metagenome']).stem}", f"{Path(args['input_metagenome']).stem}.phages_combined.fna")
-        final_vs2_virus_fasta_file = os.path.join(inner_vs_outdir, 'final_vs2_virus.fasta')
-        final_dvf_virus_fasta_file = os.path.join(inner_dvf_outdir, 'final_dvf_virus.fasta')
-        final_vb_virus_annotation_file = os.path.join(inner_vb_outdir, f"VIBRANT_results_{Path(args['input_metagenome']).stem}", f"VIBRANT_annotations_{Path(args['input_metagenome']).stem}.tsv")
-        scripts.module.get_overlapped_viral_scaffolds(final_vb_virus_fasta_file, final_vs2_virus_fasta_file, final_dvf_virus_fasta_file, final_vb_virus_annotation_file, overlap_outdir)
-        
-    elif args['identify_method'] == 'vb-vs':
-        ## Set output folders
-        inner_vb_outdir = os.path.join(args['vb_vs_outdir'],f"VIBRANT_{Path(args['input_metagenome']).stem}")
-        inner_vs_outdir = os.path.join(args['vb_vs_outdir'],f"VirSorter_{Path(args['input_metagenome']).stem}")
-        
-        ## Firstly, run VIBRANT 
-        time_current = f"[{str(datetime.now().replace(microsecond=0))}]"
-        logger.info(f"{time_current} | Run VIBRANT-VirSorter2 method. Run VIBRANT to identify and annotate virus from input metagenome. In processing...")
-        os.system(f"conda run -p {os.path.join(args['conda_env_dir'], 'ViWrap-VIBRANT')} python {os.path.join(args['root_dir'],'scripts/run_VIBRANT.py')} {args['input_metagenome']} {args['vb_vs_outdir']} {args['threads']} {args['virome']} {args['input_length_limit']} {args['db_dir']} >/dev/null 2>&1")
-        scripts.module.parse_vibrant_lytic_and_lysogenic_info(inner_vb_outdir, Path(args['input_metagenome']).stem)
-        time_current = f"[{str(datetime.now().replace(microsecond=0))}]"
-        logger.info(f"{time_current} | Run VIBRANT-VirSorter2 method. Run VIBRANT to identify and annotate viruses from input metagenome. Finished") 
-        
-        ## Secondly, run VirSorter2
-        time_current = f"[{str(datetime.now().replace(microsecond=0))}]"
-        logger.info(f"{time_current} | Run VIBRANT-VirSorter2 method. Run VirSorter2 to identify viruses from input metagenome. Also plus CheckV to QC and trim, and KEGG, Pfam, and VOG HMMs to annotate viruses. In processing...")    
+def step_identify_virus_by_VirSorter2(args, threads):
+    method_name = identify_method2name[args['identify_method']]
+    os.makedirs(args['identify_outdir'], exist_ok = True)
     
-        os.system(f"conda run -p {os.path.join(args['conda_env_dir'], 'ViWrap-vs2')} python {os.path.join(args['root_dir'],'scripts/run_VirSorter2_1st.py')} {args['input_metagenome']} {inner_vs_outdir} {args['threads']} {args['input_length_limit']} >/dev/null 2>&1")
+    time_current = f"[{str(datetime.now().replace(microsecond=0))}]"
+    logger.info(f"{time_current} | Run {method_name} method. Run VirSorter2 to identify viruses from input metagenome. Also plus CheckV to QC and trim, and KEGG, Pfam, and VOG HMMs to annotate viruses. In processing...")    
     
-        time_current = f"[{str(datetime.now().replace(microsecond=0))}]"
-        logger.info(f"{time_current} | Run VIBRANT-VirSorter2 method. Run VirSorter2 the 1st time to identify viruses from input metagenome. Finished")    
-
-        os.system(f"conda run -p {os.path.join(args['conda_env_dir'], 'ViWrap-CheckV')} python {os.path.join(args['root_dir'],'scripts/run_VirSorter2_CheckV_1st.py')} {inner_vs_outdir} {args['threads']} {args['CheckV_db']} >/dev/null 2>&1")
-        
-        time_current = f"[{str(datetime.now().replace(microsecond=0))}]"
-        logger.info(f"{time_current} | Run VIBRANT-VirSorter2 method. Run CheckV the 1st time to QC and trim viruses identified from VirSorter2 1st run. Finished")   
-        
-        os.system(f"conda run -p {os.path.join(args['conda_env_dir'], 'ViWrap-vs2')} python {os.path.join(args['root_dir'],'scripts/run_VirSorter2_2nd.py')} {inner_vs_outdir} {args['threads']} {args['input_length_limit']} >/dev/null 2>&1")
+    conda_launcher.run(os.path.join(args['conda_env_dir'], 'ViWrap-vs2'), f"python {os.path.join(args['root_dir'],'scripts/run_VirSorter2_1st.py')} {args['input_metagenome']} {args['inner_vs_outdir']} {threads} {args['input_length_limit']} >/dev/null")
     
-        time_current = f"[{str(datetime.now().replace(microsecond=0))}]"
-        logger.info(f"{time_current} | Run VIBRANT-VirSorter2 method. Run VirSorter2 the 2nd time for CheckV-trimmed sequences. Finished")    
-
-        os.system(f"conda run -p {os.path.join(args['conda_env_dir'], 'ViWrap-CheckV')} python {os.path.join(args['root_dir'],'scripts/run_VirSorter2_CheckV_2nd.py')} {inner_vs_outdir} {args['threads']} {args['CheckV_db']} >/dev/null 2>&1")
-        
-        time_current = f"[{str(datetime.now().replace(microsecond=0))}]"
-        logger.info(f"{time_current} | Run VIBRANT-VirSorter2 method. Run CheckV the 2nd time to get viral and host gene counts. Finished")
-
-        keep1_list_file = os.path.join(inner_vs_outdir, 'keep1_list.txt')
-        keep2_list_file = os.path.join(inner_vs_outdir, 'keep2_list.txt')
-        discard_list_file = os.path.join(inner_vs_outdir, 'discard_list.txt')
-        manual_check_list_file = os.path.join(inner_vs_outdir, 'manual_check_list.txt')
-        scripts.module.screen_virsorter2_result(inner_vs_outdir, keep1_list_file, keep2_list_file, discard_list_file, manual_check_list_file)
-        
-        keep2_fasta = os.path.join(inner_vs_outdir, 'keep2.fasta')
-        manual_check_fasta = os.path.join(inner_vs_outdir, 'manual_check.fasta')
-        scripts.module.get_keep2_mc_seq(inner_vs_outdir, keep2_list_file, manual_check_list_file, keep2_fasta, manual_check_fasta)
-        
-        if os.path.exists(keep2_fasta) and os.path.getsize(keep2_fasta) != 0:
-            os.system(f"conda run -p {os.path.join(args['conda_env_dir'], 'ViWrap-VIBRANT')} python {os.path.join(args['root_dir'],'scripts/run_VIBRANT.py')} {keep2_fasta} {inner_vs_outdir} {args['threads']} {args['virome']} {args['input_length_limit']} {args['db_dir']} >/dev/null 2>&1")
-            keep2_vb_result = os.path.join(inner_vs_outdir, 'VIBRANT_keep2/VIBRANT_phages_keep2/keep2.phages_combined.fna') 
-            keep2_list_vb_passed_file = os.path.join(inner_vs_outdir, 'keep2_list_vb_passed.txt')
-            scripts.module.get_keep2_vb_passed_list(inner_vs_outdir, keep2_vb_result, keep2_list_vb_passed_file)
-            os.system(f"rm -r {os.path.join(inner_vs_outdir, 'VIBRANT_keep2')}")
-        if os.path.exists(manual_check_fasta) and os.path.getsize(manual_check_fasta) != 0:
-            os.system(f"conda run -p {os.path.join(args['conda_env_dir'], 'ViWrap-VIBRANT')} python {os.path.join(args['root_dir'],'scripts/run_VIBRANT.py')} {manual_check_fasta} {inner_vs_outdir} {args['threads']} {args['virome']} {args['input_length_limit']} {args['db_dir']} >/dev/null 2>&1")
-            manual_check_vb_result = os.path.join(inner_vs_outdir, 'VIBRANT_manual_check/VIBRANT_phages_manual_check/manual_check.phages_combined.fna') 
-            manual_check_list_vb_passed_file = os.path.join(inner_vs_outdir, 'manual_check_list_vb_passed.txt')
-            scripts.module.get_manual_check_vb_passed_list(inner_vs_outdir, manual_check_vb_result, manual_check_list_vb_passed_file)
-            os.system(f"rm -r {os.path.join(inner_vs_outdir, 'VIBRANT_manual_check')}")            
-
-        keep2_list_vb_passed_file = os.path.join(inner_vs_outdir, 'keep2_list_vb_passed.txt')
-        manual_check_list_vb_passed_file = os.path.join(inner_vs_outdir, 'manual_check_list_vb_passed.txt')
-        final_vs2_virus_fasta_file = os.path.join(inner_vs_outdir, 'final_vs2_virus.fasta')
-        scripts.module.get_final_vs2_virus(inner_vs_outdir, keep1_list_file, keep2_list_vb_passed_file, manual_check_list_vb_passed_file, final_vs2_virus_fasta_file)
-        
-        time_current = f"[{str(datetime.now().replace(microsecond=0))}]"
-        logger.info(f"{time_current} | Run VIBRANT-VirSorter2 method. Run VIBRANT to check \"keep2\" and \"manual_check\" groups and get the final VirSorter2 virus sequences. Finished")  
-                  
-        ## Thirdly, get the overlapped result
-        overlap_outdir = os.path.join(args['vb_vs_outdir'],f"Overlap_{Path(args['input_metagenome']).stem}")
-        final_vb_virus_fasta_file = os.path.join(inner_vb_outdir, f"VIBRANT_phages_{Path(args['input_metagenome']).stem}", f"{Path(args['input_metagenome']).stem}.phages_combined.fna")
-        final_vs2_virus_fasta_file = os.path.join(inner_vs_outdir, 'final_vs2_virus.fasta')
-        final_vb_virus_annotation_file = os.path.join(inner_vb_outdir, f"VIBRANT_results_{Path(args['input_metagenome']).stem}", f"VIBRANT_annotations_{Path(args['input_metagenome']).stem}.tsv")
-        scripts.module.get_overlapped_viral_scaffolds(final_vb_virus_fasta_file, final_vs2_virus_fasta_file, '', final_vb_virus_annotation_file, overlap_outdir)
+    time_current = f"[{str(datetime.now().replace(microsecond=0))}]"
+    logger.info(f"{time_current} | Run {method_name} method. Run VirSorter2 the 1st time to identify viruses from input metagenome. Finished")    
     
-    else:
-        sys.exit(f"Please make sure your input for --identify_method option is one of these: \"vb-vs\", \"vb-vs-dvf\", \"vb\", \"vs\", and \"dvf\"; you can also omit this in the command line, the default is \"vb\"")
+    conda_launcher.run(os.path.join(args['conda_env_dir'], 'ViWrap-CheckV'), f"python {os.path.join(args['root_dir'],'scripts/run_VirSorter2_CheckV_1st.py')} {args['inner_vs_outdir']} {threads} {args['CheckV_db']} >/dev/null")
     
-
-    # Step 3 Run vContact2
     time_current = f"[{str(datetime.now().replace(microsecond=0))}]"
-    logger.info(f"{time_current} | Run vContact2 to cluster viral genomes. In processing...")    
+    logger.info(f"{time_current} | Run {method_name} method. Run CheckV the 1st time to QC and trim viruses identified from VirSorter2 1st run. Finished")   
+    
+    conda_launcher.run(os.path.join(args['conda_env_dir'], 'ViWrap-vs2'), f"python {os.path.join(args['root_dir'],'scripts/run_VirSorter2_2nd.py')} {args['inner_vs_outdir']} {threads} {args['input_length_limit']} >/dev/null")
     
+    time_current = f"[{str(datetime.now().replace(microsecond=0))}]"
+    logger.info(f"{time_current} | Run {method_name} method. Run VirSorter2 the 2nd time for CheckV-trimmed sequences. Finished")    
+    
+    conda_launcher.run(os.path.join(args['conda_env_dir'], 'ViWrap-CheckV'), f"python {os.path.join(args['root_dir'],'scripts/run_VirSorter2_CheckV_2nd.py')} {args['inner_vs_outdir']} {threads} {args['CheckV_db']} >/dev/null")
+    
+    time_current = f"[{str(datetime.now().replace(microsecond=0))}]"
+    logger.info(f"{time_current} | Run {method_name} method. Run CheckV the 2nd time to get viral and host gene counts. Finished")
+    
+    keep1_list_file = os.path.join(args['inner_vs_outdir'], 'keep1_list.txt')
+    keep2_list_file = os.path.join(args['inner_vs_outdir'], 'keep2_list.txt')
+    discard_list_file = os.path.join(args['inner_vs_outdir'], 'discard_list.txt')
+    manual_check_list_file = os.path.join(args['inner_vs_outdir'], 'manual_check_list.txt')
+    scripts.module.screen_virsorter2_result(args['inner_vs_outdir'], keep1_list_file, keep2_list_file, discard_list_file, manual_check_list_file)
+    
+    keep2_fasta = os.path.join(args['inner_vs_outdir'], 'keep2.fasta')
+    manual_check_fasta = os.path.join(args['inner_vs_outdir'], 'manual_check.fasta')
+    scripts.module.get_keep2_mc_seq(args['inner_vs_outdir'], keep2_list_file, manual_check_list_file, keep2_fasta, manual_check_fasta)
+    
+    if os.path.exists(keep2_fasta) and os.path.getsize(keep2_fasta) != 0:
+        conda_launcher.run(os.path.join(args['conda_env_dir'], 'ViWrap-VIBRANT'), f"python {os.path.join(args['root_dir'],'scripts/run_VIBRANT.py')} {keep2_fasta} {args['inner_vs_outdir']} {threads} {args['virome']} {args['input_length_limit']} {args['db_dir']} >/dev/null")
+        keep2_vb_result = os.path.join(args['inner_vs_outdir'], 'VIBRANT_keep2/VIBRANT_phages_keep2/keep2.phages_combined.fna') 
+        keep2_list_vb_passed_file = os.path.join(args['inner_vs_outdir'], 'keep2_list_vb_passed.txt')
+        scripts.module.get_keep2_vb_passed_list(args['inner_vs_outdir'], keep2_vb_result, keep2_list_vb_passed_file)
+        shutil.rmtree(os.path.join(args['inner_vs_outdir'], 'VIBRANT_keep2'))
+    if os.path.exists(manual_check_fasta) and os.path.getsize(manual_check_fasta) != 0:
+        conda_launcher.run(os.path.join(args['conda_env_dir'], 'ViWrap-VIBRANT'), f"python {os.path.join(args['root_dir'],'scripts/run_VIBRANT.py')} {manual_check_fasta} {args['inner_vs_outdir']} {threads} {args['virome']} {args['input_length_limit']} {args['db_dir']} >/dev/null")
+        manual_check_vb_result = os.path.join(args['inner_vs_outdir'], 'VIBRANT_manual_check/VIBRANT_phages_manual_check/manual_check.phages_combined.fna') 
+        manual_check_list_vb_passed_file = os.path.join(args['inner_vs_outdir'], 'manual_check_list_vb_passed.txt')
+        scripts.module.get_manual_check_vb_passed_list(args['inner_vs_outdir'], manual_check_vb_result, manual_check_list_vb_passed_file)
+        shutil.rmtree(os.path.join(args['inner_vs_outdir'], 'VIBRANT_manual_check'))    
+    
+    keep2_list_vb_passed_file = os.path.join(args['inner_vs_outdir'], 'keep2_list_vb_passed.txt')
+    manual_check_list_vb_passed_file = os.path.join(args['inner_vs_outdir'], 'manual_check_list_vb_passed.txt')
+    final_vs2_virus_fasta_file = os.path.join(args['inner_vs_outdir'], 'final_vs2_virus.fasta')
+    scripts.module.get_final_vs2_virus(args['inner_vs_outdir'], keep1_list_file, keep2_list_vb_passed_file, manual_check_list_vb_passed_file, final_vs2_virus_fasta_file)
+    
+    time_current = f"[{str(datetime.now().replace(microsecond=0))}]"
+    logger.info(f"{time_current} | Run {method_name} method. Run VIBRANT to check \"keep2\" and \"manual_check\" groups and get the final VirSorter2 virus sequences. Finished")
+
+def step_identify_virus_by_DVF(args):
+    # DeepVirFinder has no threads option
+    method_name = identify_method2name[args['identify_method']]
+    os.makedirs(args['identify_outdir'], exist_ok = True)
+    
+    conda_launcher.run(os.path.join(args['conda_env_dir'], 'ViWrap-DVF'), f"python {os.path.join(args['root_dir'],'scripts/run_DVF.py')} {args['input_metagenome']} {args['inner_dvf_outdir']} {args['input_length_limit']} {args['DVF_db']} >/dev/null")
+    final_dvf_virus_fasta_file = os.path.join(args['inner_dvf_outdir'], 'final_dvf_virus.fasta')
+    scripts.module.get_dvf_result_seq(args, args['inner_dvf_outdir'], final_dvf_virus_fasta_file)
+    
+    time_current = f"[{str(datetime.now().replace(microsecond=0))}]"
+    logger.info(f"{time_current} | Run {method_name} method. Run DeepVirFinder to identify viruses from input metagenome. Finished")   
+
+def step_get_overlapped_viral_scaffolds(args):
+    # Get the overlapped result once all branches are finished
+    final_vb_virus_fasta_file = os.path.join(args['inner_vb_outdir'], f"VIBRANT_phages_{Path(args['input_metagenome']).stem}", f"{Path(args['input_metagenome']).stem}.phages_combined.fna")
+    final_vs2_virus_fasta_file = os.path.join(args['inner_vs_outdir'], 'final_vs2_virus.fasta')
+    final_dvf_virus_fasta_file = ''
+    if args['inner_dvf_outdir']:
+        final_dvf_virus_fasta_file = os.path.join(args['inner_dvf_outdir'], 'final_dvf_virus.fasta')
+    final_vb_virus_annotation_file = os.path.join(args['inner_vb_outdir'], f"VIBRANT_results_{Path(args['input_metagenome']).stem}", f"VIBRANT_annotations_{Path(args['input_metagenome']).stem}.tsv")
+    scripts.module.get_overlapped_viral_scaffolds(final_vb_virus_fasta_file, final_vs2_virus_fasta_file, final_dvf_virus_fasta_file, final_vb_virus_annotation_file, args['overlap_outdir'])
+
+def step_get_virus_genome_files(args):
     ## Step 3.1 Get the virus genome files and annotation file 
     os.mkdir(args['viwrap_summary_outdir']) 
     scripts.module.move_virus_genome_files_and_annotation_file(args)    
     
-    ## Step 3.2 Prepare pro2viral_gn map file
+    ## Step 3.2 Make the viral id registry and prepare pro2viral_gn map file
+    id_registry.build_id_registry_from_single_scf_gns(args['id_registry_dir'], os.path.join(args['viwrap_summary_outdir'], 'final_virus.fasta'), os.path.join(args['viwrap_summary_outdir'], 'final_virus.faa'))
+
+def step_run_vContact2(args):
+    # Step 3 Run vContact2
+    time_current = f"[{str(datetime.now().replace(microsecond=0))}]"
+    logger.info(f"{time_current} | Run vContact2 to cluster viral genomes. In processing...")    
+    ## Step 3.2 Prepare pro2viral_gn map file (the viral id registry has been made with the virus genome files)
     pro2viral_gn_map = os.path.join(args['out_dir'], 'pro2viral_gn_map.csv')
     scripts.module.get_pro2viral_gn_map_for_wo_reads(args, pro2viral_gn_map)
 
     ## Step 3.3 Run vContact2
     cluster_one_jar = os.path.join(args['conda_env_dir'], 'ViWrap-vContact2/bin/cluster_one-1.0.jar')
-    os.system(f"conda run -p {os.path.join(args['conda_env_dir'], 'ViWrap-vContact2')} python {os.path.join(args['root_dir'],'scripts/run_vContact2.py')} {os.path.join(args['viwrap_summary_outdir'],'final_virus.faa')} {pro2viral_gn_map} {args['Tax_classification_db']} {cluster_one_jar} {args['vcontact2_outdir']} {args['threads']} >/dev/null 2>&1")
-    os.system(f"mv {os.path.join(args['viwrap_summary_outdir'], 'combined_viral_faa.faa')} {os.path.join(args['vcontact2_outdir'], 'combined_viral_faa.faa')}")
-    os.system(f"mv {os.path.join(args['viwrap_summary_outdir'], 'combined_pro2viral_gn_map.csv')} {os.path.join(args['vcontact2_outdir'], 'combined_pro2viral_gn_map.csv')}")
-    os.system(f"mv {os.path.join(args['out_dir'], 'pro2viral_gn_map.csv')} {os.path.join(args['vcontact2_outdir'], 'pro2viral_gn_map.csv')}")
+    conda_launcher.run(os.path.join(args['conda_env_dir'], 'ViWrap-vContact2'), f"python {os.path.join(args['root_dir'],'scripts/run_vContact2.py')} {os.path.join(args['viwrap_summary_outdir'],'final_virus.faa')} {pro2viral_gn_map} {args['Tax_classification_db']} {cluster_one_jar} {args['vcontact2_outdir']} {args['threads']} >/dev/null")
+    shutil.move(os.path.join(args['viwrap_summary_outdir'], 'combined_viral_faa.faa'), os.path.join(args['vcontact2_outdir'], 'combined_viral_faa.faa'))
+    shutil.move(os.path.join(args['viwrap_summary_outdir'], 'combined_pro2viral_gn_map.csv'), os.path.join(args['vcontact2_outdir'], 'combined_pro2viral_gn_map.csv'))
+    shutil.move(os.path.join(args['out_dir'], 'pro2viral_gn_map.csv'), os.path.join(args['vcontact2_outdir'], 'pro2viral_gn_map.csv'))
     pro2viral_gn_map = os.path.join(args['vcontact2_outdir'], 'pro2viral_gn_map.csv')
 
     ## Step 3.4 Write down genus cluster info
-    genome_by_genome_file = os.path.join(args['vcontact2_outdir'], 'genome_by_genome_overview.csv')
-    genus_cluster_info = os.path.join(args['out_dir'], 'Genus_cluster_info.txt')
+    genome_by_genome_file = args['genome_by_genome_file']
+    genus_cluster_info = args['genus_cluster_info']
     ref_pro2viral_gn_map = os.path.join(args['Tax_classification_db'], 'IMGVR_high-quality_phage_vOTU_representatives_pro2viral_gn_map.csv')
     scripts.module.get_genus_cluster_info(genome_by_genome_file, genus_cluster_info, ref_pro2viral_gn_map) 
  
@@ -391,17 +324,21 @@ def main(args):
     logger.info(f"{time_current} | Run vContact2 to cluster viral genomes. Finished")   
     
     
+def step_split_viral_gn(args):
     # Step 4 Run CheckV
     time_current = f"[{str(datetime.now().replace(microsecond=0))}]"
     logger.info(f"{time_current} | Run CheckV to evaluate virus genome quality. In processing...") 
 
     ## Step 4.1 Make temporary folder to contain split viral genomes
-    final_virus_fasta_file = os.path.join(args['viwrap_summary_outdir'], 'final_virus.fasta')
-    split_viral_gn_dir = os.path.join(args['viwrap_summary_outdir'], 'split_viral_gn_dir')
-    scripts.module.get_split_viral_gn(final_virus_fasta_file, split_viral_gn_dir)    
+    final_virus_fasta_file = args['final_virus_fasta_file']
+    split_viral_gn_dir = args['split_viral_gn_dir']
+    scripts.module.get_split_viral_gn(final_virus_fasta_file, split_viral_gn_dir, int(args['max_gn_per_dir']))    
+
+def step_run_CheckV(args):
+    split_viral_gn_dir = args['split_viral_gn_dir']
 
     ## Step 4.2 Run CheckV in parallel and parse the result
-    os.system(f"conda run -p {os.path.join(args['conda_env_dir'], 'ViWrap-CheckV')} python {os.path.join(args['root_dir'],'scripts/run_CheckV.py')} {split_viral_gn_dir} {args['checkv_outdir']} {args['threads']} {args['CheckV_db']} >/dev/null 2>&1")
+    conda_launcher.run(os.path.join(args['conda_env_dir'], 'ViWrap-CheckV'), f"python {os.path.join(args['root_dir'],'scripts/run_CheckV.py')} {split_viral_gn_dir} {args['checkv_outdir']} {args['threads']} {args['CheckV_db']} >/dev/null")
     CheckV_quality_summary = os.path.join(args['checkv_outdir'], 'CheckV_quality_summary.txt')
     scripts.module.parse_checkv_result(args['checkv_outdir'], CheckV_quality_summary)   
 
@@ -409,6 +346,10 @@ def main(args):
     logger.info(f"{time_current} | Run CheckV to evaluate virus genome quality. Finished")
     
     
+def step_run_dRep(args):
+    split_viral_gn_dir = args['split_viral_gn_dir']
+    genus_cluster_info = args['genus_cluster_info']
+
     # Step 5 Run dRep to get viral species
     time_current = f"[{str(datetime.now().replace(microsecond=0))}]"
     logger.info(f"{time_current} | Run dRep to cluster virus species. In processing...") 
@@ -418,63 +359,89 @@ def main(args):
 
     ## Step 5.2 Run dRep
     viral_genus_genome_list_dir = os.path.join(args['drep_outdir'], 'viral_genus_genome_list')
-    os.system(f"conda run -p {os.path.join(args['conda_env_dir'], 'ViWrap-dRep')} python {os.path.join(args['root_dir'],'scripts/run_dRep.py')} {args['drep_outdir']} {viral_genus_genome_list_dir} {args['threads']} 2000 >/dev/null 2>&1")
-    species_cluster_info = os.path.join(args['out_dir'], 'Species_cluster_info.txt')
+    conda_launcher.run(os.path.join(args['conda_env_dir'], 'ViWrap-dRep'), f"python {os.path.join(args['root_dir'],'scripts/run_dRep.py')} {args['drep_outdir']} {viral_genus_genome_list_dir} {args['threads']} 2000 >/dev/null")
+    species_cluster_info = args['species_cluster_info']
     scripts.module.parse_dRep(args['out_dir'], args['drep_outdir'], species_cluster_info, genus_cluster_info, viral_genus_genome_list_dir)
     
     time_current = f"[{str(datetime.now().replace(microsecond=0))}]"
     logger.info(f"{time_current} | Run dRep to cluster virus species. Finished") 
     
     
+def step_run_Tax_RefSeq(args):
+    split_viral_gn_dir = args['split_viral_gn_dir']
+
     # Step 6 Taxonomic charaterization
     time_current = f"[{str(datetime.now().replace(microsecond=0))}]"
     logger.info(f"{time_current} | Conduct taxonomic charaterization. In processing...")  
     
     ## Step 6.1 Run diamond to NCBI RefSeq viral protein db  
-    tax_refseq_output = os.path.join(args['out_dir'], 'tax_refseq_output.txt')
-    os.system(f"conda run -p {os.path.join(args['conda_env_dir'], 'ViWrap-Tax')} python {os.path.join(args['root_dir'],'scripts/run_Tax_RefSeq.py')} {args['out_dir']} {split_viral_gn_dir} {split_viral_gn_dir} {args['Tax_classification_db']} {pro2viral_gn_map} {args['threads']} {tax_refseq_output}")
+    tax_refseq_output = args['tax_refseq_output']
+    conda_launcher.run(os.path.join(args['conda_env_dir'], 'ViWrap-Tax'), f"python {os.path.join(args['root_dir'],'scripts/run_Tax_RefSeq.py')} {args['out_dir']} {split_viral_gn_dir} {split_viral_gn_dir} {args['Tax_classification_db']} {args['id_registry_dir']} {args['threads']} {tax_refseq_output}")
+
+def step_run_Tax_VOG(args):
+    split_viral_gn_dir = args['split_viral_gn_dir']
 
     ## Step 6.2 Run hmmsearch to marker VOG HMM db
     vog_marker_table = os.path.join(args['Tax_classification_db'], 'VOG_marker_table.txt')
-    tax_vog_output = os.path.join(args['out_dir'], 'tax_vog_output.txt')
-    os.system(f"conda run -p {os.path.join(args['conda_env_dir'], 'ViWrap-Tax')} python {os.path.join(args['root_dir'],'scripts/run_Tax_VOG.py')} {vog_marker_table} {args['out_dir']} {split_viral_gn_dir} {split_viral_gn_dir} {args['Tax_classification_db']} {pro2viral_gn_map} {args['threads']} {tax_vog_output}")
+    tax_vog_output = args['tax_vog_output']
+    conda_launcher.run(os.path.join(args['conda_env_dir'], 'ViWrap-Tax'), f"python {os.path.join(args['root_dir'],'scripts/run_Tax_VOG.py')} {vog_marker_table} {args['out_dir']} {split_viral_gn_dir} {split_viral_gn_dir} {args['Tax_classification_db']} {args['id_registry_dir']} {args['threads']} {tax_vog_output}")
+
+def step_run_Tax_vContact2(args):
+    genome_by_genome_file = args['genome_by_genome_file']
 
     ## Step 6.3 Get taxonomy information from vContact2 result
-    tax_vcontact2_output = os.path.join(args['out_dir'], 'tax_vcontact2_output.txt')
+    tax_vcontact2_output = args['tax_vcontact2_output']
     IMGVR_db_map = os.path.join(args['Tax_classification_db'], 'IMGVR_high-quality_phage_vOTU_representatives_pro2viral_gn_map.csv') 
-    os.system(f"conda run -p {os.path.join(args['conda_env_dir'], 'ViWrap-Tax')} python {os.path.join(args['root_dir'],'scripts/run_Tax_vContact2.py')} {genome_by_genome_file} {IMGVR_db_map} {tax_vcontact2_output}")
+    conda_launcher.run(os.path.join(args['conda_env_dir'], 'ViWrap-Tax'), f"python {os.path.join(args['root_dir'],'scripts/run_Tax_vContact2.py')} {genome_by_genome_file} {IMGVR_db_map} {tax_vcontact2_output}")
+
+def step_combine_Tax(args):
+    genus_cluster_info = args['genus_cluster_info']
+    tax_refseq_output = args['tax_refseq_output']
+    tax_vog_output = args['tax_vog_output']
+    tax_vcontact2_output = args['tax_vcontact2_output']
 
     ## Step 6.4 Integrate all taxonomical results
-    tax_classification_result = os.path.join(args['out_dir'], 'Tax_classification_result.txt')
-    os.system(f"conda run -p {os.path.join(args['conda_env_dir'], 'ViWrap-Tax')} python {os.path.join(args['root_dir'],'scripts/run_Tax_combine.py')} {args['out_dir']} {genus_cluster_info} {tax_classification_result}")
-    os.system(f"rm {tax_refseq_output} {tax_vog_output} {tax_vcontact2_output}")    
+    tax_classification_result = args['tax_classification_result']
+    conda_launcher.run(os.path.join(args['conda_env_dir'], 'ViWrap-Tax'), f"python {os.path.join(args['root_dir'],'scripts/run_Tax_combine.py')} {args['out_dir']} {genus_cluster_info} {tax_classification_result}")
+    for tax_output in [tax_refseq_output, tax_vog_output, tax_vcontact2_output]:
+        os.remove(tax_output)    
     
     time_current = f"[{str(datetime.now().replace(microsecond=0))}]"
     logger.info(f"{time_current} | Conduct taxonomic charaterization. Finished")  
     
     
+def step_run_iPHoP(args):
+    final_virus_fasta_file = args['final_virus_fasta_file']
+
     # Step 7 Host prediction
     time_current = f"[{str(datetime.now().replace(microsecond=0))}]"
     logger.info(f"{time_current} | Conduct Host prediction by iPHoP. In processing...")      
     ## Step 7.1 Host prediction by iPHoP
-    os.system(f"conda run -p {os.path.join(args['conda_env_dir'], 'ViWrap-iPHoP')} python {os.path.join(args['root_dir'],'scripts/run_iPHoP.py')} {final_virus_fasta_file} {args['iphop_outdir']} {args['iPHoP_db']} {args['threads']} >/dev/null 2>&1")
+    conda_launcher.run(os.path.join(args['conda_env_dir'], 'ViWrap-iPHoP'), f"python {os.path.join(args['root_dir'],'scripts/run_iPHoP.py')} {final_virus_fasta_file} {args['iphop_outdir']} {args['iPHoP_db']} {args['threads']} >/dev/null")
 
     time_current = f"[{str(datetime.now().replace(microsecond=0))}]"
     logger.info(f"{time_current} | Conduct Host prediction by iPHoP. Finished")  
     
+def step_run_iPHoP_custom_MAGs(args):
+    final_virus_fasta_file = args['final_virus_fasta_file']
+
     ## Step 7.2 Host prediction by iPHoP by adding custom MAGs to host db
     if args['custom_MAGs_dir'] != 'none':
         time_current = f"[{str(datetime.now().replace(microsecond=0))}]"
         logger.info(f"{time_current} | Conduct Host prediction by iPHoP using custom MAGs. In processing...")   
     
-        os.system(f"conda run -p {os.path.join(args['conda_env_dir'], 'ViWrap-GTDBTk')} python {os.path.join(args['root_dir'],'scripts/add_custom_MAGs_to_host_db__make_gtdbtk_results.py')} {args['out_dir']} {args['custom_MAGs_dir']} {args['threads']} >/dev/null 2>&1")
-        os.system(f"conda run -p {os.path.join(args['conda_env_dir'], 'ViWrap-iPHoP')} python {os.path.join(args['root_dir'],'scripts/add_custom_MAGs_to_host_db__add_to_db.py')} {args['out_dir']} {args['custom_MAGs_dir']} {args['iPHoP_db']} {args['iPHoP_db_custom']} >/dev/null 2>&1")    
-        os.system(f"conda run -p {os.path.join(args['conda_env_dir'], 'ViWrap-iPHoP')} python {os.path.join(args['root_dir'],'scripts/run_iPHoP.py')} {final_virus_fasta_file} {args['iphop_custom_outdir']} {args['iPHoP_db_custom']} {args['threads']} >/dev/null 2>&1")   
+        conda_launcher.run(os.path.join(args['conda_env_dir'], 'ViWrap-GTDBTk'), f"python {os.path.join(args['root_dir'],'scripts/add_custom_MAGs_to_host_db__make_gtdbtk_results.py')} {args['out_dir']} {args['custom_MAGs_dir']} {args['threads']} >/dev/null")
+        conda_launcher.run(os.path.join(args['conda_env_dir'], 'ViWrap-iPHoP'), f"python {os.path.join(args['root_dir'],'scripts/add_custom_MAGs_to_host_db__add_to_db.py')} {args['out_dir']} {args['custom_MAGs_dir']} {args['iPHoP_db']} {args['iPHoP_db_custom']} >/dev/null")    
+        conda_launcher.run(os.path.join(args['conda_env_dir'], 'ViWrap-iPHoP'), f"python {os.path.join(args['root_dir'],'scripts/run_iPHoP.py')} {final_virus_fasta_file} {args['iphop_custom_outdir']} {args['iPHoP_db_custom']} {args['threads']} >/dev/null")   
 
         time_current = f"[{str(datetime.now().replace(microsecond=0))}]"
         logger.info(f"{time_current} | Conduct Host prediction by iPHoP using custom MAGs. Finished") 
     
         
+def step_summarize(args):
+    final_virus_fasta_file = args['final_virus_fasta_file']
+    split_viral_gn_dir = args['split_viral_gn_dir']
+
     # Step 8 Get all virus sequence information    
     ## Step 8.1 Get VIBRANT lytic and lysogenic information and genome information
     checkv_dict = scripts.module.get_checkv_useful_info(os.path.join(args['checkv_outdir'], 'CheckV_quality_summary.txt'))
@@ -499,8 +466,9 @@ def main(args):
     scripts.module.combine_iphop_results(args, combined_host_pred_to_genome_result, combined_host_pred_to_genus_result)
     
     ## Step 8.3 Delete split_viral_gn_dir folder and move files into viwrap_summary_outdir
-    os.system(f"rm -rf {split_viral_gn_dir}")
-    os.system(f"mv {args['out_dir']}/*.txt {args['viwrap_summary_outdir']}")
+    shutil.rmtree(split_viral_gn_dir, ignore_errors = True)
+    for txt_file in glob(os.path.join(args['out_dir'], '*.txt')):
+        shutil.move(txt_file, args['viwrap_summary_outdir'])
     
     ## Step 8.4 Get AMG results
     AMG_dir = os.path.join(args['viwrap_summary_outdir'],'AMG_results')
@@ -516,7 +484,222 @@ def main(args):
     logger.info(f"{time_current} | Get virus sequence information. Finished")  
    
 
+def build_pipeline(args):
+    # Declare every step with the artifacts it needs and makes; the order of adding is the order of the original straight-line run
+    # The params, conda envs, and the inputs not made by any step (the input metagenome and databases) are recorded in the checkpoint markers
+    run = pipeline.Pipeline(args['max_parallel_steps'], args['checkpoint_dir'], args['resume'])
+    identify_method2dbs = {'vb': ['VIBRANT_db'], 'vs': ['VirSorter2_db', 'CheckV_db', 'VIBRANT_db'], 'dvf': ['DVF_db', 'VIBRANT_db']}
+    identify_method2envs = {'vb': ['ViWrap-VIBRANT'], 'vs': ['ViWrap-vs2', 'ViWrap-CheckV', 'ViWrap-VIBRANT'], 'dvf': ['ViWrap-DVF', 'ViWrap-VIBRANT']}
+    def get_envs(*env_names):
+        return [os.path.join(args['conda_env_dir'], env_name) for env_name in env_names]
+        
+    identify_params = pipeline.get_params(args, ['identify_method', 'virome', 'input_length_limit'])
+    if args['identify_method'] in identify_method2name:
+        # VIBRANT, the VirSorter2 - CheckV - VirSorter2 - CheckV chain, and DVF (vb-vs-dvf) run at the same time, splitting the threads between them;
+        # the overlap step starts once all of them are finished
+        branches = ['VIBRANT', 'VirSorter2', 'DVF'] if args['identify_method'] == 'vb-vs-dvf' else ['VIBRANT', 'VirSorter2']
+        branch2threads = {branch: int(args['threads']) for branch in branches}
+        if int(args['max_parallel_steps']) >= len(branches):
+            branch2threads = pipeline.split_threads(args['threads'], {branch: pipeline.IDENTIFY_BRANCH2SCALING[branch] for branch in branches})
+            time_current = f"[{str(datetime.now().replace(microsecond=0))}]"
+            logger.info(f"{time_current} | Split {args['threads']} threads between the virus identification branches: {', '.join(f'{branch} - {branch2threads[branch]}' for branch in branches if branch != 'DVF')}")
+        run.add_step('identify_virus_by_VIBRANT', partial(step_identify_virus_by_VIBRANT, args, branch2threads['VIBRANT']), 
+            inputs = [args['input_metagenome'], args['VIBRANT_db']], 
+            outputs = [args['inner_vb_outdir']], 
+            params = identify_params, 
+            envs = get_envs('ViWrap-VIBRANT'))
+        run.add_step('identify_virus_by_VirSorter2', partial(step_identify_virus_by_VirSorter2, args, branch2threads['VirSorter2']), 
+            inputs = [args['input_metagenome'], args['VirSorter2_db'], args['CheckV_db'], args['VIBRANT_db']], 
+            outputs = [args['inner_vs_outdir']], 
+            params = identify_params, 
+            envs = get_envs('ViWrap-vs2', 'ViWrap-CheckV', 'ViWrap-VIBRANT'))
+        if 'DVF' in branches:
+            run.add_step('identify_virus_by_DVF', partial(step_identify_virus_by_DVF, args), 
+                inputs = [args['input_metagenome'], args['DVF_db']], 
+                outputs = [args['inner_dvf_outdir']], 
+                params = identify_params, 
+                envs = get_envs('ViWrap-DVF'))
+        run.add_step('get_overlapped_viral_scaffolds', partial(step_get_overlapped_viral_scaffolds, args), 
+            inputs = [args['inner_vb_outdir'], args['inner_vs_outdir'], args['inner_dvf_outdir']], 
+            outputs = [args['overlap_outdir']])
+        identify_result = args['overlap_outdir']
+    else:
+        run.add_step('identify_virus', partial(step_identify_virus, args), 
+            inputs = [args['input_metagenome']] + [args[db] for db in identify_method2dbs[args['identify_method']]], 
+            outputs = [args['identify_outdir']], 
+            params = identify_params, 
+            envs = get_envs(*identify_method2envs[args['identify_method']]))
+        identify_result = args['identify_outdir']
+    run.add_step('get_virus_genome_files', partial(step_get_virus_genome_files, args), 
+        inputs = [identify_result], 
+        outputs = [args['viwrap_summary_outdir'], args['final_virus_fasta_file'], args['final_virus_faa_file'], args['final_virus_annotation_file'], args['id_registry_dir']])
+    run.add_step('run_vContact2', partial(step_run_vContact2, args), 
+        inputs = [args['final_virus_faa_file'], args['id_registry_dir'], args['Tax_classification_db']], 
+        outputs = [args['vcontact2_outdir'], args['genome_by_genome_file'], args['genus_cluster_info']], 
+        envs = get_envs('ViWrap-vContact2'))
+    run.add_step('split_viral_gn', partial(step_split_viral_gn, args), 
+        inputs = [args['final_virus_fasta_file'], args['final_virus_faa_file']], 
+        outputs = [args['split_viral_gn_dir']], 
+        params = pipeline.get_params(args, ['max_gn_per_dir']))
+    run.add_step('run_CheckV', partial(step_run_CheckV, args), 
+        inputs = [args['split_viral_gn_dir'], args['CheckV_db']], 
+        outputs = [args['checkv_outdir']], 
+        envs = get_envs('ViWrap-CheckV'))
+    run.add_step('run_dRep', partial(step_run_dRep, args), 
+        inputs = [args['genus_cluster_info'], args['split_viral_gn_dir']], 
+        outputs = [args['drep_outdir'], args['species_cluster_info']], 
+        envs = get_envs('ViWrap-dRep'))
+    run.add_step('run_Tax_RefSeq', partial(step_run_Tax_RefSeq, args), 
+        inputs = [args['split_viral_gn_dir'], args['id_registry_dir'], args['Tax_classification_db']], 
+        outputs = [args['tax_refseq_output']], 
+        envs = get_envs('ViWrap-Tax'))
+    run.add_step('run_Tax_VOG', partial(step_run_Tax_VOG, args), 
+        inputs = [args['split_viral_gn_dir'], args['id_registry_dir'], args['Tax_classification_db']], 
+        outputs = [args['tax_vog_output']], 
+        envs = get_envs('ViWrap-Tax'))
+    run.add_step('run_Tax_vContact2', partial(step_run_Tax_vContact2, args), 
+        inputs = [args['genome_by_genome_file'], args['Tax_classification_db']], 
+        outputs = [args['tax_vcontact2_output']], 
+        envs = get_envs('ViWrap-Tax'))
+    run.add_step('combine_Tax', partial(step_combine_Tax, args), 
+        inputs = [args['genus_cluster_info'], args['tax_refseq_output'], args['tax_vog_output'], args['tax_vcontact2_output']], 
+        outputs = [args['tax_classification_result']], 
+        envs = get_envs('ViWrap-Tax'), 
+        removes = [args['tax_refseq_output'], args['tax_vog_output'], args['tax_vcontact2_output']])
+    run.add_step('run_iPHoP', partial(step_run_iPHoP, args), 
+        inputs = [args['final_virus_fasta_file'], args['iPHoP_db']], 
+        outputs = [args['iphop_outdir']], 
+        envs = get_envs('ViWrap-iPHoP'))
+    summary_inputs = [args['final_virus_fasta_file'], args['final_virus_annotation_file'], args['checkv_outdir'], args['genus_cluster_info'], args['species_cluster_info'], 
+        args['tax_classification_result'], args['iphop_outdir'], args['VIBRANT_db']]
+    if args['custom_MAGs_dir'] != 'none':
+        # The GTDB-Tk results are written into the iPHoP outdir, so it runs after the default iPHoP run has made the folder
+        # The custom iPHoP db is made by this step, so it is cleared together with the outdir when the step is run again
+        run.add_step('run_iPHoP_custom_MAGs', partial(step_run_iPHoP_custom_MAGs, args), 
+            inputs = [args['final_virus_fasta_file'], args['iphop_outdir'], args['custom_MAGs_dir'], args['iPHoP_db']], 
+            outputs = [args['iphop_custom_outdir'], args['iPHoP_db_custom']], 
+            params = pipeline.get_params(args, ['custom_MAGs_dir']), 
+            envs = get_envs('ViWrap-GTDBTk', 'ViWrap-iPHoP'))
+        summary_inputs.append(args['iphop_custom_outdir'])
+    # The summary step removes split_viral_gn_dir and moves all "*.txt" files in the outdir, so it waits for every step that uses or writes them
+    run.add_step('summarize', partial(step_summarize, args), 
+        inputs = summary_inputs, 
+        outputs = [os.path.join(args['viwrap_summary_outdir'], x) for x in ['Virus_summary_info.txt', 'Host_prediction_to_genome_m90.csv', 'Host_prediction_to_genus_m90.csv', 'AMG_results']], 
+        after = ['run_CheckV', 'run_dRep', 'run_Tax_RefSeq', 'run_Tax_VOG'], 
+        params = pipeline.get_params(args, ['identify_method']), 
+        removes = [args['split_viral_gn_dir'], args['genus_cluster_info'], args['species_cluster_info'], args['tax_classification_result']])
+    ## Record what each finished step took, for the estimates of --dry_run
+    run.history_file = args['step_history_file']
+    run.run_features = cost_model.get_run_features(args)
+    return run
+    
+def check_inputs(args):
+    # Exit with a message if any input, database, or option is not set up well
+    if not os.path.exists(args['input_metagenome']):
+        sys.exit(f"Could not find input metagenome {args['input_metagenome']}")        
+    if not os.path.exists(args['db_dir']):
+        sys.exit(f"Could not find directory {args['db_dir']}. Maybe the database directory was not specified with the --db_dir and is not the default \".ViWrap_db/\" directory?")
+    
+    if args['custom_MAGs_dir'] != 'none' and not os.path.exists(args['custom_MAGs_dir']):
+        sys.exit(f"Could not find custom MAGs directory {args['custom_MAGs_dir']}. Maybe the directory is not correct")
+    elif args['custom_MAGs_dir'] != 'none' and os.path.exists(args['custom_MAGs_dir']):   
+        for file in glob(f"os.path.join(args['custom_MAGs_dir'],'*.fasta')"):
+            if '.fasta' not in file:
+                sys.exit(f"Make sure all MAGs in custom MAGs directory {args['custom_MAGs_dir']} end with \'.fasta\', and no additional files within the directory")
+                
+    if args['custom_MAGs_dir'] != 'none' and not os.path.isabs(args['custom_MAGs_dir']):
+        sys.exit(f"Please make sure that the path to custom MAGs directory {args['custom_MAGs_dir']} is a full absolute path")
+                
+    if not os.path.exists(args['conda_env_dir']):
+        sys.exit(f"Could not find conda env dirs within {args['conda_env_dir']}") 
+
+    if args['identify_method'] not in ['vb', 'vs', 'dvf', 'vb-vs-dvf', 'vb-vs']:
+        sys.exit(f"Please make sure your input for --identify_method option is one of these: \"vb-vs\", \"vb-vs-dvf\", \"vb\", \"vs\", and \"dvf\"; you can also omit this in the command line, the default is \"vb\"")
+        
+    if os.path.exists(args['iPHoP_db_custom']) and not args['resume']:
+        sys.exit(f"Please make sure that {args['iPHoP_db_custom']} is not present before ViWrap run. If present, please remove the folder")
+
+    if args.get('executor', 'local') not in ['local', 'slurm', 'mock']:
+        sys.exit(f"Please make sure your input for --executor option is one of these: \"local\", \"slurm\", and \"mock\"; you can also omit this in the command line, the default is \"local\"")
+
+
+def main(args):
+    # Welcome and logger
+    print("### Welcome to ViWrap ###\n") 
+
+    if args['dry_run']:
+        # Only print the planned steps with their estimates; nothing is run or written
+        set_defaults(args)
+        check_inputs(args)
+        print(cost_model.get_plan_report(build_pipeline(args), args['max_parallel_steps']))
+        return
+
+	## Set up the logger
+    if not args['resume'] or not os.path.exists(args['out_dir']):
+        os.mkdir(args['out_dir'])
+    log_file = os.path.join(args['out_dir'],'ViWrap_run.log')
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(message)s",
+        handlers=[
+            logging.FileHandler(log_file),
+            logging.StreamHandler(sys.stdout)
+        ]
+    )    
+    logger = logging.getLogger(__name__) 
+
+    ## Store the input arguments
+    issued_command = scripts.module.get_run_input_arguments_wo_reads(args)
+    logger.info(f"The issued command is:\n{issued_command}\n")
+    
+    ## Set the default args:
+    set_defaults(args)
+    
+    # Step 1 Pre-check inputs
+    start_time = datetime.now().replace(microsecond=0)
+    time_current = f"[{str(datetime.now().replace(microsecond=0))}]"
+    logger.info(f"{time_current} | Pre-check inputings. In processing...")
+    
+    check_inputs(args)
+
+    time_current = f"[{str(datetime.now().replace(microsecond=0))}]"
+    logger.info(f"{time_current} | Looks like the input metagenome and reads, database, and custom MAGs dir (if option used) are now set up well, start up to run ViWrap pipeline")
+         
+
+    # Step 2-8 Run all steps; independent steps (i.e., CheckV, dRep, taxonomic charaterization, and iPHoP) run at the same time
+    ## Share --threads and the memory among all tools started by the steps; the pool path is passed to the helper scripts by the env variable
+    if not os.environ.get(resource_pool.POOL_ENV):
+        pool_file = os.path.abspath(args['resource_pool_file'])
+        resource_pool.create_pool(pool_file, int(args['threads']))
+        os.environ[resource_pool.POOL_ENV] = pool_file
+    with resource_pool.get_pool().locked_state() as pool_state:
+        logger.info(f"All tools share {pool_state['cores']} cores and {pool_state['memory']:.1f} GB memory")
+    ## Record the resource usage of all processes started by the steps; the path is passed to the helper scripts by the env variable
+    if not os.environ.get(process_metrics.METRICS_ENV):
+        os.environ[process_metrics.METRICS_ENV] = os.path.abspath(args['process_metrics_file'])
+    ## Keep the stderr of each job, and set the timeout, retries, and backend of parallel sub-jobs
+    if not os.environ.get(supervisor.LOG_DIR_ENV):
+        os.environ[supervisor.LOG_DIR_ENV] = os.path.abspath(args['job_log_dir'])
+        os.environ[supervisor.TIMEOUT_ENV] = str(args['job_timeout'])
+        os.environ[supervisor.RETRIES_ENV] = str(args['job_retries'])
+        os.environ[executors.EXECUTOR_ENV] = args['executor']
+        os.environ[executors.MAX_CLUSTER_JOBS_ENV] = str(args['max_cluster_jobs'])
+        os.environ[executors.SBATCH_ARGS_ENV] = args['sbatch_args']
+    run = build_pipeline(args)
+    run.get_step_metrics = lambda name: {'peak_rss': process_metrics.get_step_peak_rss(name)}
+    ## Resolve the conda envs of all steps once, so that helper scripts are started directly instead of by "conda run" each time
+    conda_launcher.resolve_envs(sorted(set(env_dir for step in run.steps.values() for env_dir in step.envs)))
+    try:
+        run.run()
+    finally:
+        ## Keep the usage of the finished steps even if a step failed
+        process_metrics.write_run_metrics(args['run_metrics_file'], run.step2span)
+        timeline.write_trace(args['trace_file'], run.step2span, process_metrics.read_records(os.environ[process_metrics.METRICS_ENV]))
+    logger.info(f"Conda env launching:\n{conda_launcher.get_launch_report()}")
+    logger.info(f"The wall time, CPU time, peak memory, and disk I/O of each step and each process are in {args['run_metrics_file']}; the timeline of all steps and processes is in {args['trace_file']} (open it in https://ui.perfetto.dev)")
+    
+
     end_time = datetime.now().replace(microsecond=0)
     duration = end_time - start_time
     logger.info(f"The total running time is {duration} (in \"hr:min:sec\" format)")  
-    
\ No newline at end of file
+    
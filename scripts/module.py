@@ -15,96 +15,27 @@ try:
     warnings.filterwarnings("ignore")
     from pathlib import Path
     from glob import glob
+    import shutil
+    from concurrent.futures import ThreadPoolExecutor
     import pyfastx # For fastq and fasta reading and parsing
+    from scripts import seq_io # For streaming fasta, faa, and ffn reading and writing
+    from scripts import seq_index # For seeking sequences by ID from the on-disk offset index
+    from scripts import id_registry # For the protein => scaffold => genome relation of all viral genomes
+    from scripts import viral_id # For parsing genome, scaffold, and protein IDs once (memoised)
 except Exception as e:
     sys.stderr.write(str(e) + "\n\n")
     exit(1)
  
  
-def store_seq(input_seq_file): # The input sequence file should be a file with full path
-    head = "" # Store the header line
-    seq_dict = {} # Store the sequence dict
-    
-    with open(input_seq_file, "r") as seq_lines:
-        for line in seq_lines:
-            line = line.rstrip("\n") # Remove "\n" in the end
-            if ">" in line:
-                if (" " or "\t") in line: # Break at the first " " or "\t"
-                    spliter = ""
-                    for i in range(len(line)):
-                        if line[i] == " " or line[i] == "\t":
-                            spliter = line[i]
-                            break 
-                           
-                    head = line.split(f'{spliter}', 1)[0]
-                    seq_dict[head] = ""
-                else:
-                    head = line
-                    seq_dict[head] = ""
-            else:
-                seq_dict[head] += line
-            
-    seq_lines.close()
-    
-    return seq_dict
-    
-def store_seq_with_full_head(input_seq_file): # The input sequence file should be a file with full path
-    head = "" # Store the header line
-    seq_dict = {} # Store the sequence dict
-    
-    with open(input_seq_file, "r") as seq_lines:
-        for line in seq_lines:
-            line = line.replace("\n","") # Remove "\n"
-            if line[0] == ">":
-                head = line
-                seq_dict[head] = ""
-            else:
-                seq_dict[head] += line
-            
-    seq_lines.close()
-    
-    return seq_dict
-    
-def get_gene_seq(input_gene_file): # Add the filename to the header; 
-    # The input sequence file should be a file with full path
-    head = "" # Store the header line
-    gene_dict = {} # Store the sequence dict
-    filename = Path(input_gene_file).stem # Get the stem name from a file with full path
-    
-    with open(input_gene_file,"r") as gene_lines:
-        for line in gene_lines:
-            line = line.replace("\n","") # Remove "\n"
-            if ">" in line[0]:
-                if "\s" in line:
-                    head = ">" + filename + "~~" + line.replace(">", "").split("\s")[0]
-                else:
-                    head = ">" + filename + "~~" + line.replace(">", "")
-                gene_dict[head] = ""    
-            else: 
-                gene_dict[head] += line
-                gene_dict[head].replace("*","")
-    
-    gene_lines.close()
-            
-    return gene_dict   
-
-def write_down_seq(seq_dict, path_to_file): 
-    # Two inputs are required:
-    # (1) The dict of the sequence
-    # (2) The path that you want to write your sequence down
-    
-    seq_file = open(path_to_file,"w")
-    for head in seq_dict:
-        seq_file.write(head + "\n")
-        seq_file.write(seq_dict[head] + "\n")
-    seq_file.close()       
-    
 def make_unbinned_viral_gn(viral_scaffold, vRhyme_best_bin_dir, vRhyme_unbinned_viral_gn_dir):
     viral_scaffold_faa = viral_scaffold.rsplit(".", 1)[0] + ".faa"
     viral_scaffold_ffn = viral_scaffold.rsplit(".", 1)[0] + ".faa"       
-    viral_scaffold_fasta_dict = store_seq_with_full_head(viral_scaffold)
-    viral_scaffold_faa_dict = store_seq_with_full_head(viral_scaffold_faa)
-    viral_scaffold_ffn_dict = store_seq_with_full_head(viral_scaffold_ffn)
+    viral_scaffold_fasta_index = seq_index.load_seq_index(viral_scaffold) # scaffold_id => offsets; records are fetched by seeking
+    viral_scaffold_faa_index = seq_index.load_seq_index(viral_scaffold_faa)
+    viral_scaffold_ffn_index = seq_index.load_seq_index(viral_scaffold_ffn)
+    viral_scaffold_fasta_handle = seq_index.open_indexed_seq_file(viral_scaffold)
+    viral_scaffold_faa_handle = seq_index.open_indexed_seq_file(viral_scaffold_faa)
+    viral_scaffold_ffn_handle = seq_index.open_indexed_seq_file(viral_scaffold_ffn)
     
     # Step 1 Make unnbinned fasta dict and write down unbinned viral genome fasta file
     viral_scaffold_fasta_binned_dict = {} # scaffold_id (NODE_10610_length_8667_cov_0.658730) => bin_name (vRhyme_10)
@@ -114,19 +45,14 @@ def make_unbinned_viral_gn(viral_scaffold, vRhyme_best_bin_dir, vRhyme_unbinned_
         for file_name in file_list:
             if "fasta" in file_name: 
                 file_name_with_path = os.path.join(path, file_name)
-                with open(file_name_with_path, "r") as fasta_lines:
-                    for line in fasta_lines:
-                        if ">" in line:
-                            line = line.rstrip("\n")
-                            bin_name = line.replace(">", "", 1).split("__", 1)[0]
-                            scaffold_id = line.replace(">", "", 1).split("__", 1)[1]
-                            viral_scaffold_fasta_binned_dict[scaffold_id] = bin_name
-                fasta_lines.close() 
+                for line in seq_io.read_headers(file_name_with_path, full_head = True):
+                    bin_name = line.replace(">", "", 1).split("__", 1)[0]
+                    scaffold_id = line.replace(">", "", 1).split("__", 1)[1]
+                    viral_scaffold_fasta_binned_dict[scaffold_id] = bin_name
 
     viral_scaffold_fasta_unbinned_dict = {} # scaffold_id (NODE_10610_length_8667_cov_0.658730) => unbinned_gn_name (vRhyme_unbinned_1)
     i = 1 
-    for header in viral_scaffold_fasta_dict:
-        scaffold_id = header.replace(">", "", 1)
+    for scaffold_id in viral_scaffold_fasta_index:
         if scaffold_id not in viral_scaffold_fasta_binned_dict:
             viral_scaffold_fasta_unbinned_dict[scaffold_id] = f'vRhyme_unbinned_{i}'
             i += 1
@@ -135,151 +61,83 @@ def make_unbinned_viral_gn(viral_scaffold, vRhyme_best_bin_dir, vRhyme_unbinned_
     
     for scaffold_id in viral_scaffold_fasta_unbinned_dict:
         unbinned_fasta_file = open(f'{vRhyme_unbinned_viral_gn_dir}/{viral_scaffold_fasta_unbinned_dict[scaffold_id]}.fasta',"w")
-        unbinned_fasta_file.write(f'>{viral_scaffold_fasta_unbinned_dict[scaffold_id]}__{scaffold_id}\n')
-        scaffold_id_w_array = ">" + scaffold_id
-        unbinned_fasta_file.write(f'{viral_scaffold_fasta_dict[scaffold_id_w_array]}\n')
+        head, seq = seq_index.fetch_seq(viral_scaffold_fasta_handle, viral_scaffold_fasta_index, scaffold_id, full_head = True)
+        unbinned_fasta_file.write(f'>{viral_scaffold_fasta_unbinned_dict[scaffold_id]}__{head[1:]}\n')
+        unbinned_fasta_file.write(f'{seq}\n')
         unbinned_fasta_file.close()
         
-    # Step 2 Write down unbinned viral genome faa file    
-    viral_scaffold_faa_unbinned_dict = {} # pro_id (NODE_10811_length_8534_cov_0.218494_1  (1..228)        1       PF02229.16      Transcriptional Coactivator p15 (PC4)) => unbinned_gn_name (vRhyme_unbinned_1)
-    for header in viral_scaffold_faa_dict:
-        pro_id = header.replace(">", "", 1)
-        scaffold_id = pro_id.split("\t", 1)[0].rsplit("_", 1)[0]
-        if scaffold_id in viral_scaffold_fasta_unbinned_dict:
-            viral_scaffold_faa_unbinned_dict[pro_id] = viral_scaffold_fasta_unbinned_dict[scaffold_id]
-   
-    
+    # Step 2 Bucket proteins (faa) and genes (ffn) by their parent scaffold, in one pass over each index (headers only)
+    scaffold2faa_pro_ids = defaultdict(list) # scaffold_id => [pro_ids]; pro_ids keep the order in the faa file
+    for pro_id in viral_scaffold_faa_index:
+        scaffold2faa_pro_ids[pro_id.rsplit("_", 1)[0]].append(pro_id)
+
+    scaffold2ffn_pro_ids = defaultdict(list) # scaffold_id => [pro_ids]; pro_ids keep the order in the ffn file
+    for pro_id in viral_scaffold_ffn_index:
+        scaffold2ffn_pro_ids[pro_id.rsplit("_", 1)[0]].append(pro_id)
+
+    # Step 3 Write down unbinned viral genome faa and ffn files    
     for scaffold_id in viral_scaffold_fasta_unbinned_dict:
-        unbinned_faa_file = open(f'{vRhyme_unbinned_viral_gn_dir}/{viral_scaffold_fasta_unbinned_dict[scaffold_id]}.faa',"w")
-        for pro_id in viral_scaffold_faa_unbinned_dict:
-            scaffold_id_within = pro_id.split("\t", 1)[0].rsplit("_", 1)[0]
-            if (scaffold_id_within == scaffold_id):
-                unbinned_faa_file.write(f'>{viral_scaffold_faa_unbinned_dict[pro_id]}__{pro_id}\n')
-                pro_id_w_array = ">" + pro_id
-                unbinned_faa_file.write(f'{viral_scaffold_faa_dict[pro_id_w_array]}\n')
-        unbinned_faa_file.close()    
+        unbinned_gn_name = viral_scaffold_fasta_unbinned_dict[scaffold_id]
         
-    # Step 3 Write down unbinned viral genome ffn file    
-    viral_scaffold_ffn_unbinned_dict = {} # pro_id (NODE_10811_length_8534_cov_0.218494_1  (1..228)        1       PF02229.16      Transcriptional Coactivator p15 (PC4)) => unbinned_gn_name (vRhyme_unbinned_1)
-    for header in viral_scaffold_ffn_dict:
-        pro_id = header.replace(">", "", 1)
-        scaffold_id = pro_id.split("\t", 1)[0].rsplit("_", 1)[0]
-        if scaffold_id in viral_scaffold_fasta_unbinned_dict:
-            viral_scaffold_ffn_unbinned_dict[pro_id] = viral_scaffold_fasta_unbinned_dict[scaffold_id]
-    
-    for scaffold_id in viral_scaffold_fasta_unbinned_dict:
-        unbinned_ffn_file = open(f'{vRhyme_unbinned_viral_gn_dir}/{viral_scaffold_fasta_unbinned_dict[scaffold_id]}.ffn',"w")
-        for pro_id in viral_scaffold_ffn_unbinned_dict:
-            scaffold_id_within = pro_id.split("\t", 1)[0].rsplit("_", 1)[0]
-            if (scaffold_id_within == scaffold_id):
-                unbinned_ffn_file.write(f'>{viral_scaffold_ffn_unbinned_dict[pro_id]}__{pro_id}\n')
-                pro_id_w_array = ">" + pro_id
-                unbinned_ffn_file.write(f'{viral_scaffold_ffn_dict[pro_id_w_array]}\n')
+        unbinned_faa_file = open(f'{vRhyme_unbinned_viral_gn_dir}/{unbinned_gn_name}.faa',"w")
+        for pro_id in scaffold2faa_pro_ids.get(scaffold_id, []):
+            head, seq = seq_index.fetch_seq(viral_scaffold_faa_handle, viral_scaffold_faa_index, pro_id, full_head = True)
+            unbinned_faa_file.write(f'>{unbinned_gn_name}__{head[1:]}\n')
+            unbinned_faa_file.write(f'{seq}\n')
+        unbinned_faa_file.close()    
+
+        unbinned_ffn_file = open(f'{vRhyme_unbinned_viral_gn_dir}/{unbinned_gn_name}.ffn',"w")
+        for pro_id in scaffold2ffn_pro_ids.get(scaffold_id, []):
+            head, seq = seq_index.fetch_seq(viral_scaffold_ffn_handle, viral_scaffold_ffn_index, pro_id, full_head = True)
+            unbinned_ffn_file.write(f'>{unbinned_gn_name}__{head[1:]}\n')
+            unbinned_ffn_file.write(f'{seq}\n')
         unbinned_ffn_file.close()  
         
-    # Step 4 Write down best bin faa file
-    viral_scaffold_faa_binned_dict = {} # pro_id (NODE_10811_length_8534_cov_0.218494_1  (1..228)        1       PF02229.16      Transcriptional Coactivator p15 (PC4)) => unbinned_gn_name (vRhyme_bin_1)
-    for header in viral_scaffold_faa_dict:
-        pro_id = header.replace(">", "", 1)
-        scaffold_id = pro_id.split("\t", 1)[0].rsplit("_", 1)[0]
-        if scaffold_id in viral_scaffold_fasta_binned_dict:
-            viral_scaffold_faa_binned_dict[pro_id] = viral_scaffold_fasta_binned_dict[scaffold_id]
-
-    binned_faa_name2scaffolds = {} # binned_faa_name to scaffolds
+    # Step 4 Write down best bin faa and ffn files
+    binned_gn_name2scaffolds = {} # binned_gn_name (vRhyme_bin_1) => [scaffolds]
     for scaffold_id in viral_scaffold_fasta_binned_dict:
-        binned_faa_name = viral_scaffold_fasta_binned_dict[scaffold_id].replace("vRhyme","vRhyme_bin",1)
-        if binned_faa_name not in binned_faa_name2scaffolds:
-            binned_faa_name2scaffolds[binned_faa_name] = scaffold_id
+        binned_gn_name = viral_scaffold_fasta_binned_dict[scaffold_id].replace("vRhyme","vRhyme_bin",1)
+        if binned_gn_name not in binned_gn_name2scaffolds:
+            binned_gn_name2scaffolds[binned_gn_name] = [scaffold_id]
         else:
-            binned_faa_name2scaffolds[binned_faa_name] += "\t" + scaffold_id
+            binned_gn_name2scaffolds[binned_gn_name].append(scaffold_id)
 
-    for binned_faa_name in binned_faa_name2scaffolds:
-        binned_faa_file = open(f'{vRhyme_best_bin_dir}/{binned_faa_name}.faa',"w") 
-        scaffolds = binned_faa_name2scaffolds[binned_faa_name].split("\t")
+    for binned_gn_name in binned_gn_name2scaffolds:
+        scaffolds = binned_gn_name2scaffolds[binned_gn_name]
+        
+        binned_faa_file = open(f'{vRhyme_best_bin_dir}/{binned_gn_name}.faa',"w") 
         for scaffold_id in scaffolds:
-            for pro_id in viral_scaffold_faa_binned_dict:
-                scaffold_id_within = pro_id.split("\t", 1)[0].rsplit("_", 1)[0]
-                if (scaffold_id_within == scaffold_id):
-                    binned_faa_file.write(f'>{viral_scaffold_faa_binned_dict[pro_id]}__{pro_id}\n')
-                    pro_id_w_array = ">" + pro_id
-                    binned_faa_file.write(f'{viral_scaffold_faa_dict[pro_id_w_array]}\n')
+            for pro_id in scaffold2faa_pro_ids.get(scaffold_id, []):
+                head, seq = seq_index.fetch_seq(viral_scaffold_faa_handle, viral_scaffold_faa_index, pro_id, full_head = True)
+                binned_faa_file.write(f'>{viral_scaffold_fasta_binned_dict[scaffold_id]}__{head[1:]}\n')
+                binned_faa_file.write(f'{seq}\n')
         binned_faa_file.close()
-        
-    # Step 5 Write down best bin ffn file
-    viral_scaffold_ffn_binned_dict = {} # pro_id (NODE_10811_length_8534_cov_0.218494_1  (1..228)        1       PF02229.16      Transcriptional Coactivator p15 (PC4)) => unbinned_gn_name (vRhyme_bin_1)
-    for header in viral_scaffold_ffn_dict:
-        pro_id = header.replace(">", "", 1)
-        scaffold_id = pro_id.split("\t", 1)[0].rsplit("_", 1)[0]
-        if scaffold_id in viral_scaffold_fasta_binned_dict:
-            viral_scaffold_ffn_binned_dict[pro_id] = viral_scaffold_fasta_binned_dict[scaffold_id]
-
-    binned_ffn_name2scaffolds = {} # binned_ffn_name to scaffolds
-    for scaffold_id in viral_scaffold_fasta_binned_dict:
-        binned_ffn_name = viral_scaffold_fasta_binned_dict[scaffold_id].replace("vRhyme","vRhyme_bin",1)
-        if binned_ffn_name not in binned_ffn_name2scaffolds:
-            binned_ffn_name2scaffolds[binned_ffn_name] = scaffold_id
-        else:
-            binned_ffn_name2scaffolds[binned_ffn_name] += "\t" + scaffold_id
 
-    for binned_ffn_name in binned_ffn_name2scaffolds:
-        binned_ffn_file = open(f'{vRhyme_best_bin_dir}/{binned_ffn_name}.ffn',"w") 
-        scaffolds = binned_ffn_name2scaffolds[binned_ffn_name].split("\t")
+        binned_ffn_file = open(f'{vRhyme_best_bin_dir}/{binned_gn_name}.ffn',"w") 
         for scaffold_id in scaffolds:
-            for pro_id in viral_scaffold_ffn_binned_dict:
-                scaffold_id_within = pro_id.split("\t", 1)[0].rsplit("_", 1)[0]
-                if (scaffold_id_within == scaffold_id):
-                    binned_ffn_file.write(f'>{viral_scaffold_ffn_binned_dict[pro_id]}__{pro_id}\n')
-                    pro_id_w_array = ">" + pro_id
-                    binned_ffn_file.write(f'{viral_scaffold_ffn_dict[pro_id_w_array]}\n')
+            for pro_id in scaffold2ffn_pro_ids.get(scaffold_id, []):
+                head, seq = seq_index.fetch_seq(viral_scaffold_ffn_handle, viral_scaffold_ffn_index, pro_id, full_head = True)
+                binned_ffn_file.write(f'>{viral_scaffold_fasta_binned_dict[scaffold_id]}__{head[1:]}\n')
+                binned_ffn_file.write(f'{seq}\n')
         binned_ffn_file.close()         
+
+    viral_scaffold_fasta_handle.close()
+    viral_scaffold_faa_handle.close()
+    viral_scaffold_ffn_handle.close()
     
-def get_pro2viral_gn_map(vRhyme_best_bin_dir, vRhyme_unbinned_viral_gn_dir, pro2viral_gn_map):
-    pro2viral_gn_dict = {}
-    walk = os.walk(vRhyme_best_bin_dir)
-    for path,dir_list,file_list in walk:
-        for file_name in file_list:
-            if "faa" in file_name: 
-                viral_gn = Path(file_name).stem
-                file_name_with_path = os.path.join(path, file_name)
-                with open(file_name_with_path, "r") as faa_lines:
-                    for line in faa_lines:
-                        if ">" in line:
-                            line = line.rstrip("\n")
-                            pro = line.replace(">", "", 1).split("\t", 1)[0]
-                            pro2viral_gn_dict[pro] = viral_gn
-                faa_lines.close()          
-                            
-    walk2 = os.walk(vRhyme_unbinned_viral_gn_dir)
-    for path, dir_list, file_list in walk2:
-        for file_name in file_list:
-            if "faa" in file_name:
-                viral_gn = Path(file_name).stem
-                file_name_with_path = os.path.join(path, file_name)
-                with open(file_name_with_path,"r") as faa_lines2:
-                    for line in faa_lines2:
-                        if ">" in line:
-                            line = line.rstrip("\n")
-                            pro = line.replace(">", "", 1).split("\t", 1)[0]
-                            pro2viral_gn_dict[pro] = viral_gn
-                faa_lines2.close()            
+def get_pro2viral_gn_map(id_registry_dir, pro2viral_gn_map):
+    registry = id_registry.load_id_registry(id_registry_dir)
+    pro2viral_gn_dict = id_registry.get_pro2gn(registry)
                             
     file = open(pro2viral_gn_map,"w")
     file.write('protein_id,contig_id,keywords\n')
     for pro in pro2viral_gn_dict:
-        # print(pro)
-        # print(pro2viral_gn_dict[pro])
         file.write(f'{pro},{pro2viral_gn_dict[pro]},None\n')
     file.close()
     
 def get_pro2viral_gn_map_for_wo_reads(args, pro2viral_gn_map):
-    pro2viral_gn_dict = {}
-
-    final_virus_faa_file = os.path.join(args['viwrap_summary_outdir'], 'final_virus.faa')
-    final_virus_faa_seq = store_seq(final_virus_faa_file)
-    for header in final_virus_faa_seq:
-        pro = header.replace('>', '' ,1)
-        viral_gn = pro.rsplit('_', 1)[0]
-        pro2viral_gn_dict[pro] = viral_gn
+    registry = id_registry.load_id_registry(args['id_registry_dir'])
+    pro2viral_gn_dict = id_registry.get_pro2gn(registry)
                                      
     file = open(pro2viral_gn_map,"w")
     file.write('protein_id,contig_id,keywords\n')
@@ -298,91 +156,84 @@ def move_virus_genome_files_and_annotation_file(args):
         final_vb_virus_ffn_file = os.path.join(args['vibrant_outdir'], 'final_vb_virus.ffn')
         final_vb_virus_faa_file = os.path.join(args['vibrant_outdir'], 'final_vb_virus.faa')
         final_vb_virus_annotation_file = os.path.join(args['vibrant_outdir'], 'final_vb_virus.annotation.txt')
-        os.system(f"cp {final_vb_virus_fasta_file} {final_virus_fasta_file}")
-        os.system(f"cp {final_vb_virus_ffn_file} {final_virus_ffn_file}")
-        os.system(f"cp {final_vb_virus_faa_file} {final_virus_faa_file}")
-        os.system(f"cp {final_vb_virus_annotation_file} {final_virus_annotation_file}")
+        shutil.copy(final_vb_virus_fasta_file, final_virus_fasta_file)
+        shutil.copy(final_vb_virus_ffn_file, final_virus_ffn_file)
+        shutil.copy(final_vb_virus_faa_file, final_virus_faa_file)
+        shutil.copy(final_vb_virus_annotation_file, final_virus_annotation_file)
     elif args['identify_method'] == 'vs':       
         final_vs_virus_fasta_file = os.path.join(args['virsorter_outdir'], 'final_vs2_virus.fasta')
         final_vs_virus_ffn_file = os.path.join(args['virsorter_outdir'], 'final_vs2_virus.ffn')
         final_vs_virus_faa_file = os.path.join(args['virsorter_outdir'], 'final_vs2_virus.faa')
         final_vs_virus_annotation_file = os.path.join(args['virsorter_outdir'], 'final_vs2_virus.annotation.txt')
-        os.system(f"cp {final_vs_virus_fasta_file} {final_virus_fasta_file}")
-        os.system(f"cp {final_vs_virus_ffn_file} {final_virus_ffn_file}")
-        os.system(f"cp {final_vs_virus_faa_file} {final_virus_faa_file}")
-        os.system(f"cp {final_vs_virus_annotation_file} {final_virus_annotation_file}")
+        shutil.copy(final_vs_virus_fasta_file, final_virus_fasta_file)
+        shutil.copy(final_vs_virus_ffn_file, final_virus_ffn_file)
+        shutil.copy(final_vs_virus_faa_file, final_virus_faa_file)
+        shutil.copy(final_vs_virus_annotation_file, final_virus_annotation_file)
     elif args['identify_method'] == 'dvf':       
         final_dvf_virus_fasta_file = os.path.join(args['dvf_outdir'], 'final_dvf_virus.fasta')
         final_dvf_virus_ffn_file = os.path.join(args['dvf_outdir'], 'final_dvf_virus.ffn')
         final_dvf_virus_faa_file = os.path.join(args['dvf_outdir'], 'final_dvf_virus.faa')
         final_dvf_virus_annotation_file = os.path.join(args['dvf_outdir'], 'final_dvf_virus.annotation.txt')
-        os.system(f"cp {final_dvf_virus_fasta_file} {final_virus_fasta_file}")
-        os.system(f"cp {final_dvf_virus_ffn_file} {final_virus_ffn_file}")
-        os.system(f"cp {final_dvf_virus_faa_file} {final_virus_faa_file}")
-        os.system(f"cp {final_dvf_virus_annotation_file} {final_virus_annotation_file}")
+        shutil.copy(final_dvf_virus_fasta_file, final_virus_fasta_file)
+        shutil.copy(final_dvf_virus_ffn_file, final_virus_ffn_file)
+        shutil.copy(final_dvf_virus_faa_file, final_virus_faa_file)
+        shutil.copy(final_dvf_virus_annotation_file, final_virus_annotation_file)
     elif args['identify_method'] == 'vb-vs-dvf':        
         final_overlapped_virus_fasta_file = os.path.join(args['vb_vs_dvf_outdir'], f"Overlap_{Path(args['input_metagenome']).stem}", "final_overlapped_virus.fasta")
         final_overlapped_virus_ffn_file = os.path.join(args['vb_vs_dvf_outdir'], f"Overlap_{Path(args['input_metagenome']).stem}", "final_overlapped_virus.ffn")
         final_overlapped_virus_faa_file = os.path.join(args['vb_vs_dvf_outdir'], f"Overlap_{Path(args['input_metagenome']).stem}", "final_overlapped_virus.faa")
         final_overlapped_virus_annotation_file = os.path.join(args['vb_vs_dvf_outdir'], f"Overlap_{Path(args['input_metagenome']).stem}", "final_overlapped_virus.annotation.txt")
-        os.system(f"cp {final_overlapped_virus_fasta_file} {final_virus_fasta_file}")
-        os.system(f"cp {final_overlapped_virus_ffn_file} {final_virus_ffn_file}")
-        os.system(f"cp {final_overlapped_virus_faa_file} {final_virus_faa_file}")
-        os.system(f"cp {final_overlapped_virus_annotation_file} {final_virus_annotation_file}")         
+        shutil.copy(final_overlapped_virus_fasta_file, final_virus_fasta_file)
+        shutil.copy(final_overlapped_virus_ffn_file, final_virus_ffn_file)
+        shutil.copy(final_overlapped_virus_faa_file, final_virus_faa_file)
+        shutil.copy(final_overlapped_virus_annotation_file, final_virus_annotation_file)         
     elif args['identify_method'] == 'vb-vs':        
         final_overlapped_virus_fasta_file = os.path.join(args['vb_vs_outdir'], f"Overlap_{Path(args['input_metagenome']).stem}", "final_overlapped_virus.fasta")
         final_overlapped_virus_ffn_file = os.path.join(args['vb_vs_outdir'], f"Overlap_{Path(args['input_metagenome']).stem}", "final_overlapped_virus.ffn")
         final_overlapped_virus_faa_file = os.path.join(args['vb_vs_outdir'], f"Overlap_{Path(args['input_metagenome']).stem}", "final_overlapped_virus.faa")
         final_overlapped_virus_annotation_file = os.path.join(args['vb_vs_outdir'], f"Overlap_{Path(args['input_metagenome']).stem}", "final_overlapped_virus.annotation.txt")
-        os.system(f"cp {final_overlapped_virus_fasta_file} {final_virus_fasta_file}")
-        os.system(f"cp {final_overlapped_virus_ffn_file} {final_virus_ffn_file}")
-        os.system(f"cp {final_overlapped_virus_faa_file} {final_virus_faa_file}")
-        os.system(f"cp {final_overlapped_virus_annotation_file} {final_virus_annotation_file}")      
+        shutil.copy(final_overlapped_virus_fasta_file, final_virus_fasta_file)
+        shutil.copy(final_overlapped_virus_ffn_file, final_virus_ffn_file)
+        shutil.copy(final_overlapped_virus_faa_file, final_virus_faa_file)
+        shutil.copy(final_overlapped_virus_annotation_file, final_virus_annotation_file)      
    
 def combine_all_vRhyme_faa(vRhyme_best_bin_dir, vRhyme_unbinned_viral_gn_dir, all_vRhyme_faa):
     walk = os.walk(vRhyme_best_bin_dir)
     walk2 = os.walk(vRhyme_unbinned_viral_gn_dir)
-    all_vRhyme_faa_dict = {}
     
-    for path, dir_list, file_list in walk:
-        for file_name in file_list:
-            if "faa" in file_name:
-                file_name_with_path = os.path.join(path, file_name)
-                each_vRhyme_faa_dict = store_seq(file_name_with_path)
-                all_vRhyme_faa_dict.update(each_vRhyme_faa_dict) # Add dict from one to another one
+    # Stream each faa file into the combined file; headers are unique as they are prefixed by the viral gn name
+    with seq_io.open_seq_file(all_vRhyme_faa, 'w') as all_vRhyme_faa_file:
+        for path, dir_list, file_list in walk:
+            for file_name in file_list:
+                if "faa" in file_name:
+                    file_name_with_path = os.path.join(path, file_name)
+                    seq_io.append_seq(seq_io.read_seq(file_name_with_path), all_vRhyme_faa_file)
 
-    for path, dir_list, file_list in walk2:
-        for file_name in file_list:
-            if "faa" in file_name:
-                file_name_with_path = os.path.join(path, file_name)
-                each_vRhyme_faa_dict = store_seq(file_name_with_path)
-                all_vRhyme_faa_dict.update(each_vRhyme_faa_dict) # Add dict from one to another one
-                
-    write_down_seq(all_vRhyme_faa_dict, all_vRhyme_faa)       
+        for path, dir_list, file_list in walk2:
+            for file_name in file_list:
+                if "faa" in file_name:
+                    file_name_with_path = os.path.join(path, file_name)
+                    seq_io.append_seq(seq_io.read_seq(file_name_with_path), all_vRhyme_faa_file)
 
 def combine_all_vRhyme_fasta(vRhyme_best_bin_dir, vRhyme_unbinned_viral_gn_dir, all_vRhyme_fasta):
     walk = os.walk(vRhyme_best_bin_dir)
     walk2 = ''
     if vRhyme_unbinned_viral_gn_dir:
         walk2 = os.walk(vRhyme_unbinned_viral_gn_dir)
-    all_vRhyme_fasta_dict = {}
     
-    for path, dir_list, file_list in walk:
-        for file_name in file_list:
-            if "fasta" in file_name:
-                file_name_with_path = os.path.join(path, file_name)
-                each_vRhyme_faa_dict = store_seq(file_name_with_path)
-                all_vRhyme_fasta_dict.update(each_vRhyme_faa_dict) # Add dict from one to another one
-
-    if walk2:
-        for path, dir_list, file_list in walk2:
+    with seq_io.open_seq_file(all_vRhyme_fasta, 'w') as all_vRhyme_fasta_file:
+        for path, dir_list, file_list in walk:
             for file_name in file_list:
                 if "fasta" in file_name:
                     file_name_with_path = os.path.join(path, file_name)
-                    each_vRhyme_faa_dict = store_seq(file_name_with_path)
-                    all_vRhyme_fasta_dict.update(each_vRhyme_faa_dict) # Add dict from one to another one
-                
-    write_down_seq(all_vRhyme_fasta_dict, all_vRhyme_fasta)     
+                    seq_io.append_seq(seq_io.read_seq(file_name_with_path), all_vRhyme_fasta_file)
+
+        if walk2:
+            for path, dir_list, file_list in walk2:
+                for file_name in file_list:
+                    if "fasta" in file_name:
+                        file_name_with_path = os.path.join(path, file_name)
+                        seq_io.append_seq(seq_io.read_seq(file_name_with_path), all_vRhyme_fasta_file)
    
 def get_genus_cluster_info(genome_by_genome_file, genus_cluster_info, ref_pro2viral_gn_map):
     genus_cluster_dict = {} # VC => VC, all gn
@@ -432,9 +283,21 @@ def get_genus_cluster_info(genome_by_genome_file, genus_cluster_info, ref_pro2vi
         file.write(f'{VC},{gns}\n')           
     file.close()  
     
-def Nlinker(infolder, outdir, extension, n):
+def link_scaffolds(file, outfile, base, n):
+    # Link all sequence lines of one genome file by n of Ns, write down the linked genome, and return the linked genome file
+    with open(file, 'r') as fasta:
+        seq = ("N" * n).join([line.strip("\n") for line in fasta if not line.startswith(">")])
+
+    with open(outfile, "w") as out:
+        out.write(">" + base + "\n" + seq + "\n")
+    return outfile
+
+def Nlinker(infolder, outdir, extension, n, combined_fasta = '', threads = 1):
 # Copied from vRhyme auxiliary scripts by Kristopher Kieft, UW-Madison
 # Using n of Ns to link scaffolds
+# Genomes are linked in parallel by a pool of "threads" threads (the work is mostly file reading and writing, and Nlinker runs within
+# a pipeline step thread, where forking processes is not safe); if combined_fasta is given, each linked genome file is appended to it
+# as soon as it is written, so that only one genome at a time is held in memory by each thread
     files = os.listdir(infolder)
     len_ext = len(extension)
     files = [i for i in files if i[-len_ext:] == extension]
@@ -443,19 +306,19 @@ def Nlinker(infolder, outdir, extension, n):
         sys.stderr.write("\nError: No input files were identified. Verify that the input folder and extension are correct. Exiting.\n\n")
         exit()
 
-    N_string = ''.join("N" * n)
+    jobs = [] # [(file, outfile, base, n)]
     for f in files:
-        file = infolder + "/" + f
         base = f.rsplit(".",1)[0]
-        with open(file, 'r') as fasta:
-            seq = ''
-            for line in fasta:
-                if not line.startswith(">"):
-                    seq += line.strip("\n")
-                    seq += N_string
-
-        with open(outdir + "/" + base + '.linked.' + extension, "w") as outfile:
-            outfile.write(">" + base + "\n" + seq[:-n] + "\n") # -n to remove last n added characters         
+        jobs.append((infolder + "/" + f, outdir + "/" + base + '.linked.' + extension, base, n))
+
+    combined = seq_io.open_seq_file(combined_fasta, 'a') if combined_fasta else None
+    with ThreadPoolExecutor(max_workers = max(int(threads), 1)) as executor:
+        for outfile in executor.map(lambda job: link_scaffolds(*job), jobs):
+            if combined:
+                with open(outfile, 'r') as linked:
+                    shutil.copyfileobj(linked, combined)
+    if combined:
+        combined.close()
                 
 def parse_checkv_result(input_dir, outfile):
     walk = os.walk(input_dir)
@@ -658,8 +521,7 @@ def get_virus_raw_abundance(mapping_result_dir, vRhyme_best_bin_dir, vRhyme_unbi
     
     for gn_adds in all_gn_addrs: 
         gn = Path(gn_adds).stem
-        seqs = store_seq(gn_adds)
-        scaffolds = [x.replace('>', '', 1).split('__', 1)[1] for x in seqs]
+        scaffolds = [viral_id.parse_long_scaffold_id(x).contig for x in seq_io.read_headers(gn_adds)] # The original contig names used in the coverm table
         gn2scaffolds[gn] = scaffolds
         
     # Step 2 Store coverm raw coverage table  
@@ -680,10 +542,6 @@ def get_virus_raw_abundance(mapping_result_dir, vRhyme_best_bin_dir, vRhyme_unbi
             coverages = [] # Store all scaffold coverages
             scaffolds = gn2scaffolds[gn]
             for scaffold in scaffolds:
-                if '_fragment_' in scaffold:
-                    scaffold = scaffold.rsplit('_fragment_', 1)[0]
-                if '||' in scaffold:
-                    scaffold = scaffold.rsplit('||', 1)[0]
                 coverage = coverm_raw_dict[bam][scaffold]
                 coverages.append(coverage)
             gn_coverage = mean(coverages)
@@ -796,12 +654,10 @@ def parse_vibrant_lytic_and_lysogenic_info(vibrant_outdir, metagenomic_scaffold_
     scf2lytic_or_lyso = {} # scf => [lytic_or_lyso_or_integrated_prophage, integrase_presence_or_absence]
     # lytic_or_lyso_or_integrated_prophage can contain: lytic_scaffold, integrated_prophage (parent scaffold), and lysogenic_scaffold
     # integrase_presence_or_absence can contain: integrase_present and integrase_absent
-    lytic_fasta_seq = store_seq(lytic_fasta_addr)
-    lytic_scf2lytic = {x.replace('>', '', 1):'lytic_scaffold' for x in lytic_fasta_seq}
+    lytic_scf2lytic = {x.replace('>', '', 1):'lytic_scaffold' for x in seq_io.read_headers(lytic_fasta_addr)}
 
-    lysogenic_fasta_seq = store_seq(lysogenic_fasta_addr)
     lysogenic_scf2lyso = {} # scf => lyso
-    for header in lysogenic_fasta_seq:
+    for header in seq_io.read_headers(lysogenic_fasta_addr):
         header_wo_array = header.replace('>', '', 1)
         if '_fragment_' in header_wo_array:
             parent_scaffold = header_wo_array.split('_fragment_', 1)[0]
@@ -845,10 +701,9 @@ def get_vRhyme_best_bin_lytic_and_lysogenic_info(vRhyme_best_bin_dir, vrhyme_out
     vRhyme_bin_addrs = glob(os.path.join(vRhyme_best_bin_dir, '*.fasta'))
     for vRhyme_bin_addr in vRhyme_bin_addrs:
         vRhyme_bin = Path(vRhyme_bin_addr).stem
-        vRhyme_bin_seq = store_seq(vRhyme_bin_addr)
         scfs = []
-        for header in vRhyme_bin_seq:
-            scf = header.replace('>', '', 1).split('__', 1)[1]
+        for header in seq_io.read_headers(vRhyme_bin_addr):
+            scf = viral_id.remove_genome_prefix(header)
             scfs.append(scf)
         vRhyme_bin2scf[vRhyme_bin] = scfs
 
@@ -969,11 +824,11 @@ def make_vRhyme_best_bins_fasta_modified(vRhyme_best_bin_dir, vRhyme_best_bin_di
         
         if fasta_stem not in vRhyme_bin_to_split:
             # Copy fasta files
-            os.system(f"cp {fasta_addr} {fasta_addr_new}")
+            shutil.copy(fasta_addr, fasta_addr_new)
             # Copy faa files
-            os.system(f"cp {faa_addr} {faa_addr_new}")
+            shutil.copy(faa_addr, faa_addr_new)
             # Copy ffn files
-            os.system(f"cp {ffn_addr} {ffn_addr_new}")
+            shutil.copy(ffn_addr, ffn_addr_new)
                       
 def parse_vibrant_lytic_and_lysogenic_info_for_wo_reads(vibrant_outdir, metagenomic_scaffold_stem_name):
     # Step 1 Get scf 2 lytic or lysogenic dict
@@ -981,10 +836,8 @@ def parse_vibrant_lytic_and_lysogenic_info_for_wo_reads(vibrant_outdir, metageno
     lytic_fasta_addr = f'{vibrant_outdir}/VIBRANT_phages_{metagenomic_scaffold_stem_name}/{metagenomic_scaffold_stem_name}.phages_lytic.fna'
     
     scf2lytic_or_lyso = {} # scf => 'lytic' or 'lysogenic'
-    lysogenic_fasta_seq = store_seq(lysogenic_fasta_addr)
-    lysogenic_scf2lyso = {x.replace('>', '', 1):'lysogenic' for x in lysogenic_fasta_seq}
-    lytic_fasta_seq = store_seq(lytic_fasta_addr)
-    lytic_scf2lytic = {x.replace('>', '', 1):'lytic' for x in lytic_fasta_seq}
+    lysogenic_scf2lyso = {x.replace('>', '', 1):'lysogenic' for x in seq_io.read_headers(lysogenic_fasta_addr)}
+    lytic_scf2lytic = {x.replace('>', '', 1):'lytic' for x in seq_io.read_headers(lytic_fasta_addr)}
     scf2lytic_or_lyso.update(lysogenic_scf2lyso)
     scf2lytic_or_lyso.update(lytic_scf2lytic)
     
@@ -1001,17 +854,15 @@ def get_viral_gn_size_and_scf_no_and_pro_count(viral_gn_dir):
     all_gn_addrs = glob(f'{viral_gn_dir}/*.fasta')
     for gn_addr in all_gn_addrs:
         gn = Path(gn_addr).stem
-        gn_seq = store_seq(gn_addr)
     
         size = 0
-        for header in gn_seq:
-            size += len(gn_seq[header])
-            
-        scf_no = len(gn_seq)
+        scf_no = 0
+        for header, seq in seq_io.read_seq(gn_addr):
+            size += len(seq)
+            scf_no += 1
         
         gn_faa_addr = gn_addr.replace('.fasta', '.faa', 1)
-        gn_faa_seq = store_seq(gn_faa_addr)
-        pro_count = len(gn_faa_seq)
+        pro_count = sum(1 for _ in seq_io.read_headers(gn_faa_addr))
         
         gn2size_and_scf_no_and_pro_count[gn] = [size, scf_no, pro_count]
     return gn2size_and_scf_no_and_pro_count 
@@ -1019,18 +870,18 @@ def get_viral_gn_size_and_scf_no_and_pro_count(viral_gn_dir):
 def get_viral_gn_size_and_scf_no_and_pro_count_for_wo_reads(final_virus_fasta_file):
     gn2size_and_scf_no_and_pro_count = {} # gn => [size, scf_no, pro_count]
     final_virus_faa_file = final_virus_fasta_file.replace('.fasta', '.faa', 1)
-    final_virus_fasta_file_seq = store_seq(final_virus_fasta_file)
-    final_virus_faa_file_seq = store_seq(final_virus_faa_file)
-    for header in final_virus_fasta_file_seq:
+    
+    gn2pro_count = defaultdict(int) # gn => pro_count
+    for pro_header in seq_io.read_headers(final_virus_faa_file):
+        gn_from_pro_header = viral_id.get_protein_scaffold(pro_header)
+        gn2pro_count[gn_from_pro_header] += 1
+        
+    for header, seq in seq_io.read_seq(final_virus_fasta_file):
         header_wo_array = header.replace('>', '', 1)
         gn = header_wo_array
-        size = len(final_virus_fasta_file_seq[header])
+        size = len(seq)
         scf_no = 1
-        pro_count = 0
-        for pro_header in final_virus_faa_file_seq:
-            gn_from_pro_header = pro_header.replace('>', '', 1).rsplit('_', 1)[0]
-            if gn_from_pro_header == gn:
-                pro_count = pro_count + 1
+        pro_count = gn2pro_count.get(gn, 0)
         gn2size_and_scf_no_and_pro_count[gn] = [size, scf_no, pro_count]       
     return gn2size_and_scf_no_and_pro_count     
     
@@ -1042,8 +893,7 @@ def get_amg_info_for_vb(vibrant_outdir, metagenomic_scaffold_stem_name, viral_gn
     all_gn_addrs = glob(f'{viral_gn_dir}/*.fasta')
     for gn_addr in all_gn_addrs:
         gn = Path(gn_addr).stem
-        gn_seq = store_seq(gn_addr)
-        long_scfs = [x.replace('>', '', 1) for x in gn_seq]
+        long_scfs = [x.replace('>', '', 1) for x in seq_io.read_headers(gn_addr)]
         gn2long_scfs[gn] = long_scfs 
         
     # Step 2 Get scf2kos dict
@@ -1059,7 +909,7 @@ def get_amg_info_for_vb(vibrant_outdir, metagenomic_scaffold_stem_name, viral_gn
     # Step 3 Get gn2long_scf2kos dict
     for gn in gn2long_scfs:
         for long_scf in gn2long_scfs[gn]:
-            scf = long_scf.split('__', 1)[1]
+            scf = viral_id.remove_genome_prefix(long_scf)
             kos = scf2kos[scf]
             gn2long_scf2kos[gn][long_scf] = kos
             
@@ -1238,41 +1088,25 @@ def write_down_amg_pro2info_for_wo_reads(AMG_dir, amg_pro2info):
         f.write(line)
     f.close()     
     
-def pick_amg_pro(AMG_dir, amg_pro2info, viral_gn_dir):
+def pick_amg_pro(AMG_dir, amg_pro2info, all_vRhyme_faa):
     amg_pro_seq_file = os.path.join(AMG_dir,'AMG_pros.faa')  # sequence file for AMG proteins 
     
-    all_amg_pro_seq = {} # Store all the AMG proteins
-    all_faa_addrs = glob(f'{viral_gn_dir}/*.faa')
-    for faa_addr in all_faa_addrs:
-        faa_seq = store_seq(faa_addr)
-        for header_w_array in faa_seq:
-            header = header_w_array.replace('>', '', 1)
-            if header in amg_pro2info:
-                all_amg_pro_seq[header_w_array] = faa_seq[header_w_array]
-    write_down_seq(all_amg_pro_seq, amg_pro_seq_file)    
+    # Seek the AMG proteins from the combined faa of all viral genomes
+    all_amg_pro_seq = seq_index.fetch_seqs(all_vRhyme_faa, amg_pro2info)
+    seq_io.write_seq(all_amg_pro_seq, amg_pro_seq_file)
     
 def pick_amg_pro_for_wo_reads(AMG_dir, amg_pro2info, final_virus_faa_file):
     amg_pro_seq_file = os.path.join(AMG_dir,'AMG_pros.faa')  # sequence file for AMG proteins 
     
-    all_amg_pro_seq = {} # Store all the AMG proteins
-    faa_seq = store_seq(final_virus_faa_file) 
-    for header_w_array in faa_seq:
-        header = header_w_array.replace('>', '', 1)
-        if header in amg_pro2info:
-            all_amg_pro_seq[header_w_array] = faa_seq[header_w_array]
-    write_down_seq(all_amg_pro_seq, amg_pro_seq_file)     
+    all_amg_pro_seq = seq_index.fetch_seqs(final_virus_faa_file, amg_pro2info) # Seek all the AMG proteins
+    seq_io.write_seq(all_amg_pro_seq, amg_pro_seq_file)     
 
-def get_amg_info_for_vs_and_dvf(args, viral_gn_dir):
+def get_amg_info_for_vs_and_dvf(args):
     gn2long_scf2kos = defaultdict(dict) # gn => long_scf => [kos]
     
     # Step 1 Get gn2long_scfs dict
-    gn2long_scfs = {} # gn => [long_scfs]
-    all_gn_addrs = glob(f'{viral_gn_dir}/*.fasta')
-    for gn_addr in all_gn_addrs:
-        gn = Path(gn_addr).stem
-        gn_seq = store_seq(gn_addr)
-        long_scfs = [x.replace('>', '', 1) for x in gn_seq]
-        gn2long_scfs[gn] = long_scfs 
+    registry = id_registry.load_id_registry(args['id_registry_dir'])
+    gn2long_scfs = id_registry.get_gn2scfs(registry) # gn => [long_scfs]
         
     # Step 2 Get scf2kos dict
     scf2kos = defaultdict(list) # scf => [kos]
@@ -1297,7 +1131,7 @@ def get_amg_info_for_vs_and_dvf(args, viral_gn_dir):
     # Step 3 Get gn2long_scf2kos dict
     for gn in gn2long_scfs:
         for long_scf in gn2long_scfs[gn]:
-            scf = long_scf.split('__', 1)[1]
+            scf = viral_id.remove_genome_prefix(long_scf)
             kos = scf2kos[scf]
             gn2long_scf2kos[gn][long_scf] = kos
             
@@ -1388,6 +1222,7 @@ def get_run_input_arguments(args):
     if args['virome']: argu_items.append('--virome')
     argu_items.append('--input_length_limit' + ' ' + str(args['input_length_limit']))
     if args['custom_MAGs_dir'] != 'none': argu_items.append('--custom_MAGs_dir' + ' ' + args['custom_MAGs_dir'])
+    if args['resume']: argu_items.append('--resume')
     
     command += " ".join(argu_items)
     return command
@@ -1404,6 +1239,7 @@ def get_run_input_arguments_wo_reads(args):
     if args['virome']: argu_items.append('--virome')
     argu_items.append('--input_length_limit' + ' ' + str(args['input_length_limit']))
     if args['custom_MAGs_dir'] != 'none': argu_items.append('--custom_MAGs_dir' + ' ' + args['custom_MAGs_dir'])
+    if args['resume']: argu_items.append('--resume')
     
     command += " ".join(argu_items)
     return command    
@@ -1486,26 +1322,21 @@ def get_virus_genome_annotation_result(args):
         lines.close()            
                     
         # Step 2 Store gn2long_proteins and long_protein2gn dict
-        gn2long_proteins = {} # gn => [long_proteins]
         long_protein2gn = {} # long_protein => gn
         
-        all_faa_addrs = glob(os.path.join(args['viwrap_summary_outdir'],'Virus_genomes_files/*.faa'))
-        for faa_addr in all_faa_addrs:
-            gn = Path(faa_addr).stem
-            faa_seqs = store_seq(faa_addr)
-            long_proteins = [x.replace('>', '', 1).split('\t', 1)[0] for x in faa_seqs]
-            gn2long_proteins[gn] = long_proteins
-            
-            for long_protein in long_proteins:
+        registry = id_registry.load_id_registry(args['id_registry_dir'])
+        gn2long_proteins = id_registry.get_gn2pros(registry) # gn => [long_proteins]
+        for gn in gn2long_proteins:
+            for long_protein in gn2long_proteins[gn]:
                 long_protein2gn[long_protein] = gn
                 
         # Step 3 Get new VIBRANT annotation result
         vibrant_annotation_result_new = {} # long_protein => [items in each line]
         for long_protein in long_protein2gn:
-            protein = long_protein.split('__', 1)[1]
+            protein = viral_id.remove_genome_prefix(long_protein)
             items = vibrant_annotation_result[protein]
             items[0] = long_protein
-            items[1] = long_protein.rsplit('_', 1)[0]
+            items[1] = viral_id.get_protein_scaffold(long_protein)
             items.insert(0, long_protein2gn[long_protein])
             vibrant_annotation_result_new[long_protein] = items
             
@@ -1544,26 +1375,21 @@ def get_virus_genome_annotation_result(args):
         lines.close() 
 
         # Step 2 Store gn2long_proteins and long_protein2gn dict
-        gn2long_proteins = {} # gn => [long_proteins]
         long_protein2gn = {} # long_protein => gn
         
-        all_faa_addrs = glob(os.path.join(args['viwrap_summary_outdir'],'Virus_genomes_files/*.faa'))
-        for faa_addr in all_faa_addrs:
-            gn = Path(faa_addr).stem
-            faa_seqs = store_seq(faa_addr)
-            long_proteins = [x.replace('>', '', 1) for x in faa_seqs]
-            gn2long_proteins[gn] = long_proteins
-            
-            for long_protein in long_proteins:
+        registry = id_registry.load_id_registry(args['id_registry_dir'])
+        gn2long_proteins = id_registry.get_gn2pros(registry) # gn => [long_proteins]
+        for gn in gn2long_proteins:
+            for long_protein in gn2long_proteins[gn]:
                 long_protein2gn[long_protein] = gn 
 
         # Step 3 Get new VIBRANT annotation result
         annotation_result_new = {} # long_protein => [items in each line]
         for long_protein in long_protein2gn:
-            protein = long_protein.split('__', 1)[1]
+            protein = viral_id.remove_genome_prefix(long_protein)
             items = annotation_result[protein]
             items[0] = long_protein
-            items[1] = long_protein.rsplit('_', 1)[0]
+            items[1] = viral_id.get_protein_scaffold(long_protein)
             items.insert(0, long_protein2gn[long_protein])
             annotation_result_new[long_protein] = items
             
@@ -1676,22 +1502,7 @@ def get_keep2_mc_seq(virsorter_outdir, keep2_list_file, manual_check_list_file,
     lines.close()  
 
     # Step 2 Make keep2_fasta, manual_check_fasta
-    all_seq = store_seq(os.path.join(virsorter_outdir, 'pass2/final-viral-combined.fa'))
-    
-    all_seq_keep2 = {}
-    for header in all_seq:
-        header_wo_array = header.replace('>', '', 1)
-        if header_wo_array in keep2_list:
-            all_seq_keep2[header] = all_seq[header]
-            
-    all_seq_manual_check = {}
-    for header in all_seq:
-        header_wo_array = header.replace('>', '', 1)
-        if header_wo_array in manual_check_list:
-            all_seq_manual_check[header] = all_seq[header] 
-            
-    write_down_seq(all_seq_keep2, keep2_fasta) 
-    write_down_seq(all_seq_manual_check, manual_check_fasta) 
+    seq_io.extract_seq_to_files(os.path.join(virsorter_outdir, 'pass2/final-viral-combined.fa'), [(keep2_list, keep2_fasta), (manual_check_list, manual_check_fasta)])
 
 def get_keep2_vb_passed_list(virsorter_outdir, keep2_vb_result, keep2_list_vb_passed_file):
     # Step 1 Store keep2_list
@@ -1708,11 +1519,8 @@ def get_keep2_vb_passed_list(virsorter_outdir, keep2_vb_result, keep2_list_vb_pa
     lines.close()
   
     keep2_list_vb_passed = {} # seq => [length, score, hallmark, viral_gene, host_gene]
-    keep2_vb_result_seq = store_seq(keep2_vb_result)
-    for header in keep2_vb_result_seq:
-        header_wo_array = header.replace('>', '', 1)
-        if '_fragment' in header_wo_array:
-            header_wo_array = header_wo_array.rsplit('_fragment', 1)[0]
+    for header in seq_io.read_headers(keep2_vb_result):
+        header_wo_array = viral_id.get_contig(header)
         keep2_list_vb_passed[header_wo_array] = keep2_list[header_wo_array]
         
     f = open(keep2_list_vb_passed_file, 'w')
@@ -1736,11 +1544,8 @@ def get_manual_check_vb_passed_list(virsorter_outdir, manual_check_vb_result, ma
     lines.close()
   
     manual_check_list_vb_passed = {} # seq => [length, score, hallmark, viral_gene, host_gene]
-    manual_check_vb_result_seq = store_seq(manual_check_vb_result)
-    for header in manual_check_vb_result_seq:
-        header_wo_array = header.replace('>', '', 1)
-        if '_fragment' in header_wo_array:
-            header_wo_array = header_wo_array.rsplit('_fragment', 1)[0]
+    for header in seq_io.read_headers(manual_check_vb_result):
+        header_wo_array = viral_id.get_contig(header)
         manual_check_list_vb_passed[header_wo_array] = manual_check_list[header_wo_array]
         
     f = open(manual_check_list_vb_passed_file, 'w')
@@ -1784,19 +1589,12 @@ def get_final_vs2_virus(virsorter_outdir, keep1_list_file, keep2_list_vb_passed_
         lines.close()  
 
     # Step 2 Make final_vs2_virus.fasta
-    all_seq = store_seq(os.path.join(virsorter_outdir, 'pass2/final-viral-combined.fa'))
-    
-    all_seq_final = {}
-    for header in all_seq:
-        header_wo_array = header.replace('>', '', 1)
-        if header_wo_array in keep1_list or header_wo_array in keep2_list_vb_passed or header_wo_array in manual_check_list_vb_passed:
-            all_seq_final[header] = all_seq[header] 
-            
-    write_down_seq(all_seq_final, final_vs2_virus_fasta_file)    
+    final_vs2_virus_ids = set(keep1_list) | set(keep2_list_vb_passed) | set(manual_check_list_vb_passed)
+    seq_io.extract_seq(os.path.join(virsorter_outdir, 'pass2/final-viral-combined.fa'), final_vs2_virus_ids, final_vs2_virus_fasta_file)    
     
 def get_dvf_result_seq(args, inner_dvf_outdir, final_dvf_virus_fasta_file):
     # Step 1 Store and filter dvfpred.txt
-    dvf_passed_seq = [] 
+    dvf_passed_seq = set() 
     with open(os.path.join(inner_dvf_outdir, f"{Path(args['input_metagenome']).stem}.fasta_gt{args['input_length_limit']}bp_dvfpred.txt"),'r') as lines:
         for line in lines:
             line = line.rstrip('\n')
@@ -1806,57 +1604,42 @@ def get_dvf_result_seq(args, inner_dvf_outdir, final_dvf_virus_fasta_file):
                 score = tmp[2]
                 pvalue = tmp[3]
                 if float(score) >= 0.95 and float(pvalue) < 0.05: 
-                    dvf_passed_seq.append(seq)
+                    dvf_passed_seq.add(seq)
                 else:
                     continue
              
     # Step 2 get the final_dvf_virus_fasta_file
-    all_seq = store_seq(args['input_metagenome'])
-    
-    all_seq_final = {}
-    for header in all_seq:
-        header_wo_array = header.replace('>', '', 1)
-        if header_wo_array in dvf_passed_seq:
-            all_seq_final[header] = all_seq[header] 
-            
-    write_down_seq(all_seq_final, final_dvf_virus_fasta_file)  
+    seq_io.extract_seq(args['input_metagenome'], dvf_passed_seq, final_dvf_virus_fasta_file)  
     
 def get_vb_result_seq(args, final_vb_virus_fasta_file, final_vb_virus_ffn_file, final_vb_virus_faa_file, final_vb_virus_annotation_file): 
     # Step 1 get final_vb_virus_fasta 
-    final_vb_virus_fasta_seq = store_seq(os.path.join(args['vibrant_outdir'], f"VIBRANT_phages_{Path(args['input_metagenome']).stem}", f"{Path(args['input_metagenome']).stem}.phages_combined.fna"))
-    write_down_seq(final_vb_virus_fasta_seq, final_vb_virus_fasta_file)  
+    final_vb_virus_fasta_seq = seq_io.read_seq(os.path.join(args['vibrant_outdir'], f"VIBRANT_phages_{Path(args['input_metagenome']).stem}", f"{Path(args['input_metagenome']).stem}.phages_combined.fna"))
+    seq_io.write_seq(final_vb_virus_fasta_seq, final_vb_virus_fasta_file)  
     # Step 2 get final_vb_virus_ffn
-    final_vb_virus_ffn_seq = store_seq(os.path.join(args['vibrant_outdir'], f"VIBRANT_phages_{Path(args['input_metagenome']).stem}", f"{Path(args['input_metagenome']).stem}.phages_combined.ffn"))
-    write_down_seq(final_vb_virus_ffn_seq, final_vb_virus_ffn_file)  
+    final_vb_virus_ffn_seq = seq_io.read_seq(os.path.join(args['vibrant_outdir'], f"VIBRANT_phages_{Path(args['input_metagenome']).stem}", f"{Path(args['input_metagenome']).stem}.phages_combined.ffn"))
+    seq_io.write_seq(final_vb_virus_ffn_seq, final_vb_virus_ffn_file)  
     # Step 3 get final_vb_virus_faa
-    final_vb_virus_faa_seq = store_seq(os.path.join(args['vibrant_outdir'], f"VIBRANT_phages_{Path(args['input_metagenome']).stem}", f"{Path(args['input_metagenome']).stem}.phages_combined.faa"))
-    write_down_seq(final_vb_virus_faa_seq, final_vb_virus_faa_file)    
+    final_vb_virus_faa_seq = seq_io.read_seq(os.path.join(args['vibrant_outdir'], f"VIBRANT_phages_{Path(args['input_metagenome']).stem}", f"{Path(args['input_metagenome']).stem}.phages_combined.faa"))
+    seq_io.write_seq(final_vb_virus_faa_seq, final_vb_virus_faa_file)    
     # Step 4 get final_vb_virus_annotation
     final_vb_virus_annotation_file_old_addr = os.path.join(args['vibrant_outdir'], f"VIBRANT_results_{Path(args['input_metagenome']).stem}", f"VIBRANT_annotations_{Path(args['input_metagenome']).stem}.tsv")
-    os.system(f"cp {final_vb_virus_annotation_file_old_addr} {final_vb_virus_annotation_file}")
+    shutil.copy(final_vb_virus_annotation_file_old_addr, final_vb_virus_annotation_file)
                  
 def get_overlapped_viral_scaffolds(final_vb_virus_fasta_file, final_vs2_virus_fasta_file, final_dvf_virus_fasta_file, final_vb_virus_annotation_file, overlap_outdir):    
     # Step 1 Store vb_viral_scaffold_ids (both include and exclude 'fragment')
     vb_viral_scaffold_ids_include_fragment = set()
     vb_viral_scaffold_ids = set()
-    final_vb_virus_fasta_file_seqs = store_seq(final_vb_virus_fasta_file)
-    vb_viral_scaffold_ids_include_fragment = set([x.replace('>', '', 1) for x in final_vb_virus_fasta_file_seqs])
-    for scaffold_id in vb_viral_scaffold_ids_include_fragment:
-        if '_fragment' not in scaffold_id:
-            vb_viral_scaffold_ids.add(scaffold_id)
-        else:
-            vb_viral_scaffold_ids.add(scaffold_id.split('_fragment', 1)[0])
+    vb_viral_scaffold_ids_include_fragment = set([x.replace('>', '', 1) for x in seq_io.read_headers(final_vb_virus_fasta_file)])
+    vb_viral_scaffold_ids = set([viral_id.get_contig(scaffold_id) for scaffold_id in vb_viral_scaffold_ids_include_fragment])
         
     # Step 2 Store vs_viral_scaffold_ids (exclude info after '||')
     vs_viral_scaffold_ids = set()
-    final_vs_virus_fasta_file_seqs = store_seq(final_vs2_virus_fasta_file)
-    vs_viral_scaffold_ids = set([x.replace('>', '', 1).split('||', 1)[0] for x in final_vs_virus_fasta_file_seqs])
+    vs_viral_scaffold_ids = set([viral_id.get_contig(x) for x in seq_io.read_headers(final_vs2_virus_fasta_file)])
     
     # Step 3 Store dvf_viral_scaffold_ids
     dvf_viral_scaffold_ids = set()
     if final_dvf_virus_fasta_file:
-        final_dvf_virus_fasta_file_seqs = store_seq(final_dvf_virus_fasta_file)
-        dvf_viral_scaffold_ids = set([x.replace('>', '', 1) for x in final_dvf_virus_fasta_file_seqs])
+        dvf_viral_scaffold_ids = set([x.replace('>', '', 1) for x in seq_io.read_headers(final_dvf_virus_fasta_file)])
     
     # Step 4 Get the final overlapped viral scaffold ids (mainly based on vb viral scaffold ids, include 'fragment')
     overlapped_viral_scaffold_ids = set()
@@ -1866,33 +1649,30 @@ def get_overlapped_viral_scaffolds(final_vb_virus_fasta_file, final_vs2_virus_fa
         overlapped_viral_scaffold_ids = vb_viral_scaffold_ids & vs_viral_scaffold_ids
     overlapped_viral_scaffold_ids_include_fragment = set()
     for scaffold_id in vb_viral_scaffold_ids_include_fragment:
-        if scaffold_id.split('_fragment', 1)[0] in overlapped_viral_scaffold_ids:
+        if viral_id.get_contig(scaffold_id) in overlapped_viral_scaffold_ids:
             overlapped_viral_scaffold_ids_include_fragment.add(scaffold_id)
     
     # Step 5 Get related files: ffn, faa, and annotation file
     ## Step 5.1 Make fasta file
     os.mkdir(overlap_outdir) 
-    final_overlapped_virus_fasta_file_seqs = {}
-    for scaffold_id in overlapped_viral_scaffold_ids_include_fragment:
-        scaffold_id_w_array = '>' + scaffold_id
-        final_overlapped_virus_fasta_file_seqs[scaffold_id_w_array] = final_vb_virus_fasta_file_seqs[scaffold_id_w_array]
-    write_down_seq(final_overlapped_virus_fasta_file_seqs, os.path.join(overlap_outdir, 'final_overlapped_virus.fasta'))
+    final_vb_virus_fasta_index = seq_index.load_seq_index(final_vb_virus_fasta_file)
+    overlapped_scaffolds = [x for x in final_vb_virus_fasta_index if x in overlapped_viral_scaffold_ids_include_fragment]
+    final_overlapped_virus_fasta_file_seqs = seq_index.fetch_seqs(final_vb_virus_fasta_file, overlapped_scaffolds, seq_index = final_vb_virus_fasta_index)
+    seq_io.write_seq(final_overlapped_virus_fasta_file_seqs, os.path.join(overlap_outdir, 'final_overlapped_virus.fasta'))
 
     ## Step 5.2 Make ffn file      
-    final_vb_virus_ffn_file_seqs = store_seq(final_vb_virus_fasta_file.replace('.fna', '.ffn', 1))
-    final_overlapped_virus_ffn_file_seqs = {}
-    for scaffold_id_w_array in final_vb_virus_ffn_file_seqs:
-        if scaffold_id_w_array.replace('>', '', 1).rsplit('_', 1)[0] in overlapped_viral_scaffold_ids_include_fragment:
-            final_overlapped_virus_ffn_file_seqs[scaffold_id_w_array] = final_vb_virus_ffn_file_seqs[scaffold_id_w_array]
-    write_down_seq(final_overlapped_virus_ffn_file_seqs, os.path.join(overlap_outdir, 'final_overlapped_virus.ffn')) 
+    final_vb_virus_ffn_file = final_vb_virus_fasta_file.replace('.fna', '.ffn', 1)
+    final_vb_virus_ffn_index = seq_index.load_seq_index(final_vb_virus_ffn_file)
+    overlapped_genes = [x for x in final_vb_virus_ffn_index if viral_id.get_protein_scaffold(x) in overlapped_viral_scaffold_ids_include_fragment]
+    final_overlapped_virus_ffn_file_seqs = seq_index.fetch_seqs(final_vb_virus_ffn_file, overlapped_genes, seq_index = final_vb_virus_ffn_index)
+    seq_io.write_seq(final_overlapped_virus_ffn_file_seqs, os.path.join(overlap_outdir, 'final_overlapped_virus.ffn')) 
 
     ## Step 5.3 Make faa file      
-    final_vb_virus_faa_file_seqs = store_seq(final_vb_virus_fasta_file.replace('.fna', '.faa', 1))
-    final_overlapped_virus_faa_file_seqs = {}
-    for scaffold_id_w_array in final_vb_virus_faa_file_seqs:
-        if scaffold_id_w_array.replace('>', '', 1).rsplit('_', 1)[0] in overlapped_viral_scaffold_ids_include_fragment:
-            final_overlapped_virus_faa_file_seqs[scaffold_id_w_array] = final_vb_virus_faa_file_seqs[scaffold_id_w_array]
-    write_down_seq(final_overlapped_virus_faa_file_seqs, os.path.join(overlap_outdir, 'final_overlapped_virus.faa'))      
+    final_vb_virus_faa_file = final_vb_virus_fasta_file.replace('.fna', '.faa', 1)
+    final_vb_virus_faa_index = seq_index.load_seq_index(final_vb_virus_faa_file)
+    overlapped_pros = [x for x in final_vb_virus_faa_index if viral_id.get_protein_scaffold(x) in overlapped_viral_scaffold_ids_include_fragment]
+    final_overlapped_virus_faa_file_seqs = seq_index.fetch_seqs(final_vb_virus_faa_file, overlapped_pros, seq_index = final_vb_virus_faa_index)
+    seq_io.write_seq(final_overlapped_virus_faa_file_seqs, os.path.join(overlap_outdir, 'final_overlapped_virus.faa'))      
         
     ## Step 5.4 Make annotation file
     final_vb_virus_annotation = pd.read_csv(final_vb_virus_annotation_file, sep = '\t')
@@ -1900,34 +1680,51 @@ def get_overlapped_viral_scaffolds(final_vb_virus_fasta_file, final_vs2_virus_fa
     final_overlapped_virus_annotation = final_vb_virus_annotation[final_vb_virus_annotation['protein'].isin(final_overlapped_virus_faa_ids)]
     final_overlapped_virus_annotation.to_csv(os.path.join(overlap_outdir, 'final_overlapped_virus.annotation.txt'), sep='\t', index=False)
     
-def get_split_viral_gn(final_virus_fasta_file, split_viral_gn_dir):
-    # Step 1 Store final_virus_fasta seq and final_virus_faa seq
-    final_virus_fasta_seq = store_seq(final_virus_fasta_file)
+def get_split_viral_gn(final_virus_fasta_file, split_viral_gn_dir, max_gn_per_dir = 0):
+    # max_gn_per_dir: if the number of genomes is larger than it, shard genomes into sub-dirs (shard_1, shard_2, ...) of split_viral_gn_dir
+    # 0 means no sharding
     final_virus_faa_file = final_virus_fasta_file.replace('.fasta', '.faa', 1)
-    final_virus_faa_seq = store_seq(final_virus_faa_file)
     
-    # Step 2 Make split_viral_gn_dir and write down individual fasta and faa files
+    # Step 1 Get the genome count to decide whether to shard 
+    gn_num = sum(1 for _ in seq_io.read_headers(final_virus_fasta_file))
+    shard = max_gn_per_dir and gn_num > int(max_gn_per_dir)
+    
+    # Step 2 Make split_viral_gn_dir and write down individual fasta files in one pass
     os.mkdir(split_viral_gn_dir)
-    for header in final_virus_fasta_seq:
+    gn2out_prefix = {} # gn (header_wo_array) => output file path without the extension
+    for i, (header, seq) in enumerate(seq_io.read_seq(final_virus_fasta_file)):
         header_wo_array = header.replace('>', '', 1)
-        seq = final_virus_fasta_seq[header]
+        out_dir = split_viral_gn_dir
+        if shard:
+            out_dir = os.path.join(split_viral_gn_dir, f"shard_{i // int(max_gn_per_dir) + 1}")
+            if i % int(max_gn_per_dir) == 0:
+                os.mkdir(out_dir)
+        out_prefix = os.path.join(out_dir, header_wo_array)
+        if '||' in out_prefix:
+            out_prefix = out_prefix.replace('||', '__', 1)
+        gn2out_prefix[header_wo_array] = out_prefix
         
-        each_fasta_seq_dict = {}
-        each_fasta_seq_dict[header] = seq
-        each_fasta_seq_file = os.path.join(split_viral_gn_dir, f"{header_wo_array}.fasta")
-        if '||' in each_fasta_seq_file:
-            each_fasta_seq_file = each_fasta_seq_file.replace('||', '__', 1)
-        write_down_seq(each_fasta_seq_dict, each_fasta_seq_file)
+        with open(f"{out_prefix}.fasta", 'w') as each_fasta_seq_file:
+            each_fasta_seq_file.write(f'{header}\n{seq}\n')
         
-        each_faa_seq_dict = {}
-        for pro_header in final_virus_faa_seq:
-            header_wo_array_from_pro_header = pro_header.replace('>', '', 1).rsplit('_', 1)[0]
-            if header_wo_array_from_pro_header == header_wo_array:
-                each_faa_seq_dict[pro_header] = final_virus_faa_seq[pro_header]
-                each_faa_seq_file = os.path.join(split_viral_gn_dir, f"{header_wo_array}.faa")
-                if '||' in each_faa_seq_file:
-                    each_faa_seq_file = each_faa_seq_file.replace('||', '__', 1)
-                write_down_seq(each_faa_seq_dict, each_faa_seq_file)
+    # Step 3 Write down individual faa files in one pass; proteins of one genome are adjacent in final_virus.faa, 
+    # so each faa file is normally opened once; if they are not adjacent, the faa file is re-opened in append mode
+    gn_w_faa = set()
+    each_faa_seq_file = None
+    current_gn = None
+    for pro_header, pro_seq in seq_io.read_seq(final_virus_faa_file):
+        gn = viral_id.get_protein_scaffold(pro_header)
+        if gn not in gn2out_prefix:
+            continue
+        if gn != current_gn:
+            if each_faa_seq_file:
+                each_faa_seq_file.close()
+            each_faa_seq_file = open(f"{gn2out_prefix[gn]}.faa", 'a' if gn in gn_w_faa else 'w')
+            gn_w_faa.add(gn)
+            current_gn = gn
+        each_faa_seq_file.write(f'{pro_header}\n{pro_seq}\n')
+    if each_faa_seq_file:
+        each_faa_seq_file.close()
                 
 def get_gn_lyso_lytic_result(scf2lytic_or_lyso_summary, vRhyme_best_bin_lytic_and_lysogenic_info, viral_gn_dir):
     gn2lyso_lytic_result = {} # gn => lyso_lytic_property
@@ -1965,9 +1762,8 @@ def get_gn_lyso_lytic_result(scf2lytic_or_lyso_summary, vRhyme_best_bin_lytic_an
     for vRhyme_unbinned_addr in vRhyme_unbinned_addrs:
         vRhyme_unbinned = Path(vRhyme_unbinned_addr).stem
         scf = ''
-        vRhyme_unbinned_seq = store_seq(vRhyme_unbinned_addr)
-        for header in vRhyme_unbinned_seq:
-            scf = header.replace('>', '', 1).split('__', 1)[1]
+        for header in seq_io.read_headers(vRhyme_unbinned_addr):
+            scf = viral_id.remove_genome_prefix(header)
         gn2lyso_lytic_result[vRhyme_unbinned] = scf2lytic_or_lyso[scf][0] 
 
     return gn2lyso_lytic_result       
@@ -1988,8 +1784,7 @@ def get_gn_lyso_lytic_result_for_wo_reads(scf2lytic_or_lyso_summary, final_virus
                 scf2lytic_or_lyso[scf] = [lytic_or_lyso_or_integrated_prophage, integrase_presence_or_absence]  
 
     # Step 2 Store gn list
-    final_virus_fasta_seq = store_seq(final_virus_fasta_file)
-    gn_list = [x.replace('>', '', 1) for x in final_virus_fasta_seq]
+    gn_list = [x.replace('>', '', 1) for x in seq_io.read_headers(final_virus_fasta_file)]
     
     # Step 3 Store gn2lyso_lytic_result
     for gn in gn_list:
@@ -2145,17 +1940,12 @@ def generate_result_visualization_inputs(viwrap_visualization_outdir, viwrap_sum
     f.close()          
                 
 def change_vertical_bar_to_underscore(final_vs2_virus_fasta_file):    
-    # Step 1 Store seq
-    final_vs2_virus_fasta_file_seq = store_seq(final_vs2_virus_fasta_file)
-
-    # Step 2 Change vertical bar to underscore
-    final_vs2_virus_fasta_file_seq_new = {}
-    for header in final_vs2_virus_fasta_file_seq:
-        header_new = header.replace('||', '__', 1)
-        final_vs2_virus_fasta_file_seq_new[header_new] = final_vs2_virus_fasta_file_seq[header]
+    # Step 1 Stream seq and change vertical bar to underscore
+    final_vs2_virus_fasta_file_seq_new = ((header.replace('||', '__', 1), seq) for header, seq in seq_io.read_seq(final_vs2_virus_fasta_file))
         
-    # Step 3 Remove the old fasta file and write down the new one
-    os.system(f"rm {final_vs2_virus_fasta_file}")
-    write_down_seq(final_vs2_virus_fasta_file_seq_new, final_vs2_virus_fasta_file)
+    # Step 2 Write down the new fasta file to a tmp file and replace the old one
+    final_vs2_virus_fasta_file_tmp = final_vs2_virus_fasta_file + '.tmp'
+    seq_io.write_seq(final_vs2_virus_fasta_file_seq_new, final_vs2_virus_fasta_file_tmp)
+    os.replace(final_vs2_virus_fasta_file_tmp, final_vs2_virus_fasta_file)
         
       
\ No newline at end of file
@@ -0,0 +1,379 @@
+#!/usr/bin/env python3
+
+'''
+Aim: Run the ViWrap steps as a dependency graph (DAG) instead of one straight line
+Note: Each step declares the artifacts (files or folders) it needs (inputs) and makes (outputs);
+a step starts as soon as all steps making its inputs are finished, and independent steps run concurrently.
+Inputs that are not made by any step (i.e., the input metagenome and the databases) are ready from the start.
+Steps run in threads: the heavy work is done by external tools started as subprocesses (conda_launcher.run and supervisor.run),
+so a step thread mostly waits on its tools and does not hold the GIL
+With a checkpoint dir, a marker is written for each finished step, recording the checksums of its inputs that are not made
+by any step (i.e., the input metagenome, reads, and databases), the versions of its conda envs, and its parameters.
+In the resume mode, a step is skipped if its marker is still valid; invalid steps and all steps downstream of them are run again
+'''
+
+try:
+    import warnings
+    import sys
+    import os
+    import logging
+    import json
+    import hashlib
+    import shutil
+    import threading
+    import time
+    from glob import glob
+    from functools import partial
+    from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+    from datetime import datetime
+    warnings.filterwarnings("ignore")
+except Exception as e:
+    sys.stderr.write(str(e) + "\n\n")
+    exit(1)
+
+
+# Scaling of each virus identification branch: (relative run time with 1 thread, parallel fraction);
+# rough estimates - the VirSorter2 branch runs VirSorter2 and CheckV twice plus VIBRANT on "keep2" and "manual_check",
+# and DeepVirFinder has no threads option, so it is given 1 thread and never more
+IDENTIFY_BRANCH2SCALING = {'VIBRANT': (1.0, 0.9), 'VirSorter2': (2.0, 0.9), 'DVF': (0.5, 0.0)}
+
+step_context = threading.local() # step_context.name is the name of the step run by the current thread, i.e., for adding it to log messages
+
+
+class PipelineError(Exception):
+    pass
+
+
+def get_params(args, keys):
+    # Pick the parameters that change the result of a step
+    return {key: args[key] for key in keys}
+    
+def split_threads(threads, branch2scaling):
+    # Split the threads between branches running at the same time, so that the slowest branch finishes as early as possible:
+    # each branch gets 1 thread, then each of the other threads goes to the branch with the longest estimated run time that can use it
+    # (Amdahl's law: run time = run time with 1 thread * (1 - parallel fraction + parallel fraction / threads))
+    branch2threads = {branch: 1 for branch in branch2scaling}
+    def get_run_time(branch):
+        single_thread_time, parallel_fraction = branch2scaling[branch]
+        return single_thread_time * (1 - parallel_fraction + parallel_fraction / branch2threads[branch])
+        
+    scalable_branches = [branch for branch in branch2scaling if branch2scaling[branch][1] > 0]
+    if scalable_branches:
+        for _ in range(int(threads) - len(branch2threads)):
+            branch2threads[max(scalable_branches, key = get_run_time)] += 1
+    return branch2threads
+    
+def get_file_checksum(input_file, block_size = 1 << 20):
+    md5 = hashlib.md5()
+    with open(input_file, 'rb') as f:
+        for block in iter(partial(f.read, block_size), b''):
+            md5.update(block)
+    return md5.hexdigest()
+
+def get_dir_checksum(input_dir):
+    # The relative paths and sizes of all files in a folder; the contents are not read, as database folders are too large
+    md5 = hashlib.md5()
+    for root, dirs, files in os.walk(input_dir):
+        dirs.sort()
+        for file in sorted(files):
+            file_with_path = os.path.join(root, file)
+            try:
+                size = os.path.getsize(file_with_path)
+            except OSError: # Broken link
+                size = -1
+            md5.update(f"{os.path.relpath(file_with_path, input_dir)}\t{size}\n".encode())
+    return md5.hexdigest()
+
+def get_disk_usage(path):
+    # The total size (bytes) of a file or of all files in a folder
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    size = 0
+    for root, dirs, files in os.walk(path):
+        for file in files:
+            try:
+                size += os.path.getsize(os.path.join(root, file))
+            except OSError: # Broken link
+                pass
+    return size
+
+def get_input_signature(input_path, recorded = None):
+    # Returns {'size': , 'mtime_ns': , 'checksum': } for a file, {'checksum': } for a folder, and None if the path does not exist;
+    # the full checksum of a file is only computed again if its size or modification time is not the same as the recorded one
+    if os.path.isfile(input_path):
+        stat = os.stat(input_path)
+        if recorded and recorded.get('size') == stat.st_size and recorded.get('mtime_ns') == stat.st_mtime_ns:
+            return recorded
+        return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'checksum': get_file_checksum(input_path)}
+    elif os.path.isdir(input_path):
+        return {'checksum': get_dir_checksum(input_path)}
+    return None
+
+def get_conda_env_version(env_dir):
+    # Each installed package has a "name-version-build.json" file in conda-meta, so the file names pin all tool versions in the env
+    packages = sorted(os.path.basename(x) for x in glob(os.path.join(env_dir, 'conda-meta', '*.json')))
+    if not packages:
+        return None
+    return hashlib.md5('\n'.join(packages).encode()).hexdigest()
+    
+def is_same_checksum(signature_1, signature_2):
+    if signature_1 is None or signature_2 is None:
+        return signature_1 is signature_2
+    return signature_1['checksum'] == signature_2['checksum']
+    
+
+class Step:
+    def __init__(self, name, func, inputs = (), outputs = (), after = (), params = None, envs = (), removes = ()):
+        self.name = name
+        self.func = func # Called without arguments; use functools.partial or a lambda to bind args
+        self.inputs = [x for x in inputs if x] # Artifacts needed by this step; empty ones (i.e., an option not used) are dropped
+        self.outputs = [x for x in outputs if x] # Artifacts made by this step
+        self.after = list(after) # Names of steps that should finish before this step, besides the ones found by artifacts
+        self.params = json.loads(json.dumps(params or {})) # Parameters recorded in the marker (normalized as they are read back from json)
+        self.envs = list(envs) # Conda env dirs used by this step; their package versions are recorded in the marker
+        self.removes = [x for x in removes if x] # Artifacts of other steps that this step moves away or removes
+        self.checkpoint_dir = None # The folder of its marker if it is not the one of the pipeline (i.e., a step added from another pipeline)
+        self.marker_name = name # The name of its marker file, and the step name recorded in the marker
+        self.run_features = None # The run features recorded in the step history if they are not the ones of the pipeline (i.e., another sample)
+
+
+class Pipeline:
+    def __init__(self, max_parallel_steps = 1, checkpoint_dir = None, resume = False):
+        self.steps = {} # name => Step; keeps the adding order, which is also the order to start ready steps
+        self.max_parallel_steps = max(1, int(max_parallel_steps))
+        self.checkpoint_dir = checkpoint_dir # The folder to store step markers; no markers are written if it is None
+        self.resume = resume # Skip the steps with valid markers, and clear the outputs of the other steps before running them
+        self.priority = None # Function: name => sort key, to choose which ready steps to start first; the adding order is used if None
+        self.history_file = None # A json lines file; the wall time and disk footprint of each finished step are appended to it, for calibrating cost estimates
+        self.run_features = {} # The inputs that decide the cost of the run (i.e., the sizes of the assembly and reads), recorded with each step in the history
+        self.get_step_metrics = None # Function: name => dict of measured usage of the step (i.e., the peak RSS of its processes), added to its history record
+        self.step2span = {} # name => (start, end) time (seconds since the epoch) of the step in this run
+        self.logger = logging.getLogger(__name__)
+        self.signatures = {} # input path => signature; computed once for each run
+        self.lock = threading.Lock()
+
+    def add_step(self, name, func, inputs = (), outputs = (), after = (), params = None, envs = (), removes = ()):
+        if name in self.steps:
+            raise ValueError(f'Step {name} has been added already')
+        self.steps[name] = Step(name, func, inputs, outputs, after, params, envs, removes)
+
+    def add_pipeline(self, prefix, pipeline):
+        # Add all steps of another pipeline (i.e., one sample of a batch) as "prefix/name"; their markers are kept in the checkpoint dir of that pipeline,
+        # so that the sample can also be resumed by itself
+        for step in pipeline.steps.values():
+            name = f'{prefix}/{step.name}'
+            self.add_step(name, step.func, step.inputs, step.outputs, [f'{prefix}/{x}' for x in step.after], step.params, step.envs, step.removes)
+            self.steps[name].checkpoint_dir = step.checkpoint_dir or pipeline.checkpoint_dir
+            self.steps[name].marker_name = step.marker_name
+            self.steps[name].run_features = step.run_features or pipeline.run_features
+
+    def get_artifact2step(self):
+        # Returns artifact => name of the step that makes it
+        artifact2step = {}
+        for step in self.steps.values():
+            for output in step.outputs:
+                if output in artifact2step:
+                    raise ValueError(f'Artifact {output} is made by both step {artifact2step[output]} and step {step.name}')
+                artifact2step[output] = step.name
+        return artifact2step
+
+    def get_dependencies(self):
+        # Returns name => set of names of the steps it depends on
+        artifact2step = self.get_artifact2step()
+        dependencies = {} # name => {names}
+        for step in self.steps.values():
+            dependencies[step.name] = set(artifact2step[x] for x in step.inputs if x in artifact2step and artifact2step[x] != step.name)
+            for name in step.after:
+                if name not in self.steps:
+                    raise ValueError(f'Step {step.name} should run after step {name}, but there is no step {name}')
+                dependencies[step.name].add(name)
+        return dependencies
+
+    def get_order(self, dependencies = None):
+        # Topological order of all steps (ties are broken by the adding order); raises ValueError if there is a cycle
+        if dependencies is None:
+            dependencies = self.get_dependencies()
+        order = []
+        done = set()
+        while len(order) < len(self.steps):
+            ready = [name for name in self.steps if name not in done and dependencies[name] <= done]
+            if not ready:
+                raise ValueError(f"There is a dependency cycle among steps: {', '.join(name for name in self.steps if name not in done)}")
+            order.extend(ready)
+            done.update(ready)
+        return order
+
+    def get_marker_file(self, name):
+        step = self.steps[name]
+        return os.path.join(step.checkpoint_dir or self.checkpoint_dir, f'{step.marker_name}.json')
+
+    def read_marker(self, name):
+        marker_file = self.get_marker_file(name)
+        if not os.path.exists(marker_file):
+            return None
+        try:
+            with open(marker_file) as f:
+                return json.load(f)
+        except ValueError: # A marker cut off by a crash is not valid
+            return None
+
+    def get_signature(self, input_path, recorded = None):
+        with self.lock:
+            if input_path not in self.signatures:
+                self.signatures[input_path] = get_input_signature(input_path, recorded)
+            return self.signatures[input_path]
+
+    def write_marker(self, name, external_inputs):
+        step = self.steps[name]
+        marker = {
+            'step': step.marker_name,
+            'finished_time': str(datetime.now().replace(microsecond=0)),
+            'params': step.params,
+            'tool_versions': {env_dir: get_conda_env_version(env_dir) for env_dir in step.envs},
+            'inputs': {x: self.get_signature(x) for x in external_inputs},
+            'outputs': step.outputs
+        }
+        # Write to a temporary file first, so that a crash during writing does not leave a marker that looks valid
+        marker_file = self.get_marker_file(name)
+        with open(marker_file + '.tmp', 'w') as f:
+            json.dump(marker, f, indent = 1)
+        os.replace(marker_file + '.tmp', marker_file)
+
+    def is_marker_valid(self, name, marker, external_inputs, removed_artifacts):
+        step = self.steps[name]
+        if marker.get('params') != step.params:
+            return False
+        if marker.get('tool_versions') != {env_dir: get_conda_env_version(env_dir) for env_dir in step.envs}:
+            return False
+        recorded_inputs = marker.get('inputs', {})
+        if set(recorded_inputs) != set(external_inputs):
+            return False
+        for x in external_inputs:
+            if not is_same_checksum(recorded_inputs[x], self.get_signature(x, recorded_inputs[x])):
+                return False
+        # The outputs should still be there, unless a finished later step has moved them away
+        for x in step.outputs:
+            if not os.path.exists(x) and x not in removed_artifacts:
+                return False
+        return True
+
+    def get_steps_to_run(self, dependencies, order):
+        # Returns the names of steps that are not finished in a previous run or whose markers are no longer valid, plus all steps downstream of them
+        artifact2step = self.get_artifact2step()
+        name2marker = {name: self.read_marker(name) for name in order}
+        removed_artifacts = set(x for name in order if name2marker[name] for x in self.steps[name].removes)
+        steps_to_run = set()
+        for name in order:
+            external_inputs = [x for x in self.steps[name].inputs if x not in artifact2step]
+            if name2marker[name] is None or dependencies[name] & steps_to_run or not self.is_marker_valid(name, name2marker[name], external_inputs, removed_artifacts):
+                steps_to_run.add(name)
+
+        # A step to run needs its inputs; if an input has been moved away, the step that makes it is run again too
+        changed = True
+        while changed:
+            changed = False
+            for name in order:
+                if name in steps_to_run:
+                    for x in self.steps[name].inputs:
+                        if x in artifact2step and artifact2step[x] not in steps_to_run and not os.path.exists(x):
+                            steps_to_run.add(artifact2step[x])
+                            changed = True
+                elif dependencies[name] & steps_to_run:
+                    steps_to_run.add(name)
+                    changed = True
+        return steps_to_run
+
+    def clear_outputs(self, name):
+        # Remove what is left by an unfinished or invalid run of a step, as most tools refuse to write into an existing folder
+        for x in self.steps[name].outputs:
+            if os.path.isdir(x) and not os.path.islink(x):
+                shutil.rmtree(x)
+            elif os.path.lexists(x):
+                os.remove(x)
+
+    def run_step(self, name, external_inputs):
+        if self.checkpoint_dir:
+            marker_file = self.get_marker_file(name)
+            if os.path.exists(marker_file):
+                os.remove(marker_file)
+        if self.resume:
+            self.clear_outputs(name)
+        step_context.name = name
+        start_time = time.time()
+        try:
+            self.steps[name].func()
+        finally:
+            step_context.name = None
+        end_time = time.time()
+        wall_time = end_time - start_time
+        with self.lock:
+            self.step2span[name] = (start_time, end_time)
+        if self.checkpoint_dir:
+            self.write_marker(name, external_inputs)
+        if self.history_file:
+            self.write_history(name, wall_time)
+
+    def write_history(self, name, wall_time):
+        # Append what the step took; the history is only used for estimates, so a history file that can not be written is ignored
+        step = self.steps[name]
+        record = {
+            'step': step.marker_name,
+            'finished_time': str(datetime.now().replace(microsecond=0)),
+            'features': step.run_features or self.run_features,
+            'wall_time': round(wall_time, 1),
+            'disk_bytes': sum(get_disk_usage(x) for x in step.outputs if os.path.exists(x))
+        }
+        if self.get_step_metrics:
+            record.update(self.get_step_metrics(name))
+        try:
+            with self.lock:
+                with open(self.history_file, 'a') as f:
+                    f.write(json.dumps(record) + '\n')
+        except OSError:
+            pass
+
+    def run(self):
+        # Run all steps; when a step fails, no new steps are started, the running steps are waited for, and the failure is raised
+        dependencies = self.get_dependencies()
+        order = self.get_order(dependencies)
+        artifact2step = self.get_artifact2step()
+        name2external_inputs = {name: [x for x in self.steps[name].inputs if x not in artifact2step] for name in order}
+        done = set()
+        if self.checkpoint_dir:
+            for checkpoint_dir in set(self.steps[name].checkpoint_dir or self.checkpoint_dir for name in order):
+                os.makedirs(checkpoint_dir, exist_ok = True)
+        start_order = sorted(order, key = self.priority) if self.priority else order
+        if self.checkpoint_dir and self.resume:
+            steps_to_run = self.get_steps_to_run(dependencies, order)
+            for name in order:
+                if name not in steps_to_run:
+                    self.logger.info(f"[{str(datetime.now().replace(microsecond=0))}] | Step {name} was finished in a previous run and is still valid, skip it")
+                    done.add(name)
+        running = {} # future => name
+        failures = [] # [(name, exception)]
+
+        with ThreadPoolExecutor(max_workers = self.max_parallel_steps) as executor:
+            while len(done) < len(order):
+                if not failures:
+                    for name in start_order:
+                        if len(running) >= self.max_parallel_steps:
+                            break
+                        if name not in done and name not in running.values() and dependencies[name] <= done:
+                            self.logger.debug(f"[{str(datetime.now().replace(microsecond=0))}] | Start step {name}")
+                            running[executor.submit(self.run_step, name, name2external_inputs[name])] = name
+                if not running:
+                    break
+                finished, _ = wait(list(running), return_when = FIRST_COMPLETED)
+                for future in finished:
+                    name = running.pop(future)
+                    exception = future.exception()
+                    if exception is not None:
+                        failures.append((name, exception))
+                    else:
+                        done.add(name)
+
+        if failures:
+            name, exception = failures[0]
+            if isinstance(exception, SystemExit): # sys.exit() within a step keeps its message and exit code
+                raise exception
+            raise PipelineError(f'Step {name} failed: {exception}') from exception
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+
+'''
+Aim: Record the wall time, CPU time, peak memory (RSS), disk I/O, and exit code of every external process started by ViWrap
+Note: Processes are reaped by os.wait4(), which gives the resource usage of the process and of all its descendants that it has waited for
+(i.e., a shell and the tool it runs); read and written bytes are the block I/O counts (512-byte blocks), so page cache hits are not counted.
+Each process appends one json line to the metrics file (the path is passed by the VIWRAP_METRICS_FILE env variable); the step that started it
+is taken from the running pipeline step, or from the VIWRAP_STEP env variable in helper scripts.
+Processes started by ViWrap itself are "step" processes; processes started by helper scripts are "tool" processes, whose usage is also included in their step process
+'''
+
+try:
+    import warnings
+    import sys
+    import os
+    import json
+    import time
+    import subprocess
+    from datetime import datetime
+    warnings.filterwarnings("ignore")
+    try:
+        from scripts.pipeline import step_context
+    except ImportError:
+        step_context = None # Helper scripts get the step from the env variable
+except Exception as e:
+    sys.stderr.write(str(e) + "\n\n")
+    exit(1)
+
+
+METRICS_ENV = 'VIWRAP_METRICS_FILE'
+STEP_ENV = 'VIWRAP_STEP'
+MAX_CMD_LENGTH = 1000 # Long commands (i.e., with many input files) are cut in the records
+
+
+def get_step():
+    name = getattr(step_context, 'name', None) if step_context is not None else None
+    return name or os.environ.get(STEP_ENV, '')
+
+def get_exit_code(status):
+    # The same as Popen.returncode: the exit code, or minus the signal number if the process was killed
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+    return os.WEXITSTATUS(status)
+
+def write_record(record):
+    metrics_file = os.environ.get(METRICS_ENV)
+    if not metrics_file:
+        return
+    # One write() of a line to a file opened for appending, so that lines from processes writing at the same time are not mixed
+    try:
+        fd = os.open(metrics_file, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, (json.dumps(record) + '\n').encode())
+        finally:
+            os.close(fd)
+    except OSError:
+        pass
+
+
+class Popen(subprocess.Popen):
+    # subprocess.Popen that reaps the process by os.wait4() and records its resource usage;
+    # Popen.wait() (and so communicate() and the with block) waits through _try_wait(), which is overridden here
+    def __init__(self, args, job = '', **kwargs):
+        self.step = get_step()
+        self.job = job # The name of the sub-job (i.e., a genome for CheckV) shown in the timeline
+        self.start_time = time.time()
+        self.wait_status = None
+        if self.step and 'env' in kwargs and kwargs['env'] is not None:
+            kwargs['env'] = dict(kwargs['env'], **{STEP_ENV: self.step})
+        elif self.step:
+            kwargs['env'] = dict(os.environ, **{STEP_ENV: self.step})
+        super().__init__(args, **kwargs)
+
+    def _try_wait(self, wait_flags):
+        try:
+            pid, status, rusage = os.wait4(self.pid, wait_flags)
+        except ChildProcessError:
+            return (self.pid, 0)
+        if pid == self.pid:
+            self.wait_status = status
+            self.write_metrics(status, rusage)
+        return (pid, status)
+
+    def write_metrics(self, status, rusage):
+        cmd = self.args if isinstance(self.args, str) else ' '.join(str(x) for x in self.args)
+        write_record({
+            'step': self.step,
+            'level': 'tool' if os.environ.get(STEP_ENV) else 'step',
+            'cmd': cmd[:MAX_CMD_LENGTH],
+            'job': self.job,
+            'start_time': str(datetime.fromtimestamp(self.start_time).replace(microsecond=0)),
+            'start_timestamp': round(self.start_time, 6),
+            'wall_time': round(time.time() - self.start_time, 3),
+            'user_time': round(rusage.ru_utime, 3),
+            'system_time': round(rusage.ru_stime, 3),
+            'max_rss_bytes': rusage.ru_maxrss * 1024, # ru_maxrss is in KB on Linux
+            'read_bytes': rusage.ru_inblock * 512,
+            'write_bytes': rusage.ru_oublock * 512,
+            'exit_code': get_exit_code(status)
+        })
+
+
+def system(cmd, check = False):
+    # Replacement of os.system() that records the process; returns the wait status like os.system()
+    # check = True: exit with the command and its exit code if it fails (i.e., a tool that crashes or is killed),
+    # so that the helper script running it fails too instead of passing broken results to the next steps
+    proc = Popen(cmd, shell=True)
+    proc.wait()
+    status = proc.wait_status if proc.wait_status is not None else 0
+    if check and status != 0:
+        sys.exit(f"Command failed with exit code {get_exit_code(status)}: {cmd}")
+    return status
+
+def read_records(metrics_file):
+    records = []
+    if metrics_file and os.path.exists(metrics_file):
+        with open(metrics_file) as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError: # A line cut off by a crash
+                    pass
+    return records
+
+def get_step2summary(records):
+    # step => totals of its step processes (which include their tools), the peak RSS of all its processes, and the number of (failed) processes
+    step2summary = {}
+    for record in records:
+        summary = step2summary.setdefault(record['step'], {'processes': 0, 'failed_processes': 0, 'user_time': 0.0, 'system_time': 0.0, 'max_rss_bytes': 0, 'read_bytes': 0, 'write_bytes': 0})
+        summary['processes'] += 1
+        summary['failed_processes'] += 1 if record['exit_code'] != 0 else 0
+        summary['max_rss_bytes'] = max(summary['max_rss_bytes'], record['max_rss_bytes'])
+        if record['level'] == 'step':
+            for key in ['user_time', 'system_time', 'read_bytes', 'write_bytes']:
+                summary[key] += record[key]
+    for summary in step2summary.values():
+        summary['user_time'] = round(summary['user_time'], 3)
+        summary['system_time'] = round(summary['system_time'], 3)
+    return step2summary
+
+def get_step_peak_rss(step):
+    # The peak RSS of all processes of a step so far, from the metrics file of the current run
+    summary = get_step2summary(read_records(os.environ.get(METRICS_ENV))).get(step)
+    return summary['max_rss_bytes'] if summary else None
+
+def write_run_metrics(run_metrics_file, step2span = None):
+    # Write ViWrap_run_metrics.json: the summary of each step (plus its wall time from the pipeline) and all process records
+    records = read_records(os.environ.get(METRICS_ENV))
+    step2summary = get_step2summary(records)
+    for step, (start, end) in (step2span or {}).items():
+        step2summary.setdefault(step, {'processes': 0})['wall_time'] = round(end - start, 3)
+    with open(run_metrics_file + '.tmp', 'w') as f:
+        json.dump({'created_time': str(datetime.now().replace(microsecond=0)), 'steps': step2summary, 'processes': records}, f, indent = 1)
+    os.replace(run_metrics_file + '.tmp', run_metrics_file)
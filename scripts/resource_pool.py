@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+
+'''
+Aim: Hand out CPU cores and memory to all external tools of a ViWrap run, so that the total use never goes over --threads,
+the cores and memory of the machine, or the cgroup (container/job) limits
+Note: The pool is a json state file shared by all processes of a run (the path is passed by the VIWRAP_RESOURCE_POOL env variable)
+and guarded by a file lock. Each tool launch waits until enough cores and memory are free; waiting jobs are served first come first served,
+a later job can only take what is left after the older waiting jobs, and freed cores go to the waiting jobs.
+Without the env variable (i.e., a script run by hand), nothing is limited
+'''
+
+try:
+    import warnings
+    import sys
+    import os
+    import json
+    import time
+    import fcntl
+    import uuid
+    import threading
+    from contextlib import contextmanager
+    warnings.filterwarnings("ignore")
+    try:
+        from scripts import process_metrics
+    except ImportError:
+        import process_metrics
+except Exception as e:
+    sys.stderr.write(str(e) + "\n\n")
+    exit(1)
+
+
+POOL_ENV = 'VIWRAP_RESOURCE_POOL'
+POLL_INTERVAL = 1 # Seconds between two checks while waiting for resources
+
+# Rough peak memory (GB) of each tool, used as the memory request; a request larger than the pool is cut to the pool size, so the tool can still run alone
+TOOL2MEMORY = {
+    'VIBRANT': 4, 'VirSorter2': 8, 'CheckV': 4, 'DVF': 4, 'prodigal': 0.5, 'hmmsearch': 1, 'bowtie2': 8, 'minimap2': 16, 'CONSENT': 8,
+    'samtools': 2, 'coverm': 4, 'vRhyme': 8, 'vContact2': 16, 'dRep': 2, 'diamond': 2, 'iPHoP': 64, 'GTDB-Tk': 80
+}
+
+
+def get_cgroup_cores():
+    # cgroup v2 "cpu.max" ("max 100000" or "quota period") or cgroup v1 "cpu.cfs_quota_us"/"cpu.cfs_period_us"; None if there is no limit
+    try:
+        with open('/sys/fs/cgroup/cpu.max') as f:
+            quota, period = f.read().split()[:2]
+        if quota != 'max':
+            return max(1, int(int(quota) / int(period)))
+    except (OSError, ValueError):
+        pass
+    try:
+        with open('/sys/fs/cgroup/cpu/cpu.cfs_quota_us') as f:
+            quota = int(f.read())
+        with open('/sys/fs/cgroup/cpu/cpu.cfs_period_us') as f:
+            period = int(f.read())
+        if quota > 0:
+            return max(1, int(quota / period))
+    except (OSError, ValueError):
+        pass
+    return None
+
+def get_available_cores():
+    # The cores this process may run on (CPU affinity, i.e., set by taskset or a job scheduler), also limited by the cgroup quota
+    try:
+        cores = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cores = os.cpu_count() or 1
+    cgroup_cores = get_cgroup_cores()
+    if cgroup_cores:
+        cores = min(cores, cgroup_cores)
+    return cores
+
+def get_available_memory():
+    # The total memory (GB) of the machine, limited by the cgroup memory limit
+    memory = None
+    try:
+        with open('/proc/meminfo') as f:
+            for line in f:
+                if line.startswith('MemTotal:'):
+                    memory = int(line.split()[1]) / 1024 / 1024
+                    break
+    except (OSError, ValueError):
+        pass
+    for cgroup_memory_file in ['/sys/fs/cgroup/memory.max', '/sys/fs/cgroup/memory/memory.limit_in_bytes']:
+        try:
+            with open(cgroup_memory_file) as f:
+                limit = f.read().strip()
+            if limit != 'max' and int(limit) < (1 << 60): # cgroup v1 writes a huge number for no limit
+                limit = int(limit) / 1024 / 1024 / 1024
+                memory = min(memory, limit) if memory else limit
+        except (OSError, ValueError):
+            pass
+    return memory or float('inf')
+
+def is_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class ResourcePool:
+    def __init__(self, pool_file):
+        self.pool_file = pool_file
+        self.lock_file = pool_file + '.lock'
+
+    @contextmanager
+    def locked_state(self):
+        # Yield the state dict under the file lock; the changed state is written back when the block ends
+        with open(self.lock_file, 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                with open(self.pool_file) as f:
+                    state = json.load(f)
+                # Drop the holders and waiters of processes that have died without giving back their resources
+                state['holders'] = {token: x for token, x in state['holders'].items() if is_alive(x['pid'])}
+                state['waiters'] = [x for x in state['waiters'] if is_alive(x['pid'])]
+                yield state
+                with open(self.pool_file + '.tmp', 'w') as f:
+                    json.dump(state, f)
+                os.replace(self.pool_file + '.tmp', self.pool_file)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def acquire(self, cores, memory = 0, min_cores = 1):
+        # Wait until at least min_cores and the memory are free, then take up to cores; returns (token, the number of cores taken)
+        token = uuid.uuid4().hex
+        with self.locked_state() as state:
+            cores = max(1, min(int(cores), state['cores']))
+            min_cores = max(1, min(int(min_cores), cores))
+            memory = min(memory, state['memory'])
+            state['waiters'].append({'token': token, 'pid': os.getpid(), 'min_cores': min_cores, 'memory': memory})
+        while True:
+            with self.locked_state() as state:
+                free_cores = state['cores'] - sum(x['cores'] for x in state['holders'].values())
+                free_memory = state['memory'] - sum(x['memory'] for x in state['holders'].values())
+                for waiter in state['waiters']:
+                    if waiter['token'] == token:
+                        break
+                    # Keep what the older waiting jobs need, so that big jobs are not starved by a stream of small ones
+                    free_cores -= waiter['min_cores']
+                    free_memory -= waiter['memory']
+                if free_cores >= min_cores and free_memory >= memory:
+                    granted_cores = min(cores, free_cores)
+                    state['waiters'] = [x for x in state['waiters'] if x['token'] != token]
+                    state['holders'][token] = {'pid': os.getpid(), 'cores': granted_cores, 'memory': memory}
+                    return token, granted_cores
+            time.sleep(POLL_INTERVAL)
+
+    def release(self, token):
+        with self.locked_state() as state:
+            state['holders'].pop(token, None)
+
+
+def create_pool(pool_file, cores, memory = None):
+    # Make a new pool state file; cores and memory are cut to what the machine and the cgroup have
+    cores = max(1, min(int(cores), get_available_cores()))
+    memory = get_available_memory() if memory is None else min(memory, get_available_memory())
+    with open(pool_file, 'w') as f:
+        json.dump({'cores': cores, 'memory': memory, 'holders': {}, 'waiters': []}, f)
+    return ResourcePool(pool_file)
+
+def get_pool():
+    # The pool of the current run, or None if the script is not run by ViWrap
+    pool_file = os.environ.get(POOL_ENV)
+    if pool_file and os.path.exists(pool_file):
+        return ResourcePool(pool_file)
+    return None
+
+@contextmanager
+def allocate(cores, memory = 0, min_cores = 1):
+    # Use as: with allocate(threads, TOOL2MEMORY['vRhyme']) as cores: process_metrics.system(f'vRhyme -t {cores} ...')
+    pool = get_pool()
+    if pool is None:
+        yield int(cores)
+        return
+    token, granted_cores = pool.acquire(cores, memory, min_cores)
+    try:
+        yield granted_cores
+    finally:
+        pool.release(token)
+
+def run(cmd, cores = 1, memory = 0, check = False):
+    # process_metrics.system() for a tool that uses a fixed number of cores
+    with allocate(cores, memory, cores):
+        return process_metrics.system(cmd, check)
+
+def Popen(cmd, cores = 1, memory = 0, **kwargs):
+    # process_metrics.Popen() that waits for resources first; they are given back as soon as the process exits, not when wait() is called,
+    # so a batch of processes started together never waits for its own members
+    pool = get_pool()
+    if pool is None:
+        return process_metrics.Popen(cmd, **kwargs)
+    token, _ = pool.acquire(cores, memory, cores)
+    try:
+        proc = process_metrics.Popen(cmd, **kwargs)
+    except Exception:
+        pool.release(token)
+        raise
+    def release_on_exit():
+        proc.wait()
+        pool.release(token)
+    threading.Thread(target = release_on_exit).start()
+    return proc
@@ -4,31 +4,108 @@ try:
     import warnings
     import sys
     import os
+    import shutil
+    import resource_pool # For sharing CPU cores and memory among all tools of a run
+    import job_pool # For running sub-jobs with a bounded number of parallel processes
+    import seq_io # For streaming fasta reading and writing
     import re
     warnings.filterwarnings("ignore")
     from pathlib import Path
     import subprocess
-    from subprocess import DEVNULL, STDOUT, check_call    
+    from subprocess import DEVNULL, STDOUT, check_call
 except Exception as e:
     sys.stderr.write(str(e) + "\n\n")
-    exit(1) 
-    
+    exit(1)
+
+
+MAX_CHUNK_MB = 20 # A chunk of genomes is at most about 20 MB (about 500 viral genomes of 40 kb)
+CHECKV_TABLES = ['quality_summary.tsv', 'completeness.tsv', 'contamination.tsv', 'complete_genomes.tsv'] # One row for each contig; the contig id is the 1st column
+CHECKV_SEQS = ['viruses.fna', 'proviruses.fna']
+
+
+def write_chunk_fasta(genomes, genome2addr, chunk_fasta, seq_id2genome_and_contig):
+    # Contigs get ids that are unique in the run (i.e., "ViWrapSeq_12"), as contigs of different genomes can have the same id
+    with seq_io.open_seq_file(chunk_fasta, 'w') as f:
+        for genome in genomes:
+            for head, seq in seq_io.read_seq(genome2addr[genome]):
+                seq_id = f'ViWrapSeq_{len(seq_id2genome_and_contig) + 1}'
+                seq_id2genome_and_contig[seq_id] = (genome, head[1:])
+                f.write(f'>{seq_id}\n{seq}\n')
+
+def split_checkv_result(chunk_outdir, outdir, genomes, seq_id2genome_and_contig):
+    # Write the CheckV result of each genome into "outdir/genome/", the same as a CheckV run of the genome alone
+    genome2outdir = {genome: os.path.join(outdir, genome) for genome in genomes}
+    for genome_outdir in genome2outdir.values():
+        os.makedirs(genome_outdir, exist_ok = True)
+
+    # Step 1 Split tables by the contig id of each row
+    for table in CHECKV_TABLES:
+        if not os.path.exists(os.path.join(chunk_outdir, table)):
+            continue
+        genome2lines = {genome: [] for genome in genomes} # genome => [line]
+        with open(os.path.join(chunk_outdir, table), 'r') as lines:
+            header = next(lines, '')
+            for line in lines:
+                seq_id, rest = line.split('\t', 1)
+                genome, contig = seq_id2genome_and_contig[seq_id]
+                genome2lines[genome].append(f'{contig}\t{rest}')
+        for genome, genome_lines in genome2lines.items():
+            with open(os.path.join(genome2outdir[genome], table), 'w') as f:
+                f.write(header)
+                f.writelines(genome_lines)
+
+    # Step 2 Split sequences; a provirus is named by its contig id plus "_1", "_2", ...
+    for seq_file in CHECKV_SEQS:
+        if not os.path.exists(os.path.join(chunk_outdir, seq_file)):
+            continue
+        genome2file = {genome: open(os.path.join(genome2outdir[genome], seq_file), 'w') for genome in genomes}
+        for head, seq in seq_io.read_seq(os.path.join(chunk_outdir, seq_file), full_head = True):
+            seq_name, rest = (head[1:].split(' ', 1) + [''])[:2]
+            seq_id = seq_name if seq_name in seq_id2genome_and_contig else seq_name.rsplit('_', 1)[0]
+            genome, contig = seq_id2genome_and_contig[seq_id]
+            seq_name = contig + seq_name[len(seq_id):]
+            genome2file[genome].write(f'>{seq_name} {rest}\n{seq}\n' if rest else f'>{seq_name}\n{seq}\n')
+        for f in genome2file.values():
+            f.close()
+
 def run_checkv(input_dir, outdir, threads, checkv_db_dir):
-    checkv_cmd = []
+    # Genomes are run in a few multi-genome chunks, so that CheckV loads its databases once for each chunk instead of each genome;
+    # contigs are assessed one by one, so the result of each genome is not changed by the other genomes of its chunk
+    genome2addr = {} # genome => its fasta file
+    genome2size = {} # genome => MB of its fasta file
     walk = os.walk(input_dir)
     for path, dir_list, file_list in walk:
         for file_name in file_list:
             if "fasta" in file_name:
                 file_name_with_path = os.path.join(path, file_name)
                 file_name_stem = Path(file_name).stem
-                each_cmd = f'checkv end_to_end {file_name_with_path} {outdir}/{file_name_stem} -t 1 -d {checkv_db_dir} 1> /dev/null'
-                checkv_cmd.append(each_cmd)
-                
-    n = int(threads) # The number of parallel processes
-    for j in range(max(int(len(checkv_cmd)/n + 1), 1)):
-        procs = [subprocess.Popen(i, shell=True, stdout=DEVNULL) for i in checkv_cmd[j*n: min((j+1)*n, len(checkv_cmd))] ]
-        for p in procs:
-            p.wait()       
-    
-input_dir, outdir, threads, checkv_db_dir = sys.argv[1], sys.argv[2], sys.argv[3], sys.argv[4]
-run_checkv(input_dir, outdir, threads, checkv_db_dir)    
\ No newline at end of file
+                genome2addr[file_name_stem] = file_name_with_path
+                genome2size[file_name_stem] = os.path.getsize(file_name_with_path) / 1e6
+
+    # Step 1 Write the fasta file of each chunk; the chunk number is decided by the genome number, sizes, and threads
+    chunk_dir = os.path.join(outdir, 'tmp_CheckV_chunks') # "tmp" dirs are skipped by parse_checkv_result
+    if os.path.exists(chunk_dir):
+        shutil.rmtree(chunk_dir)
+    os.makedirs(chunk_dir)
+    chunks = job_pool.get_chunks('CheckV', genome2size, int(threads), MAX_CHUNK_MB)
+    seq_id2genome_and_contig = {} # seq id in the chunk => (genome, contig id)
+    checkv_cmd = [] # [(chunk, cmd, outputs)]
+    chunk2size = {} # chunk => MB of its genomes
+    for i, genomes in enumerate(chunks, start = 1):
+        chunk_fasta = os.path.join(chunk_dir, f'chunk_{i}.fasta')
+        write_chunk_fasta(genomes, genome2addr, chunk_fasta, seq_id2genome_and_contig)
+        each_cmd = f'checkv end_to_end {chunk_fasta} {chunk_dir}/chunk_{i} -t {job_pool.THREADS} -d {checkv_db_dir} --restart 1> /dev/null'
+        checkv_cmd.append((f'CheckV chunk_{i}', each_cmd, [f'{chunk_dir}/chunk_{i}'])) # A retry starts from an empty output dir
+        chunk2size[f'CheckV chunk_{i}'] = sum(genome2size[genome] for genome in genomes)
+
+    # Step 2 Run CheckV on all chunks
+    job_pool.run_packed_jobs('CheckV', checkv_cmd, chunk2size, int(threads), resource_pool.TOOL2MEMORY['CheckV'], shell=True, stdout=DEVNULL) # Threads of each job are decided by the chunk number and sizes
+
+    # Step 3 Split the result of each chunk back into its genomes
+    for i, genomes in enumerate(chunks, start = 1):
+        split_checkv_result(os.path.join(chunk_dir, f'chunk_{i}'), outdir, genomes, seq_id2genome_and_contig)
+    shutil.rmtree(chunk_dir)
+
+if __name__ == '__main__':
+    input_dir, outdir, threads, checkv_db_dir = sys.argv[1], sys.argv[2], sys.argv[3], sys.argv[4]
+    run_checkv(input_dir, outdir, threads, checkv_db_dir)
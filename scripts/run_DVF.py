@@ -4,6 +4,7 @@ try:
     import warnings
     import sys
     import os
+    import resource_pool # For sharing CPU cores and memory among all tools of a run
     import re
     warnings.filterwarnings("ignore")
 except Exception as e:
@@ -11,8 +12,9 @@ except Exception as e:
     exit(1) 
     
 def run_dvf(metagenomic_scaffold, dvf_outdir, input_length_limit, db_dir):
+    # DeepVirFinder has no option for the number of threads, so it takes one core
     cmd = f"dvf.py -i {metagenomic_scaffold} -o {dvf_outdir} -l {int(input_length_limit)} -m {db_dir} 1> /dev/null"
-    os.system(cmd) 
+    resource_pool.run(cmd, 1, resource_pool.TOOL2MEMORY['DVF'], check=True)
     
 metagenomic_scaffold, dvf_outdir, input_length_limit, db_dir = sys.argv[1], sys.argv[2], sys.argv[3], sys.argv[4]   
 run_dvf(metagenomic_scaffold, dvf_outdir, input_length_limit, db_dir)    
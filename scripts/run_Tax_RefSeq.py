@@ -4,11 +4,15 @@ try:
     import warnings
     import sys
     import os
+    import resource_pool # For sharing CPU cores and memory among all tools of a run
+    import job_pool # For running sub-jobs with a bounded number of parallel processes
+    import process_metrics # For recording the resource usage of all tools of a run
     import re
     from pathlib import Path
     import subprocess
     from subprocess import DEVNULL, STDOUT, check_call  
     warnings.filterwarnings("ignore")
+    import id_registry # For the protein => scaffold => genome relation of all viral genomes
 except Exception as e:
     sys.stderr.write(str(e) + "\n\n")
     exit(1) 
@@ -36,7 +40,7 @@ def find_best_hits(input_diamond_outfile):
         
     return result    
    
-def run_diamond_to_RefSeq_viral_protein_db(viwrap_outdir, vRhyme_best_bin_dir, vRhyme_unbinned_viral_gn_dir, NCBI_RefSeq_viral_protein_db_dir, pro2viral_gn_map, threads, output):
+def run_diamond_to_RefSeq_viral_protein_db(viwrap_outdir, vRhyme_best_bin_dir, vRhyme_unbinned_viral_gn_dir, NCBI_RefSeq_viral_protein_db_dir, id_registry_dir, threads, output):
     tmp_outdir = f'{viwrap_outdir}/tmp_dir_refseq'
     os.mkdir(tmp_outdir)
     
@@ -58,31 +62,21 @@ def run_diamond_to_RefSeq_viral_protein_db(viwrap_outdir, vRhyme_best_bin_dir, v
                 bin_name = Path(file_name_with_path).stem
                 bin2addr[bin_name] = file_name_with_path  
 
-    diamond_cmd = []
+    diamond_cmd = [] # [(bin, cmd)]
+    bin2size = {} # bin => MB of its faa file
     for bin_name in bin2addr:
         bin_addr = bin2addr[bin_name]
-        each_cmd = f'diamond blastp -q {bin_addr} -p 1 --db {NCBI_RefSeq_viral_protein_db_dir}/NCBI_RefSeq_viral.dmnd --evalue 0.00001 --query-cover 50 --subject-cover 50 -k 10000 -o {tmp_outdir}/{bin_name}.diamond_out.txt -f 6 --quiet 1> /dev/null'
-        diamond_cmd.append(each_cmd)
+        each_cmd = f'diamond blastp -q {bin_addr} -p {job_pool.THREADS} --db {NCBI_RefSeq_viral_protein_db_dir}/NCBI_RefSeq_viral.dmnd --evalue 0.00001 --query-cover 50 --subject-cover 50 -k 10000 -o {tmp_outdir}/{bin_name}.diamond_out.txt -f 6 --quiet 1> /dev/null'
+        diamond_cmd.append((f'DIAMOND {bin_name}', each_cmd))
+        bin2size[f'DIAMOND {bin_name}'] = os.path.getsize(bin_addr) / 1e6
     
-    n = int(threads) # The number of parallel processes
-    for j in range(max(int(len(diamond_cmd)/n + 1), 1)):
-        procs = [subprocess.Popen(i, shell=True, stdout=DEVNULL) for i in diamond_cmd[j*n: min((j+1)*n, len(diamond_cmd))] ]
-        for p in procs:
-            p.wait()     
+    job_pool.run_packed_jobs('diamond', diamond_cmd, bin2size, int(threads), resource_pool.TOOL2MEMORY['diamond'], shell=True, stdout=DEVNULL) # Threads of each job are decided by the bin number and sizes
 
     # Step 2 Summarize the result            
     # Store 2.1 Store pro information in a bin
-    pro2bin = {} # pro (header wo arrow) => bin_name
-    bin2pro_num = {} # bin_name => pro_num; Store the number of proteins in each bin
-    
-    with open(pro2viral_gn_map, "r") as lines:
-        for line in lines:
-            line = line.rstrip("\n")
-            if not line.startswith("protein_id"):
-                pro, bin_name = line.split(",")[0], line.split(",")[1]
-                pro2bin[pro] = bin_name
-                bin2pro_num[bin_name] = bin2pro_num.get(bin_name, 0) + 1
-    lines.close()
+    registry = id_registry.load_id_registry(id_registry_dir)
+    pro2bin = id_registry.get_pro2gn(registry) # pro (header wo arrow) => bin_name
+    bin2pro_num = {bin_name: len(pros) for bin_name, pros in id_registry.get_gn2pros(registry).items()} # bin_name => pro_num; Store the number of proteins in each bin
     
     # Store 2.2 Store the diamond db pro 2 tax info
     NCBI_RefSeq_viral_protein2tax = {} # pro => tax
@@ -146,7 +140,7 @@ def run_diamond_to_RefSeq_viral_protein_db(viwrap_outdir, vRhyme_best_bin_dir, v
             bin2consensus_tax[bin_name] = tax_w_highest_freq
            
     # Step 2.5 Remove tmp dir 
-    os.system(f'rm -r {tmp_outdir}')
+    process_metrics.system(f'rm -r {tmp_outdir}')
     
     # Step 2.6 Write to output
     f = open(output, 'w')
@@ -154,5 +148,5 @@ def run_diamond_to_RefSeq_viral_protein_db(viwrap_outdir, vRhyme_best_bin_dir, v
         f.write(f'{bin_name}\t{bin2consensus_tax[bin_name]}\n')
     f.close()    
     
-viwrap_outdir, vRhyme_best_bin_dir, vRhyme_unbinned_viral_gn_dir, NCBI_RefSeq_viral_protein_db_dir, pro2viral_gn_map, threads, output = sys.argv[1], sys.argv[2], sys.argv[3], sys.argv[4], sys.argv[5], sys.argv[6], sys.argv[7]
-run_diamond_to_RefSeq_viral_protein_db(viwrap_outdir, vRhyme_best_bin_dir, vRhyme_unbinned_viral_gn_dir, NCBI_RefSeq_viral_protein_db_dir, pro2viral_gn_map, threads, output)    
\ No newline at end of file
+viwrap_outdir, vRhyme_best_bin_dir, vRhyme_unbinned_viral_gn_dir, NCBI_RefSeq_viral_protein_db_dir, id_registry_dir, threads, output = sys.argv[1], sys.argv[2], sys.argv[3], sys.argv[4], sys.argv[5], sys.argv[6], sys.argv[7]
+run_diamond_to_RefSeq_viral_protein_db(viwrap_outdir, vRhyme_best_bin_dir, vRhyme_unbinned_viral_gn_dir, NCBI_RefSeq_viral_protein_db_dir, id_registry_dir, threads, output)    
\ No newline at end of file
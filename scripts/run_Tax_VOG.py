@@ -4,12 +4,16 @@ try:
     import warnings
     import sys
     import os
+    import resource_pool # For sharing CPU cores and memory among all tools of a run
+    import job_pool # For running sub-jobs with a bounded number of parallel processes
+    import process_metrics # For recording the resource usage of all tools of a run
     import re
     from pathlib import Path
     from glob import glob
     import subprocess
     from subprocess import DEVNULL, STDOUT, check_call      
     warnings.filterwarnings("ignore")
+    import id_registry # For the protein => scaffold => genome relation of all viral genomes
 except Exception as e:
     sys.stderr.write(str(e) + "\n\n")
     exit(1) 
@@ -27,30 +31,28 @@ def get_hmmsearch_result(hmmsearch_result):
     lines.close()            
     return pro2info         
  
-def run_hmmsearch_to_marker_VOG_HMM_db(vog_marker_table, viwrap_outdir, vRhyme_best_bin_dir, vRhyme_unbinned_viral_gn_dir, tax_classification_db_dir, pro2viral_gn_map, threads, output):
+def run_hmmsearch_to_marker_VOG_HMM_db(vog_marker_table, viwrap_outdir, vRhyme_best_bin_dir, vRhyme_unbinned_viral_gn_dir, tax_classification_db_dir, id_registry_dir, threads, output):
     tmp_outdir = f'{viwrap_outdir}/tmp_dir_vog'
     os.mkdir(tmp_outdir)
     
     # Step 1 Run hmmsearch
     bin2addr = {} # bin => addr to the bin; i.e., vRhyme_bin_10 => path/to/the/dir/vRhyme_bin_10.faa
-    file_names1 = glob(f'{vRhyme_best_bin_dir}/*.faa')
-    file_names2 = glob(f'{vRhyme_unbinned_viral_gn_dir}/*.faa')
+    file_names1 = glob(f'{vRhyme_best_bin_dir}/**/*.faa', recursive = True) # Genome files can be sharded into sub-dirs
+    file_names2 = glob(f'{vRhyme_unbinned_viral_gn_dir}/**/*.faa', recursive = True)
     file_names = file_names1 + file_names2
     for file_name in file_names:
         bin_name = Path(file_name).stem
         bin2addr[bin_name] = file_name
   
-    hmmsearch_cmd = []
+    hmmsearch_cmd = [] # [(bin, cmd)]
+    bin2size = {} # bin => MB of its faa file
     for bin_name in bin2addr:
         bin_addr = bin2addr[bin_name]
-        each_cmd = f'hmmsearch -E 0.01 --cpu 1 --tblout {tmp_outdir}/{bin_name}.hmmsearch_result.txt {tax_classification_db_dir}/marker_VOG.hmm {bin_addr} 1> /dev/null'
-        hmmsearch_cmd.append(each_cmd)
+        each_cmd = f'hmmsearch -E 0.01 --cpu {job_pool.THREADS} --tblout {tmp_outdir}/{bin_name}.hmmsearch_result.txt {tax_classification_db_dir}/marker_VOG.hmm {bin_addr} 1> /dev/null'
+        hmmsearch_cmd.append((f'hmmsearch {bin_name}', each_cmd))
+        bin2size[f'hmmsearch {bin_name}'] = os.path.getsize(bin_addr) / 1e6
     
-    n = int(threads) # The number of parallel processes
-    for j in range(max(int(len(hmmsearch_cmd)/n + 1), 1)):
-        procs = [subprocess.Popen(i, shell=True, stdout=DEVNULL) for i in hmmsearch_cmd[j*n: min((j+1)*n, len(hmmsearch_cmd))] ]
-        for p in procs:
-            p.wait()        
+    job_pool.run_packed_jobs('hmmsearch', hmmsearch_cmd, bin2size, int(threads), resource_pool.TOOL2MEMORY['hmmsearch'], shell=True, stdout=DEVNULL) # Threads of each job are decided by the bin number and sizes
 
     # Step 2 Get marker VOG info
     vog_marker_list = {} # vog => tax
@@ -73,14 +75,8 @@ def run_hmmsearch_to_marker_VOG_HMM_db(vog_marker_table, viwrap_outdir, vRhyme_b
                 pro2vog[pro] = vog
      
     # Step 4 Find a consensus taxonomy for each bin (simple plurality rule)
-    pro2bin = {} # pro (header wo arrow) => bin_name
-    with open(pro2viral_gn_map, "r") as lines:
-        for line in lines:
-            line = line.rstrip("\n")
-            if not line.startswith("protein_id"):
-                pro, bin_name = line.split(",")[0], line.split(",")[1]
-                pro2bin[pro] = bin_name
-    lines.close()           
+    registry = id_registry.load_id_registry(id_registry_dir)
+    pro2bin = id_registry.get_pro2gn(registry) # pro (header wo arrow) => bin_name
            
     bin2pro_hits = {} # bin_name => [pro_hits]; Store bin with pro hits
     for pro in pro2vog:
@@ -110,7 +106,7 @@ def run_hmmsearch_to_marker_VOG_HMM_db(vog_marker_table, viwrap_outdir, vRhyme_b
         bin2consensus_tax[bin_name] = consensus_tax
 
     # Step 5 Remove tmp dir 
-    os.system(f'rm -r {tmp_outdir}')
+    process_metrics.system(f'rm -r {tmp_outdir}')
      
     # Step 6 Write to output
     f = open(output, 'w')
@@ -119,5 +115,5 @@ def run_hmmsearch_to_marker_VOG_HMM_db(vog_marker_table, viwrap_outdir, vRhyme_b
     f.close()
 
     
-vog_marker_table, viwrap_outdir, vRhyme_best_bin_dir, vRhyme_unbinned_viral_gn_dir, tax_classification_db_dir, pro2viral_gn_map, threads, output = sys.argv[1], sys.argv[2], sys.argv[3], sys.argv[4], sys.argv[5], sys.argv[6], sys.argv[7], sys.argv[8]
-run_hmmsearch_to_marker_VOG_HMM_db(vog_marker_table, viwrap_outdir, vRhyme_best_bin_dir, vRhyme_unbinned_viral_gn_dir, tax_classification_db_dir, pro2viral_gn_map, threads, output)    
\ No newline at end of file
+vog_marker_table, viwrap_outdir, vRhyme_best_bin_dir, vRhyme_unbinned_viral_gn_dir, tax_classification_db_dir, id_registry_dir, threads, output = sys.argv[1], sys.argv[2], sys.argv[3], sys.argv[4], sys.argv[5], sys.argv[6], sys.argv[7], sys.argv[8]
+run_hmmsearch_to_marker_VOG_HMM_db(vog_marker_table, viwrap_outdir, vRhyme_best_bin_dir, vRhyme_unbinned_viral_gn_dir, tax_classification_db_dir, id_registry_dir, threads, output)    
\ No newline at end of file
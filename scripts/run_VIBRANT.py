@@ -4,6 +4,8 @@ try:
     import warnings
     import sys
     import os
+    import resource_pool # For sharing CPU cores and memory among all tools of a run
+    import process_metrics # For recording the resource usage of all tools of a run
     import re
     warnings.filterwarnings("ignore")
 except Exception as e:
@@ -13,11 +15,12 @@ except Exception as e:
 def run_vibrant(metagenomic_scaffold, viwrap_outdir, threads, virome, input_length_limit, db_dir):
     cmd = ""
     
-    if virome:
-        cmd = f'VIBRANT_run.py -i {metagenomic_scaffold} -folder {viwrap_outdir} -t {int(threads)} -l {input_length_limit} -d {db_dir}/VIBRANT_db/databases -m {db_dir}/VIBRANT_db/files 1> /dev/null'
-    else:
-        cmd = f'VIBRANT_run.py -i {metagenomic_scaffold} -folder {viwrap_outdir} -t {int(threads)} -virome -l {input_length_limit} -d {db_dir}/VIBRANT_db/databases -m {db_dir}/VIBRANT_db/files 1> /dev/null'
-    os.system(cmd)     
+    with resource_pool.allocate(int(threads), resource_pool.TOOL2MEMORY['VIBRANT']) as cores:
+        if virome:
+            cmd = f'VIBRANT_run.py -i {metagenomic_scaffold} -folder {viwrap_outdir} -t {cores} -l {input_length_limit} -d {db_dir}/VIBRANT_db/databases -m {db_dir}/VIBRANT_db/files 1> /dev/null'
+        else:
+            cmd = f'VIBRANT_run.py -i {metagenomic_scaffold} -folder {viwrap_outdir} -t {cores} -virome -l {input_length_limit} -d {db_dir}/VIBRANT_db/databases -m {db_dir}/VIBRANT_db/files 1> /dev/null'
+        process_metrics.system(cmd, check=True)     
     
 metagenomic_scaffold, viwrap_outdir, threads, virome, input_length_limit, db_dir = sys.argv[1], sys.argv[2], sys.argv[3], sys.argv[4], sys.argv[5], sys.argv[6]   
 run_vibrant(metagenomic_scaffold, viwrap_outdir, threads, virome, input_length_limit, db_dir)    
\ No newline at end of file
@@ -4,6 +4,8 @@ try:
     import warnings
     import sys
     import os
+    import resource_pool # For sharing CPU cores and memory among all tools of a run
+    import process_metrics # For recording the resource usage of all tools of a run
     import re
     warnings.filterwarnings("ignore")
 except Exception as e:
@@ -11,8 +13,9 @@ except Exception as e:
     exit(1) 
     
 def run_virsorter2_1st(metagenomic_scaffold, virsorter_outdir, threads, input_length_limit):
-    vs_cmd = f"virsorter run --keep-original-seq -i {metagenomic_scaffold} -w {virsorter_outdir}/pass1 --min-length {input_length_limit} --min-score 0.5 -j {threads} all 1> /dev/null" 
-    os.system(vs_cmd)    
+    with resource_pool.allocate(int(threads), resource_pool.TOOL2MEMORY['VirSorter2']) as cores:
+        vs_cmd = f"virsorter run --keep-original-seq -i {metagenomic_scaffold} -w {virsorter_outdir}/pass1 --min-length {input_length_limit} --min-score 0.5 -j {cores} all 1> /dev/null" 
+        process_metrics.system(vs_cmd, check=True)    
       
 metagenomic_scaffold, virsorter_outdir, threads, input_length_limit = sys.argv[1], sys.argv[2], sys.argv[3], sys.argv[4] 
 run_virsorter2_1st(metagenomic_scaffold, virsorter_outdir, threads, input_length_limit)
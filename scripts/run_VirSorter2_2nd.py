@@ -4,6 +4,8 @@ try:
     import warnings
     import sys
     import os
+    import resource_pool # For sharing CPU cores and memory among all tools of a run
+    import process_metrics # For recording the resource usage of all tools of a run
     import re
     warnings.filterwarnings("ignore")
 except Exception as e:
@@ -11,8 +13,9 @@ except Exception as e:
     exit(1) 
     
 def run_virsorter2_2nd(virsorter_outdir, threads, input_length_limit):
-    vs_2nd_cmd = f"virsorter run --seqname-suffix-off --viral-gene-enrich-off --prep-for-dramv -i {virsorter_outdir}/CheckV_result_1st/combined.fna -w {virsorter_outdir}/pass2 --min-length {input_length_limit} --min-score 0.5 -j {threads} all 1> /dev/null"
-    os.system(vs_2nd_cmd)    
+    with resource_pool.allocate(int(threads), resource_pool.TOOL2MEMORY['VirSorter2']) as cores:
+        vs_2nd_cmd = f"virsorter run --seqname-suffix-off --viral-gene-enrich-off --prep-for-dramv -i {virsorter_outdir}/CheckV_result_1st/combined.fna -w {virsorter_outdir}/pass2 --min-length {input_length_limit} --min-score 0.5 -j {cores} all 1> /dev/null"
+        process_metrics.system(vs_2nd_cmd, check=True)    
 
 virsorter_outdir, threads, input_length_limit = sys.argv[1], sys.argv[2], sys.argv[3]
 run_virsorter2_2nd(virsorter_outdir, threads, input_length_limit)
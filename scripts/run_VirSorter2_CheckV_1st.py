@@ -4,6 +4,8 @@ try:
     import warnings
     import sys
     import os
+    import resource_pool # For sharing CPU cores and memory among all tools of a run
+    import process_metrics # For recording the resource usage of all tools of a run
     import re
     warnings.filterwarnings("ignore")
 except Exception as e:
@@ -12,11 +14,12 @@ except Exception as e:
     
 def run_virsorter2_checkv_1st(virsorter_outdir, threads, checkv_db_dir):
 
-    checkv_cmd = f"checkv end_to_end {virsorter_outdir}/pass1/final-viral-combined.fa {virsorter_outdir}/CheckV_result_1st -t {threads} -d {checkv_db_dir} 1> /dev/null"
-    os.system(checkv_cmd)   
+    with resource_pool.allocate(int(threads), resource_pool.TOOL2MEMORY['CheckV']) as cores:
+        checkv_cmd = f"checkv end_to_end {virsorter_outdir}/pass1/final-viral-combined.fa {virsorter_outdir}/CheckV_result_1st -t {cores} -d {checkv_db_dir} 1> /dev/null"
+        process_metrics.system(checkv_cmd, check=True)   
 
     cat_cmd = f"cat {virsorter_outdir}/CheckV_result_1st/proviruses.fna {virsorter_outdir}/CheckV_result_1st/viruses.fna > {virsorter_outdir}/CheckV_result_1st/combined.fna"
-    os.system(cat_cmd) 
+    process_metrics.system(cat_cmd, check=True) 
      
 virsorter_outdir, threads, checkv_db_dir = sys.argv[1], sys.argv[2], sys.argv[3]
 run_virsorter2_checkv_1st(virsorter_outdir, threads, checkv_db_dir)
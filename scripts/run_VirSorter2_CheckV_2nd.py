@@ -4,6 +4,8 @@ try:
     import warnings
     import sys
     import os
+    import resource_pool # For sharing CPU cores and memory among all tools of a run
+    import process_metrics # For recording the resource usage of all tools of a run
     import re
     warnings.filterwarnings("ignore")
 except Exception as e:
@@ -12,8 +14,9 @@ except Exception as e:
     
 def run_virsorter2_checkv_2nd(virsorter_outdir, threads, checkv_db_dir):
 
-    checkv_cmd = f"checkv end_to_end {virsorter_outdir}/pass2/final-viral-combined.fa {virsorter_outdir}/CheckV_result_2nd -t {threads} -d {checkv_db_dir} 1> /dev/null"
-    os.system(checkv_cmd)   
+    with resource_pool.allocate(int(threads), resource_pool.TOOL2MEMORY['CheckV']) as cores:
+        checkv_cmd = f"checkv end_to_end {virsorter_outdir}/pass2/final-viral-combined.fa {virsorter_outdir}/CheckV_result_2nd -t {cores} -d {checkv_db_dir} 1> /dev/null"
+        process_metrics.system(checkv_cmd, check=True)   
 
 
      
@@ -12,76 +12,20 @@ try:
     import subprocess
     from subprocess import DEVNULL, STDOUT, check_call    
     warnings.filterwarnings("ignore")
+    import seq_io # For streaming fasta, faa, and ffn reading and writing
+    import resource_pool # For sharing CPU cores and memory among all tools of a run
+    import job_pool # For running sub-jobs with a bounded number of parallel processes
+    import process_metrics # For recording the resource usage of all tools of a run
 except Exception as e:
     sys.stderr.write(str(e) + "\n\n")
     exit(1) 
     
-def store_seq(input_seq_file): # The input sequence file should be a file with full path
-    head = "" # Store the header line
-    seq_dict = {} # Store the sequence dict
-    
-    with open(input_seq_file, "r") as seq_lines:
-        for line in seq_lines:
-            line = line.rstrip("\n") # Remove "\n" in the end
-            if ">" in line:
-                if (" " or "\t") in line: # Break at the first " " or "\t"
-                    spliter = ""
-                    for i in range(len(line)):
-                        if line[i] == " " or line[i] == "\t":
-                            spliter = line[i]
-                            break 
-                           
-                    head = line.split(f'{spliter}', 1)[0]
-                    seq_dict[head] = ""
-                else:
-                    head = line
-                    seq_dict[head] = ""
-            else:
-                seq_dict[head] += line
-            
-    seq_lines.close()
-    
-    return seq_dict
-
-def write_down_seq(seq_dict, path_to_file): 
-    # Two inputs are required:
-    # (1) The dict of the sequence
-    # (2) The path that you want to write your sequence down
-    
-    seq_file = open(path_to_file,"w")
-    for head in seq_dict:
-        seq_file.write(head + "\n")
-        seq_file.write(seq_dict[head] + "\n")
-    seq_file.close()   
-
-def chuncker(list_to_split, chunk_size):
-    list_of_chunks =[]
-    start_chunk = 0
-    end_chunk = start_chunk+chunk_size
-    while end_chunk <= len(list_to_split)+chunk_size:
-        chunk_ls = list_to_split[start_chunk: end_chunk]
-        list_of_chunks.append(chunk_ls)
-        start_chunk = start_chunk +chunk_size
-        end_chunk = end_chunk+chunk_size    
-    return list_of_chunks    
-    
 def split_seq(input_seq, split_num, output_seq_folder):
-    # Step 1 Store the seq dict
-    input_seq_dict = store_seq(input_seq)
-    
-    # Step 2 Make list of each seq dict
-    input_seq_dict_keys_list = list(input_seq_dict.keys())
-    chunk_size = math.ceil(len(input_seq_dict_keys_list) / int(split_num))
-    input_seq_dict_keys_list_of_chunks = chuncker(input_seq_dict_keys_list, chunk_size)
-    
-    list_of_seq_dicts = [] # [seq_dicts]
-    for chunk in input_seq_dict_keys_list_of_chunks:
-        seq_dict = {}
-        for header in chunk:
-            seq_dict[header] = input_seq_dict[header]
-        list_of_seq_dicts.append(seq_dict)
+    # Step 1 Count the seqs and get the chunk size
+    seq_num = sum(1 for _ in seq_io.read_headers(input_seq))
+    chunk_size = max(math.ceil(seq_num / int(split_num)), 1)
 
-    # Step 3 Write down individual seq files
+    # Step 2 Write down individual seq files by streaming the seqs into each chunk
     stem_name = Path(input_seq).stem
     suffix = Path(input_seq).suffix
     if os.path.exists(output_seq_folder):
@@ -89,11 +33,17 @@ def split_seq(input_seq, split_num, output_seq_folder):
     else:
         os.mkdir(output_seq_folder)
     
-    for i in range(len(list_of_seq_dicts)):
-        j = i + 1
-        seq_dict = list_of_seq_dicts[i]
-        output_seq_file = os.path.join(output_seq_folder, f"{stem_name}.chunk_{j}{suffix}")
-        write_down_seq(seq_dict, output_seq_file)
+    output_seq = None
+    for i, (header, seq) in enumerate(seq_io.read_seq(input_seq)):
+        if i % chunk_size == 0:
+            if output_seq:
+                output_seq.close()
+            j = i // chunk_size + 1
+            output_seq_file = os.path.join(output_seq_folder, f"{stem_name}.chunk_{j}{suffix}")
+            output_seq = seq_io.open_seq_file(output_seq_file, 'w')
+        output_seq.write(f'{header}\n{seq}\n')
+    if output_seq:
+        output_seq.close()
         
 def get_hmmsearch_result(hmmsearch_result):
     pro2info = {} # pro => [query, query_accession, evalue, score]
@@ -125,7 +75,8 @@ def run_annotate_by_vibrant_db(VIBRANT_db, identify_method, virsorter_outdir, dv
     all_fasta_addrs = glob(os.path.join(output_seq_folder, '*.fasta'))  
     
     # Step 2 Prodigal annotate all fasta files
-    prodigal_cmds = []
+    prodigal_cmds = [] # [(chunk, cmd)]
+    prodigal_chunk2size = {} # chunk => bytes of its fasta file
     for fasta_addr in all_fasta_addrs:
         if os.path.getsize(fasta_addr):
             fasta_stem = Path(fasta_addr).stem
@@ -133,13 +84,10 @@ def run_annotate_by_vibrant_db(VIBRANT_db, identify_method, virsorter_outdir, dv
             ffn_addr = fasta_addr.replace('.fasta', '.ffn', 1)
             temp_addr = fasta_addr.replace('.fasta', '_temp.txt', 1)
             each_cmd = f"prodigal -i {fasta_addr} -a {faa_addr} -d {ffn_addr} -p meta -q -o {temp_addr}"
-            prodigal_cmds.append(each_cmd)
+            prodigal_cmds.append((f'prodigal {fasta_stem}', each_cmd))
+            prodigal_chunk2size[f'prodigal {fasta_stem}'] = os.path.getsize(fasta_addr)
 
-    n = int(threads) # The number of parallel processes
-    for j in range(max(int(len(prodigal_cmds)/n + 1), 1)):
-        procs = [subprocess.Popen(i, shell=True, stdout=DEVNULL) for i in prodigal_cmds[j*n: min((j+1)*n, len(prodigal_cmds))] ]
-        for p in procs:
-            p.wait() 
+    job_pool.run_jobs(prodigal_cmds, int(threads), 1, resource_pool.TOOL2MEMORY['prodigal'], prodigal_chunk2size, shell=True, stdout=DEVNULL) # Larger chunks start first; the next job starts as soon as any running job exits
     
     all_faa_addrs = glob(f"{output_seq_folder}/*.faa")
 
@@ -150,19 +98,17 @@ def run_annotate_by_vibrant_db(VIBRANT_db, identify_method, virsorter_outdir, dv
     else:
         os.mkdir(tmp_dir_kegg_hmmsearch_results)
     
-    kegg_hmmsearch_cmds = []
+    kegg_hmmsearch_cmds = [] # [(chunk, cmd)]
+    kegg_chunk2size = {} # chunk => MB of its faa file
     for faa_addr in all_faa_addrs:
         faa_stem = Path(faa_addr).stem
         kegg_hmmtbl = os.path.join(tmp_dir_kegg_hmmsearch_results, f"{faa_stem}.KEGG.hmmtbl")
         kegg_temp = os.path.join(tmp_dir_kegg_hmmsearch_results, f"{faa_stem}_temp.txt")
-        each_cmd = f"hmmsearch --tblout {kegg_hmmtbl} --noali -T 40 --cpu {int(threads)} -o {kegg_temp} {KEGG_hmm_file} {faa_addr}"
-        kegg_hmmsearch_cmds.append(each_cmd)
+        each_cmd = f"hmmsearch --tblout {kegg_hmmtbl} --noali -T 40 --cpu {job_pool.THREADS} -o {kegg_temp} {KEGG_hmm_file} {faa_addr}"
+        kegg_hmmsearch_cmds.append((f'hmmsearch KEGG {faa_stem}', each_cmd))
+        kegg_chunk2size[f'hmmsearch KEGG {faa_stem}'] = os.path.getsize(faa_addr) / 1e6
     
-    n = int(threads) # The number of parallel processes
-    for j in range(max(int(len(kegg_hmmsearch_cmds)/n + 1), 1)):
-        procs = [subprocess.Popen(i, shell=True, stdout=DEVNULL) for i in kegg_hmmsearch_cmds[j*n: min((j+1)*n, len(kegg_hmmsearch_cmds))] ]
-        for p in procs:
-            p.wait()  
+    job_pool.run_packed_jobs('hmmsearch', kegg_hmmsearch_cmds, kegg_chunk2size, int(threads), resource_pool.TOOL2MEMORY['hmmsearch'], shell=True, stdout=DEVNULL) # Threads of each job are decided by the chunk number and sizes
 
     # Step 4 Run hmmsearch against Pfam database
     tmp_dir_pfam_hmmsearch_results = os.path.join(out_dir, 'tmp_dir_pfam_hmmsearch_results')
@@ -171,19 +117,17 @@ def run_annotate_by_vibrant_db(VIBRANT_db, identify_method, virsorter_outdir, dv
     else:
         os.mkdir(tmp_dir_pfam_hmmsearch_results)
     
-    pfam_hmmsearch_cmds = []
+    pfam_hmmsearch_cmds = [] # [(chunk, cmd)]
+    pfam_chunk2size = {} # chunk => MB of its faa file
     for faa_addr in all_faa_addrs:
         faa_stem = Path(faa_addr).stem
         pfam_hmmtbl = os.path.join(tmp_dir_pfam_hmmsearch_results, f"{faa_stem}.Pfam.hmmtbl")
         pfam_temp = os.path.join(tmp_dir_pfam_hmmsearch_results, f"{faa_stem}_temp.txt")
-        each_cmd = f"hmmsearch --tblout {pfam_hmmtbl} --noali -T 40 --cpu {int(threads)} -o {pfam_temp} {Pfam_hmm_file} {faa_addr}"
-        pfam_hmmsearch_cmds.append(each_cmd)
+        each_cmd = f"hmmsearch --tblout {pfam_hmmtbl} --noali -T 40 --cpu {job_pool.THREADS} -o {pfam_temp} {Pfam_hmm_file} {faa_addr}"
+        pfam_hmmsearch_cmds.append((f'hmmsearch Pfam {faa_stem}', each_cmd))
+        pfam_chunk2size[f'hmmsearch Pfam {faa_stem}'] = os.path.getsize(faa_addr) / 1e6
     
-    n = int(threads) # The number of parallel processes
-    for j in range(max(int(len(pfam_hmmsearch_cmds)/n + 1), 1)):
-        procs = [subprocess.Popen(i, shell=True, stdout=DEVNULL) for i in pfam_hmmsearch_cmds[j*n: min((j+1)*n, len(pfam_hmmsearch_cmds))] ]
-        for p in procs:
-            p.wait()  
+    job_pool.run_packed_jobs('hmmsearch', pfam_hmmsearch_cmds, pfam_chunk2size, int(threads), resource_pool.TOOL2MEMORY['hmmsearch'], shell=True, stdout=DEVNULL) # Threads of each job are decided by the chunk number and sizes
 
     # Step 5 Run hmmsearch against VOG database
     tmp_dir_vog_hmmsearch_results = os.path.join(out_dir, 'tmp_dir_vog_hmmsearch_results')
@@ -192,19 +136,17 @@ def run_annotate_by_vibrant_db(VIBRANT_db, identify_method, virsorter_outdir, dv
     else:
         os.mkdir(tmp_dir_vog_hmmsearch_results)
     
-    vog_hmmsearch_cmds = []
+    vog_hmmsearch_cmds = [] # [(chunk, cmd)]
+    vog_chunk2size = {} # chunk => MB of its faa file
     for faa_addr in all_faa_addrs:
         faa_stem = Path(faa_addr).stem
         vog_hmmtbl = os.path.join(tmp_dir_vog_hmmsearch_results, f"{faa_stem}.VOG.hmmtbl")
         vog_temp = os.path.join(tmp_dir_vog_hmmsearch_results, f"{faa_stem}_temp.txt")
-        each_cmd = f"hmmsearch --tblout {vog_hmmtbl} --noali -T 40 --cpu {int(threads)} -o {vog_temp} {VOG_hmm_file} {faa_addr}"
-        vog_hmmsearch_cmds.append(each_cmd)
+        each_cmd = f"hmmsearch --tblout {vog_hmmtbl} --noali -T 40 --cpu {job_pool.THREADS} -o {vog_temp} {VOG_hmm_file} {faa_addr}"
+        vog_hmmsearch_cmds.append((f'hmmsearch VOG {faa_stem}', each_cmd))
+        vog_chunk2size[f'hmmsearch VOG {faa_stem}'] = os.path.getsize(faa_addr) / 1e6
     
-    n = int(threads) # The number of parallel processes
-    for j in range(max(int(len(vog_hmmsearch_cmds)/n + 1), 1)):
-        procs = [subprocess.Popen(i, shell=True, stdout=DEVNULL) for i in vog_hmmsearch_cmds[j*n: min((j+1)*n, len(vog_hmmsearch_cmds))] ]
-        for p in procs:
-            p.wait()  
+    job_pool.run_packed_jobs('hmmsearch', vog_hmmsearch_cmds, vog_chunk2size, int(threads), resource_pool.TOOL2MEMORY['hmmsearch'], shell=True, stdout=DEVNULL) # Threads of each job are decided by the chunk number and sizes
             
     # Step 6 Parse hmmsearch results
         #KEGG-> query
@@ -276,10 +218,7 @@ def run_annotate_by_vibrant_db(VIBRANT_db, identify_method, virsorter_outdir, dv
     header_list = ['protein', 'scaffold', 'KO', 'AMG', 'KO name', 'KO evalue', 'KO score', 'Pfam', 'Pfam name', 'Pfam evalue', 'Pfam score', 'VOG', 'VOG name', 'VOG evalue', 'VOG score']    
     header = '\t'.join(header_list)
     f.write(header + '\n')
-    all_pro_seq = {}
-    for faa_addr in all_faa_addrs:
-        pro_seq = store_seq(faa_addr)
-        all_pro_seq.update(pro_seq)
+    all_pro_seq = (pro_w_array for faa_addr in all_faa_addrs for pro_w_array in seq_io.read_headers(faa_addr))
     
     for pro_w_array in all_pro_seq:
         pro = pro_w_array.replace('>', '' , 1)
@@ -303,9 +242,7 @@ def run_annotate_by_vibrant_db(VIBRANT_db, identify_method, virsorter_outdir, dv
 
     # Step 7 Make the final virus faa and ffn files and remove all tmp dirs
     all_ffn_addrs = glob(f"{output_seq_folder}/*.ffn")
-    all_faa_seq = {}
     all_faa_seq_addr = ''
-    all_ffn_seq = {}
     all_ffn_seq_addr = ''
     
     if identify_method == 'vs':
@@ -315,18 +252,15 @@ def run_annotate_by_vibrant_db(VIBRANT_db, identify_method, virsorter_outdir, dv
         all_faa_seq_addr = os.path.join(dvf_outdir, 'final_dvf_virus.faa')
         all_ffn_seq_addr = os.path.join(dvf_outdir, 'final_dvf_virus.ffn')
     
-    for faa_addr in all_faa_addrs:
-        faa_addr_seq = store_seq(faa_addr)
-        all_faa_seq.update(faa_addr_seq)
-
-    for ffn_addr in all_ffn_addrs:
-        ffn_addr_seq = store_seq(ffn_addr)
-        all_ffn_seq.update(ffn_addr_seq)   
+    with seq_io.open_seq_file(all_faa_seq_addr, 'w') as all_faa_seq:
+        for faa_addr in all_faa_addrs:
+            seq_io.append_seq(seq_io.read_seq(faa_addr), all_faa_seq)
 
-    write_down_seq(all_faa_seq, all_faa_seq_addr)
-    write_down_seq(all_ffn_seq, all_ffn_seq_addr)    
+    with seq_io.open_seq_file(all_ffn_seq_addr, 'w') as all_ffn_seq:
+        for ffn_addr in all_ffn_addrs:
+            seq_io.append_seq(seq_io.read_seq(ffn_addr), all_ffn_seq)    
     
-    os.system(f"rm -rf {output_seq_folder} {tmp_dir_kegg_hmmsearch_results} {tmp_dir_pfam_hmmsearch_results} {tmp_dir_vog_hmmsearch_results}")
+    process_metrics.system(f"rm -rf {output_seq_folder} {tmp_dir_kegg_hmmsearch_results} {tmp_dir_pfam_hmmsearch_results} {tmp_dir_vog_hmmsearch_results}")
                
     
 VIBRANT_db, identify_method, virsorter_outdir, dvf_outdir, out_dir, threads = sys.argv[1], sys.argv[2], sys.argv[3], sys.argv[4], sys.argv[5], sys.argv[6]
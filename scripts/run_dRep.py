@@ -4,6 +4,8 @@ try:
     import warnings
     import sys
     import os
+    import resource_pool # For sharing CPU cores and memory among all tools of a run
+    import job_pool # For running sub-jobs with a bounded number of parallel processes
     import re
     warnings.filterwarnings("ignore")
     from pathlib import Path
@@ -15,25 +17,25 @@ except Exception as e:
     exit(1) 
     
 def run_drep(dRep_outdir, viral_genus_genome_list_dir, threads, dRep_length_limit):
-    dRep_cmd = []
+    dRep_cmd = [] # [(genus, cmd, outputs)]
+    genus2size = {} # genus => the number of its genomes
     viral_genus_genome_lists = glob(f'{viral_genus_genome_list_dir}/viral_genus_genome_list.*.txt')
     viral_genus_genome_lists_non_singleton = []
+    viral_genus_genome_list2num = {} # viral_genus_genome_list => the number of genomes in it
     for viral_genus_genome_list in viral_genus_genome_lists:
         with open(viral_genus_genome_list, 'r') as fp:
             line_num = len(fp.readlines())
             if line_num != 1:
                 viral_genus_genome_lists_non_singleton.append(viral_genus_genome_list)
+                viral_genus_genome_list2num[viral_genus_genome_list] = line_num
 
     for viral_genus_genome_list in viral_genus_genome_lists_non_singleton:
         VC = Path(viral_genus_genome_list).stem.split(".")[1]
-        each_cmd = f'dRep dereplicate {dRep_outdir}/Output.{VC} -p 1 -g {viral_genus_genome_list} -l {dRep_length_limit} --ignoreGenomeQuality -pa 0.8 -sa 0.95 -nc 0.85 -comW 0 -conW 0 -strW 0 -N50W 0 -sizeW 1 -centW 0 1> /dev/null'
-        dRep_cmd.append(each_cmd)
+        each_cmd = f'dRep dereplicate {dRep_outdir}/Output.{VC} -p {job_pool.THREADS} -g {viral_genus_genome_list} -l {dRep_length_limit} --ignoreGenomeQuality -pa 0.8 -sa 0.95 -nc 0.85 -comW 0 -conW 0 -strW 0 -N50W 0 -sizeW 1 -centW 0 1> /dev/null'
+        dRep_cmd.append((f'dRep genus {VC}', each_cmd, [f'{dRep_outdir}/Output.{VC}'])) # A retry starts from an empty work dir
+        genus2size[f'dRep genus {VC}'] = viral_genus_genome_list2num[viral_genus_genome_list]
 
-    n = int(threads) # The number of parallel processes
-    for j in range(max(int(len(dRep_cmd)/n + 1), 1)):
-        procs = [subprocess.Popen(i, shell=True, stdout=DEVNULL) for i in dRep_cmd[j*n: min((j+1)*n, len(dRep_cmd))] ]
-        for p in procs:
-            p.wait()      
+    job_pool.run_packed_jobs('dRep', dRep_cmd, genus2size, int(threads), resource_pool.TOOL2MEMORY['dRep'], shell=True, stdout=DEVNULL) # Threads of each job are decided by the genus number and sizes
     
 dRep_outdir, viral_genus_genome_list_dir, threads, dRep_length_limit = sys.argv[1], sys.argv[2], sys.argv[3], sys.argv[4]
 run_drep(dRep_outdir, viral_genus_genome_list_dir, threads, dRep_length_limit)    
\ No newline at end of file
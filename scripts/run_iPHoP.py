@@ -4,6 +4,8 @@ try:
     import warnings
     import sys
     import os
+    import resource_pool # For sharing CPU cores and memory among all tools of a run
+    import process_metrics # For recording the resource usage of all tools of a run
     warnings.filterwarnings("ignore")   
 except Exception as e:
     sys.stderr.write(str(e) + "\n\n")
@@ -11,9 +13,10 @@ except Exception as e:
 
     
 def run_iphop(all_vRhyme_fasta_Nlinked, iphop_outdir, iphop_db_dir, threads):
-    run_cmd = f'iphop predict --fa_file {all_vRhyme_fasta_Nlinked} --out_dir {iphop_outdir} -t {threads} --db_dir {iphop_db_dir} --no_qc 1> /dev/null'
     os.mkdir(iphop_outdir)
-    os.system(run_cmd)    
+    with resource_pool.allocate(int(threads), resource_pool.TOOL2MEMORY['iPHoP']) as cores:
+        run_cmd = f'iphop predict --fa_file {all_vRhyme_fasta_Nlinked} --out_dir {iphop_outdir} -t {cores} --db_dir {iphop_db_dir} --no_qc 1> /dev/null'
+        process_metrics.system(run_cmd, check=True)    
 
     
 all_vRhyme_fasta_Nlinked, iphop_outdir, iphop_db_dir, threads = sys.argv[1], sys.argv[2], sys.argv[3], sys.argv[4]
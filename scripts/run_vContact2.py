@@ -4,6 +4,8 @@ try:
     import warnings
     import sys
     import os
+    import resource_pool # For sharing CPU cores and memory among all tools of a run
+    import process_metrics # For recording the resource usage of all tools of a run
     import re
     from pathlib import Path
     warnings.filterwarnings("ignore")
@@ -19,12 +21,13 @@ def run_vcontact2(all_vRhyme_faa, pro2viral_gn_map, tax_classification_db_dir, c
     # Make tmp input files
     dir_path = Path(all_vRhyme_faa).parent
     
-    os.system(f'cat {all_vRhyme_faa} {ref_viral_faa} > {dir_path}/combined_viral_faa.faa')
-    os.system(f'cat {pro2viral_gn_map} {ref_pro2viral_gn_map} > {dir_path}/combined_pro2viral_gn_map.csv')
+    process_metrics.system(f'cat {all_vRhyme_faa} {ref_viral_faa} > {dir_path}/combined_viral_faa.faa', check=True)
+    process_metrics.system(f'cat {pro2viral_gn_map} {ref_pro2viral_gn_map} > {dir_path}/combined_pro2viral_gn_map.csv', check=True)
 
     # Run vcontact
-    cmd = f'vcontact2 --raw-proteins {dir_path}/combined_viral_faa.faa --rel-mode Diamond --proteins-fp {dir_path}/combined_pro2viral_gn_map.csv --db None --pcs-mode MCL --vcs-mode ClusterONE --c1-bin {cluster_one_jar} --output-dir {outdir} -t {int(threads)} -v 1> /dev/null' 
-    os.system(cmd)   
+    with resource_pool.allocate(int(threads), resource_pool.TOOL2MEMORY['vContact2']) as cores:
+        cmd = f'vcontact2 --raw-proteins {dir_path}/combined_viral_faa.faa --rel-mode Diamond --proteins-fp {dir_path}/combined_pro2viral_gn_map.csv --db None --pcs-mode MCL --vcs-mode ClusterONE --c1-bin {cluster_one_jar} --output-dir {outdir} -t {cores} -v 1> /dev/null' 
+        process_metrics.system(cmd, check=True)   
 
 all_vRhyme_faa, pro2viral_gn_map, tax_classification_db_dir, cluster_one_jar, outdir, threads = sys.argv[1], sys.argv[2], sys.argv[3], sys.argv[4], sys.argv[5], sys.argv[6]
 run_vcontact2(all_vRhyme_faa, pro2viral_gn_map, tax_classification_db_dir, cluster_one_jar, outdir, threads)  
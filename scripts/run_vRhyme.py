@@ -4,6 +4,8 @@ try:
     import warnings
     import sys
     import os
+    import resource_pool # For sharing CPU cores and memory among all tools of a run
+    import process_metrics # For recording the resource usage of all tools of a run
     import re
     warnings.filterwarnings("ignore")
 except Exception as e:
@@ -14,8 +16,9 @@ def run_vrhyme(viral_scaffold, vRhyme_outdir, mapping_result_dir, threads):
     viral_scaffold_faa = viral_scaffold.rsplit(".", 1)[0] + ".faa"
     viral_scaffold_ffn = viral_scaffold.rsplit(".", 1)[0] + ".ffn"      
             
-    cmd = f'vRhyme -i {viral_scaffold} -g {viral_scaffold_ffn} -p {viral_scaffold_faa} -c {mapping_result_dir}/vRhyme_input_coverage.txt -t {int(threads)} -o {vRhyme_outdir} --red 5 1> /dev/null'
-    os.system(cmd)      
+    with resource_pool.allocate(int(threads), resource_pool.TOOL2MEMORY['vRhyme']) as cores:
+        cmd = f'vRhyme -i {viral_scaffold} -g {viral_scaffold_ffn} -p {viral_scaffold_faa} -c {mapping_result_dir}/vRhyme_input_coverage.txt -t {cores} -o {vRhyme_outdir} --red 5 1> /dev/null'
+        process_metrics.system(cmd, check=True)      
     
 viral_scaffold, vRhyme_outdir, mapping_result_dir, threads = sys.argv[1], sys.argv[2], sys.argv[3], sys.argv[4]
 run_vrhyme(viral_scaffold, vRhyme_outdir, mapping_result_dir, threads)    
\ No newline at end of file
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+
+'''
+Aim: Build an on-disk offset index for fasta/faa/ffn files, so that any record can be fetched by its ID with a single seek
+Note: The index is stored next to the sequence file as "<seq file>.seqidx", one record per line:
+ID    header_offset    seq_offset    end_offset    seq_length
+and the first line keeps the size and mtime of the sequence file, so that a stale index is rebuilt automatically
+'''
+
+try:
+    import warnings
+    import sys
+    import os
+    import re
+    warnings.filterwarnings("ignore")
+    try:
+        from scripts import seq_io
+    except ImportError:
+        import seq_io
+except Exception as e:
+    sys.stderr.write(str(e) + "\n\n")
+    exit(1)
+
+
+INDEX_SUFFIX = '.seqidx'
+HEAD_SPLITTER = re.compile(rb'[ \t]') # Break the header at the first " " or "\t", the same as seq_io.read_seq
+
+
+def get_index_file(input_seq_file):
+    return str(input_seq_file) + INDEX_SUFFIX
+
+def get_seq_file_stamp(input_seq_file):
+    stat = os.stat(input_seq_file)
+    return f'{stat.st_size}\t{stat.st_mtime_ns}'
+
+def build_seq_index(input_seq_file):
+    # Scan the sequence file once (bytes, no sequence joining) and write down the index
+    # Returns the index dict: ID => [header_offset, seq_offset, end_offset, seq_length]; ID is without ">"
+    if seq_io.is_gzipped(input_seq_file):
+        raise ValueError(f"Cannot build a random-access index for the gzipped file {input_seq_file}")
+
+    seq_index = {} # ID => [header_offset, seq_offset, end_offset, seq_length]
+    record = None
+    offset = 0
+    with open(input_seq_file, 'rb', buffering = seq_io.BUFFER_SIZE) as seq_lines:
+        for line in seq_lines:
+            if line.startswith(b'>'):
+                if record:
+                    record[3] = offset
+                head = HEAD_SPLITTER.split(line[1:].rstrip(b'\r\n'), 1)[0].decode()
+                record = [head, offset, offset + len(line), 0, 0]
+                seq_index[head] = record
+            elif record:
+                record[4] += len(line.rstrip(b'\r\n'))
+            offset += len(line)
+    if record:
+        record[3] = offset
+
+    seq_index = {head: record[1:] for head, record in seq_index.items()}
+
+    index_file = get_index_file(input_seq_file)
+    index_file_tmp = index_file + '.tmp'
+    with open(index_file_tmp, 'w') as f:
+        f.write(f'#{get_seq_file_stamp(input_seq_file)}\n')
+        for head, record in seq_index.items():
+            f.write(head + '\t' + '\t'.join(str(x) for x in record) + '\n')
+    os.replace(index_file_tmp, index_file)
+
+    return seq_index
+
+def load_seq_index(input_seq_file):
+    # Load the index of the sequence file; (re)build it if it does not exist or it is older than the sequence file
+    index_file = get_index_file(input_seq_file)
+    if os.path.exists(index_file):
+        with open(index_file, 'r') as lines:
+            stamp = lines.readline().rstrip('\n').replace('#', '', 1)
+            if stamp == get_seq_file_stamp(input_seq_file):
+                seq_index = {} # ID => [header_offset, seq_offset, end_offset, seq_length]
+                for line in lines:
+                    tmp = line.rstrip('\n').split('\t')
+                    seq_index[tmp[0]] = [int(tmp[1]), int(tmp[2]), int(tmp[3]), int(tmp[4])]
+                return seq_index
+
+    return build_seq_index(input_seq_file)
+
+def open_indexed_seq_file(input_seq_file):
+    return open(input_seq_file, 'rb')
+
+def fetch_seq(seq_handle, seq_index, seq_id, full_head = False):
+    # Seek to one record and return (head, seq); head keeps the leading ">" as in seq_io.read_seq
+    # seq_handle should be opened by open_indexed_seq_file
+    header_offset, seq_offset, end_offset, seq_length = seq_index[seq_id]
+    seq_handle.seek(header_offset)
+    record = seq_handle.read(end_offset - header_offset).decode()
+    header_line, seq_lines = record.split('\n', 1) if '\n' in record else (record, '')
+    head = header_line.rstrip('\r') if full_head else '>' + seq_id
+    seq = seq_lines.replace('\r', '').replace('\n', '')
+    return head, seq
+
+def fetch_seqs(input_seq_file, seq_ids, full_head = False, seq_index = None):
+    # Yield (head, seq) for each ID in seq_ids (in the given order); IDs not in the file are skipped
+    if seq_index is None:
+        seq_index = load_seq_index(input_seq_file)
+    with open_indexed_seq_file(input_seq_file) as seq_handle:
+        for seq_id in seq_ids:
+            if seq_id in seq_index:
+                yield fetch_seq(seq_handle, seq_index, seq_id, full_head)
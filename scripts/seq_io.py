@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+
+'''
+Aim: Stream FASTA/FAA/FFN records (plain or gzipped) without holding the whole file in memory
+'''
+
+try:
+    import warnings
+    import sys
+    import os
+    import re
+    import gzip
+    import mmap
+    warnings.filterwarnings("ignore")
+    from pathlib import Path
+except Exception as e:
+    sys.stderr.write(str(e) + "\n\n")
+    exit(1)
+
+
+BUFFER_SIZE = 1024 * 1024 # 1 Mb buffer for reading and writing sequence files
+HEAD_SPLITTER = re.compile(r'[ \t]') # Break the header at the first " " or "\t"
+GZIP_MAGIC = b'\x1f\x8b'
+
+
+def is_gzipped(input_seq_file):
+    with open(input_seq_file, 'rb') as f:
+        return f.read(2) == GZIP_MAGIC
+
+def open_seq_file(input_seq_file, mode = 'r'):
+    # Read: gzipped files are detected by their magic number, not by the extension
+    # Write: files ending with ".gz" are gzipped
+    if 'r' in mode:
+        if is_gzipped(input_seq_file):
+            return gzip.open(input_seq_file, 'rt')
+        return open(input_seq_file, 'r', buffering = BUFFER_SIZE)
+    else:
+        if str(input_seq_file).endswith('.gz'):
+            return gzip.open(input_seq_file, mode + 't')
+        return open(input_seq_file, mode, buffering = BUFFER_SIZE)
+
+def read_seq(input_seq_file, full_head = False):
+    # Yield (head, seq) for each record, head keeps the leading ">"
+    # full_head = False: break the header at the first " " or "\t" (as store_seq)
+    # full_head = True: keep the whole header line (as store_seq_with_full_head)
+    head = None
+    seq_lines = [] # Store the sequence lines of the current record; joined once per record
+
+    with open_seq_file(input_seq_file) as lines:
+        for line in lines:
+            if line.startswith('>'):
+                if head is not None:
+                    yield head, ''.join(seq_lines)
+                line = line.rstrip('\n')
+                if full_head:
+                    head = line
+                else:
+                    head = HEAD_SPLITTER.split(line, 1)[0]
+                seq_lines = []
+            else:
+                seq_lines.append(line.rstrip('\n'))
+
+    if head is not None:
+        yield head, ''.join(seq_lines)
+
+def read_headers(input_seq_file, full_head = False):
+    # Yield only the heads (with the leading ">"), the same as [head for head, _ in read_seq(input_seq_file, full_head)]
+    # Plain files are memory-mapped and scanned with find(b'\n>'), jumping from one header to the next without building sequence strings
+    if is_gzipped(input_seq_file):
+        with open_seq_file(input_seq_file) as lines:
+            for line in lines:
+                if line.startswith('>'):
+                    line = line.rstrip('\n')
+                    yield line if full_head else HEAD_SPLITTER.split(line, 1)[0]
+        return
+
+    if os.path.getsize(input_seq_file) == 0: # mmap can not map an empty file
+        return
+    with open(input_seq_file, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ) as mapped:
+            start = 0 if mapped[:1] == b'>' else mapped.find(b'\n>') + 1 # Start of the current header line
+            if start == 0 and mapped[:1] != b'>':
+                return
+            while True:
+                end = mapped.find(b'\n', start)
+                if end == -1:
+                    end = len(mapped)
+                line = mapped[start:end].rstrip(b'\r').decode()
+                yield line if full_head else HEAD_SPLITTER.split(line, 1)[0]
+                start = mapped.find(b'\n>', end) + 1
+                if start == 0:
+                    break
+
+def read_gene_seq(input_gene_file):
+    # Yield (head, seq) with the file stem added to the header: ">" + stem + "~~" + gene_id; "*" is removed from the sequence
+    filename = Path(input_gene_file).stem
+    for head, seq in read_seq(input_gene_file):
+        yield '>' + filename + '~~' + head[1:], seq.replace('*', '')
+
+def write_seq(seq_records, path_to_file):
+    # seq_records can be any iterable of (head, seq), i.e., the generator from read_seq or dict.items()
+    with open_seq_file(path_to_file, 'w') as seq_file:
+        for head, seq in seq_records:
+            seq_file.write(f'{head}\n{seq}\n')
+
+def append_seq(seq_records, seq_file):
+    # Write (head, seq) records into an already opened file handle
+    for head, seq in seq_records:
+        seq_file.write(f'{head}\n{seq}\n')
+
+def extract_seq_to_files(input_seq_file, seq_ids_and_output_files):
+    # Stream the (plain or gzipped) input once and write the records whose ID is in a given ID set into the paired output file
+    # seq_ids_and_output_files: [(seq_ids, output_seq_file)]; seq_ids should be a set or dict (ID without ">")
+    # Sequence lines are copied as they are read and never joined, so memory does not grow with the input or the scaffold length;
+    # the output has the same format as write_seq (header broken at the first " " or "\t", one line per sequence)
+    outputs = [(seq_ids, open_seq_file(output_seq_file, 'w')) for seq_ids, output_seq_file in seq_ids_and_output_files]
+    targets = [] # The output files of the current record
+    
+    with open_seq_file(input_seq_file) as lines:
+        for line in lines:
+            if line.startswith('>'):
+                for target in targets:
+                    target.write('\n')
+                head = HEAD_SPLITTER.split(line.rstrip('\n'), 1)[0]
+                targets = [output for seq_ids, output in outputs if head[1:] in seq_ids]
+                for target in targets:
+                    target.write(head + '\n')
+            elif targets:
+                seq_line = line.rstrip('\n')
+                for target in targets:
+                    target.write(seq_line)
+                    
+    for target in targets:
+        target.write('\n')
+    for seq_ids, output in outputs:
+        output.close()
+
+def extract_seq(input_seq_file, seq_ids, output_seq_file):
+    # Write the records whose ID is in seq_ids into output_seq_file, in one streaming pass over input_seq_file
+    extract_seq_to_files(input_seq_file, [(seq_ids, output_seq_file)])
+
+def store_seq(input_seq_file):
+    # The input sequence file should be a file with full path
+    return dict(read_seq(input_seq_file))
+
+def store_seq_with_full_head(input_seq_file):
+    # The input sequence file should be a file with full path
+    return dict(read_seq(input_seq_file, full_head = True))
+
+def get_gene_seq(input_gene_file):
+    return dict(read_gene_seq(input_gene_file))
+
+def write_down_seq(seq_dict, path_to_file):
+    # Two inputs are required:
+    # (1) The dict of the sequence
+    # (2) The path that you want to write your sequence down
+    write_seq(seq_dict.items(), path_to_file)
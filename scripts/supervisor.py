@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+
+'''
+Aim: Run an external command under supervision: check its exit code, keep its stderr in a log file, stop it after a timeout,
+and run it again after a transient failure
+Note: The stderr of each job is appended to "job log dir/step/job.stderr.txt" (the dir is passed by the VIWRAP_JOB_LOG_DIR env variable),
+and the last lines of it are put in the error message when the job fails.
+A failure is transient if the job is killed by a signal (i.e., by the OOM killer under memory pressure) or by the timeout;
+these jobs are run again after 30 s, 60 s, ... (VIWRAP_JOB_RETRIES times at most), and any other non-zero exit code fails at once.
+The outputs of a job (files or dirs given by the caller) are removed before each attempt, so that a retry does not continue from
+the truncated files of a killed attempt (i.e., CheckV and dRep reuse the intermediate files found in their output dir).
+The timeout (seconds, 0 = no limit) is passed by the VIWRAP_JOB_TIMEOUT env variable
+'''
+
+try:
+    import warnings
+    import sys
+    import os
+    import re
+    import time
+    import signal
+    import shutil
+    import tempfile
+    import subprocess
+    from datetime import datetime
+    warnings.filterwarnings("ignore")
+    try:
+        from scripts import process_metrics
+    except ImportError:
+        import process_metrics
+except Exception as e:
+    sys.stderr.write(str(e) + "\n\n")
+    exit(1)
+
+
+LOG_DIR_ENV = 'VIWRAP_JOB_LOG_DIR'
+TIMEOUT_ENV = 'VIWRAP_JOB_TIMEOUT'
+RETRIES_ENV = 'VIWRAP_JOB_RETRIES'
+BACKOFF = 30 # Seconds to wait before the first retry; doubled for each later retry
+POLL_INTERVAL = 1 # Seconds between two checks of the timeout and the abort event
+TAIL_LINES = 20 # The number of stderr lines in the error message
+
+
+class JobError(Exception):
+    pass
+
+
+def get_timeout():
+    return float(os.environ.get(TIMEOUT_ENV) or 0) or None
+
+def get_retries():
+    return int(os.environ.get(RETRIES_ENV) or 0)
+
+def get_log_file(job):
+    # Step and job names are made safe as file names (i.e., "sample/run_CheckV" => "sample__run_CheckV")
+    def get_safe_name(name):
+        return re.sub(r'[^\w.-]+', '_', name.replace('/', '__')) or 'job'
+    log_dir = os.environ.get(LOG_DIR_ENV) or os.path.join(tempfile.gettempdir(), 'ViWrap_job_logs')
+    step_log_dir = os.path.join(log_dir, get_safe_name(process_metrics.get_step() or 'no_step'))
+    os.makedirs(step_log_dir, exist_ok = True)
+    return os.path.join(step_log_dir, f'{get_safe_name(job)}.stderr.txt')
+
+def get_tail(log_file, line_num = TAIL_LINES):
+    try:
+        with open(log_file, errors = 'replace') as f:
+            return ''.join(f.readlines()[-line_num:])
+    except OSError:
+        return ''
+
+def is_transient(returncode):
+    # Killed by a signal: Popen gives minus the signal number, and a shell gives 128 + the signal number for a killed tool
+    return returncode is None or returncode < 0 or 128 < returncode < 128 + 64
+
+def kill(proc):
+    # A local job runs in its own process group (start_new_session), so the shell and the tools started by it are all killed;
+    # a cluster job (see executors.py) is cancelled by the scheduler
+    if hasattr(proc, 'cancel'):
+        proc.cancel()
+    else:
+        try:
+            os.killpg(proc.pid, signal.SIGKILL)
+        except OSError:
+            pass
+    proc.wait()
+
+def remove_outputs(outputs):
+    for output in outputs or []:
+        if os.path.isdir(output) and not os.path.islink(output):
+            shutil.rmtree(output, ignore_errors = True)
+        elif os.path.lexists(output):
+            os.remove(output)
+
+def wait(proc, timeout = None, abort = None):
+    # Returns the exit code, None if the job is killed by the timeout, or raises JobError if it is killed because another job has failed
+    start_time = time.time()
+    while True:
+        try:
+            return proc.wait(timeout = POLL_INTERVAL)
+        except subprocess.TimeoutExpired:
+            pass
+        if abort is not None and abort.is_set():
+            kill(proc)
+            raise JobError('Stopped as another job has failed')
+        if timeout and time.time() - start_time > timeout:
+            kill(proc)
+            return None
+
+def run(cmd, job, popen = process_metrics.Popen, timeout = None, retries = 0, abort = None, outputs = None, **kwargs):
+    # Run cmd by popen(cmd, **kwargs) with its stderr in the job log; returns the log file, or raises JobError with the end of the log
+    # abort: a threading.Event; when it is set (i.e., another job of the same batch has failed), the job is killed
+    # outputs: [file or dir written only by this job], removed before each attempt
+    log_file = get_log_file(job)
+    for attempt in range(retries + 1):
+        remove_outputs(outputs)
+        with open(log_file, 'a') as log:
+            log.write(f"### [{str(datetime.now().replace(microsecond=0))}] Attempt {attempt + 1}: {cmd}\n")
+            log.flush()
+            proc = popen(cmd, stderr = log, start_new_session = True, **kwargs)
+            returncode = wait(proc, timeout, abort)
+        if returncode == 0:
+            return log_file
+        if not is_transient(returncode) or attempt == retries:
+            break
+        time.sleep(BACKOFF * 2 ** attempt)
+        if abort is not None and abort.is_set():
+            raise JobError('Stopped as another job has failed')
+
+    reason = f'timed out after {timeout:g} s' if returncode is None else f'failed with exit code {returncode}'
+    raise JobError(f"Job {job} {reason} (attempts: {attempt + 1}); the last lines of its stderr ({log_file}):\n{get_tail(log_file)}")
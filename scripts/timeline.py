@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+
+'''
+Aim: Write the timeline of a ViWrap run as a Chrome Trace Event file (ViWrap_trace.json), to be opened in Perfetto (https://ui.perfetto.dev) or chrome://tracing
+Note: The "ViWrap steps" track has one span for each step, plus counters of the running steps and sub-jobs;
+each step has its own track with one span for each process it started: the helper script or tool of the step,
+and each parallel sub-job (i.e., a CheckV chunk of genomes, a dRep genus, a DIAMOND genome, or an hmmsearch chunk).
+Spans that overlap in time are put on different rows (threads), so the number of rows of a step is the number of its processes running at the same time.
+Process spans come from the process records (see process_metrics.py); step spans come from the pipeline
+'''
+
+try:
+    import warnings
+    import sys
+    import os
+    import json
+    warnings.filterwarnings("ignore")
+except Exception as e:
+    sys.stderr.write(str(e) + "\n\n")
+    exit(1)
+
+
+STEPS_PID = 0 # The track of all steps; the track of each step gets its own pid from 1
+
+
+def get_lanes(spans):
+    # Put spans on rows so that spans on the same row do not overlap; spans are [(start, end, item)] in seconds; returns [(row, start, end, item)]
+    lane_ends = [] # row => end of its last span
+    laid_out = []
+    for start, end, item in sorted(spans, key = lambda x: (x[0], x[1])):
+        for lane, lane_end in enumerate(lane_ends):
+            if lane_end <= start:
+                break
+        else:
+            lane = len(lane_ends)
+            lane_ends.append(0)
+        lane_ends[lane] = end
+        laid_out.append((lane, start, end, item))
+    return laid_out
+
+def get_counter_events(name, spans, origin):
+    # A counter of how many spans are running, changed at each start and end
+    changes = sorted([(start, 1) for start, end in spans] + [(end, -1) for start, end in spans])
+    events = []
+    count = 0
+    for timestamp, change in changes:
+        count += change
+        events.append({'name': name, 'ph': 'C', 'pid': STEPS_PID, 'ts': round((timestamp - origin) * 1e6), 'args': {name: count}})
+    return events
+
+def get_metadata_events(pid, name):
+    # The name of a track, and its position (tracks are sorted by pid)
+    return [{'name': 'process_name', 'ph': 'M', 'pid': pid, 'args': {'name': name}}, {'name': 'process_sort_index', 'ph': 'M', 'pid': pid, 'args': {'sort_index': pid}}]
+
+def get_trace_events(step2span, records):
+    # Returns [trace event]; time stamps are in microseconds from the start of the first step or process
+    process_spans = [(x['start_timestamp'], x['start_timestamp'] + x['wall_time'], x) for x in records if x.get('start_timestamp') is not None]
+    if step2span:
+        # A resumed run appends to the process records of the previous runs; only the processes of this run are shown
+        run_start = min(start for start, end in step2span.values())
+        process_spans = [x for x in process_spans if x[0] >= run_start - 1]
+    starts = [start for start, end in step2span.values()] + [start for start, end, record in process_spans]
+    if not starts:
+        return []
+    origin = min(starts)
+    events = get_metadata_events(STEPS_PID, 'ViWrap steps')
+
+    # Step 1 Step spans
+    steps = sorted(set(step2span) | set(x['step'] for start, end, x in process_spans), key = lambda x: step2span.get(x, (float('inf'),))[0])
+    for lane, start, end, name in get_lanes([(start, end, name) for name, (start, end) in step2span.items()]):
+        events.append({'name': name, 'cat': 'step', 'ph': 'X', 'pid': STEPS_PID, 'tid': lane, 'ts': round((start - origin) * 1e6), 'dur': round((end - start) * 1e6)})
+    events.extend(get_counter_events('running steps', list(step2span.values()), origin))
+    events.extend(get_counter_events('running sub-jobs', [(start, end) for start, end, x in process_spans if x['level'] == 'tool'], origin))
+
+    # Step 2 Process spans, one track for each step
+    for pid, step in enumerate(steps, start = 1):
+        events.extend(get_metadata_events(pid, step or 'not in a step'))
+        for lane, start, end, record in get_lanes([(start, end, x) for start, end, x in process_spans if x['step'] == step]):
+            events.append({
+                'name': record.get('job') or record['cmd'].split(' ', 1)[0],
+                'cat': 'sub-job' if record['level'] == 'tool' else 'process',
+                'ph': 'X', 'pid': pid, 'tid': lane,
+                'ts': round((start - origin) * 1e6), 'dur': round((end - start) * 1e6),
+                'args': {key: record[key] for key in ['cmd', 'user_time', 'system_time', 'max_rss_bytes', 'read_bytes', 'write_bytes', 'exit_code']}
+            })
+    return events
+
+def write_trace(trace_file, step2span, records):
+    with open(trace_file + '.tmp', 'w') as f:
+        json.dump({'traceEvents': get_trace_events(step2span, records), 'displayTimeUnit': 'ms'}, f)
+    os.replace(trace_file + '.tmp', trace_file)
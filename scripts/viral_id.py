@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+
+'''
+Aim: Parse viral genome, scaffold, and protein IDs once into structured records
+Note: pandas is only needed for the column helper
+ID conventions used in ViWrap:
+(1) "__" links a genome and its scaffold or protein, i.e., vRhyme_bin_1__NODE_1_length_5000_cov_2.1
+(2) "||" is the VirSorter2 suffix, i.e., NODE_1_length_5000_cov_2.1||full
+(3) "_fragment_" is the VIBRANT prophage fragment, i.e., NODE_1_length_5000_cov_2.1_fragment_2
+(4) "_" + number is the protein (gene) suffix of a scaffold, i.e., NODE_1_length_5000_cov_2.1_12
+'''
+
+try:
+    import warnings
+    import sys
+    import re
+    from collections import namedtuple
+    from functools import lru_cache
+    warnings.filterwarnings("ignore")
+except Exception as e:
+    sys.stderr.write(str(e) + "\n\n")
+    exit(1)
+
+
+CACHE_SIZE = 1 << 16 # The number of IDs to memoise by each parser; IDs repeat a lot (i.e., a scaffold for each of its proteins), mostly close together
+
+# scaffold => contig [_fragment_N] [||suffix]
+SCAFFOLD_PATTERN = r'(?P<scaffold>(?P<contig>.+?)(?:_fragment_(?P<fragment>\d+))?(?:\|\|(?P<vs2_suffix>.*))?)'
+SCAFFOLD_ID = re.compile(r'^>?' + SCAFFOLD_PATTERN + r'$')
+LONG_SCAFFOLD_ID = re.compile(r'^>?(?:(?P<genome>.+?)__)?' + SCAFFOLD_PATTERN + r'$')
+PROTEIN_ID = re.compile(r'^>?(?:(?P<genome>.+?)__)?(?P<long_scaffold_wo_genome>.+)_(?P<protein>\d+)$')
+
+ScaffoldID = namedtuple('ScaffoldID', ['genome', 'scaffold', 'contig', 'fragment', 'vs2_suffix'])
+ProteinID = namedtuple('ProteinID', ['genome', 'scaffold', 'contig', 'fragment', 'vs2_suffix', 'protein'])
+# genome: the genome name before "__" ('' if there is no genome prefix)
+# scaffold: the scaffold name without the genome prefix (keeps "_fragment_N" and "||suffix")
+# contig: the original contig name in the input metagenome (without "_fragment_N" and "||suffix")
+# fragment: the VIBRANT fragment number (None if it is not a fragment)
+# vs2_suffix: the VirSorter2 suffix after "||" (None if there is no suffix)
+# protein: the protein number of the scaffold
+
+
+def make_scaffold_id(match):
+    fragment = match.group('fragment')
+    return ScaffoldID(match.groupdict().get('genome') or '', match.group('scaffold'), match.group('contig'), int(fragment) if fragment else None, match.group('vs2_suffix'))
+
+@lru_cache(maxsize = CACHE_SIZE)
+def parse_scaffold_id(scaffold_id):
+    # For scaffold IDs without the genome prefix, i.e., headers in VIBRANT/VirSorter2/DeepVirFinder results
+    return make_scaffold_id(SCAFFOLD_ID.match(scaffold_id))
+
+@lru_cache(maxsize = CACHE_SIZE)
+def parse_long_scaffold_id(long_scaffold_id):
+    # For scaffold IDs with the genome prefix ("genome__scaffold"), i.e., headers in viral genome fasta files
+    return make_scaffold_id(LONG_SCAFFOLD_ID.match(long_scaffold_id))
+
+@lru_cache(maxsize = CACHE_SIZE)
+def parse_protein_id(protein_id):
+    # For protein IDs with or without the genome prefix ("genome__scaffold_N" or "scaffold_N")
+    match = PROTEIN_ID.match(protein_id)
+    if not match:
+        raise ValueError(f'{protein_id} is not a protein ID (scaffold + "_" + number)')
+    scaffold = parse_scaffold_id(match.group('long_scaffold_wo_genome'))
+    return ProteinID(match.group('genome') or '', scaffold.scaffold, scaffold.contig, scaffold.fragment, scaffold.vs2_suffix, int(match.group('protein')))
+
+def remove_genome_prefix(long_id):
+    # "genome__scaffold" => "scaffold" and "genome__protein" => "protein"; the same as long_id.replace('>', '', 1).split('__', 1)[1]
+    return parse_long_scaffold_id(long_id).scaffold
+
+def get_contig(scaffold_id):
+    # Remove "_fragment_N" and "||suffix" to get the original contig name
+    return parse_scaffold_id(scaffold_id).contig
+
+def get_protein_scaffold(protein_id):
+    # The scaffold of a protein, keeping the genome prefix if there is one; the same as protein_id.replace('>', '', 1).rsplit('_', 1)[0]
+    return protein_id.lstrip('>').rsplit('_', 1)[0]
+
+def parse_scaffold_id_column(ids, long_id = False):
+    # Vectorised version of parse_scaffold_id/parse_long_scaffold_id for a pandas Series; returns a DataFrame with the ScaffoldID fields
+    pattern = LONG_SCAFFOLD_ID if long_id else SCAFFOLD_ID
+    parsed = ids.astype(str).str.extract(pattern.pattern)
+    if 'genome' not in parsed:
+        parsed['genome'] = ''
+    parsed['genome'] = parsed['genome'].fillna('')
+    parsed['fragment'] = parsed['fragment'].astype('Int64')
+    return parsed[list(ScaffoldID._fields)]
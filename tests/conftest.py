@@ -0,0 +1,22 @@
+import os
+import sys
+
+import pytest
+
+# The masters import shared modules as "scripts.X", and helper scripts import them as "X" from the scripts dir
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in [ROOT_DIR, os.path.join(ROOT_DIR, 'scripts')]:
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+
+@pytest.fixture
+def log_dir(tmp_path, monkeypatch):
+    # Job logs of supervised jobs go to the test dir; no timeout and no retries unless a test sets them
+    from scripts import supervisor
+    monkeypatch.setenv(supervisor.LOG_DIR_ENV, str(tmp_path / 'logs'))
+    monkeypatch.delenv(supervisor.TIMEOUT_ENV, raising = False)
+    monkeypatch.delenv(supervisor.RETRIES_ENV, raising = False)
+    return tmp_path / 'logs'
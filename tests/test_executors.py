@@ -0,0 +1,75 @@
+import os
+import subprocess
+import time
+
+import pytest
+
+from scripts import executors
+from scripts import job_pool
+from scripts import supervisor
+
+
+@pytest.fixture
+def mock_executor(monkeypatch, log_dir):
+    executor = executors.ClusterExecutor(executors.MockCluster(2))
+    monkeypatch.setattr(executors, 'executor', executor)
+    return executor
+
+def submit(executor, cmd, job = 'job'):
+    log_file = supervisor.get_log_file(job)
+    with open(log_file, 'a') as log:
+        return executor.popen(cmd, job, 1, 0, stderr = log), log_file
+
+
+def test_cluster_job_exit_code_is_read_from_exit_file(mock_executor):
+    proc, log_file = submit(mock_executor, 'echo out; echo err >&2')
+    assert proc.wait(timeout = 10) == 0
+    assert os.path.exists(log_file[:-len('.stderr.txt')] + '.sh')
+    with open(proc.exit_file) as f:
+        assert f.read().strip() == '0'
+    with open(log_file) as f:
+        assert 'err' in f.read()
+
+def test_cluster_job_keeps_exit_code_of_exit_command(mock_executor):
+    # "exit" in the command should not skip writing the exit file
+    proc, _ = submit(mock_executor, 'exit 4')
+    assert proc.wait(timeout = 10) == 4
+
+def test_cluster_job_timeout_and_cancel(mock_executor):
+    proc, _ = submit(mock_executor, 'sleep 30')
+    with pytest.raises(subprocess.TimeoutExpired):
+        proc.wait(timeout = 0.5)
+    proc.cancel()
+    assert proc.wait(timeout = 1) == executors.KILLED
+    assert not os.path.exists(proc.exit_file)
+
+def test_cluster_job_gone_without_exit_file_is_killed(mock_executor, monkeypatch):
+    monkeypatch.setattr(executors, 'STATE_CHECK_INTERVAL', 0)
+    proc, _ = submit(mock_executor, 'sleep 30')
+    time.sleep(0.5)
+    mock_executor.cluster.cancel(proc.job_id) # i.e., killed by the scheduler for running out of memory
+    assert proc.wait(timeout = 10) == executors.KILLED
+    assert supervisor.is_transient(proc.returncode)
+
+def test_mock_cluster_runs_queued_jobs_in_order(mock_executor, tmp_path):
+    procs = [submit(mock_executor, f'echo {i} >> {tmp_path}/order.txt; sleep 0.2', f'job {i}')[0] for i in range(4)]
+    assert [proc.wait(timeout = 10) for proc in procs] == [0] * 4
+    with open(tmp_path / 'order.txt') as f:
+        assert sorted(f.read().split()[:2]) == ['0', '1']
+
+
+def test_run_jobs_on_mock_cluster(mock_executor, tmp_path):
+    jobs = [(f'job {i}', f'echo {i} > {tmp_path}/{i}.txt') for i in range(5)]
+    job_pool.run_jobs(jobs, 2, shell = True)
+    for i in range(5):
+        with open(tmp_path / f'{i}.txt') as f:
+            assert f.read().strip() == str(i)
+
+def test_run_jobs_on_mock_cluster_cancels_jobs_after_failure(mock_executor, tmp_path):
+    jobs = [('bad job', 'echo broken input >&2; exit 3'), ('slow job', 'sleep 30')]
+    start_time = time.time()
+    with pytest.raises(SystemExit) as error:
+        job_pool.run_jobs(jobs, 2, shell = True)
+    assert 'bad job failed with exit code 3' in str(error.value)
+    assert 'broken input' in str(error.value)
+    assert time.time() - start_time < 15 # The slow job is cancelled instead of waited for
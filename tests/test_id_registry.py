@@ -0,0 +1,38 @@
+from scripts import id_registry
+
+
+def test_build_id_registry_from_gn_dirs(tmp_path):
+    gn_dir = tmp_path / 'genomes'
+    gn_dir.mkdir()
+    (gn_dir / 'vRhyme_bin_1.fasta').write_text('>vRhyme_bin_1__scf_1\nA\n>vRhyme_bin_1__scf_2\nA\n')
+    (gn_dir / 'vRhyme_bin_1.faa').write_text('>vRhyme_bin_1__scf_1_1 # 1\nM\n>vRhyme_bin_1__scf_1_2\nM\n>vRhyme_bin_1__scf_2_1\nM\n')
+    (gn_dir / 'scf_3.fasta').write_text('>scf_3\nA\n')
+    (gn_dir / 'scf_3.faa').write_text('>scf_3_1\nM\n')
+    registry_dir = tmp_path / 'registry'
+    id_registry.build_id_registry_from_gn_dirs(registry_dir, [gn_dir])
+
+    registry = id_registry.load_id_registry(registry_dir)
+    assert id_registry.get_count(registry, 'genome') == 2
+    assert id_registry.get_count(registry, 'protein') == 4
+    assert id_registry.get_names(registry, 'genome') == ['scf_3', 'vRhyme_bin_1']
+    assert id_registry.get_pro2gn(registry) == {'scf_3_1': 'scf_3', 'vRhyme_bin_1__scf_1_1': 'vRhyme_bin_1', 'vRhyme_bin_1__scf_1_2': 'vRhyme_bin_1', 'vRhyme_bin_1__scf_2_1': 'vRhyme_bin_1'}
+    assert id_registry.get_gn2scfs(registry) == {'scf_3': ['scf_3'], 'vRhyme_bin_1': ['vRhyme_bin_1__scf_1', 'vRhyme_bin_1__scf_2']}
+    assert id_registry.get_gn2pros(registry)['vRhyme_bin_1'] == ['vRhyme_bin_1__scf_1_1', 'vRhyme_bin_1__scf_1_2', 'vRhyme_bin_1__scf_2_1']
+
+def test_build_id_registry_from_single_scf_gns(tmp_path):
+    fasta_file, faa_file = tmp_path / 'viruses.fasta', tmp_path / 'viruses.faa'
+    fasta_file.write_text('>scf_1\nA\n>scf_2\nA\n>scf_3\nA\n')
+    faa_file.write_text('>scf_1_1\nM\n>scf_1_2\nM\n>scf_3_1\nM\n')
+    registry_dir = tmp_path / 'registry'
+    id_registry.build_id_registry_from_single_scf_gns(registry_dir, fasta_file, faa_file)
+
+    registry = id_registry.load_id_registry(registry_dir)
+    assert id_registry.get_gn2pros(registry) == {'scf_1': ['scf_1_1', 'scf_1_2'], 'scf_2': [], 'scf_3': ['scf_3_1']}
+    assert id_registry.get_name(registry, 'scaffold', 1) == 'scf_2'
+
+def test_empty_registry(tmp_path):
+    registry_dir = tmp_path / 'registry'
+    id_registry.write_id_registry(registry_dir, [], [])
+    registry = id_registry.load_id_registry(registry_dir)
+    assert id_registry.get_count(registry, 'genome') == 0
+    assert id_registry.get_pro2gn(registry) == {}
@@ -0,0 +1,68 @@
+import pytest
+
+from scripts import executors
+from scripts import job_pool
+
+
+@pytest.fixture(autouse = True)
+def local_executor(monkeypatch, log_dir):
+    monkeypatch.setattr(executors, 'executor', executors.LocalExecutor())
+
+
+def test_run_jobs_runs_at_most_max_parallel_jobs(tmp_path):
+    (tmp_path / 'running').mkdir()
+    jobs = [(f'job {i}', f'touch {tmp_path}/running/{i}; ls {tmp_path}/running | wc -l >> {tmp_path}/counts.txt; sleep 0.3; rm {tmp_path}/running/{i}') for i in range(6)]
+    job_pool.run_jobs(jobs, 2, shell = True)
+    with open(tmp_path / 'counts.txt') as f:
+        counts = [int(x) for x in f.read().split()]
+    assert len(counts) == 6
+    assert max(counts) == 2
+
+def test_run_jobs_failure_exits_and_starts_no_new_jobs(tmp_path):
+    jobs = [('bad job', 'echo broken input >&2; exit 3'), ('next job', f'touch {tmp_path}/next.txt')]
+    with pytest.raises(SystemExit) as error:
+        job_pool.run_jobs(jobs, 1, shell = True)
+    assert 'bad job failed with exit code 3' in str(error.value)
+    assert 'broken input' in str(error.value)
+    assert not (tmp_path / 'next.txt').exists()
+
+def test_get_packing_few_large_inputs_get_wide_jobs():
+    threads, parallel_jobs = job_pool.get_packing('diamond', [100], 8)
+    assert (threads, parallel_jobs) == (8, 1)
+
+def test_get_packing_many_small_inputs_get_narrow_jobs():
+    threads, parallel_jobs = job_pool.get_packing('diamond', [0.01] * 100, 8)
+    assert (threads, parallel_jobs) == (1, 8)
+
+def test_get_packing_never_uses_more_cores_than_given():
+    for sizes in [[1], [1] * 3, [50, 1, 1], [0.1] * 40]:
+        threads, parallel_jobs = job_pool.get_packing('CheckV', sizes, 6)
+        assert threads * parallel_jobs <= 6
+        assert parallel_jobs <= len(sizes)
+
+def test_get_chunks_puts_each_input_in_one_chunk():
+    input2size = {f'genome_{i}': 0.01 * (i % 7 + 1) for i in range(200)}
+    chunks = job_pool.get_chunks('CheckV', input2size, 4, 20)
+    assert sorted(x for chunk in chunks for x in chunk) == sorted(input2size)
+    assert all(chunks)
+
+def test_get_chunks_loads_the_database_much_less_often():
+    chunks = job_pool.get_chunks('CheckV', {i: 0.04 for i in range(2000)}, 8, 20)
+    assert 8 <= len(chunks) <= 20
+    sizes = [len(chunk) for chunk in chunks]
+    assert max(sizes) - min(sizes) <= 1 # Chunks of equal inputs get the same sizes
+
+def test_get_chunks_splits_by_max_chunk_size():
+    chunks = job_pool.get_chunks('CheckV', {i: 1 for i in range(100)}, 1, 20)
+    assert len(chunks) >= 5
+    assert max(len(chunk) for chunk in chunks) <= 20
+
+def test_get_chunks_with_few_inputs():
+    assert job_pool.get_chunks('CheckV', {}, 4, 20) == []
+    assert job_pool.get_chunks('CheckV', {'a': 5}, 4, 20) == [['a']]
+
+def test_run_jobs_starts_largest_jobs_first(tmp_path):
+    jobs = [(f'job {i}', f'echo {i} >> {tmp_path}/order.txt') for i in range(4)]
+    job_pool.run_jobs(jobs, 1, job2size = {'job 0': 1, 'job 1': 5, 'job 2': 3, 'job 3': 5}, shell = True)
+    with open(tmp_path / 'order.txt') as f:
+        assert f.read().split() == ['1', '3', '2', '0'] # Jobs of the same size keep their order
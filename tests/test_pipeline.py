@@ -0,0 +1,86 @@
+import pytest
+
+from scripts import pipeline
+
+
+@pytest.fixture
+def workdir(tmp_path):
+    (tmp_path / 'input.fasta').write_text('>seq_1\nACGT\n')
+    return tmp_path
+
+def make_pipeline(workdir, calls, resume = False, threads = 1, max_parallel_steps = 1):
+    # input.fasta => step_a => a.txt => step_b => b.txt => step_c => c.txt; step_d only needs input.fasta
+    def write(name, output):
+        calls.append(name)
+        (workdir / output).write_text(name)
+    p = pipeline.Pipeline(max_parallel_steps, str(workdir / 'checkpoints'), resume)
+    p.add_step('step_a', lambda: write('step_a', 'a.txt'), [str(workdir / 'input.fasta')], [str(workdir / 'a.txt')], params = {'threads': threads})
+    p.add_step('step_b', lambda: write('step_b', 'b.txt'), [str(workdir / 'a.txt')], [str(workdir / 'b.txt')])
+    p.add_step('step_c', lambda: write('step_c', 'c.txt'), [str(workdir / 'b.txt')], [str(workdir / 'c.txt')])
+    p.add_step('step_d', lambda: write('step_d', 'd.txt'), [str(workdir / 'input.fasta')], [str(workdir / 'd.txt')])
+    return p
+
+def get_steps_to_run(p):
+    dependencies = p.get_dependencies()
+    return p.get_steps_to_run(dependencies, p.get_order(dependencies))
+
+
+def test_dependencies_and_order(workdir):
+    p = make_pipeline(workdir, [])
+    assert p.get_dependencies() == {'step_a': set(), 'step_b': {'step_a'}, 'step_c': {'step_b'}, 'step_d': set()}
+    assert p.get_order() == ['step_a', 'step_d', 'step_b', 'step_c']
+
+def test_run_follows_dependencies(workdir):
+    calls = []
+    make_pipeline(workdir, calls, max_parallel_steps = 2).run()
+    assert sorted(calls) == ['step_a', 'step_b', 'step_c', 'step_d']
+    assert calls.index('step_a') < calls.index('step_b') < calls.index('step_c')
+
+def test_dependency_cycle_is_refused(workdir):
+    p = pipeline.Pipeline()
+    p.add_step('step_a', lambda: None, [str(workdir / 'b.txt')], [str(workdir / 'a.txt')])
+    p.add_step('step_b', lambda: None, [str(workdir / 'a.txt')], [str(workdir / 'b.txt')])
+    with pytest.raises(ValueError, match = 'cycle'):
+        p.get_order()
+
+def test_failed_step_stops_downstream_steps(workdir):
+    calls = []
+    p = make_pipeline(workdir, calls)
+    p.steps['step_b'].func = lambda: 1 / 0
+    with pytest.raises(pipeline.PipelineError, match = 'step_b'):
+        p.run()
+    assert 'step_c' not in calls
+    assert not (workdir / 'checkpoints' / 'step_b.json').exists()
+
+def test_fresh_run_runs_all_steps(workdir):
+    assert get_steps_to_run(make_pipeline(workdir, [])) == {'step_a', 'step_b', 'step_c', 'step_d'}
+
+def test_resume_skips_valid_steps(workdir):
+    calls = []
+    make_pipeline(workdir, calls).run()
+    assert sorted(calls) == ['step_a', 'step_b', 'step_c', 'step_d']
+    p = make_pipeline(workdir, calls, resume = True)
+    assert get_steps_to_run(p) == set()
+    p.run()
+    assert len(calls) == 4
+
+def test_changed_input_reruns_step_and_downstream(workdir):
+    make_pipeline(workdir, []).run()
+    (workdir / 'input.fasta').write_text('>seq_1\nACGTT\n')
+    assert get_steps_to_run(make_pipeline(workdir, [], resume = True)) == {'step_a', 'step_b', 'step_c', 'step_d'}
+
+def test_changed_params_reruns_step_and_downstream(workdir):
+    make_pipeline(workdir, []).run()
+    assert get_steps_to_run(make_pipeline(workdir, [], resume = True, threads = 2)) == {'step_a', 'step_b', 'step_c'}
+
+def test_missing_output_reruns_step_and_downstream(workdir):
+    make_pipeline(workdir, []).run()
+    (workdir / 'b.txt').unlink()
+    calls = []
+    make_pipeline(workdir, calls, resume = True).run()
+    assert calls == ['step_b', 'step_c']
+
+def test_invalid_marker_is_run_again(workdir):
+    make_pipeline(workdir, []).run()
+    (workdir / 'checkpoints' / 'step_c.json').write_text('{"step": ')
+    assert get_steps_to_run(make_pipeline(workdir, [], resume = True)) == {'step_c'}
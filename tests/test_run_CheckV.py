@@ -0,0 +1,62 @@
+import os
+import filecmp
+
+import pytest
+
+import run_CheckV
+from conftest import DATA_DIR
+
+
+CHECKV_DATA_DIR = os.path.join(DATA_DIR, 'checkv')
+GENOMES = ['vRhyme_bin_1', 'NODE_5_length_200_cov_3.1'] # The order of genomes in the recorded chunk
+# chunk/: a CheckV run of the chunk fasta written from input/; expected/: CheckV runs of each genome alone
+
+
+@pytest.fixture
+def split_outdir(tmp_path):
+    genome2addr = {genome: os.path.join(CHECKV_DATA_DIR, 'input', f'{genome}.fasta') for genome in GENOMES}
+    seq_id2genome_and_contig = {}
+    run_CheckV.write_chunk_fasta(GENOMES, genome2addr, str(tmp_path / 'chunk_1.fasta'), seq_id2genome_and_contig)
+    outdir = tmp_path / 'CheckV'
+    run_CheckV.split_checkv_result(os.path.join(CHECKV_DATA_DIR, 'chunk'), str(outdir), GENOMES, seq_id2genome_and_contig)
+    return outdir
+
+
+def test_write_chunk_fasta_renames_contigs(tmp_path):
+    genome2addr = {genome: os.path.join(CHECKV_DATA_DIR, 'input', f'{genome}.fasta') for genome in GENOMES}
+    seq_id2genome_and_contig = {}
+    run_CheckV.write_chunk_fasta(GENOMES, genome2addr, str(tmp_path / 'chunk_1.fasta'), seq_id2genome_and_contig)
+    assert seq_id2genome_and_contig == {
+        'ViWrapSeq_1': ('vRhyme_bin_1', 'vRhyme_bin_1__NODE_1_length_120_cov_5.2'),
+        'ViWrapSeq_2': ('vRhyme_bin_1', 'vRhyme_bin_1__NODE_7_length_90_cov_4.8'),
+        'ViWrapSeq_3': ('NODE_5_length_200_cov_3.1', 'NODE_5_length_200_cov_3.1')
+    }
+    assert [head for head, seq in run_CheckV.seq_io.read_seq(tmp_path / 'chunk_1.fasta')] == ['>ViWrapSeq_1', '>ViWrapSeq_2', '>ViWrapSeq_3']
+
+def test_split_checkv_result_matches_checkv_of_each_genome(split_outdir):
+    assert sorted(os.listdir(split_outdir)) == sorted(GENOMES)
+    for genome in GENOMES:
+        expected_dir = os.path.join(CHECKV_DATA_DIR, 'expected', genome)
+        for file_name in run_CheckV.CHECKV_TABLES + run_CheckV.CHECKV_SEQS:
+            assert filecmp.cmp(split_outdir / genome / file_name, os.path.join(expected_dir, file_name), shallow = False), f'{genome}/{file_name}'
+
+def test_split_checkv_result_keeps_provirus_regions(split_outdir):
+    with open(split_outdir / 'NODE_5_length_200_cov_3.1' / 'proviruses.fna') as f:
+        heads = [line.rstrip('\n') for line in f if line.startswith('>')]
+    assert heads == ['>NODE_5_length_200_cov_3.1_1 1-60/200', '>NODE_5_length_200_cov_3.1_2 151-200/200']
+    assert os.path.getsize(split_outdir / 'vRhyme_bin_1' / 'proviruses.fna') == 0
+
+def test_quality_summary_is_the_same_as_checkv_of_each_genome(split_outdir, tmp_path, monkeypatch):
+    # CheckV_quality_summary.txt made from the split result is the same as the one made from CheckV runs of each genome alone
+    pytest.importorskip('pyfastx')
+    from scripts import module
+    monkeypatch.chdir(tmp_path) # Relative paths, as parse_checkv_result skips paths containing "tmp"
+    module.parse_checkv_result('CheckV', 'split_summary.txt')
+    module.parse_checkv_result(os.path.join(CHECKV_DATA_DIR, 'expected'), 'expected_summary.txt')
+    with open('split_summary.txt') as f:
+        split_lines = f.readlines()
+    with open('expected_summary.txt') as f:
+        expected_lines = f.readlines()
+    assert split_lines[0] == expected_lines[0]
+    assert sorted(split_lines[1:]) == sorted(expected_lines[1:]) # Genome dirs are walked in the order of the file system
+    assert len(split_lines) == 4
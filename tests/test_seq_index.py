@@ -0,0 +1,40 @@
+import os
+
+import pytest
+
+from scripts import seq_index
+
+
+@pytest.fixture
+def fasta_file(tmp_path):
+    fasta_file = tmp_path / 'test.fasta'
+    fasta_file.write_text('>seq_1 desc\nACGT\nAC\n>seq_2\nGG\n>seq_3\nTTT\n')
+    return fasta_file
+
+
+def test_build_seq_index(fasta_file):
+    index = seq_index.build_seq_index(fasta_file)
+    assert list(index) == ['seq_1', 'seq_2', 'seq_3']
+    assert [record[3] for record in index.values()] == [6, 2, 3]
+    assert os.path.exists(seq_index.get_index_file(fasta_file))
+    assert seq_index.load_seq_index(fasta_file) == index
+
+def test_fetch_seqs_keeps_given_order_and_skips_missing_ids(fasta_file):
+    records = list(seq_index.fetch_seqs(fasta_file, ['seq_3', 'missing', 'seq_1']))
+    assert records == [('>seq_3', 'TTT'), ('>seq_1', 'ACGTAC')]
+    assert list(seq_index.fetch_seqs(fasta_file, ['seq_1'], full_head = True)) == [('>seq_1 desc', 'ACGTAC')]
+
+def test_load_seq_index_rebuilds_stale_index(fasta_file):
+    seq_index.build_seq_index(fasta_file)
+    fasta_file.write_text('>seq_4\nCCCC\n')
+    os.utime(fasta_file, ns = (0, 0))
+    assert list(seq_index.load_seq_index(fasta_file)) == ['seq_4']
+    assert list(seq_index.fetch_seqs(fasta_file, ['seq_4', 'seq_1'])) == [('>seq_4', 'CCCC')]
+
+def test_build_seq_index_refuses_gzipped_file(tmp_path):
+    import gzip
+    gz_file = tmp_path / 'test.fasta.gz'
+    with gzip.open(gz_file, 'wt') as f:
+        f.write('>seq_1\nA\n')
+    with pytest.raises(ValueError):
+        seq_index.build_seq_index(gz_file)
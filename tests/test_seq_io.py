@@ -0,0 +1,60 @@
+import gzip
+
+import pytest
+
+from scripts import seq_io
+
+
+FASTA = '>seq_1 first record\nACGT\nAC\n>seq_2\tsecond\nGG\n>seq_3\n\n'
+
+
+@pytest.fixture
+def fasta_file(tmp_path):
+    fasta_file = tmp_path / 'test.fasta'
+    fasta_file.write_text(FASTA)
+    return fasta_file
+
+@pytest.fixture
+def gz_file(tmp_path):
+    gz_file = tmp_path / 'test.fasta.gz'
+    with gzip.open(gz_file, 'wt') as f:
+        f.write(FASTA)
+    return gz_file
+
+
+def test_read_seq_joins_lines_and_breaks_heads(fasta_file):
+    assert list(seq_io.read_seq(fasta_file)) == [('>seq_1', 'ACGTAC'), ('>seq_2', 'GG'), ('>seq_3', '')]
+
+def test_read_seq_full_head(fasta_file):
+    heads = [head for head, seq in seq_io.read_seq(fasta_file, full_head = True)]
+    assert heads == ['>seq_1 first record', '>seq_2\tsecond', '>seq_3']
+
+def test_read_seq_gzipped(fasta_file, gz_file):
+    assert list(seq_io.read_seq(gz_file)) == list(seq_io.read_seq(fasta_file))
+
+def test_read_headers_matches_read_seq(fasta_file, gz_file):
+    for seq_file in [fasta_file, gz_file]:
+        for full_head in [False, True]:
+            assert list(seq_io.read_headers(seq_file, full_head)) == [head for head, seq in seq_io.read_seq(seq_file, full_head)]
+
+def test_read_headers_empty_file(tmp_path):
+    empty_file = tmp_path / 'empty.fasta'
+    empty_file.write_text('')
+    assert list(seq_io.read_headers(empty_file)) == []
+
+def test_write_seq_gzips_by_extension(tmp_path, fasta_file):
+    out_file = tmp_path / 'out.fasta.gz'
+    seq_io.write_seq(seq_io.read_seq(fasta_file), out_file)
+    assert seq_io.is_gzipped(out_file)
+    assert list(seq_io.read_seq(out_file)) == list(seq_io.read_seq(fasta_file))
+
+def test_extract_seq_to_files(tmp_path, gz_file):
+    out_1, out_2 = tmp_path / 'out_1.fasta', tmp_path / 'out_2.fasta'
+    seq_io.extract_seq_to_files(gz_file, [({'seq_1', 'seq_3'}, out_1), ({'seq_2'}, out_2)])
+    assert out_1.read_text() == '>seq_1\nACGTAC\n>seq_3\n\n'
+    assert out_2.read_text() == '>seq_2\nGG\n'
+
+def test_read_gene_seq_adds_file_stem(tmp_path):
+    faa_file = tmp_path / 'genome_1.faa'
+    faa_file.write_text('>scf_1_1 # 1 # 90\nMKL*\n')
+    assert list(seq_io.read_gene_seq(faa_file)) == [('>genome_1~~scf_1_1', 'MKL')]
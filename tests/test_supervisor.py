@@ -0,0 +1,40 @@
+import os
+
+import pytest
+
+from scripts import supervisor
+
+
+@pytest.fixture(autouse = True)
+def fast_retries(monkeypatch, log_dir):
+    monkeypatch.setattr(supervisor, 'BACKOFF', 0.01)
+    monkeypatch.setattr(supervisor, 'POLL_INTERVAL', 0.1)
+
+
+def test_is_transient():
+    assert supervisor.is_transient(None) # Timed out
+    assert supervisor.is_transient(-9) # Killed by a signal
+    assert supervisor.is_transient(137) # A tool killed by a signal under a shell
+    assert not supervisor.is_transient(1)
+    assert not supervisor.is_transient(0)
+
+def test_retry_removes_outputs_of_killed_attempt(tmp_path):
+    out_dir, flag = tmp_path / 'out', tmp_path / 'flag'
+    cmd = (f'test -e {out_dir}/partial && exit 9; mkdir -p {out_dir}; '
+           f'if [ -e {flag} ]; then touch {out_dir}/done; else touch {flag} {out_dir}/partial; kill -9 $$; fi')
+    log_file = supervisor.run(cmd, 'job', retries = 1, outputs = [str(out_dir)], shell = True)
+    assert sorted(os.listdir(out_dir)) == ['done']
+    with open(log_file) as f:
+        assert 'Attempt 2' in f.read()
+
+def test_failure_is_not_retried(tmp_path):
+    cmd = f'echo run >> {tmp_path}/runs.txt; echo bad option >&2; exit 2'
+    with pytest.raises(supervisor.JobError, match = 'failed with exit code 2') as error:
+        supervisor.run(cmd, 'job', retries = 2, shell = True)
+    assert 'bad option' in str(error.value)
+    with open(tmp_path / 'runs.txt') as f:
+        assert f.read().split() == ['run']
+
+def test_timeout_kills_job():
+    with pytest.raises(supervisor.JobError, match = 'timed out after 0.5 s'):
+        supervisor.run('sleep 30', 'job', timeout = 0.5, shell = True)
@@ -0,0 +1,36 @@
+import pytest
+
+from scripts import viral_id
+
+
+def test_parse_scaffold_id():
+    assert viral_id.parse_scaffold_id('>NODE_1_length_5000_cov_2.1_fragment_2||full') == viral_id.ScaffoldID('', 'NODE_1_length_5000_cov_2.1_fragment_2||full', 'NODE_1_length_5000_cov_2.1', 2, 'full')
+    assert viral_id.parse_scaffold_id('NODE_1') == viral_id.ScaffoldID('', 'NODE_1', 'NODE_1', None, None)
+
+def test_parse_long_scaffold_id():
+    parsed = viral_id.parse_long_scaffold_id('vRhyme_bin_1__NODE_1||0_partial')
+    assert (parsed.genome, parsed.scaffold, parsed.contig, parsed.vs2_suffix) == ('vRhyme_bin_1', 'NODE_1||0_partial', 'NODE_1', '0_partial')
+    assert viral_id.remove_genome_prefix('>vRhyme_bin_1__NODE_1_fragment_1') == 'NODE_1_fragment_1'
+
+def test_parse_protein_id():
+    parsed = viral_id.parse_protein_id('vRhyme_bin_1__NODE_1_fragment_3_12')
+    assert parsed == viral_id.ProteinID('vRhyme_bin_1', 'NODE_1_fragment_3', 'NODE_1', 3, None, 12)
+    assert viral_id.get_protein_scaffold('>vRhyme_bin_1__NODE_1_12') == 'vRhyme_bin_1__NODE_1'
+    with pytest.raises(ValueError):
+        viral_id.parse_protein_id('NODE')
+
+def test_get_contig():
+    assert viral_id.get_contig('NODE_1_fragment_1') == 'NODE_1'
+    assert viral_id.get_contig('NODE_1||lt2gene') == 'NODE_1'
+
+def test_parse_scaffold_id_column_matches_parse_scaffold_id():
+    pd = pytest.importorskip('pandas')
+    ids = ['NODE_1_fragment_2||full', 'NODE_2', 'NODE_3||0_partial']
+    parsed = viral_id.parse_scaffold_id_column(pd.Series(ids))
+    assert list(parsed['contig']) == [viral_id.get_contig(x) for x in ids]
+    assert list(parsed['scaffold']) == ids
+    assert parsed['fragment'].tolist()[0] == 2 and parsed['fragment'].isna().tolist()[1:] == [True, True]
+
+    long_parsed = viral_id.parse_scaffold_id_column(pd.Series(['bin_1__NODE_1', 'NODE_2']), long_id = True)
+    assert list(long_parsed['genome']) == ['bin_1', '']
+    assert list(long_parsed['scaffold']) == ['NODE_1', 'NODE_2']